@@ -7,7 +7,7 @@ from typing import Dict, List, Optional
 
 import streamlit as st
 
-from app_core.email_notifications import preparar_resumen_bloques_entrenador
+from app_core.email_notifications import enviar_resumenes_bloques, preparar_resumen_bloques_entrenador
 from app_core.firebase_client import get_db
 
 
@@ -129,6 +129,31 @@ def _render_metadata(metadata: Dict) -> None:
             st.caption("Sin comentarios registrados para la semana seleccionada.")
 
 
+def _render_envio_lote(entrenadores: List[EntrenadorInfo], fecha_referencia: date) -> None:
+    st.subheader("Enviar resúmenes")
+    st.caption("Envía el resumen a todos los destinatarios habilitados en un solo lote.")
+    if not st.button(f"Enviar a {len(entrenadores)} entrenador(es)", key="enviar_resumenes_lote"):
+        return
+    with st.spinner("Enviando resúmenes…"):
+        resultados = enviar_resumenes_bloques(
+            [e.correo for e in entrenadores],
+            enviar=True,
+            fecha_referencia=fecha_referencia,
+        )
+    enviados = sum(1 for r in resultados if r.get("enviado"))
+    if enviados == len(resultados):
+        st.success(f"Resúmenes enviados: {enviados}.")
+    else:
+        st.warning(f"Resúmenes enviados: {enviados} de {len(resultados)}.")
+    fallidos = [
+        {"Correo": r.get("destinatario", ""), "Error": r.get("error") or ""}
+        for r in resultados
+        if not r.get("enviado")
+    ]
+    if fallidos:
+        st.table(fallidos)
+
+
 def ver_previsualizacion_correos() -> None:
     """Renderiza la pantalla de previsualización de correos semanales."""
     rol_actual = (st.session_state.get("rol") or "").strip().lower()
@@ -197,3 +222,6 @@ def ver_previsualizacion_correos() -> None:
 
     metadata = contenido.get("metadata") or {}
     _render_metadata(metadata)
+
+    st.divider()
+    _render_envio_lote(entrenadores, fecha_referencia)
@@ -17,6 +17,8 @@ from app_core.utils import (
     EMPRESA_DESCONOCIDA,
     _invalidate_usuario_cache,
 )
+from app_core.cache import cache_data, clear_cache
+from app_core.users_service import list_users, note_user_write
 
 # ========== Firebase: inicializar solo una vez ==========
 if not firebase_admin._apps:
@@ -101,7 +103,8 @@ def _set_empresa_usuario(correo: str, empresa: str) -> bool:
 
         db.collection("usuarios").document(doc_id).set(payload, merge=True)
         _invalidate_usuario_cache()
-        st.cache_data.clear()
+        note_user_write(correo, {"empresa": empresa_clean.lower(), "empresa_id": empresa_clean.lower()})
+        clear_cache("usuarios")
         return True
     except Exception as exc:
         st.error(f"No se pudo actualizar la empresa: {exc}")
@@ -109,7 +112,7 @@ def _set_empresa_usuario(correo: str, empresa: str) -> bool:
 
 
 # ========== Catálogos / mapas ==========
-@st.cache_data(ttl=300)
+@cache_data("usuarios", ttl=300)
 def _mapear_entrenadores() -> Dict[str, str]:
     """{correo_entrenador: nombre_entrenador} desde colección 'usuarios'."""
     m: Dict[str, str] = {}
@@ -125,7 +128,7 @@ def _mapear_entrenadores() -> Dict[str, str]:
         pass
     return m
 
-@st.cache_data(ttl=180)
+@cache_data("usuarios", ttl=180)
 def _cargar_usuarios_deportistas() -> List[Dict[str, Any]]:
     """Lista de usuarios con rol 'deportista'."""
     res: List[Dict[str, Any]] = []
@@ -142,15 +145,11 @@ def _cargar_usuarios_deportistas() -> List[Dict[str, Any]]:
     return res
 
 
-@st.cache_data(ttl=120)
 def _cargar_todos_usuarios() -> List[Dict[str, Any]]:
     usuarios: List[Dict[str, Any]] = []
     try:
-        for snap in db.collection("usuarios").stream():
-            if not snap.exists:
-                continue
-            data = snap.to_dict() or {}
-            data["_id"] = snap.id
+        for u in list_users():
+            data = dict(u)
             data["correo"] = (data.get("correo") or "").strip().lower()
             usuarios.append(data)
     except Exception:
@@ -420,7 +419,7 @@ def ver_resumen_entrenadores():
                         st.session_state["_admin_baja_msg"] = (
                             f"Usuario {'reactivado' if not activo_actual else 'dado de baja'} correctamente."
                         )
-                        st.cache_data.clear()
+                        clear_cache("usuarios")
                         _trigger_rerun()
 
     st.markdown("</div>", unsafe_allow_html=True)
@@ -1,18 +1,34 @@
+import asyncio
+import hashlib
+import logging
 import os
 import json
 import tomllib
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
+import threading
+import time
 import unicodedata
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional
 
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 
 import firebase_admin
 from firebase_admin import credentials, firestore
+from app_core.progresion import decidir_progresion, resumir_historial
 from app_core.utils_rm import calcular_rm_teorico, calcular_peso_por_porcentaje
 
+try:
+    from app_core.cache import on_write
+except Exception:  # fuera de Streamlit (scripts / main de prueba)
+    on_write = None
+
+logger = logging.getLogger(__name__)
+
 # ==============================
 # 🔐 Cargar variables
 # ==============================
@@ -59,17 +75,22 @@ def _load_openai_api_key() -> Optional[str]:
     return None
 
 
-def get_openai_client() -> OpenAI:
-    """
-    Crea el cliente tomando la key de entorno o de .streamlit/secrets.toml.
-    Nunca guardes la llave en el código.
-    """
+def _api_key_requerida() -> str:
     api_key = _load_openai_api_key()
     if not api_key:
         raise RuntimeError(
             "OPENAI_API_KEY no configurada. Exporta la variable o colócala en .streamlit/secrets.toml"
         )
-    return OpenAI(api_key=api_key)
+    return api_key
+
+
+@lru_cache(maxsize=1)
+def get_openai_client() -> OpenAI:
+    """
+    Crea el cliente (una vez por proceso) tomando la key de entorno o de .streamlit/secrets.toml.
+    Nunca guardes la llave en el código. `OPENAI_BASE_URL` permite apuntar a un servidor local de prueba.
+    """
+    return OpenAI(api_key=_api_key_requerida())
 
 # ==============================
 # 🔥 Cliente Firestore
@@ -92,6 +113,132 @@ def get_db() -> firestore.Client:
 # ============================================================
 # 🧩 Obtener historial real según tu estructura
 # ============================================================
+TTL_INDICE_HISTORIAL_S = 300   # una tanda de sugerencias reusa las mismas semanas leídas
+MAX_INDICES_HISTORIAL = 64
+
+# (correo_formateado, fecha_base, start, semanas) -> (creado_en, {nombre_norm: [entradas]}, docs_revisados)
+_INDICES_HISTORIAL: "OrderedDict[tuple, tuple]" = OrderedDict()
+_LOCK_HISTORIAL = threading.Lock()
+
+
+def _norm(txt: str) -> str:
+    txt = (txt or "").strip().lower()
+    txt = unicodedata.normalize("NFD", txt).encode("ascii", "ignore").decode("utf-8")
+    return txt
+
+
+def _ejercicios_de_documento(data: dict) -> List[tuple]:
+    """
+    (dia_index, ejercicio) de un doc de `rutinas_semanales`, desde varias formas posibles:
+    1) data["rutina"] = lista de días -> lista de ejercicios (dicts)
+    2) data["ejercicios"] = lista de ejercicios (dicts)
+    3) cualquier campo lista que contenga dicts con clave "ejercicio"
+    4) sub-mapas o el propio documento con clave "ejercicio"
+    """
+    contenedores: list = []
+    rutina = data.get("rutina")
+    if isinstance(rutina, list):
+        contenedores.append(rutina)
+    elif isinstance(rutina, dict):
+        # rutina como mapa de días -> lista de ejercicios
+        contenedores.append(list(rutina.values()))
+
+    ejercicios_flat = data.get("ejercicios")
+    if isinstance(ejercicios_flat, list):
+        contenedores.append([ejercicios_flat])
+
+    for v in data.values():
+        if isinstance(v, list) and any(isinstance(x, dict) and "ejercicio" in x for x in v):
+            contenedores.append([v])
+        if isinstance(v, dict):
+            if "ejercicio" in v:
+                contenedores.append([[v]])
+            # dict de días u otras claves que contengan listas de ejercicios
+            for sub in v.values():
+                if isinstance(sub, list) and any(isinstance(x, dict) and "ejercicio" in x for x in sub):
+                    contenedores.append([sub])
+
+    if "ejercicio" in data:
+        contenedores.append([[data]])
+
+    encontrados: List[tuple] = []
+    for cont in contenedores:
+        for dia_index, ejercicios_dia in enumerate(cont):
+            if not isinstance(ejercicios_dia, list):
+                continue
+            for ej in ejercicios_dia:
+                if isinstance(ej, dict):
+                    encontrados.append((dia_index, ej))
+    return encontrados
+
+
+def _construir_indice_historial(correo_formateado: str, fecha_base, start: int, semanas_atras: int):
+    """Lee todas las semanas con un solo `get_all` y agrupa las apariciones por ejercicio normalizado."""
+    db = get_db()
+    semanas = []
+    for i in range(start, start + semanas_atras):
+        fecha_str = (fecha_base - timedelta(weeks=i)).strftime("%Y_%m_%d")
+        semanas.append((f"{correo_formateado}_{fecha_str}", fecha_str))
+    fechas = dict(semanas)
+
+    indice: Dict[str, List[Dict[str, Any]]] = {}
+    refs = [db.collection("rutinas_semanales").document(doc_id) for doc_id, _ in semanas]
+    for doc in (db.get_all(refs) if refs else []):
+        if not doc.exists:
+            continue
+        fecha_str = fechas.get(doc.id, "")
+        for dia_index, ej in _ejercicios_de_documento(doc.to_dict() or {}):
+            indice.setdefault(_norm(str(ej.get("ejercicio", ""))), []).append({
+                "fecha": fecha_str,
+                "dia": dia_index + 1,
+                "bloque": ej.get("bloque"),
+                "circuito": ej.get("circuito"),
+                "peso": ej.get("peso"),
+                "reps_min": ej.get("reps_min"),
+                "reps_max": ej.get("reps_max"),
+                "rir": ej.get("rir"),
+                "peso_alcanzado": ej.get("peso_alcanzado"),
+                "reps_alcanzadas": ej.get("reps_alcanzadas"),
+                "rir_alcanzado": ej.get("rir_alcanzado"),
+            })
+    for entradas in indice.values():
+        entradas.sort(key=lambda x: x["fecha"])
+    return indice, [doc_id for doc_id, _ in semanas]
+
+
+def _indice_historial(correo_formateado: str, fecha_base, start: int, semanas_atras: int):
+    clave = (correo_formateado.lower(), fecha_base, start, semanas_atras)
+    ahora = time.monotonic()
+    with _LOCK_HISTORIAL:
+        guardado = _INDICES_HISTORIAL.get(clave)
+        if guardado and ahora - guardado[0] < TTL_INDICE_HISTORIAL_S:
+            _INDICES_HISTORIAL.move_to_end(clave)
+            return guardado[1], guardado[2]
+    indice, docs_revisados = _construir_indice_historial(correo_formateado, fecha_base, start, semanas_atras)
+    with _LOCK_HISTORIAL:
+        _INDICES_HISTORIAL[clave] = (ahora, indice, docs_revisados)
+        while len(_INDICES_HISTORIAL) > MAX_INDICES_HISTORIAL:
+            _INDICES_HISTORIAL.popitem(last=False)
+    return indice, docs_revisados
+
+
+def invalidar_historial(correo_formateado: Optional[str] = None) -> None:
+    """Descarta los índices memoizados (de un deportista o todos) tras guardar rutinas."""
+    with _LOCK_HISTORIAL:
+        if not correo_formateado:
+            _INDICES_HISTORIAL.clear()
+            return
+        objetivo = correo_formateado.lower()
+        for clave in [c for c in _INDICES_HISTORIAL if c[0] == objetivo]:
+            del _INDICES_HISTORIAL[clave]
+
+
+if on_write is not None:
+    @on_write("rutinas")
+    def _al_escribir_rutinas(key: Optional[str]) -> None:
+        invalidar_historial(key)
+
+
 def get_historial_ejercicio_firestore(
     correo_cliente: str,
     nombre_ejercicio: str,
@@ -106,16 +253,10 @@ def get_historial_ejercicio_firestore(
     - Documentos tipo: correo_formateado_YYYY_MM_DD
     - Campo: rutina = [ [ej1, ej2...], [ej1, ej2...], ... ]
     Busca hacia atrás hasta `semanas_atras` semanas. Por defecto NO incluye la semana actual.
+    Las semanas se leen una vez (un `get_all`) y se indexan por ejercicio; las consultas
+    siguientes del mismo deportista y semana salen del índice memoizado.
     """
 
-    db = get_db()
-    historial: List[Dict[str, Any]] = []
-
-    def _norm(txt: str) -> str:
-        txt = (txt or "").strip().lower()
-        txt = unicodedata.normalize("NFD", txt).encode("ascii", "ignore").decode("utf-8")
-        return txt
-
     nombre_norm = _norm(nombre_ejercicio)
 
     # Formatear correo para IDs
@@ -127,75 +268,9 @@ def get_historial_ejercicio_firestore(
     start = 0 if incluir_semana_actual else 1
     if debug:
         print(f"[debug] buscando ejercicio='{nombre_ejercicio}' correo='{correo_cliente}' fecha_base='{fecha_semana_actual}' semanas_atras={semanas_atras} incluir_actual={incluir_semana_actual}")
-    docs_revisados = []
-    for i in range(start, start + semanas_atras):
-        fecha_semana = fecha_base - timedelta(weeks=i)
-        fecha_str = fecha_semana.strftime("%Y_%m_%d")
-
-        doc_id = f"{correo_formateado}_{fecha_str}"
-        doc = db.collection("rutinas_semanales").document(doc_id).get()
-        docs_revisados.append(doc_id)
-
-        if not doc.exists:
-            continue
-
-        data = doc.to_dict() or {}
-
-        # Extrae ejercicios desde varias formas posibles:
-        # 1) data["rutina"] = lista de días -> lista de ejercicios (dicts)
-        # 2) data["ejercicios"] = lista de ejercicios (dicts)
-        # 3) cualquier campo lista que contenga dicts con clave "ejercicio"
-        # 4) sub-mapas o el propio documento con clave "ejercicio"
-        contenedores: list = []
-        rutina = data.get("rutina")
-        if isinstance(rutina, list):
-            contenedores.append(rutina)
-        elif isinstance(rutina, dict):
-            # rutina como mapa de días -> lista de ejercicios
-            contenedores.append(list(rutina.values()))
-
-        ejercicios_flat = data.get("ejercicios")
-        if isinstance(ejercicios_flat, list):
-            contenedores.append([ejercicios_flat])
-
-        for v in data.values():
-            if isinstance(v, list) and any(isinstance(x, dict) and "ejercicio" in x for x in v):
-                contenedores.append([v])
-            if isinstance(v, dict):
-                if "ejercicio" in v:
-                    contenedores.append([[v]])
-                # dict de días u otras claves que contengan listas de ejercicios
-                for sub in v.values():
-                    if isinstance(sub, list) and any(isinstance(x, dict) and "ejercicio" in x for x in sub):
-                        contenedores.append([sub])
-
-        if "ejercicio" in data:
-            contenedores.append([[data]])
-
-        if not contenedores:
-            continue
+    indice, docs_revisados = _indice_historial(correo_formateado, fecha_base, start, semanas_atras)
+    historial = [dict(item) for item in indice.get(nombre_norm, [])]
 
-        for cont in contenedores:
-            for dia_index, ejercicios_dia in enumerate(cont):
-                if not isinstance(ejercicios_dia, list):
-                    continue
-                for ej in ejercicios_dia:
-                    if not isinstance(ej, dict):
-                        continue
-                    if _norm(str(ej.get("ejercicio", ""))) == nombre_norm:
-
-                        historial.append({
-                            "fecha": fecha_str,
-                            "dia": dia_index + 1,
-                            "bloque": ej.get("bloque"),
-                            "circuito": ej.get("circuito"),
-                            "peso": ej.get("peso"),
-                            "reps_min": ej.get("reps_min"),
-                            "reps_max": ej.get("reps_max"),
-                            "rir": ej.get("rir"),
-                        })
-
-    historial.sort(key=lambda x: x["fecha"])
     if debug:
         print(f"[debug] documentos revisados: {docs_revisados}")
         print(f"[debug] coincidencias encontradas: {len(historial)}")
@@ -207,16 +282,59 @@ def get_historial_ejercicio_firestore(
 # ============================================================
 # 🤖 AGENTE DE RUTINAS — Versión ajustada
 # ============================================================
-def agente_sugerencia_rutina(
+MODELO_SUGERENCIAS = "gpt-4o-mini"
+PORCENTAJE_OBJETIVO = 80.0  # valor por defecto si no viene de la UI
+SEMANAS_ATRAS = 2  # revisar solo las 2 semanas previas
+MAX_CONCURRENCIA_IA = 4
+
+SYSTEM_MSG = """
+Eres un experto coach de fuerza.
+Analiza el historial del ejercicio y genera:
+- peso sugerido (si hay último peso, úsalo como referencia base)
+- reps sugeridas (usar reps_min / reps_max si existen)
+- RIR sugerido
+- Comentario explicativo
+
+Responde SOLO JSON válido con esta estructura:
+
+{
+ "peso_sugerido": número o null,
+ "reps_sugeridas": "texto",
+ "rir_sugerido": número o null,
+ "comentario": "texto"
+}
+"""
+
+
+def _to_float(value) -> Optional[float]:
+    try:
+        return float(str(value).replace(",", "."))
+    except Exception:
+        return None
+
+
+def _to_int(value) -> Optional[int]:
+    try:
+        return int(str(value).strip())
+    except Exception:
+        return None
+
+
+def _to_pct(value) -> Optional[float]:
+    try:
+        val = float(str(value).replace(",", "."))
+        return val if val > 0 else None
+    except Exception:
+        return None
+
+
+def _preparar_consulta(
     correo_cliente: str,
     nombre_ejercicio: str,
     fecha_semana_actual: str,
     porcentaje_objetivo: Optional[float] = None,
 ) -> Dict[str, Any]:
-
-    PORCENTAJE_OBJETIVO = 80.0  # valor por defecto si no viene de la UI
-    SEMANAS_ATRAS = 2  # revisar solo las 2 semanas previas
-
+    """Historial, RM y prompt de un ejercicio (sin llamar al modelo)."""
     historial = get_historial_ejercicio_firestore(
         correo_cliente,
         nombre_ejercicio,
@@ -226,25 +344,6 @@ def agente_sugerencia_rutina(
         debug=False,
     )
 
-    def _to_float(value) -> Optional[float]:
-        try:
-            return float(str(value).replace(",", "."))
-        except Exception:
-            return None
-
-    def _to_int(value) -> Optional[int]:
-        try:
-            return int(str(value).strip())
-        except Exception:
-            return None
-
-    def _to_pct(value) -> Optional[float]:
-        try:
-            val = float(str(value).replace(",", "."))
-            return val if val > 0 else None
-        except Exception:
-            return None
-
     # usa el mayor peso de las últimas 2 semanas (si empata, el más reciente)
     ultimo_peso = None
     ultimo_fecha = None
@@ -264,6 +363,8 @@ def agente_sugerencia_rutina(
             break
 
     historial_json = json.dumps(historial, ensure_ascii=False)
+    # el prompt lleva el resumen de tamaño fijo; el historial crudo solo entra en la huella de la caché
+    resumen_json = json.dumps(resumir_historial(historial), ensure_ascii=False)
 
     porcentaje_final = _to_pct(porcentaje_objetivo) or PORCENTAJE_OBJETIVO
     rm_teorico = None
@@ -272,31 +373,13 @@ def agente_sugerencia_rutina(
         rm_teorico = calcular_rm_teorico(ultimo_peso, ultimo_reps, ultimo_rir)
         peso_objetivo = calcular_peso_por_porcentaje(rm_teorico, porcentaje_final)
 
-    system_msg = """
-Eres un experto coach de fuerza.
-Analiza el historial del ejercicio y genera:
-- peso sugerido (si hay último peso, úsalo como referencia base)
-- reps sugeridas (usar reps_min / reps_max si existen)
-- RIR sugerido
-- Comentario explicativo
-
-Responde SOLO JSON válido con esta estructura:
-
-{
- "peso_sugerido": número o null,
- "reps_sugeridas": "texto",
- "rir_sugerido": número o null,
- "comentario": "texto"
-}
-"""
-
     user_msg = f"""
 Cliente: {correo_cliente}
 Ejercicio: {nombre_ejercicio}
 Fecha semana actual: {fecha_semana_actual}
 
-Historial encontrado:
-{historial_json}
+Resumen del historial (últimas {SEMANAS_ATRAS} semanas previas):
+{resumen_json}
 
 Ultimo peso registrado (si existe): {ultimo_peso} (fecha: {ultimo_fecha})
 Últimas reps usadas para RM (si existen): {ultimo_reps} (RIR: {ultimo_rir})
@@ -307,65 +390,55 @@ Mayor peso encontrado (últimas {SEMANAS_ATRAS} semanas previas): {ultimo_peso}
 
 Genera la recomendación.
 """
-
-    client = get_openai_client()
-
-    def _llamar_openai(client: OpenAI, system: str, user: str) -> str:
-        """
-        Soporta tanto el cliente nuevo (.responses) como el antiguo (.chat.completions).
-        """
-        if hasattr(client, "responses"):
-            resp = client.responses.create(
-                model="gpt-4o-mini",
-                input=[
-                    {"role": "system", "content": system},
-                    {"role": "user", "content": user},
-                ],
-            )
-            return resp.output_text or ""
-
-        # fallback para versiones viejas del SDK
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": user},
-            ],
-        )
-        if resp.choices:
-            return resp.choices[0].message.content or ""
-        return ""
-
-    raw = _llamar_openai(client, system_msg, user_msg)
-
-    def _parse_json(texto: str) -> Optional[dict]:
-        """
-        Intenta parsear JSON aun si viene envuelto en ```json ...```, con texto extra
-        o agregado "undefined" al final. Busca el primer bloque {...}.
-        """
-        txt = (texto or "").strip()
-        # Quita fences ```json ... ```
-        if txt.startswith("```"):
-            parts = txt.split("```")
-            if len(parts) >= 3:
-                # part[1] suele ser 'json\n{...}' o directamente '{...}'
-                candidate = parts[1].strip()
-                if candidate.lower().startswith("json"):
-                    candidate = candidate[4:].strip()
-                txt = candidate or parts[2].strip()
-        # Si queda basura afuera, toma el primer bloque { ... }
-        if "{" in txt and "}" in txt:
-            try:
-                start = txt.index("{")
-                end = txt.rindex("}")
-                txt = txt[start:end+1]
-            except Exception:
-                pass
+    return {
+        "porcentaje_objetivo": _to_pct(porcentaje_objetivo),
+        "historial": historial,
+        "historial_json": historial_json,
+        "rm_teorico": rm_teorico,
+        "peso_objetivo": peso_objetivo,
+        "porcentaje_final": porcentaje_final,
+        "system": SYSTEM_MSG,
+        "user": user_msg,
+    }
+
+
+def _clave_consulta(consulta: Dict[str, Any]) -> str:
+    """Hash del prompt completo más la huella del historial: cambia si cambia cualquiera de los dos."""
+    huella = hashlib.sha256(consulta["historial_json"].encode("utf-8")).hexdigest()
+    base = "\x1f".join([MODELO_SUGERENCIAS, consulta["system"], consulta["user"], huella])
+    return hashlib.sha256(base.encode("utf-8")).hexdigest()
+
+
+def _parse_json(texto: str) -> Optional[dict]:
+    """
+    Intenta parsear JSON aun si viene envuelto en ```json ...```, con texto extra
+    o agregado "undefined" al final. Busca el primer bloque {...}.
+    """
+    txt = (texto or "").strip()
+    # Quita fences ```json ... ```
+    if txt.startswith("```"):
+        parts = txt.split("```")
+        if len(parts) >= 3:
+            # part[1] suele ser 'json\n{...}' o directamente '{...}'
+            candidate = parts[1].strip()
+            if candidate.lower().startswith("json"):
+                candidate = candidate[4:].strip()
+            txt = candidate or parts[2].strip()
+    # Si queda basura afuera, toma el primer bloque { ... }
+    if "{" in txt and "}" in txt:
         try:
-            return json.loads(txt)
+            start = txt.index("{")
+            end = txt.rindex("}")
+            txt = txt[start:end+1]
         except Exception:
-            return None
+            pass
+    try:
+        return json.loads(txt)
+    except Exception:
+        return None
+
 
+def _armar_sugerencia(raw: str, consulta: Dict[str, Any]) -> Dict[str, Any]:
     sugerencia = _parse_json(raw)
     if not isinstance(sugerencia, dict):
         sugerencia = {
@@ -375,16 +448,284 @@ Genera la recomendación.
             "comentario": f"Respuesta no válida: {raw}"
         }
 
-    if rm_teorico is not None:
-        sugerencia["rm_teorico"] = rm_teorico
-    if peso_objetivo is not None:
-        sugerencia["peso_objetivo_porcentaje"] = peso_objetivo
-    sugerencia["porcentaje_usado"] = porcentaje_final
+    if consulta["rm_teorico"] is not None:
+        sugerencia["rm_teorico"] = consulta["rm_teorico"]
+    if consulta["peso_objetivo"] is not None:
+        sugerencia["peso_objetivo_porcentaje"] = consulta["peso_objetivo"]
+    sugerencia["porcentaje_usado"] = consulta["porcentaje_final"]
+
+    sugerencia["historial_usado"] = consulta["historial"]
+    return sugerencia
+
 
-    sugerencia["historial_usado"] = historial
+def _mensajes(system: str, user: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": user},
+    ]
+
+
+def _llamar_openai(client: OpenAI, system: str, user: str) -> str:
+    """
+    Soporta tanto el cliente nuevo (.responses) como el antiguo (.chat.completions).
+    """
+    if hasattr(client, "responses"):
+        resp = client.responses.create(model=MODELO_SUGERENCIAS, input=_mensajes(system, user))
+        return resp.output_text or ""
+
+    # fallback para versiones viejas del SDK
+    resp = client.chat.completions.create(model=MODELO_SUGERENCIAS, messages=_mensajes(system, user))
+    if resp.choices:
+        return resp.choices[0].message.content or ""
+    return ""
+
+
+async def _llamar_openai_async(client: AsyncOpenAI, system: str, user: str) -> str:
+    if hasattr(client, "responses"):
+        resp = await client.responses.create(model=MODELO_SUGERENCIAS, input=_mensajes(system, user))
+        return resp.output_text or ""
+
+    resp = await client.chat.completions.create(model=MODELO_SUGERENCIAS, messages=_mensajes(system, user))
+    if resp.choices:
+        return resp.choices[0].message.content or ""
+    return ""
+
+
+_ESTADISTICAS = {"reglas": 0, "ia": 0}
+_LOCK_ESTADISTICAS = threading.Lock()
+
+
+def _registrar_origen(reglas: int, ia: int) -> None:
+    with _LOCK_ESTADISTICAS:
+        _ESTADISTICAS["reglas"] += reglas
+        _ESTADISTICAS["ia"] += ia
+        total = _ESTADISTICAS["reglas"] + _ESTADISTICAS["ia"]
+        tasa = _ESTADISTICAS["ia"] / total if total else 0.0
+    logger.info(
+        "Sugerencias: %d por reglas, %d escaladas a IA (acumulado: %.0f%% escaladas de %d)",
+        reglas, ia, tasa * 100, total,
+    )
+
+
+def tasa_escalamiento() -> Dict[str, Any]:
+    """Cuántas sugerencias resolvió el motor de reglas y cuántas fueron a la IA en este proceso."""
+    with _LOCK_ESTADISTICAS:
+        total = _ESTADISTICAS["reglas"] + _ESTADISTICAS["ia"]
+        return {**_ESTADISTICAS, "total": total, "tasa": (_ESTADISTICAS["ia"] / total) if total else 0.0}
+
+
+def _sugerencia_por_reglas(consulta: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Caso claro resuelto por `app_core.progresion` (mismo formato que la respuesta de la IA) o None."""
+    decision = decidir_progresion(consulta["historial"], consulta["porcentaje_objetivo"])
+    if decision is None:
+        return None
+    sugerencia = {
+        "peso_sugerido": decision.peso_sugerido,
+        "reps_sugeridas": decision.reps_sugeridas,
+        "rir_sugerido": decision.rir_sugerido,
+        "comentario": decision.comentario,
+        "origen": "reglas",
+        "regla": decision.regla,
+    }
+    rm = decision.rm_teorico if decision.rm_teorico is not None else consulta["rm_teorico"]
+    if rm is not None:
+        sugerencia["rm_teorico"] = rm
+    if consulta["peso_objetivo"] is not None:
+        sugerencia["peso_objetivo_porcentaje"] = consulta["peso_objetivo"]
+    sugerencia["porcentaje_usado"] = consulta["porcentaje_final"]
+    sugerencia["historial_usado"] = consulta["historial"]
     return sugerencia
 
 
+def agente_sugerencia_rutina(
+    correo_cliente: str,
+    nombre_ejercicio: str,
+    fecha_semana_actual: str,
+    porcentaje_objetivo: Optional[float] = None,
+) -> Dict[str, Any]:
+    consulta = _preparar_consulta(correo_cliente, nombre_ejercicio, fecha_semana_actual, porcentaje_objetivo)
+    por_reglas = _sugerencia_por_reglas(consulta)
+    _registrar_origen(1 if por_reglas else 0, 0 if por_reglas else 1)
+    if por_reglas is not None:
+        return por_reglas
+    clave = _clave_consulta(consulta)
+    raw = _CACHE_SUGERENCIAS.get(clave)
+    if raw is None:
+        raw = _llamar_openai(get_openai_client(), consulta["system"], consulta["user"])
+        _CACHE_SUGERENCIAS.set(clave, raw)
+    return _armar_sugerencia(raw, consulta)
+
+
+def agente_sugerencias_rutina(
+    correo_cliente: str,
+    ejercicios: List[Dict[str, Any]],
+    fecha_semana_actual: str,
+    max_concurrencia: int = MAX_CONCURRENCIA_IA,
+) -> List[Dict[str, Any]]:
+    """
+    Sugerencias para varios ejercicios ({"nombre", "porcentaje"}) en el mismo orden.
+    El historial se lee una vez (índice memoizado); los casos claros los resuelve
+    `app_core.progresion` sin IA, las respuestas en cache no van al modelo
+    y el resto se pide en paralelo con a lo más `max_concurrencia` llamadas a la vez.
+    Un ejercicio que falla devuelve {"error": "..."} sin cortar a los demás.
+    """
+    consultas: List[Optional[Dict[str, Any]]] = []
+    resultados: List[Optional[Dict[str, Any]]] = []
+    for item in ejercicios:
+        try:
+            consulta = _preparar_consulta(correo_cliente, item["nombre"], fecha_semana_actual, item.get("porcentaje"))
+            consulta["clave"] = _clave_consulta(consulta)
+        except Exception as exc:
+            consultas.append(None)
+            resultados.append({"error": str(exc)})
+            continue
+        consultas.append(consulta)
+        por_reglas = _sugerencia_por_reglas(consulta)
+        if por_reglas is not None:
+            resultados.append(por_reglas)
+            continue
+        raw = _CACHE_SUGERENCIAS.get(consulta["clave"])
+        resultados.append(_armar_sugerencia(raw, consulta) if raw is not None else None)
+
+    n_reglas = sum(1 for r in resultados if r is not None and r.get("origen") == "reglas")
+    _registrar_origen(n_reglas, sum(1 for c in consultas if c is not None) - n_reglas)
+    faltantes = [i for i, r in enumerate(resultados) if r is None]
+    if faltantes:
+        respuestas = _ejecutar_async(
+            _pedir_en_paralelo([consultas[i] for i in faltantes], max(1, int(max_concurrencia or 1)))
+        )
+        for i, resp in zip(faltantes, respuestas):
+            if isinstance(resp, BaseException):
+                resultados[i] = {"error": str(resp)}
+                continue
+            _CACHE_SUGERENCIAS.set(consultas[i]["clave"], resp)
+            resultados[i] = _armar_sugerencia(resp, consultas[i])
+    return resultados
+
+
+async def _pedir_en_paralelo(consultas: List[Dict[str, Any]], max_concurrencia: int) -> List[Any]:
+    semaforo = asyncio.Semaphore(max_concurrencia)
+    client = AsyncOpenAI(api_key=_api_key_requerida())
+
+    async def _una(consulta: Dict[str, Any]) -> str:
+        async with semaforo:
+            return await _llamar_openai_async(client, consulta["system"], consulta["user"])
+
+    try:
+        return await asyncio.gather(*(_una(c) for c in consultas), return_exceptions=True)
+    finally:
+        await client.close()
+
+
+def _ejecutar_async(coro):
+    """asyncio.run, o un hilo aparte si ya hay un loop corriendo en este hilo."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coro).result()
+
+
+# ============================================================
+# 💾 Cache de respuestas del modelo (memoria + disco, con TTL)
+# ============================================================
+TTL_SUGERENCIAS_S = 7 * 24 * 3600
+MAX_SUGERENCIAS_MEMORIA = 512
+PODA_DISCO_S = 3600   # cada cuánto se borran del disco los JSON vencidos
+DIR_CACHE_SUGERENCIAS = Path(
+    os.getenv("AGENTE_CACHE_DIR") or Path(__file__).resolve().parent / ".cache" / "sugerencias_ia"
+)
+
+
+class _CacheRespuestas:
+    """
+    Texto crudo de la respuesta por clave de consulta: LRU acotado en memoria y un JSON por clave
+    en disco (sobrevive reinicios). Los archivos vencidos se podan a lo más una vez por `PODA_DISCO_S`.
+    """
+
+    def __init__(self, directorio: Path, ttl_s: float, max_memoria: int = MAX_SUGERENCIAS_MEMORIA):
+        self._dir = directorio
+        self._ttl = ttl_s
+        self._max = max_memoria
+        self._mem: "OrderedDict[str, tuple]" = OrderedDict()
+        self._podado_en = 0.0
+        self._lock = threading.Lock()
+
+    def _ruta(self, clave: str) -> Path:
+        return self._dir / f"{clave}.json"
+
+    def _recordar(self, clave: str, item: tuple) -> None:
+        with self._lock:
+            self._mem[clave] = item
+            self._mem.move_to_end(clave)
+            while len(self._mem) > self._max:
+                self._mem.popitem(last=False)
+
+    def get(self, clave: str) -> Optional[str]:
+        ahora = time.time()
+        with self._lock:
+            item = self._mem.get(clave)
+            if item is not None:
+                self._mem.move_to_end(clave)
+        if item is None:
+            try:
+                data = json.loads(self._ruta(clave).read_text(encoding="utf-8"))
+                item = (float(data["creado"]), str(data["raw"]))
+            except Exception:
+                return None
+            self._recordar(clave, item)
+        if ahora - item[0] > self._ttl:
+            self.borrar(clave)
+            return None
+        return item[1]
+
+    def set(self, clave: str, raw: str) -> None:
+        if not raw:
+            return
+        item = (time.time(), raw)
+        self._recordar(clave, item)
+        try:
+            self._dir.mkdir(parents=True, exist_ok=True)
+            tmp = self._ruta(clave).with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text(json.dumps({"creado": item[0], "raw": raw}, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self._ruta(clave))
+        except Exception:
+            pass  # sin disco escribible queda solo en memoria
+        if item[0] - self._podado_en >= PODA_DISCO_S:
+            self.podar()
+
+    def borrar(self, clave: str) -> None:
+        with self._lock:
+            self._mem.pop(clave, None)
+        try:
+            self._ruta(clave).unlink()
+        except Exception:
+            pass
+
+    def podar(self) -> int:
+        """Borra del disco las respuestas (y temporales huérfanos) más viejas que el TTL. Devuelve cuántas."""
+        ahora = time.time()
+        self._podado_en = ahora
+        borrados = 0
+        try:
+            archivos = list(self._dir.iterdir())
+        except Exception:
+            return 0
+        for ruta in archivos:
+            try:
+                # mtime = momento del set (os.replace conserva el del temporal recién escrito)
+                if ruta.suffix in (".json", ".tmp") and ahora - ruta.stat().st_mtime > self._ttl:
+                    ruta.unlink()
+                    borrados += 1
+            except Exception:
+                continue
+        return borrados
+
+
+_CACHE_SUGERENCIAS = _CacheRespuestas(DIR_CACHE_SUGERENCIAS, TTL_SUGERENCIAS_S)
+
+
 # ============================================================
 # 🧪 Test rápido
 # ============================================================
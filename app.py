@@ -260,37 +260,56 @@ def _render_navigation(opciones_menu: list[str], menu_actual: str) -> None:
         finally:
             st.markdown("</div>", unsafe_allow_html=True)
 
-def _limpiar_estado_por_menu(menu_label: str | None) -> None:
-    if not menu_label:
-        return
-    if menu_label == "Crear Rutinas":
-        limpiar_estado_crear_rutinas()
-    elif menu_label == "Editar Rutinas":
-        limpiar_estado_editar_rutinas()
-
-
 # 2) Soft login (usa el módulo que ya probaste)
 from soft_login_full import soft_login_barrier, soft_logout
 from inicio import inicio_deportista, SEGUIMIENTO_LABEL
+from app_core.cache import clear_cache, notify_write
+from app_core.data_access import clave_rutinas
+from app_core.outbox import iniciar_worker
+from app_core.page_loader import cargar_vista, vista_cargada
 from app_core.theme import inject_theme
-# 3) Imports del resto de la app
+# 3) Imports del resto de la app (las vistas pesadas se cargan bajo demanda vía VISTAS)
 import json
 import firebase_admin
 from firebase_admin import credentials, firestore, initialize_app
-from seguimiento_entrenamiento import app as seguimiento_app  # NUEVO
-from seccion_ejercicios import base_ejercicios
-from vista_rutinas import ver_rutinas
-from borrar_rutinas import borrar_rutinas
-from ingresar_cliente_view import ingresar_cliente_o_video_o_ejercicio
-from crear_planificaciones import crear_rutinas, limpiar_estado_crear_rutinas
-from editar_rutinas import editar_rutinas, limpiar_estado_editar_rutinas
-from crear_descarga import descarga_rutina
-from reportes import ver_reportes
-from admin_resumen import ver_resumen_entrenadores  # si no lo usas, puedes comentar
-from admin_email_preview import ver_previsualizacion_correos
-from revisar_dumbbell_view import revisar_dumbbell_admin_view
 from anamnesis_view import render_anamnesis, necesita_anamnesis
 
+# Vistas por opción de menú: (módulo, función). Se importan recién al abrir la opción.
+VISTAS: dict[str, tuple[str, str]] = {
+    "Ver Rutinas": ("vista_rutinas", "ver_rutinas"),
+    "Crear Rutinas": ("crear_planificaciones", "crear_rutinas"),
+    "Ingresar Deportista o Ejercicio": ("ingresar_cliente_view", "ingresar_cliente_o_video_o_ejercicio"),
+    "Borrar Rutinas": ("borrar_rutinas", "borrar_rutinas"),
+    "Editar Rutinas": ("editar_rutinas", "editar_rutinas"),
+    "Ejercicios": ("seccion_ejercicios", "base_ejercicios"),
+    "Crear Descarga": ("crear_descarga", "descarga_rutina"),
+    "Reportes": ("reportes", "ver_reportes"),
+    SEGUIMIENTO_LABEL: ("seguimiento_entrenamiento", "app"),
+    "Resumen (Admin)": ("admin_resumen", "ver_resumen_entrenadores"),
+    "Revisar Dumbbell": ("revisar_dumbbell_view", "revisar_dumbbell_admin_view"),
+    "Previsualizar Correos": ("admin_email_preview", "ver_previsualizacion_correos"),
+}
+
+# Limpieza de estado al salir de una vista; solo aplica si su módulo ya fue cargado en este proceso
+LIMPIEZA_POR_MENU: dict[str, tuple[str, str]] = {
+    "Crear Rutinas": ("crear_planificaciones", "limpiar_estado_crear_rutinas"),
+    "Editar Rutinas": ("editar_rutinas", "limpiar_estado_editar_rutinas"),
+}
+
+
+def _vista(menu_label: str):
+    modulo, atributo = VISTAS[menu_label]
+    return cargar_vista(modulo, atributo)
+
+
+def _limpiar_estado_por_menu(menu_label: str | None) -> None:
+    if not menu_label or menu_label not in LIMPIEZA_POR_MENU:
+        return
+    modulo, atributo = LIMPIEZA_POR_MENU[menu_label]
+    if vista_cargada(modulo):
+        cargar_vista(modulo, atributo)()
+
+
 # ➕ utilidades para cargar el módulo de seguimiento
 # 4) Tema base (paleta Momentum)
 # 5) Inicializar Firebase (una sola vez)
@@ -299,6 +318,8 @@ if not firebase_admin._apps:
     cred = credentials.Certificate(cred_dict)
     initialize_app(cred)
 db = firestore.client()
+# Worker de la cola de correos: drena avisos pendientes de otros procesos o de antes de un reinicio
+iniciar_worker()
 
 # 6) Barrera de Soft Login (persistente con cookie)
 #    Cambia required_roles si quieres restringir el ingreso a ciertos roles globalmente.
@@ -443,7 +464,12 @@ with header:
             help="Actualizar datos y refrescar cachés",
             use_container_width=True,
         ):
-            st.cache_data.clear()
+            # Invalida solo las rutinas visibles para esta sesión; usuarios y ejercicios se mantienen al día por su cuenta
+            if rol in ("entrenador", "admin", "administrador"):
+                notify_write("rutinas_listado")
+                clear_cache("rutinas")
+            else:
+                notify_write("rutinas", clave_rutinas(st.session_state.get("correo", "")))
             st.rerun()
 
         if menu_actual != "Inicio":
@@ -468,56 +494,56 @@ if opcion == "Inicio":
 elif opcion == "Ver Rutinas":
     if menu_cambio:
         st.session_state.pop("dia_sel", None)
-    ver_rutinas()
+    _vista("Ver Rutinas")()
 
 elif opcion == "Crear Rutinas":
     if rol in ("entrenador", "admin", "administrador"):
-        crear_rutinas()
+        _vista("Crear Rutinas")()
     else:
         st.warning("No tienes permisos para crear rutinas.")
 
 elif opcion == "Ingresar Deportista o Ejercicio":
-    ingresar_cliente_o_video_o_ejercicio()
+    _vista("Ingresar Deportista o Ejercicio")()
 
 elif opcion == "Anamnesis":
     render_anamnesis(db=db)
 
 elif opcion == "Borrar Rutinas":
-    borrar_rutinas()
+    _vista("Borrar Rutinas")()
 
 elif opcion == "Editar Rutinas":
-    editar_rutinas()
+    _vista("Editar Rutinas")()
 
 elif opcion == "Ejercicios":
-    base_ejercicios()
+    _vista("Ejercicios")()
 
 elif opcion == "Crear Descarga":
-    descarga_rutina()
+    _vista("Crear Descarga")()
 
 elif opcion == "Reportes":
-    ver_reportes()
+    _vista("Reportes")()
 
 elif opcion in (SEGUIMIENTO_LABEL, label_seg_2):
     if rol in ("entrenador", "admin", "administrador"):
         st.header("📈 Seguimiento (Entre Evaluaciones)")
-        seguimiento_app()
+        _vista(SEGUIMIENTO_LABEL)()
     else:
         st.warning("No tienes permisos para acceder a Seguimiento.")
 
 elif opcion == "Resumen (Admin)":
     if is_admin:
-        ver_resumen_entrenadores()
+        _vista("Resumen (Admin)")()
     else:
         st.warning("Solo disponible para administradores.")
 
 elif opcion == "Revisar Dumbbell":
     if is_admin:
-        revisar_dumbbell_admin_view()
+        _vista("Revisar Dumbbell")()
     else:
         st.warning("Solo disponible para administradores.")
 
 elif opcion == "Previsualizar Correos":
     if is_admin:
-        ver_previsualizacion_correos()
+        _vista("Previsualizar Correos")()
     else:
         st.warning("Solo disponible para administradores.")
@@ -0,0 +1,80 @@
+"""Escrituras agrupadas en lotes de Firestore con estado por documento."""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Iterable, List, Optional
+
+# Firestore admite hasta 500 operaciones por batch; dejamos margen como en seccion_ejercicios.
+TAMANO_LOTE_DEFAULT = 400
+
+
+@dataclass
+class OperacionLote:
+    """
+    Una escritura pendiente: `tipo` puede ser "set", "create", "update" o "delete".
+    "create" falla (y con él todo su batch) si el documento ya existe.
+    `opcion` es una precondición (`db.write_option(last_update_time=...)`) para update/delete.
+    """
+
+    ref: Any
+    data: Optional[dict] = None
+    tipo: str = "set"
+    merge: bool = False
+    opcion: Any = None
+
+
+@dataclass
+class ResultadoEscritura:
+    doc_id: str
+    ok: bool
+    error: str = ""
+
+
+def _chunked(items: List[OperacionLote], size: int) -> Iterable[List[OperacionLote]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _agregar_a_batch(batch, op: OperacionLote) -> None:
+    if op.tipo == "delete":
+        batch.delete(op.ref, option=op.opcion)
+    elif op.tipo == "create":
+        batch.create(op.ref, op.data or {})
+    elif op.tipo == "update":
+        batch.update(op.ref, op.data or {}, option=op.opcion)
+    elif op.merge:
+        batch.set(op.ref, op.data or {}, merge=True)
+    else:
+        batch.set(op.ref, op.data or {})
+
+
+def escribir_en_lotes(
+    db,
+    operaciones: Iterable[OperacionLote],
+    tamano_lote: int = TAMANO_LOTE_DEFAULT,
+) -> List[ResultadoEscritura]:
+    """
+    Agrupa las operaciones en batches de `tamano_lote` y confirma cada uno de forma atómica.
+    Si un batch falla, todos sus documentos quedan marcados con error y se continúa con el siguiente.
+    """
+    ops = [op for op in operaciones if op is not None]
+    resultados: List[ResultadoEscritura] = []
+    if not ops:
+        return resultados
+
+    tamano_lote = max(1, min(int(tamano_lote or TAMANO_LOTE_DEFAULT), 500))
+    for lote in _chunked(ops, tamano_lote):
+        try:
+            batch = db.batch()
+            for op in lote:
+                _agregar_a_batch(batch, op)
+            batch.commit()
+        except Exception as exc:
+            resultados.extend(ResultadoEscritura(op.ref.id, False, str(exc)) for op in lote)
+            continue
+        resultados.extend(ResultadoEscritura(op.ref.id, True) for op in lote)
+    return resultados
+
+
+def documentos_fallidos(resultados: Iterable[ResultadoEscritura]) -> List[ResultadoEscritura]:
+    return [r for r in resultados if not r.ok]
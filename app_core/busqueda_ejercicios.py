@@ -0,0 +1,304 @@
+"""Índice de búsqueda de ejercicios (prefijos + trigramas) compartido por todo el proceso.
+
+Indexa nombre, `buscable_id`, grupo muscular y patrón normalizados (sin tildes) y devuelve
+resultados ordenados por relevancia, tolerando errores de tipeo. Un índice por versión del
+catálogo, compartido entre sesiones. Benchmark: `python -m app_core.busqueda_ejercicios`.
+"""
+from __future__ import annotations
+
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import OrderedDict, defaultdict
+from typing import Dict, Hashable, List, Mapping, Optional, Sequence, Tuple
+
+SIMILITUD_MINIMA = 0.4   # Jaccard de trigramas para aceptar una palabra con typo
+PESO_CAMPO_EXTRA = 0.6   # coincidencias en buscable_id/grupo/patrón pesan menos que en el nombre
+MAX_INDICES = 16         # catálogos distintos (según permisos) retenidos en memoria
+LIMITE_SUGERENCIAS = 50  # opciones que muestran los buscadores de las páginas
+
+_NO_ALNUM = re.compile(r"[^a-z0-9]+")
+_INDICES: "OrderedDict[Hashable, IndiceEjercicios]" = OrderedDict()
+_LOCK = threading.Lock()
+
+
+def normalizar_busqueda(texto: str) -> str:
+    """Minúsculas, sin tildes y solo letras/números separados por un espacio."""
+    txt = unicodedata.normalize("NFD", str(texto or "").lower()).encode("ascii", "ignore").decode("ascii")
+    return _NO_ALNUM.sub(" ", txt).strip()
+
+
+def _trigramas(palabra: str) -> set[str]:
+    p = f"  {palabra} "
+    return {p[i:i + 3] for i in range(len(p) - 2)}
+
+
+def _campos_extra(data: Mapping) -> str:
+    data = data or {}
+    partes = [
+        data.get("buscable_id"),
+        data.get("grupo_muscular_principal") or data.get("grupo_muscular"),
+        data.get("patron_de_movimiento") or data.get("patron"),
+    ]
+    return " ".join(normalizar_busqueda(p) for p in partes if p)
+
+
+class IndiceEjercicios:
+    """Índice invertido palabra -> ejercicios, con prefijos (bisect) y trigramas por palabra."""
+
+    def __init__(self, ejercicios: Mapping[str, Mapping]):
+        self._nombres: List[str] = []
+        self._nombres_norm: List[str] = []
+        en_nombre: Dict[str, set] = defaultdict(set)
+        en_extra: Dict[str, set] = defaultdict(set)
+        for nombre, data in ejercicios.items():
+            nombre_norm = normalizar_busqueda(nombre)
+            extra = _campos_extra(data if isinstance(data, Mapping) else {})
+            if not nombre_norm and not extra:
+                continue
+            idx = len(self._nombres)
+            self._nombres.append(nombre)
+            self._nombres_norm.append(nombre_norm)
+            for palabra in nombre_norm.split():
+                en_nombre[palabra].add(idx)
+            for palabra in extra.split():
+                en_extra[palabra].add(idx)
+        self._palabras: List[str] = sorted(set(en_nombre) | set(en_extra))
+        # Postings como sets: uniones e intersecciones entre tokens corren en C
+        self._en_nombre: List[frozenset] = [frozenset(en_nombre.get(p, ())) for p in self._palabras]
+        self._en_extra: List[frozenset] = [frozenset(en_extra.get(p, ())) for p in self._palabras]
+        self._trigramas: Dict[str, List[int]] = defaultdict(list)
+        for wid, palabra in enumerate(self._palabras):
+            for tri in _trigramas(palabra):
+                self._trigramas[tri].append(wid)
+        self._tri_por_palabra = [len(_trigramas(p)) for p in self._palabras]
+        # Desempate precalculado: nombres más cortos y luego alfabético
+        orden = sorted(range(len(self._nombres_norm)), key=lambda i: (len(self._nombres_norm[i]), self._nombres_norm[i]))
+        self._rango: List[int] = [0] * len(orden)
+        for pos, idx in enumerate(orden):
+            self._rango[idx] = pos
+        # Nombres ordenados para saber por bisect cuáles empiezan con la consulta completa
+        alfabetico = sorted(range(len(self._nombres_norm)), key=self._nombres_norm.__getitem__)
+        self._alfa_nombres = [self._nombres_norm[i] for i in alfabetico]
+        self._alfa_idx = alfabetico
+
+    def __len__(self) -> int:
+        return len(self._nombres)
+
+    # -------- palabras candidatas para un token de la consulta --------
+    def _puntajes_palabras(self, token: str) -> Dict[int, float]:
+        puntajes: Dict[int, float] = {}
+        # prefijo (incluye la palabra exacta)
+        i = bisect_left(self._palabras, token)
+        while i < len(self._palabras) and self._palabras[i].startswith(token):
+            puntajes[i] = 1.0 if self._palabras[i] == token else 0.9
+            i += 1
+        if len(token) < 3:
+            # Sin trigramas útiles: subcadena por recorrido de las palabras ("ll" -> "pullover")
+            for wid, palabra in enumerate(self._palabras):
+                if wid not in puntajes and token in palabra:
+                    puntajes[wid] = 0.7
+            return puntajes
+        # subcadena y typos vía trigramas compartidos
+        tri_token = _trigramas(token)
+        compartidos: Dict[int, int] = defaultdict(int)
+        for tri in tri_token:
+            for wid in self._trigramas.get(tri, ()):
+                compartidos[wid] += 1
+        for wid, n in compartidos.items():
+            if wid in puntajes:
+                continue
+            if token in self._palabras[wid]:
+                puntajes[wid] = 0.7
+                continue
+            jaccard = n / (len(tri_token) + self._tri_por_palabra[wid] - n)
+            if jaccard >= SIMILITUD_MINIMA:
+                puntajes[wid] = 0.6 * jaccard
+        return puntajes
+
+    def buscar(self, consulta: str, limite: Optional[int] = None) -> List[str]:
+        """Nombres que coinciden con todas las palabras de `consulta`, de más a menos relevante."""
+        consulta_norm = normalizar_busqueda(consulta)
+        tokens = list(dict.fromkeys(consulta_norm.split()))
+        if not tokens:
+            return []
+        por_token = [self._puntajes_palabras(t) for t in tokens]
+        conjuntos = []
+        for puntajes in por_token:
+            if not puntajes:
+                return []
+            conjuntos.append(frozenset().union(*(self._en_nombre[w] | self._en_extra[w] for w in puntajes)))
+        conjuntos.sort(key=len)
+        candidatos = conjuntos[0].intersection(*conjuntos[1:])
+        if not candidatos:
+            return []
+
+        total: Dict[int, float] = dict.fromkeys(candidatos, 0.0)
+        for puntajes in por_token:
+            # (puntaje, posting) de mayor a menor: cada ejercicio toma su mejor coincidencia por token
+            fuentes = sorted(
+                [(p, self._en_nombre[w]) for w, p in puntajes.items()]
+                + [(p * PESO_CAMPO_EXTRA, self._en_extra[w]) for w, p in puntajes.items()],
+                key=lambda par: -par[0],
+            )
+            pendientes = set(candidatos)
+            for puntaje, posting in fuentes:
+                if not pendientes:
+                    break
+                hits = pendientes & posting
+                if hits:
+                    pendientes -= hits
+                    for idx in hits:
+                        total[idx] += puntaje
+
+        # Orden: puntaje, luego nombres que empiezan con la consulta, luego el desempate fijo
+        por_puntaje: Dict[float, List[int]] = defaultdict(list)
+        for idx, puntaje in total.items():
+            por_puntaje[round(puntaje, 6)].append(idx)
+        empiezan = self._empiezan_con(consulta_norm)
+        rango = self._rango.__getitem__
+        ordenados: List[int] = []
+        for puntaje in sorted(por_puntaje, reverse=True):
+            grupo = set(por_puntaje[puntaje])
+            primeros = grupo & empiezan
+            ordenados.extend(sorted(primeros, key=rango))
+            ordenados.extend(sorted(grupo - primeros, key=rango))
+            if limite is not None and len(ordenados) >= limite:
+                break
+        if limite is not None:
+            ordenados = ordenados[:limite]
+        return [self._nombres[idx] for idx in ordenados]
+
+    def _empiezan_con(self, prefijo: str) -> frozenset:
+        lo = bisect_left(self._alfa_nombres, prefijo)
+        hi = bisect_left(self._alfa_nombres, prefijo + "\x7f", lo)
+        return frozenset(self._alfa_idx[lo:hi])
+
+
+def _huella(ejercicios: Mapping[str, Mapping]) -> Hashable:
+    return (len(ejercicios), hash(tuple(ejercicios)))
+
+
+def obtener_indice(ejercicios: Mapping[str, Mapping], version: Optional[Hashable] = None) -> IndiceEjercicios:
+    """
+    Índice del catálogo `ejercicios`, construido una vez por proceso y versión.
+    `version` (p. ej. `version_catalogo()`) detecta cambios en los campos indexados; la huella
+    de nombres distingue las vistas por permisos y las altas locales de una misma versión.
+    """
+    clave = (version, _huella(ejercicios))
+    with _LOCK:
+        indice = _INDICES.get(clave)
+        if indice is not None:
+            _INDICES.move_to_end(clave)
+            return indice
+    indice = IndiceEjercicios(ejercicios)
+    with _LOCK:
+        _INDICES[clave] = indice
+        while len(_INDICES) > MAX_INDICES:
+            _INDICES.popitem(last=False)
+    return indice
+
+
+# =============================
+#  Benchmark
+# =============================
+def catalogo_sintetico(n: int = 12000, seed: int = 7) -> Dict[str, dict]:
+    import random
+
+    rng = random.Random(seed)
+    bases = ["Press", "Sentadilla", "Remo", "Peso muerto", "Dominada", "Zancada", "Curl", "Extensión",
+             "Elevación", "Hip thrust", "Jalón", "Fondos", "Plancha", "Aperturas", "Empuje"]
+    mods = ["banca", "inclinado", "declinado", "mancuerna", "barra", "polea", "unilateral", "búlgara",
+            "rumano", "sumo", "goblet", "frontal", "trasnuca", "neutro", "supino", "prono", "lateral",
+            "isométrico", "tempo", "pausa", "déficit", "landmine", "kettlebell", "TRX", "banda"]
+    grupos = ["Pecho", "Espalda", "Cuádriceps", "Isquiotibiales", "Glúteo", "Hombro", "Bíceps", "Tríceps", "Core"]
+    patrones = ["Empuje horizontal", "Empuje vertical", "Tracción horizontal", "Tracción vertical",
+                "Dominante de rodilla", "Dominante de cadera", "Core"]
+    catalogo: Dict[str, dict] = {}
+    while len(catalogo) < n:
+        nombre = " ".join([rng.choice(bases)] + rng.sample(mods, rng.randint(1, 3)))
+        nombre = f"{nombre} {len(catalogo) % 97}" if nombre in catalogo else nombre
+        catalogo[nombre] = {
+            "buscable_id": normalizar_busqueda(nombre).replace(" ", "_"),
+            "grupo_muscular_principal": rng.choice(grupos),
+            "patron_de_movimiento": rng.choice(patrones),
+        }
+    return catalogo
+
+
+def _textos_referencia(ejercicios: Mapping[str, Mapping]) -> List[Tuple[str, str]]:
+    return [
+        (nombre, f"{normalizar_busqueda(nombre)} {normalizar_busqueda((data or {}).get('buscable_id'))}")
+        for nombre, data in ejercicios.items()
+    ]
+
+
+def _referencia_busqueda(textos: Sequence[Tuple[str, str]], consulta: str) -> List[str]:
+    """Escaneo lineal por subcadena sobre textos ya normalizados (el `_FuzzyIndex` anterior)."""
+    norm = normalizar_busqueda(consulta)
+    if not norm:
+        return []
+    return [nombre for nombre, texto in textos if norm in texto]
+
+
+def benchmark(n: int = 12000, repeticiones: int = 5) -> dict:
+    import time
+
+    catalogo = catalogo_sintetico(n)
+    textos = _textos_referencia(catalogo)
+    consultas = ["pre", "press banca", "sentadila bulgara", "remo polea", "glúteo", "peso muerto rumano",
+                 "tracción vertical", "kb", "curl", "zancada mancuerna"]
+
+    inicio = time.perf_counter()
+    indice = IndiceEjercicios(catalogo)
+    t_build = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for q in consultas:
+            _referencia_busqueda(textos, q)
+    t_lineal = (time.perf_counter() - inicio) / (repeticiones * len(consultas))
+
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for q in consultas:
+            indice.buscar(q)
+    t_indice = (time.perf_counter() - inicio) / (repeticiones * len(consultas))
+
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for q in consultas:
+            indice.buscar(q, limite=LIMITE_SUGERENCIAS)
+    t_top = (time.perf_counter() - inicio) / (repeticiones * len(consultas))
+
+    # Lo que cada rerun pagaba para saber si el índice de la sesión seguía vigente vs. la huella actual
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        tuple(sorted(catalogo.keys()))
+    t_claves = (time.perf_counter() - inicio) / repeticiones
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        _huella(catalogo)
+    t_huella = (time.perf_counter() - inicio) / repeticiones
+
+    # Toda coincidencia por subcadena de palabras completas debe seguir apareciendo
+    for q in ("press banca", "remo polea", "curl"):
+        assert set(_referencia_busqueda(textos, q)) <= set(indice.buscar(q)), q
+    return {
+        "ejercicios": len(indice),
+        "construccion_ms": t_build * 1000,
+        "lineal_ms_por_consulta": t_lineal * 1000,
+        "indice_ms_por_consulta": t_indice * 1000,
+        "speedup": t_lineal / t_indice if t_indice else float("inf"),
+        f"indice_top{LIMITE_SUGERENCIAS}_ms_por_consulta": t_top * 1000,
+        f"speedup_top{LIMITE_SUGERENCIAS}": t_lineal / t_top if t_top else float("inf"),
+        "verificacion_anterior_ms": t_claves * 1000,
+        "verificacion_huella_ms": t_huella * 1000,
+        "ejemplo_typo": indice.buscar("sentadila bulgara", limite=3),
+    }
+
+
+if __name__ == "__main__":
+    for k, v in benchmark().items():
+        print(f"{k}: {v:.2f}" if isinstance(v, float) else f"{k}: {v}")
@@ -1,6 +1,7 @@
 """Lightweight helpers around Streamlit cache decorators with namespace-aware clearing."""
 from __future__ import annotations
 
+import threading
 from collections import defaultdict
 from functools import wraps
 from typing import Any, Callable, DefaultDict, ParamSpec, TypeVar
@@ -10,27 +11,57 @@ import streamlit as st
 P = ParamSpec("P")
 T = TypeVar("T")
 
-_CACHE_REGISTRY: DefaultDict[str, list[Callable[[], None]]] = defaultdict(list)
+# namespace -> [(clear_fn, keyed)]
+_CACHE_REGISTRY: DefaultDict[str, list[tuple[Callable[[], None], bool]]] = defaultdict(list)
+# (namespace, key) -> version; bumping it makes keyed entries miss without touching other keys
+_KEY_VERSIONS: DefaultDict[tuple[str, str], int] = defaultdict(int)
+_WRITE_HOOKS: DefaultDict[str, list[Callable[[str | None], None]]] = defaultdict(list)
+_LOCK = threading.Lock()
 
 
-def cache_data(namespace: str, **cache_kwargs: Any) -> Callable[[Callable[P, T]], Callable[P, T]]:
+def cache_data(
+    namespace: str,
+    key: Callable[..., str] | None = None,
+    **cache_kwargs: Any,
+) -> Callable[[Callable[P, T]], Callable[P, T]]:
     """
     Wraps st.cache_data but keeps track of each cached function under a namespace.
     That lets us invalidate only the data we need instead of nuking the entire cache.
+
+    `key` maps the call arguments to an entry key (e.g. the athlete's correo) so that
+    `invalidate(namespace, key)` only refreshes that entry.
     """
 
     if not namespace:
         raise ValueError("cache namespace must be a non-empty string")
 
     def decorator(func: Callable[P, T]) -> Callable[P, T]:
-        cached_func = st.cache_data(**cache_kwargs)(func)
+        if key is None:
+            cached_func = st.cache_data(**cache_kwargs)(func)
+
+            @wraps(func)
+            def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
+                return cached_func(*args, **kwargs)
+
+        else:
+            @wraps(func)
+            def versioned(*args: Any, cache_version: int = 0, **kwargs: Any) -> T:
+                return func(*args, **kwargs)
+
+            cached_func = st.cache_data(**cache_kwargs)(versioned)
+
+            @wraps(func)
+            def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
+                try:
+                    entry_key = str(key(*args, **kwargs) or "")
+                except Exception:
+                    entry_key = ""
+                version = _KEY_VERSIONS.get((namespace, entry_key), 0)
+                return cached_func(*args, cache_version=version, **kwargs)
+
         clear_fn = getattr(cached_func, "clear", None)
         if callable(clear_fn):
-            _CACHE_REGISTRY[namespace].append(clear_fn)
-
-        @wraps(func)
-        def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
-            return cached_func(*args, **kwargs)
+            _CACHE_REGISTRY[namespace].append((clear_fn, key is not None))
 
         # expose clear passthrough for finer-grain manual invalidation if needed
         setattr(wrapper, "clear", getattr(cached_func, "clear", lambda: None))
@@ -40,6 +71,14 @@ def cache_data(namespace: str, **cache_kwargs: Any) -> Callable[[Callable[P, T]]
     return decorator
 
 
+def _run_clear(clear_fn: Callable[[], None]) -> None:
+    try:
+        clear_fn()
+    except Exception:
+        # cache clearing should never break the UI; swallow and continue
+        pass
+
+
 def clear_cache(namespace: str | None = None) -> None:
     """
     Clears every cached function registered under `namespace`.
@@ -52,9 +91,48 @@ def clear_cache(namespace: str | None = None) -> None:
         targets = [_CACHE_REGISTRY.get(namespace, [])]
 
     for group in targets:
-        for clear_fn in group:
-            try:
-                clear_fn()
-            except Exception:
-                # cache clearing should never break the UI; swallow and continue
-                continue
+        for clear_fn, _keyed in group:
+            _run_clear(clear_fn)
+
+
+def invalidate(namespace: str, key: str) -> None:
+    """
+    Invalidates only the `key` entry of keyed functions in `namespace`.
+    Unkeyed functions of the namespace may hold that key's data too, so those are cleared.
+    """
+
+    if not key:
+        clear_cache(namespace)
+        return
+    with _LOCK:
+        _KEY_VERSIONS[(namespace, key)] += 1
+    for clear_fn, keyed in _CACHE_REGISTRY.get(namespace, []):
+        if not keyed:
+            _run_clear(clear_fn)
+
+
+def on_write(namespace: str) -> Callable[[Callable[[str | None], None]], Callable[[str | None], None]]:
+    """Registers a write-through hook that runs after `notify_write(namespace, ...)`."""
+
+    def decorator(hook: Callable[[str | None], None]) -> Callable[[str | None], None]:
+        _WRITE_HOOKS[namespace].append(hook)
+        return hook
+
+    return decorator
+
+
+def notify_write(namespace: str, key: str | None = None) -> None:
+    """
+    Called by save functions after writing to Firestore: invalidates the affected
+    entry (or the whole namespace when no key is given) and runs its hooks.
+    """
+
+    if key:
+        invalidate(namespace, key)
+    else:
+        clear_cache(namespace)
+    for hook in list(_WRITE_HOOKS.get(namespace, [])):
+        try:
+            hook(key)
+        except Exception:
+            continue
@@ -0,0 +1,540 @@
+"""Motor columnar (NumPy/pandas) para agregar carga de entrenamiento.
+
+Las rutinas (o sus rollups) se aplanan una sola vez a arreglos tipados; series, volumen,
+tonelaje, intensidad y la distribución ponderada por grupo muscular se calculan con
+operaciones vectorizadas en vez de bucles por ejercicio.
+
+Benchmark contra los bucles actuales: `python -m app_core.carga_entrenamiento`.
+"""
+from __future__ import annotations
+
+import random
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterable, List, Mapping, Sequence, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app_core.rollups_semanales import (
+    dia_finalizado,
+    es_warmup,
+    fecha_semana_de_doc,
+    iter_dias_rutina,
+)
+
+CATEGORIAS = np.array(["Fuerza", "Hipertrofia", "Accesorio"], dtype=object)
+COLUMNAS_SEMANA = ["semana", "categoria", "series", "volumen", "tonelaje"]
+
+# Mismos formatos que parse_reps_min: "8x10", "8-10" o "8" (toma el primer número)
+_RE_REPS_MIN = r"^\s*(\d+)\s*(?:[x×]\s*\d|[-–—]\s*\d|$)"
+_CLAVES_REPS_DICT = ("min", "reps_min", "rep_min", "rmin")
+
+
+# =============================
+#  Conversión vectorizada
+# =============================
+def _por_unicos(valores: Sequence, convertir: Callable[[Sequence], np.ndarray], default) -> np.ndarray:
+    """Convierte solo los valores distintos (reps/series/pesos se repiten mucho) y expande por código."""
+    codigos, unicos = pd.factorize(pd.Series(valores, dtype=object), use_na_sentinel=True)
+    convertidos = convertir(list(unicos))
+    out = convertidos[codigos] if len(convertidos) else np.full(len(codigos), default, dtype=convertidos.dtype)
+    out[codigos < 0] = default
+    return out
+
+def _a_numerico(valores: Sequence) -> np.ndarray:
+    """Equivale a float(x) por fila (NaN si no se puede convertir)."""
+    raw = pd.Series(valores, dtype=object)
+    num = pd.to_numeric(raw.astype(str).str.strip(), errors="coerce").to_numpy(dtype=float, copy=True)
+    num[~np.isfinite(num)] = np.nan
+    return num
+
+def enteros(valores: Sequence, default: int = 0) -> np.ndarray:
+    """`safe_int` de seguimiento (int(float(x))) aplicado a toda la columna."""
+    def _convertir(unicos):
+        num = _a_numerico(unicos)
+        return np.where(np.isnan(num), default, np.trunc(num)).astype(np.int64)
+    return _por_unicos(valores, _convertir, default)
+
+def flotantes(valores: Sequence, default: float = 0.0) -> np.ndarray:
+    def _convertir(unicos):
+        num = _a_numerico(unicos)
+        return np.where(np.isnan(num), default, num)
+    return _por_unicos(valores, _convertir, default)
+
+def series_a_enteros(valores: Sequence) -> np.ndarray:
+    """Como `_to_int_series` del panel de análisis: "4", "4.0", "4,0" o "4-5" (toma el primero)."""
+    def _convertir(unicos):
+        texto = (
+            pd.Series(unicos, dtype=object).astype(str).str.strip()
+            .str.split("-", n=1).str[0].str.strip()
+            .str.replace(",", ".", regex=False)
+        )
+        num = pd.to_numeric(texto, errors="coerce").to_numpy(dtype=float)
+        return np.where(np.isfinite(num), np.trunc(num), 0).astype(np.int64)
+    return _por_unicos(valores, _convertir, 0)
+
+def reps_min(valores: Sequence) -> np.ndarray:
+    """`parse_reps_min` vectorizado; 0 cuando no hay dato reconocible."""
+    def _convertir(unicos):
+        raw = pd.Series(unicos, dtype=object)
+        es_num = raw.map(type).isin((int, float, bool)).to_numpy()
+        num = pd.to_numeric(raw.where(es_num), errors="coerce").to_numpy(dtype=float)
+        texto = raw.where(~es_num, "").astype(str).str.lower().str.extract(_RE_REPS_MIN)[0]
+        desde_texto = pd.to_numeric(texto, errors="coerce").to_numpy(dtype=float)
+        res = np.where(es_num, np.trunc(num), desde_texto)
+        return np.where(np.isfinite(res), res, 0).astype(np.int64)
+    return _por_unicos(valores, _convertir, 0)
+
+def es_bloque_warmup(bloques: Sequence) -> np.ndarray:
+    """`es_warmup` por columna a partir del bloque/sección crudo."""
+    def _convertir(unicos):
+        texto = (
+            pd.Series(unicos, dtype=object).astype(str).str.strip().str.lower()
+            .str.replace("-", " ", regex=False).str.replace("_", " ", regex=False)
+        )
+        return (texto == "warm up").to_numpy(dtype=bool)
+    return _por_unicos(bloques, _convertir, False)
+
+def categorias(reps: np.ndarray) -> np.ndarray:
+    """`clasificar_categoria` por columna: <6 Fuerza, <12 Hipertrofia, resto Accesorio."""
+    idx = np.select([reps < 6, reps < 12], [0, 1], default=2)
+    return CATEGORIAS[idx]
+
+def _lunes(fechas: np.ndarray) -> np.ndarray:
+    dias = fechas.astype("datetime64[D]").astype(np.int64)
+    # 1970-01-01 fue jueves (weekday 3)
+    return (dias - (dias + 3) % 7).astype("datetime64[D]")
+
+
+# =============================
+#  Tabla plana
+# =============================
+@dataclass
+class TablaCarga:
+    """Un ejercicio por fila, en arreglos del mismo largo."""
+
+    fecha: np.ndarray            # datetime64[D]
+    ejercicio: np.ndarray        # object
+    series: np.ndarray           # int64
+    reps_min: np.ndarray         # int64
+    peso: np.ndarray             # float64
+    peso_alcanzado: np.ndarray   # float64
+    warmup: np.ndarray           # bool
+    finalizado: np.ndarray       # bool
+
+    def __len__(self) -> int:
+        return len(self.fecha)
+
+    def filtrar(self, desde: date, hasta: date, usar_real: bool, excluir_warmup: bool) -> "TablaCarga":
+        """Mismo criterio que el seguimiento: rango por día, solo finalizados en modo real, sin Warm Up."""
+        mask = (self.fecha >= np.datetime64(desde, "D")) & (self.fecha <= np.datetime64(hasta, "D"))
+        if usar_real:
+            mask &= self.finalizado
+        if excluir_warmup:
+            mask &= ~self.warmup
+        return TablaCarga(**{campo: getattr(self, campo)[mask] for campo in self.__dataclass_fields__})
+
+    def a_dataframe(self) -> pd.DataFrame:
+        """Filas crudas (fecha como `date`) con las columnas que usa la vista de ejercicio."""
+        return pd.DataFrame({
+            "fecha": self.fecha.astype(object),
+            "ejercicio": self.ejercicio,
+            "series": self.series,
+            "reps_min": self.reps_min,
+            "peso": self.peso,
+            "peso_alcanzado": self.peso_alcanzado,
+        })
+
+
+def _tabla_vacia() -> TablaCarga:
+    return TablaCarga(
+        fecha=np.array([], dtype="datetime64[D]"),
+        ejercicio=np.array([], dtype=object),
+        series=np.array([], dtype=np.int64),
+        reps_min=np.array([], dtype=np.int64),
+        peso=np.array([], dtype=float),
+        peso_alcanzado=np.array([], dtype=float),
+        warmup=np.array([], dtype=bool),
+        finalizado=np.array([], dtype=bool),
+    )
+
+def _reps_crudas(ej: dict):
+    valor = ej.get("reps_min", ej.get("reps"))
+    if isinstance(valor, dict):
+        for k in _CLAVES_REPS_DICT:
+            if k in valor:
+                return valor[k]
+        return valor.get("reps")
+    return valor
+
+_EPOCA_ORDINAL = date(1970, 1, 1).toordinal()
+
+def tabla_desde_rutinas(docs: Iterable[Tuple[str, dict]]) -> TablaCarga:
+    """Aplana docs de `rutinas_semanales` (doc_id, data) en una sola pasada."""
+    # Por día: fecha (días desde 1970), finalizado y nº de ejercicios; se expanden con np.repeat
+    dias_epoca: List[int] = []
+    dias_fin: List[bool] = []
+    dias_n: List[int] = []
+    nombres: list = []
+    series_raw: list = []
+    reps_raw: list = []
+    peso_raw: list = []
+    peso_alc_raw: list = []
+    bloques: list = []
+    for doc_id, data in docs:
+        fecha_semana = fecha_semana_de_doc(doc_id, data)
+        if not fecha_semana:
+            continue
+        base = fecha_semana.toordinal() - _EPOCA_ORDINAL
+        for dia_key, ejercicios in iter_dias_rutina(data):
+            if not ejercicios:
+                continue
+            try: idx = int(dia_key) - 1
+            except Exception: idx = 0
+            dias_epoca.append(base + idx)
+            dias_fin.append(dia_finalizado(data, dia_key))
+            dias_n.append(len(ejercicios))
+            nombres.extend([ej.get("ejercicio") for ej in ejercicios])
+            series_raw.extend([ej.get("series", 0) for ej in ejercicios])
+            reps_raw.extend([_reps_crudas(ej) for ej in ejercicios])
+            peso_raw.extend([ej.get("peso", 0) for ej in ejercicios])
+            peso_alc_raw.extend([
+                ej.get("peso_alcanzado") or ej.get("Peso_alcanzado") or ej.get("PesoAlcanzado")
+                for ej in ejercicios
+            ])
+            bloques.extend([ej.get("bloque", ej.get("seccion", "")) for ej in ejercicios])
+    if not nombres:
+        return _tabla_vacia()
+    n = np.asarray(dias_n, dtype=np.int64)
+    return TablaCarga(
+        fecha=np.repeat(np.asarray(dias_epoca, dtype=np.int64), n).astype("datetime64[D]"),
+        ejercicio=np.array(nombres, dtype=object),
+        series=enteros(series_raw),
+        reps_min=reps_min(reps_raw),
+        peso=flotantes(peso_raw),
+        peso_alcanzado=flotantes(peso_alc_raw),
+        warmup=es_bloque_warmup(bloques),
+        finalizado=np.repeat(np.asarray(dias_fin, dtype=bool), n),
+    )
+
+def tabla_desde_rollups(rollups: Iterable[dict]) -> TablaCarga:
+    """Aplana los ejercicios compactos de `rollups_semanales` (ya vienen tipados)."""
+    fechas: List[date] = []
+    filas: List[dict] = []
+    finalizado: List[bool] = []
+    for rollup in rollups:
+        try:
+            fecha_semana = date.fromisoformat(rollup.get("fecha_lunes", ""))
+        except ValueError:
+            continue
+        for dia_key, dia in (rollup.get("dias") or {}).items():
+            try: idx = int(dia_key) - 1
+            except Exception: idx = 0
+            fecha_dia = fecha_semana + timedelta(days=idx)
+            ejercicios = dia.get("ejercicios") or []
+            fechas.extend([fecha_dia] * len(ejercicios))
+            finalizado.extend([bool(dia.get("finalizado"))] * len(ejercicios))
+            filas.extend(ejercicios)
+    if not filas:
+        return _tabla_vacia()
+    df = pd.DataFrame.from_records(filas)
+
+    def _col(nombre, default, dtype):
+        if nombre not in df:
+            return np.full(len(df), default, dtype=dtype)
+        return df[nombre].fillna(default).to_numpy(dtype=dtype)
+
+    return TablaCarga(
+        fecha=np.array(fechas, dtype="datetime64[D]"),
+        ejercicio=df["ejercicio"].to_numpy(dtype=object) if "ejercicio" in df else np.full(len(df), None, dtype=object),
+        series=_col("series", 0, np.int64),
+        reps_min=_col("reps_min", 0, np.int64),
+        peso=_col("peso", 0.0, float),
+        peso_alcanzado=_col("peso_alcanzado", 0.0, float),
+        warmup=_col("warmup", False, bool),
+        finalizado=np.array(finalizado, dtype=bool),
+    )
+
+
+# =============================
+#  Agregaciones
+# =============================
+def agregar_por_semana(tabla: TablaCarga) -> pd.DataFrame:
+    """DF semana × categoría con series, volumen (series × reps) y tonelaje (volumen × peso)."""
+    if not len(tabla):
+        return pd.DataFrame(columns=COLUMNAS_SEMANA)
+    volumen = tabla.series * tabla.reps_min
+    df = pd.DataFrame({
+        "semana": _lunes(tabla.fecha),
+        "categoria": categorias(tabla.reps_min),
+        "series": tabla.series,
+        "volumen": volumen,
+        "tonelaje": volumen * tabla.peso,
+    })
+    df = df.groupby(["semana", "categoria"], as_index=False, sort=True).sum(numeric_only=True)
+    df["semana"] = df["semana"].dt.date
+    return df[COLUMNAS_SEMANA]
+
+def semanas_desde_rollups(
+    rollups: Iterable[dict], desde: date, hasta: date, usar_real: bool, excluir_warmup: bool
+) -> pd.DataFrame:
+    """
+    Mismo DF que `agregar_por_semana(tabla_desde_rollups(...).filtrar(...))`, pero sumando las
+    `categorias`/`categorias_warmup` que el rollup ya guarda por día (sin recorrer ejercicios).
+    """
+    filas: List[tuple] = []
+    for rollup in rollups:
+        try:
+            fecha_semana = date.fromisoformat(rollup.get("fecha_lunes", ""))
+        except ValueError:
+            continue
+        for dia_key, dia in (rollup.get("dias") or {}).items():
+            try: idx = int(dia_key) - 1
+            except Exception: idx = 0
+            fecha_dia = fecha_semana + timedelta(days=idx)
+            if not (desde <= fecha_dia <= hasta) or (usar_real and not dia.get("finalizado")):
+                continue
+            semana = fecha_dia - timedelta(days=fecha_dia.weekday())
+            grupos = [dia.get("categorias") or {}]
+            if not excluir_warmup:
+                grupos.append(dia.get("categorias_warmup") or {})
+            for grupo in grupos:
+                for categoria, m in grupo.items():
+                    filas.append((semana, categoria, m.get("series", 0), m.get("volumen", 0), m.get("tonelaje", 0.0)))
+    if not filas:
+        return pd.DataFrame(columns=COLUMNAS_SEMANA)
+    df = pd.DataFrame.from_records(filas, columns=COLUMNAS_SEMANA)
+    df = df.groupby(["semana", "categoria"], as_index=False, sort=True).sum(numeric_only=True)
+    return df[COLUMNAS_SEMANA]
+
+def intensidad_por_semana(df_semana: pd.DataFrame) -> pd.Series:
+    """Intensidad media (kg/rep) = tonelaje / volumen por semana; 0 si no hubo volumen."""
+    if df_semana.empty:
+        return pd.Series(dtype=float)
+    tot = df_semana.groupby("semana")[["tonelaje", "volumen"]].sum().sort_index()
+    vol = tot["volumen"].to_numpy(dtype=float)
+    ton = tot["tonelaje"].to_numpy(dtype=float)
+    out = np.divide(ton, vol, out=np.zeros_like(ton), where=vol > 0)
+    return pd.Series(out, index=tot.index, name="intensidad")
+
+def distribucion_ponderada(
+    claves: Sequence[str],
+    series: np.ndarray,
+    pesos: np.ndarray,
+    principal_por_clave: Mapping[str, str],
+    secundarios_por_clave: Mapping[str, Sequence[str]] | None = None,
+    peso_secundario: float = 0.0,
+    normalizar: Callable[[str], str] = lambda s: s,
+) -> Tuple[Dict[str, float], Dict[str, Set[str]]]:
+    """
+    Series por categoría: cada fila suma `series × peso` a su categoría principal y reparte
+    `peso_secundario` en partes iguales entre sus secundarios. Las categorías se agrupan por
+    `normalizar(nombre)`; devuelve (valor_por_categoria_norm, nombres_originales_por_categoria_norm).
+    """
+    if not len(claves):
+        return {}, {}
+    codigos, unicas = pd.factorize(pd.Series(claves, dtype=object))
+    base = np.asarray(series, dtype=float) * np.asarray(pesos, dtype=float)
+
+    principal_u = np.array([principal_por_clave.get(c, "") for c in unicas], dtype=object)
+    partes = [pd.Series(base).groupby(principal_u[codigos]).sum()]
+
+    if secundarios_por_clave and peso_secundario > 0:
+        sec_u = [list(secundarios_por_clave.get(c) or []) for c in unicas]
+        n_sec = np.array([len(s) for s in sec_u], dtype=float)
+        con_sec = n_sec[codigos] > 0
+        if con_sec.any():
+            por_fila = np.zeros_like(base)
+            por_fila[con_sec] = base[con_sec] * float(peso_secundario) / n_sec[codigos][con_sec]
+            # Suma por ejercicio único y luego reparte a sus secundarios (una fila por par)
+            por_clave = np.bincount(codigos, weights=por_fila, minlength=len(unicas))
+            pares_cod = np.repeat(np.arange(len(unicas)), n_sec.astype(int))
+            pares_cat = np.array([cat for s in sec_u for cat in s], dtype=object)
+            partes.append(pd.Series(por_clave[pares_cod]).groupby(pares_cat).sum())
+
+    totales = pd.concat(partes).groupby(level=0, sort=False).sum()
+    valores: Dict[str, float] = {}
+    nombres: Dict[str, Set[str]] = {}
+    for cat_raw, valor in totales.items():
+        cat_norm = normalizar(str(cat_raw))
+        if not cat_norm:
+            continue
+        valores[cat_norm] = valores.get(cat_norm, 0.0) + float(valor)
+        nombres.setdefault(cat_norm, set()).add(cat_raw)
+    return valores, nombres
+
+
+# =============================
+#  Benchmark
+# =============================
+_NOMBRES_SINTETICOS = [f"Ejercicio {i}" for i in range(120)]
+_REPS_SINTETICAS = ["5", "8-10", "3x5", 12, "10", "6 - 8", 15.0, "20", "", None]
+
+def historial_sintetico(anios: int = 3, dias_por_semana: int = 5, ejercicios_por_dia: int = 8,
+                        semilla: int = 7) -> List[Tuple[str, dict]]:
+    """Docs (doc_id, data) con la forma de `rutinas_semanales` para medir."""
+    rnd = random.Random(semilla)
+    lunes = date(2020, 1, 6)
+    docs = []
+    for s in range(anios * 52):
+        fecha = lunes + timedelta(weeks=s)
+        rutina: dict = {}
+        for d in range(1, dias_por_semana + 1):
+            rutina[str(d)] = [
+                {
+                    "ejercicio": rnd.choice(_NOMBRES_SINTETICOS),
+                    "bloque": "Warm Up" if i < 2 else "Work Out",
+                    "series": str(rnd.randint(1, 5)),
+                    "reps_min": rnd.choice(_REPS_SINTETICAS),
+                    "peso": rnd.choice(["", "20", 40.5, "60", 80]),
+                    "peso_alcanzado": rnd.choice([None, "", 42.5, "65"]),
+                }
+                for i in range(ejercicios_por_dia)
+            ]
+            rutina[f"{d}_finalizado"] = rnd.random() < 0.8
+        docs.append((f"atleta@x.com_{fecha:%Y_%m_%d}", {"fecha_lunes": fecha.isoformat(), "rutina": rutina}))
+    return docs
+
+def _referencia_agrupar(docs, desde: date, hasta: date, usar_real: bool, excluir_warmup: bool) -> pd.DataFrame:
+    """Bucle por fila que usaba `seguimiento_entrenamiento` antes del motor columnar (referencia del benchmark)."""
+    from app_core.rollups_semanales import clasificar_categoria, parse_reps_min, safe_float, safe_int
+
+    rows = []
+    for doc_id, data in docs:
+        fecha_semana = fecha_semana_de_doc(doc_id, data)
+        if not fecha_semana:
+            continue
+        for dia_key, ejercicios in iter_dias_rutina(data):
+            fecha_dia = fecha_semana + timedelta(days=int(dia_key) - 1)
+            if not (desde <= fecha_dia <= hasta):
+                continue
+            if usar_real and not dia_finalizado(data, dia_key):
+                continue
+            for ej in ejercicios:
+                if excluir_warmup and es_warmup(ej):
+                    continue
+                series = safe_int(ej.get("series", 0), 0)
+                reps = safe_int(parse_reps_min(ej.get("reps_min", ej.get("reps"))) or 0, 0)
+                peso = safe_float(ej.get("peso", 0), 0.0)
+                volumen = series * reps
+                rows.append({
+                    "semana": fecha_dia - timedelta(days=fecha_dia.weekday()),
+                    "categoria": clasificar_categoria(reps),
+                    "series": series,
+                    "volumen": volumen,
+                    "tonelaje": volumen * peso,
+                })
+    if not rows:
+        return pd.DataFrame(columns=COLUMNAS_SEMANA)
+    df = pd.DataFrame(rows)
+    df = df.groupby(["semana", "categoria"], as_index=False).sum(numeric_only=True)
+    return df.sort_values(["semana", "categoria"])
+
+def _referencia_distribucion(nombres, series_raw, pesos, principal, secundarios, peso_secundario):
+    """Bucle del panel de análisis de crear_planificaciones (_to_int_series/_add_valor)."""
+    def _to_int_series(v) -> int:
+        s = str(v or "").strip()
+        try:
+            if "-" in s:
+                s = s.split("-", 1)[0].strip()
+            return int(float(s.replace(",", ".")))
+        except Exception:
+            return 0
+
+    acum: Dict[str, float] = {}
+    for nombre, s_raw, peso in zip(nombres, series_raw, pesos):
+        series_val = _to_int_series(s_raw)
+        if series_val <= 0:
+            continue
+        cat_p = principal.get(nombre, "(sin dato)")
+        acum[cat_p] = acum.get(cat_p, 0.0) + series_val * peso
+        sec = secundarios.get(nombre) or []
+        for cat_s in sec:
+            acum[cat_s] = acum.get(cat_s, 0.0) + series_val * peso * peso_secundario / len(sec)
+    return acum
+
+def _medir(fn, repeticiones: int) -> float:
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        fn()
+        mejor = min(mejor, time.perf_counter() - t0)
+    return mejor
+
+def benchmark(anios: int = 3, repeticiones: int = 5) -> pd.DataFrame:
+    """Compara los bucles actuales con el motor columnar y verifica que den lo mismo."""
+    docs = historial_sintetico(anios=anios)
+    desde, hasta = date(2020, 1, 1), date(2020 + anios, 12, 31)
+    filas = []
+
+    ref = _referencia_agrupar(docs, desde, hasta, True, True).reset_index(drop=True)
+    nuevo = agregar_por_semana(tabla_desde_rutinas(docs).filtrar(desde, hasta, True, True))
+    pd.testing.assert_frame_equal(ref, nuevo, check_dtype=False)
+    tabla = tabla_desde_rutinas(docs)
+    filas.append({
+        "caso": f"seguimiento ({anios} años, {len(tabla)} ejercicios)",
+        "bucle_s": _medir(lambda: _referencia_agrupar(docs, desde, hasta, True, True), repeticiones),
+        "columnar_s": _medir(
+            lambda: agregar_por_semana(tabla_desde_rutinas(docs).filtrar(desde, hasta, True, True)),
+            repeticiones,
+        ),
+        "columnar_sin_aplanar_s": _medir(
+            lambda: agregar_por_semana(tabla.filtrar(desde, hasta, True, True)), repeticiones
+        ),
+    })
+
+    from app_core.rollups_semanales import calcular_rollup
+
+    rollups = [calcular_rollup(doc_id, data) for doc_id, data in docs]
+    ref_rollups = agregar_por_semana(tabla_desde_rollups(rollups).filtrar(desde, hasta, True, True))
+    pd.testing.assert_frame_equal(
+        ref_rollups.reset_index(drop=True),
+        semanas_desde_rollups(rollups, desde, hasta, True, True).reset_index(drop=True),
+        check_dtype=False,
+    )
+    filas.append({
+        "caso": f"seguimiento desde rollups ({len(rollups)} semanas)",
+        "bucle_s": _medir(
+            lambda: agregar_por_semana(tabla_desde_rollups(rollups).filtrar(desde, hasta, True, True)),
+            repeticiones,
+        ),
+        "columnar_s": _medir(lambda: semanas_desde_rollups(rollups, desde, hasta, True, True), repeticiones),
+    })
+
+    rnd = random.Random(11)
+    nombres = [rnd.choice(_NOMBRES_SINTETICOS) for _ in range(len(tabla))]
+    series_raw = [rnd.choice(["3", "4", "4-5", "2,0", "", None]) for _ in nombres]
+    pesos = np.array([rnd.choice([1.0, 0.5]) for _ in nombres])
+    principal = {n: f"Grupo {i % 9}" for i, n in enumerate(_NOMBRES_SINTETICOS)}
+    secundarios = {n: [f"Grupo {(i + 1) % 9}", f"Grupo {(i + 2) % 9}"][: i % 3] for i, n in enumerate(_NOMBRES_SINTETICOS)}
+
+    def _columnar():
+        series = series_a_enteros(series_raw)
+        validas = series > 0
+        return distribucion_ponderada(
+            np.array(nombres, dtype=object)[validas], series[validas], pesos[validas],
+            principal, secundarios, 0.5,
+        )[0]
+
+    ref_dist = _referencia_distribucion(nombres, series_raw, pesos, principal, secundarios, 0.5)
+    nuevo_dist = _columnar()
+    assert ref_dist.keys() == nuevo_dist.keys()
+    assert all(abs(ref_dist[k] - nuevo_dist[k]) < 1e-6 for k in ref_dist)
+    filas.append({
+        "caso": f"distribución muscular ({len(nombres)} filas)",
+        "bucle_s": _medir(
+            lambda: _referencia_distribucion(nombres, series_raw, pesos, principal, secundarios, 0.5),
+            repeticiones,
+        ),
+        "columnar_s": _medir(_columnar, repeticiones),
+    })
+
+    df = pd.DataFrame(filas)
+    df["speedup"] = df["bucle_s"] / df["columnar_s"]
+    return df
+
+
+if __name__ == "__main__":
+    print(benchmark().to_string(index=False))
@@ -0,0 +1,179 @@
+"""Índice compacto de clientes con rutinas (un doc por cliente) para no escanear `rutinas_semanales`.
+
+Las escrituras de rutinas mantienen el índice de forma incremental; lo anterior al despliegue se
+carga con `reconstruir_indice_clientes`, que deja la marca `configuracion_app/indice_clientes`.
+Mientras esa marca no esté completa en la versión actual, `cargar_indice_clientes` reconstruye.
+Reconstrucción manual: `python -m app_core.clientes_index`.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Iterable, List
+
+from firebase_admin import firestore
+
+from app_core.batch_writes import OperacionLote, escribir_en_lotes
+from app_core.cache import cache_data, clear_cache, on_write
+from app_core.firebase_client import get_db
+from app_core.utils import correo_a_doc_id, normalizar_correo
+
+COLECCION_INDICE = "indice_clientes_rutinas"
+CACHE_NAMESPACE = "clientes_index"
+COLECCION_CONFIG = "configuracion_app"
+DOC_MARCA = "indice_clientes"
+VERSION_INDICE = 1  # subirla fuerza una reconstrucción en el próximo arranque
+
+_LOCK_RECONSTRUCCION = threading.Lock()
+
+
+def _ref_indice(db, correo: str):
+    return db.collection(COLECCION_INDICE).document(correo_a_doc_id(correo))
+
+
+def operacion_registrar_semanas(
+    db,
+    correo: str,
+    cliente: str,
+    entrenador: str,
+    fechas_lunes: Iterable[str],
+    coach_responsable: str = "",
+) -> OperacionLote | None:
+    """Construye el upsert del índice para sumarlo al mismo batch que escribe las semanas."""
+    correo_norm = normalizar_correo(correo)
+    if not correo_norm:
+        return None
+    payload: dict = {
+        "correo": correo_norm,
+        "updated_at": firestore.SERVER_TIMESTAMP,
+    }
+    cliente = (cliente or "").strip()
+    if cliente:
+        payload["cliente"] = cliente
+    entrenador_norm = normalizar_correo(entrenador)
+    if entrenador_norm:
+        payload["entrenadores"] = firestore.ArrayUnion([entrenador_norm])
+    coach_norm = normalizar_correo(coach_responsable)
+    if coach_norm:
+        payload["coach_responsable"] = coach_norm
+    fechas = sorted({(f or "").strip() for f in fechas_lunes if (f or "").strip()})
+    if fechas:
+        payload["semanas"] = firestore.ArrayUnion(fechas)
+    return OperacionLote(_ref_indice(db, correo_norm), payload, merge=True)
+
+
+def operacion_quitar_semanas(db, correo: str, fechas_lunes: Iterable[str]) -> OperacionLote | None:
+    correo_norm = normalizar_correo(correo)
+    fechas = sorted({(f or "").strip() for f in fechas_lunes if (f or "").strip()})
+    if not correo_norm or not fechas:
+        return None
+    return OperacionLote(
+        _ref_indice(db, correo_norm),
+        {"semanas": firestore.ArrayRemove(fechas), "updated_at": firestore.SERVER_TIMESTAMP},
+        merge=True,
+    )
+
+
+def depurar_cliente_sin_semanas(db, correo: str) -> None:
+    """Elimina la entrada del índice si el cliente quedó sin semanas."""
+    ref = _ref_indice(db, correo)
+    try:
+        snap = ref.get()
+        if snap.exists and not (snap.to_dict() or {}).get("semanas"):
+            ref.delete()
+    except Exception:
+        pass
+
+
+def invalidar_indice_clientes() -> None:
+    clear_cache(CACHE_NAMESPACE)
+
+
+@on_write("rutinas_listado")
+def _al_cambiar_listado(_key: str | None) -> None:
+    invalidar_indice_clientes()
+
+
+def _ref_marca(db):
+    return db.collection(COLECCION_CONFIG).document(DOC_MARCA)
+
+
+def indice_completo(db=None) -> bool:
+    """True si ya corrió la reconstrucción de la versión actual del índice."""
+    db = db or get_db()
+    try:
+        snap = _ref_marca(db).get()
+    except Exception:
+        return True  # sin poder leer la marca no se lanza un escaneo completo
+    data = (snap.to_dict() or {}) if snap.exists else {}
+    return bool(data.get("completo")) and int(data.get("version") or 0) >= VERSION_INDICE
+
+
+def reconstruir_indice_clientes(db=None) -> int:
+    """
+    Recorre `rutinas_semanales` una sola vez y suma todo al índice. Devuelve nº de clientes.
+    Usa ArrayUnion con merge: no pisa lo que las escrituras incrementales agreguen mientras corre.
+    """
+    db = db or get_db()
+    clientes: dict[str, dict] = {}
+    for snap in db.collection("rutinas_semanales").select(
+        ["correo", "cliente", "entrenador", "coach_responsable", "fecha_lunes"]
+    ).stream():
+        data = snap.to_dict() or {}
+        correo_norm = normalizar_correo(data.get("correo", ""))
+        if not correo_norm:
+            continue
+        entry = clientes.setdefault(
+            correo_norm,
+            {"correo": correo_norm, "cliente": "", "entrenadores": set(), "coach_responsable": "", "semanas": set()},
+        )
+        fecha = (data.get("fecha_lunes") or "").strip()
+        if fecha:
+            entry["semanas"].add(fecha)
+        nombre = (data.get("cliente") or "").strip()
+        if nombre and (not entry["cliente"] or fecha >= max(entry["semanas"], default="")):
+            entry["cliente"] = nombre
+        entrenador = normalizar_correo(data.get("entrenador", ""))
+        if entrenador:
+            entry["entrenadores"].add(entrenador)
+        coach = normalizar_correo(data.get("coach_responsable", ""))
+        if coach:
+            entry["coach_responsable"] = coach
+
+    ops = []
+    for correo_norm, entry in clientes.items():
+        payload = {"correo": correo_norm, "updated_at": firestore.SERVER_TIMESTAMP}
+        if entry["cliente"]:
+            payload["cliente"] = entry["cliente"]
+        if entry["coach_responsable"]:
+            payload["coach_responsable"] = entry["coach_responsable"]
+        if entry["entrenadores"]:
+            payload["entrenadores"] = firestore.ArrayUnion(sorted(entry["entrenadores"]))
+        if entry["semanas"]:
+            payload["semanas"] = firestore.ArrayUnion(sorted(entry["semanas"]))
+        ops.append(OperacionLote(_ref_indice(db, correo_norm), payload, merge=True))
+    resultados = escribir_en_lotes(db, ops)
+    if all(r.ok for r in resultados):
+        _ref_marca(db).set({
+            "version": VERSION_INDICE,
+            "completo": True,
+            "clientes": len(clientes),
+            "reconstruido_en": firestore.SERVER_TIMESTAMP,
+        })
+    invalidar_indice_clientes()
+    return len(clientes)
+
+
+@cache_data(CACHE_NAMESPACE, show_spinner=False, ttl=120)
+def cargar_indice_clientes() -> List[dict]:
+    """Lee el índice (una fila por cliente). Si falta la marca de reconstrucción, lo reconstruye antes."""
+    db = get_db()
+    if not indice_completo(db):
+        with _LOCK_RECONSTRUCCION:
+            if not indice_completo(db):
+                reconstruir_indice_clientes(db)
+    entradas = [snap.to_dict() or {} for snap in db.collection(COLECCION_INDICE).stream()]
+    return [e for e in entradas if e.get("correo") and e.get("semanas")]
+
+
+if __name__ == "__main__":
+    print(f"Clientes indexados: {reconstruir_indice_clientes()}")
@@ -1,9 +1,24 @@
 from __future__ import annotations
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Sequence
 from .firebase_client import get_db
+from .utils import correo_a_doc_id
 
 # NOTA: No se cambian nombres de colecciones ni campos.
 
+# Campos livianos de `rutinas_semanales` para listados; el mapa `rutina` se pide aparte.
+CAMPOS_METADATA_RUTINA: tuple[str, ...] = ("correo", "cliente", "fecha_lunes", "bloque_rutina", "entrenador")
+
+
+def clave_rutinas(correo: str) -> str:
+    """Clave de cache por deportista (`rutinas:<clave>`); acepta correo crudo o normalizado."""
+    return correo_a_doc_id(correo)
+
+
+def clave_rutinas_de_doc(doc_id: str) -> str:
+    """Clave de cache a partir de un id `<correo_norm>_YYYY_MM_DD` de `rutinas_semanales`."""
+    partes = (doc_id or "").rsplit("_", 3)
+    return partes[0].lower() if len(partes) == 4 else (doc_id or "").lower()
+
 
 def usuarios_por_correo(correo: str) -> Optional[Dict[str, Any]]:
     db = get_db()
@@ -37,6 +52,43 @@ def rutinas_de_correo(correo_norm: str) -> List[Dict[str, Any]]:
     return [d.to_dict() or {} for d in docs]
 
 
+def rutinas_metadata(
+    correo: Optional[str] = None,
+    entrenador: Optional[str] = None,
+    campos: Sequence[str] = CAMPOS_METADATA_RUTINA,
+) -> List[Dict[str, Any]]:
+    """Lista semanas con proyección de campos (`select`). Cada item incluye `_id` del documento."""
+    db = get_db()
+    q = db.collection("rutinas_semanales")
+    if correo:
+        q = q.where("correo", "==", correo)
+    if entrenador:
+        q = q.where("entrenador", "==", entrenador)
+    q = q.select(list(campos))
+    out: List[Dict[str, Any]] = []
+    for d in q.stream():
+        data = d.to_dict() or {}
+        data["_id"] = d.id
+        out.append(data)
+    return out
+
+
+def rutinas_por_ids(doc_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """Trae documentos completos de `rutinas_semanales` en un solo `get_all`."""
+    ids = [i for i in dict.fromkeys(doc_ids) if i]
+    if not ids:
+        return {}
+    db = get_db()
+    col = db.collection("rutinas_semanales")
+    out: Dict[str, Dict[str, Any]] = {}
+    for snap in db.get_all([col.document(i) for i in ids]):
+        if snap.exists:
+            data = snap.to_dict() or {}
+            data["_id"] = snap.id
+            out[snap.id] = data
+    return out
+
+
 def catalogo_ejercicios() -> Dict[str, Any]:
     db = get_db()
     doc = db.collection("configuracion_app").document("catalogos_ejercicios").get()
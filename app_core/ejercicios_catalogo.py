@@ -1,11 +1,38 @@
+"""Catálogo de ejercicios: una copia por proceso, versionada, y vistas filtradas por permisos.
+
+Todas las páginas leen de `_CATALOGO` en vez de recorrer la colección `ejercicios`. Cada
+escritura hecha con `guardar_ejercicio(s)` sella `updated_at` y sube el contador
+`configuracion_app/version_ejercicios`; al cambiar la versión solo se releen los docs
+modificados desde el último `updated_at` conocido y se descartan los IDs que `borrar_ejercicio`
+anotó en `borrados` del mismo doc. Lo borrado por fuera de este módulo cae en la recarga completa.
+
+Las vistas por usuario (`VistaCatalogo`) combinan capas compartidas por versión
+(públicos, privados por empresa) con una capa personal, sin copiar el catálogo.
+"""
 from __future__ import annotations
 
+import threading
+import time
+from types import MappingProxyType
+from typing import Callable, Iterable, Iterator, Mapping
+
 import streamlit as st
+from firebase_admin import firestore
 
+from app_core.batch_writes import OperacionLote, ResultadoEscritura, escribir_en_lotes
+from app_core.cache import on_write
 from app_core.firebase_client import get_db
-from app_core.utils import empresa_de_usuario, EMPRESA_MOTION
+from app_core.utils import empresa_de_usuario, empresas_de_usuarios, EMPRESA_DESCONOCIDA, EMPRESA_MOTION
 
 ADMIN_ROLES = {"admin", "administrador", "owner"}
+# Empresas cuyos entrenadores ven los ejercicios privados de sus colegas
+EMPRESAS_CON_PRIVADOS_COMPARTIDOS = {EMPRESA_MOTION}
+
+COLECCION_EJERCICIOS = "ejercicios"
+COLECCION_CONFIG = "configuracion_app"
+DOC_VERSION = "version_ejercicios"
+INTERVALO_VERIFICACION_S = 30   # cada cuánto se consulta el contador de versión
+RECARGA_COMPLETA_S = 3600       # red de seguridad para escrituras que no pasan por este módulo
 
 
 def _normalizar_correo(valor: str) -> str:
@@ -48,90 +75,351 @@ def _store(target: dict[str, dict], doc_id: str, data: dict, correo_prioritario:
             target[nombre] = enriched
 
 
-@st.cache_data(show_spinner=False)
-def cargar_ejercicios_filtrados(correo_usuario: str, rol: str) -> dict[str, dict]:
-    db = get_db()
-    correo_usuario = (correo_usuario or "").strip().lower()
-    rol = (rol or "").strip()
-    ejercicios_por_nombre: dict[str, dict] = {}
+# =============================
+#  Copia del catálogo por proceso
+# =============================
+def _ref_version(db):
+    return db.collection(COLECCION_CONFIG).document(DOC_VERSION)
+
+
+class _CatalogoProceso:
+    """Docs de `ejercicios` (id -> data) y la versión con que se sincronizaron. El dict se reemplaza, no se muta."""
+
+    def __init__(self) -> None:
+        self._docs: dict[str, dict] = {}
+        self._version: int | None = None
+        self._ultimo_cambio = None
+        self._verificado = 0.0
+        self._carga_completa_en = 0.0
+        self._lock = threading.Lock()
+
+    def marcar_desactualizado(self) -> None:
+        self._verificado = 0.0
+
+    def _vigente(self) -> bool:
+        return self._version is not None and time.monotonic() - self._verificado < INTERVALO_VERIFICACION_S
+
+    def snapshot(self, db=None) -> tuple[int, Mapping[str, dict]]:
+        if not self._vigente():
+            with self._lock:
+                if not self._vigente():
+                    self._sincronizar(db or get_db())
+        return self._version or 0, self._docs
+
+    def _sincronizar(self, db) -> None:
+        meta = _ref_version(db).get()
+        datos_version = (meta.to_dict() or {}) if meta.exists else {}
+        version = int(datos_version.get("version") or 0)
+        vencida = time.monotonic() - self._carga_completa_en >= RECARGA_COMPLETA_S
+        if self._version is None or vencida:
+            self._carga_completa(db)
+        elif version != self._version and not self._carga_incremental(db, datos_version.get("borrados") or []):
+            self._carga_completa(db)
+        self._version = version
+        self._verificado = time.monotonic()
+
+    def _registrar_cambio(self, data: dict) -> None:
+        ts = data.get("updated_at")
+        if ts is not None and not isinstance(ts, str) and (self._ultimo_cambio is None or ts > self._ultimo_cambio):
+            self._ultimo_cambio = ts
+
+    def _carga_completa(self, db) -> None:
+        docs: dict[str, dict] = {}
+        self._ultimo_cambio = None
+        for snap in db.collection(COLECCION_EJERCICIOS).stream():
+            data = snap.to_dict() or {}
+            docs[snap.id] = data
+            self._registrar_cambio(data)
+        self._docs = docs
+        self._carga_completa_en = time.monotonic()
+
+    def _carga_incremental(self, db, borrados_registrados: Iterable[str]) -> bool:
+        """
+        Relee solo los docs con `updated_at` >= el último visto y quita los IDs de `borrados_registrados`
+        (un borrado no deja `updated_at`; los anota `borrar_ejercicio` en el doc de versión).
+        False si no encontró cambios.
+        """
+        if self._ultimo_cambio is None:
+            return False
+        col = db.collection(COLECCION_EJERCICIOS)
+        snaps = list(col.where("updated_at", ">=", self._ultimo_cambio).stream())
+        cambios = {snap.id: snap.to_dict() or {} for snap in snaps}
+        borrados = [doc_id for doc_id in set(borrados_registrados) if doc_id in self._docs and doc_id not in cambios]
+        if not borrados and not any(self._docs.get(doc_id) != data for doc_id, data in cambios.items()):
+            return False
+        docs = {doc_id: data for doc_id, data in self._docs.items() if doc_id not in borrados}
+        docs.update(cambios)
+        for data in cambios.values():
+            self._registrar_cambio(data)
+        self._docs = docs
+        return True
+
+
+_CATALOGO = _CatalogoProceso()
+
+
+@on_write("ejercicios")
+def _al_escribir_ejercicios(_key: str | None) -> None:
+    _CATALOGO.marcar_desactualizado()
+
+
+def catalogo_completo(db=None) -> tuple[int, Mapping[str, dict]]:
+    """(versión, id -> datos) de todo el catálogo. Los dicts son compartidos: no mutarlos."""
+    return _CATALOGO.snapshot(db)
+
+
+def version_catalogo(db=None) -> int:
+    return catalogo_completo(db)[0]
+
+
+# =============================
+#  Escrituras
+# =============================
+def _payload(data: dict) -> dict:
+    payload = {**data, "updated_at": firestore.SERVER_TIMESTAMP}
+    entrenador = _normalizar_correo(data.get("entrenador"))
+    if entrenador and not data.get("empresa_propietaria"):
+        empresa = empresa_de_usuario(entrenador)
+        if empresa != EMPRESA_DESCONOCIDA:
+            payload["empresa_propietaria"] = empresa
+    return payload
+
+
+def _op_version(vigentes: Iterable[str] = (), borrados: Iterable[str] = ()) -> dict:
+    """Sube la versión; `borrados` se anotan para la carga incremental y `vigentes` salen de esa lista."""
+    op = {"version": firestore.Increment(1), "updated_at": firestore.SERVER_TIMESTAMP}
+    if borrados := list(borrados):
+        op["borrados"] = firestore.ArrayUnion(borrados)
+    elif vigentes := list(vigentes):
+        op["borrados"] = firestore.ArrayRemove(vigentes)
+    return op
+
+
+def guardar_ejercicio(db, doc_id: str, data: dict, merge: bool = True, actualizar: bool = False) -> None:
+    """Escribe un ejercicio y sube la versión del catálogo en el mismo batch (propaga excepciones)."""
+    ref = db.collection(COLECCION_EJERCICIOS).document(doc_id)
+    batch = db.batch()
+    if actualizar:
+        batch.update(ref, _payload(data))
+    else:
+        batch.set(ref, _payload(data), merge=merge)
+    batch.set(_ref_version(db), _op_version(vigentes=[doc_id]), merge=True)
+    batch.commit()
+    _CATALOGO.marcar_desactualizado()
+
+
+def borrar_ejercicio(db, doc_id: str) -> None:
+    """Borra un ejercicio y lo anota en `borrados` del doc de versión en el mismo batch."""
+    batch = db.batch()
+    batch.delete(db.collection(COLECCION_EJERCICIOS).document(doc_id))
+    batch.set(_ref_version(db), _op_version(borrados=[doc_id]), merge=True)
+    batch.commit()
+    _CATALOGO.marcar_desactualizado()
+
+
+def guardar_ejercicios(db, cambios: Iterable[tuple[str, dict]], merge: bool = True) -> list[ResultadoEscritura]:
+    """Varios ejercicios en batches (set merge) y un solo aumento de versión al final."""
+    cambios = list(cambios)
+    ops = [
+        OperacionLote(db.collection(COLECCION_EJERCICIOS).document(doc_id), _payload(data), merge=merge)
+        for doc_id, data in cambios
+    ]
+    if not ops:
+        return []
+    ops.append(OperacionLote(_ref_version(db), _op_version(vigentes=[doc_id for doc_id, _ in cambios]), merge=True))
+    resultados = escribir_en_lotes(db, ops)
+    _CATALOGO.marcar_desactualizado()
+    return resultados[:-1]
 
+
+def backfill_empresa_propietaria(db=None, dry_run: bool = False) -> dict[str, int]:
+    """
+    Escribe `empresa_propietaria` en los ejercicios que no la tienen, resolviendo los creadores en lote.
+    Los creadores sin empresa conocida se omiten para volver a intentarlo en otra corrida.
+    """
+    db = db or get_db()
+    pendientes: list[tuple[str, str]] = []
+    for snap in db.collection(COLECCION_EJERCICIOS).stream():
+        data = snap.to_dict() or {}
+        if not data.get("empresa_propietaria"):
+            pendientes.append((snap.id, _normalizar_correo(data.get("entrenador"))))
+
+    empresas = empresas_de_usuarios({creador for _, creador in pendientes if creador}, db=db)
+    cambios = [
+        (doc_id, {"empresa_propietaria": empresas[creador]})
+        for doc_id, creador in pendientes
+        if creador and empresas.get(creador, EMPRESA_DESCONOCIDA) != EMPRESA_DESCONOCIDA
+    ]
+    resumen = {"sin_empresa": len(pendientes), "a_escribir": len(cambios), "escritos": 0, "fallidos": 0}
+    if cambios and not dry_run:
+        resultados = guardar_ejercicios(db, cambios)
+        resumen["escritos"] = sum(1 for r in resultados if r.ok)
+        resumen["fallidos"] = len(resultados) - resumen["escritos"]
+    return resumen
+
+
+# =============================
+#  Vistas por permisos (capas)
+# =============================
+class VistaCatalogo(Mapping):
+    """
+    Vista de solo lectura nombre -> ejercicio sobre capas compartidas; ante nombres repetidos gana la última.
+    No copia las capas: la memoria por usuario es la de su capa personal. Para agregar entradas locales
+    usar `collections.ChainMap({}, vista)`; los dicts de cada ejercicio también son compartidos.
+    """
+
+    __slots__ = ("_capas", "_transformar", "_largo")
+
+    def __init__(self, capas: Iterable[Mapping[str, dict]] = (), transformar: Callable[[dict], dict] | None = None):
+        self._capas = tuple(capa for capa in capas if capa)
+        self._transformar = transformar
+        self._largo: int | None = None
+
+    def __getitem__(self, nombre: str) -> dict:
+        for capa in reversed(self._capas):
+            if nombre in capa:
+                data = capa[nombre]
+                return self._transformar(data) if self._transformar else data
+        raise KeyError(nombre)
+
+    def __contains__(self, nombre) -> bool:
+        return any(nombre in capa for capa in self._capas)
+
+    def __iter__(self) -> Iterator[str]:
+        for i, capa in enumerate(self._capas):
+            superiores = self._capas[i + 1:]
+            for nombre in capa:
+                if not any(nombre in sup for sup in superiores):
+                    yield nombre
+
+    def __len__(self) -> int:
+        if self._largo is None:
+            self._largo = sum(1 for _ in self)
+        return self._largo
+
+    def con_transformacion(self, transformar: Callable[[dict], dict]) -> "VistaCatalogo":
+        """Misma vista aplicando `transformar` a cada ejercicio al leerlo (no guarda copias)."""
+        return VistaCatalogo(self._capas, transformar)
+
+
+_CAPA_VACIA: Mapping[str, dict] = MappingProxyType({})
+
+
+def _capa(items: Iterable[tuple[str, dict]], correo_prioritario: str = "") -> Mapping[str, dict]:
+    destino: dict[str, dict] = {}
+    for doc_id, data in items:
+        if data:
+            _store(destino, doc_id, data, correo_prioritario)
+    return MappingProxyType(destino) if destino else _CAPA_VACIA
+
+
+class _CapasCatalogo:
+    """
+    Capas construidas una vez por versión del catálogo y compartidas entre usuarios:
+    todos (admin), públicos, privados por empresa y una capa personal pequeña por entrenador.
+    """
+
+    def __init__(self) -> None:
+        self._version: int | None = None
+        self._docs: Mapping[str, dict] = {}
+        self._capas: dict[tuple, Mapping[str, dict]] = {}
+        self._por_entrenador: dict[str, list[tuple[str, dict]]] | None = None
+        self._empresa_creador: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _sincronizar(self, db=None) -> None:
+        version, docs = catalogo_completo(db)
+        if version != self._version or docs is not self._docs:
+            self._version, self._docs = version, docs
+            self._capas = {}
+            self._por_entrenador = None
+            self._empresa_creador = {}
+
+    def _obtener(self, clave: tuple, construir: Callable[[], Mapping[str, dict]]) -> Mapping[str, dict]:
+        capa = self._capas.get(clave)
+        if capa is None:
+            capa = self._capas[clave] = construir()
+        return capa
+
+    def _docs_de_entrenador(self, correo: str) -> list[tuple[str, dict]]:
+        if self._por_entrenador is None:
+            indice: dict[str, list[tuple[str, dict]]] = {}
+            for doc_id, data in self._docs.items():
+                creador = _normalizar_correo((data or {}).get("entrenador"))
+                if creador:
+                    indice.setdefault(creador, []).append((doc_id, data))
+            self._por_entrenador = indice
+        return self._por_entrenador.get(correo, [])
+
+    def _empresas_de_creadores(self, creadores: set[str], db=None) -> None:
+        """Resuelve en lote (users map + un `get_all`) las empresas de creadores aún no vistos."""
+        faltantes = {c for c in creadores if c and c not in self._empresa_creador}
+        if faltantes:
+            self._empresa_creador.update(empresas_de_usuarios(faltantes, db=db))
+
+    def _privados_de_empresa(self, empresa: str, db=None) -> list[tuple[str, dict]]:
+        privados = []
+        for doc_id, data in self._docs.items():
+            if not data or data.get("publico"):
+                continue
+            empresa_doc = (data.get("empresa_propietaria") or "").strip().lower()
+            privados.append((doc_id, data, empresa_doc, _normalizar_correo(data.get("entrenador"))))
+        # Ejercicios antiguos sin `empresa_propietaria`: se resuelve por creador, todos de una vez
+        self._empresas_de_creadores({creador for _, _, emp, creador in privados if not emp}, db)
+        return [
+            (doc_id, data)
+            for doc_id, data, empresa_doc, creador in privados
+            if (empresa_doc or self._empresa_creador.get(creador, "")) == empresa
+        ]
+
+    def vista(self, correo: str, rol: str, db=None) -> VistaCatalogo:
+        with self._lock:
+            self._sincronizar(db)
+            personal = self._obtener(
+                ("personal", correo), lambda: _capa(self._docs_de_entrenador(correo), correo)
+            ) if correo else _CAPA_VACIA
+            if _es_admin(rol):
+                return VistaCatalogo((self._obtener(("todos",), lambda: _capa(self._docs.items())), personal))
+
+            capas = [self._obtener(
+                ("publicos",), lambda: _capa((i, d) for i, d in self._docs.items() if d and d.get("publico") is True)
+            )]
+            empresa = empresa_de_usuario(correo) if correo else ""
+            if empresa in EMPRESAS_CON_PRIVADOS_COMPARTIDOS:
+                capas.append(self._obtener(("empresa", empresa), lambda: _capa(self._privados_de_empresa(empresa, db))))
+            capas.append(personal)
+            return VistaCatalogo(capas)
+
+
+_CAPAS = _CapasCatalogo()
+
+
+def cargar_ejercicios_filtrados(correo_usuario: str, rol: str) -> VistaCatalogo:
+    """
+    Ejercicios visibles para el usuario: públicos (+ privados de su empresa si la comparte)
+    con sus propios ejercicios encima. Vista de solo lectura sobre capas compartidas.
+    """
     try:
-        if _es_admin(rol):
-            for doc in db.collection("ejercicios").stream():
-                if not doc.exists:
-                    continue
-                _store(ejercicios_por_nombre, doc.id, doc.to_dict() or {}, correo_usuario)
-            return ejercicios_por_nombre
-
-        empresa_usuario = empresa_de_usuario(correo_usuario) if correo_usuario else ""
-        publicos: dict[str, dict] = {}
-        personales: dict[str, dict] = {}
-        compartidos: dict[str, dict] = {}
-
-        if empresa_usuario == EMPRESA_MOTION:
-            empresa_cache: dict[str, str] = {}
-
-            def _empresa_de_creador(correo_creador: str) -> str:
-                correo_creador = (correo_creador or "").strip().lower()
-                if not correo_creador:
-                    return ""
-                if correo_creador not in empresa_cache:
-                    try:
-                        empresa_cache[correo_creador] = empresa_de_usuario(correo_creador)
-                    except Exception:
-                        empresa_cache[correo_creador] = ""
-                return empresa_cache[correo_creador]
-
-            for doc in db.collection("ejercicios").stream():
-                if not doc.exists:
-                    continue
-                data = doc.to_dict() or {}
-                if not data:
-                    continue
-                es_publico = bool(data.get("publico"))
-                creador = (data.get("entrenador") or "").strip().lower()
-
-                if es_publico:
-                    _store(publicos, doc.id, data, correo_usuario)
-                    continue
-
-                if creador and creador == correo_usuario:
-                    _store(personales, doc.id, data, correo_usuario)
-                    continue
-
-                empresa_doc = (data.get("empresa_propietaria") or "").strip().lower()
-                if not empresa_doc:
-                    empresa_doc = _empresa_de_creador(creador)
-
-                if empresa_doc == EMPRESA_MOTION:
-                    _store(compartidos, doc.id, data, correo_usuario)
-
-            ejercicios_por_nombre.update(publicos)
-            ejercicios_por_nombre.update(compartidos)
-            ejercicios_por_nombre.update(personales)
-        else:
-            for doc in db.collection("ejercicios").where("publico", "==", True).stream():
-                if not doc.exists:
-                    continue
-                _store(publicos, doc.id, doc.to_dict() or {}, correo_usuario)
-
-            if correo_usuario:
-                for doc in db.collection("ejercicios").where("entrenador", "==", correo_usuario).stream():
-                    if not doc.exists:
-                        continue
-                    data = doc.to_dict() or {}
-                    _store(personales, doc.id, data, correo_usuario)
-                    publicos.pop((data.get("nombre") or "").strip(), None)
-
-            ejercicios_por_nombre.update(publicos)
-            ejercicios_por_nombre.update(personales)
+        return _CAPAS.vista(_normalizar_correo(correo_usuario), (rol or "").strip())
     except Exception as e:
         st.error(f"Error cargando ejercicios: {e}")
+        return VistaCatalogo()
 
-    return ejercicios_por_nombre
 
-
-def obtener_ejercicios_disponibles() -> dict[str, dict]:
+def obtener_ejercicios_disponibles() -> VistaCatalogo:
     correo_usuario = (st.session_state.get("correo") or "").strip().lower()
     rol = (st.session_state.get("rol") or "").strip()
     return cargar_ejercicios_filtrados(correo_usuario, rol)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Mantenimiento del catálogo de ejercicios.")
+    parser.add_argument("--backfill-empresas", action="store_true", help="completa `empresa_propietaria` en los ejercicios")
+    parser.add_argument("--dry-run", action="store_true", help="solo cuenta, no escribe")
+    args = parser.parse_args()
+    if args.backfill_empresas:
+        print(backfill_empresa_propietaria(dry_run=args.dry_run))
+    else:
+        parser.print_help()
@@ -0,0 +1,208 @@
+"""Envío de correos en lote: reutiliza la sesión SMTP/HTTP y envía con concurrencia acotada.
+
+No conoce plantillas ni `st.secrets`; recibe la configuración ya resuelta (ver
+`app_core.email_notifications`) y devuelve un resultado por destinatario.
+"""
+from __future__ import annotations
+
+import logging
+import smtplib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import formataddr
+from typing import Any, List, Optional, Sequence
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+SENDGRID_URL = "https://api.sendgrid.com/v3/mail/send"
+MAX_WORKERS_DEFAULT = 4
+TIMEOUT_S = 10
+
+_HTTP_LOCK = threading.Lock()
+_HTTP_SESSION: Optional[requests.Session] = None
+
+
+@dataclass
+class MensajeCorreo:
+    to_email: str
+    subject: str
+    html_body: str
+    text_body: str
+    to_name: Optional[str] = None
+
+
+@dataclass
+class ResultadoEnvio:
+    destinatario: str
+    ok: bool
+    error: str = ""
+
+
+ERROR_DESHABILITADAS = "Notificaciones deshabilitadas"
+ERROR_SIN_CONFIGURACION = "Sin configuración de correo"
+# Errores de configuración: valen para todo el lote y reintentar no los resuelve
+ERRORES_PERMANENTES = (ERROR_DESHABILITADAS, ERROR_SIN_CONFIGURACION)
+
+
+# =============================
+#  SMTP (una sesión autenticada por worker)
+# =============================
+class _SesionSMTP:
+    def __init__(self, settings) -> None:
+        self._settings = settings
+        self._smtp: Optional[smtplib.SMTP] = None
+
+    def _abrir(self) -> smtplib.SMTP:
+        s = self._settings
+        if s.use_ssl:
+            smtp = smtplib.SMTP_SSL(s.smtp_host, s.smtp_port, timeout=TIMEOUT_S)
+        else:
+            smtp = smtplib.SMTP(s.smtp_host, s.smtp_port, timeout=TIMEOUT_S)
+        if s.use_starttls and not s.use_ssl:
+            smtp.starttls()
+        smtp.login(s.smtp_user, s.smtp_password)
+        return smtp
+
+    def enviar(self, mensaje: MensajeCorreo) -> None:
+        s = self._settings
+        remitente = s.from_email or s.smtp_user
+        mime = MIMEMultipart("alternative")
+        mime["Subject"] = mensaje.subject
+        mime["From"] = formataddr((s.from_name or s.smtp_user, remitente))
+        mime["To"] = formataddr((mensaje.to_name or "", mensaje.to_email))
+        if s.reply_to:
+            mime["Reply-To"] = s.reply_to
+        mime.attach(MIMEText(mensaje.text_body, "plain", "utf-8"))
+        mime.attach(MIMEText(mensaje.html_body, "html", "utf-8"))
+        raw = mime.as_string()
+
+        if self._smtp is None:
+            self._smtp = self._abrir()
+        try:
+            self._smtp.sendmail(remitente, [mensaje.to_email], raw)
+        except smtplib.SMTPServerDisconnected:
+            # El servidor cerró la sesión reutilizada: reabre una vez y reintenta
+            self._smtp = self._abrir()
+            self._smtp.sendmail(remitente, [mensaje.to_email], raw)
+
+    def cerrar(self) -> None:
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except Exception:
+            pass
+        self._smtp = None
+
+
+def _enviar_grupo_smtp(settings, grupo: List[tuple[int, MensajeCorreo]]) -> List[tuple[int, ResultadoEnvio]]:
+    sesion = _SesionSMTP(settings)
+    out = []
+    try:
+        for idx, mensaje in grupo:
+            try:
+                sesion.enviar(mensaje)
+                out.append((idx, ResultadoEnvio(mensaje.to_email, True)))
+            except Exception as exc:
+                out.append((idx, ResultadoEnvio(mensaje.to_email, False, str(exc))))
+    finally:
+        sesion.cerrar()
+    return out
+
+
+# =============================
+#  SendGrid (sesión HTTP compartida con pool)
+# =============================
+def _http_session() -> requests.Session:
+    global _HTTP_SESSION
+    with _HTTP_LOCK:
+        if _HTTP_SESSION is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS_DEFAULT)
+            session.mount("https://", adapter)
+            _HTTP_SESSION = session
+        return _HTTP_SESSION
+
+
+def _enviar_sendgrid(settings, mensaje: MensajeCorreo) -> ResultadoEnvio:
+    payload: dict[str, Any] = {
+        "personalizations": [
+            {"to": [{"email": mensaje.to_email, **({"name": mensaje.to_name} if mensaje.to_name else {})}]}
+        ],
+        "from": {
+            "email": settings.from_email,
+            **({"name": settings.from_name} if settings.from_name else {}),
+        },
+        "subject": mensaje.subject,
+        "content": [
+            {"type": "text/plain", "value": mensaje.text_body},
+            {"type": "text/html", "value": mensaje.html_body},
+        ],
+    }
+    if settings.reply_to:
+        payload["reply_to"] = {"email": settings.reply_to}
+    headers = {
+        "Authorization": f"Bearer {settings.api_key}",
+        "Content-Type": "application/json",
+    }
+    try:
+        response = _http_session().post(SENDGRID_URL, headers=headers, json=payload, timeout=TIMEOUT_S)
+        response.raise_for_status()
+    except Exception as exc:
+        return ResultadoEnvio(mensaje.to_email, False, str(exc))
+    return ResultadoEnvio(mensaje.to_email, True)
+
+
+# =============================
+#  API
+# =============================
+def usa_sendgrid(settings) -> bool:
+    return bool(settings.api_key)
+
+
+def usa_smtp(settings) -> bool:
+    return bool(settings.smtp_host and settings.smtp_user and settings.smtp_password and settings.smtp_port)
+
+
+def enviar_lote(
+    settings,
+    mensajes: Sequence[MensajeCorreo],
+    max_workers: int = MAX_WORKERS_DEFAULT,
+) -> List[ResultadoEnvio]:
+    """
+    Envía `mensajes` con a lo más `max_workers` envíos simultáneos y devuelve un resultado
+    por mensaje (mismo orden). SMTP: cada worker abre una sola sesión y la reutiliza.
+    """
+    mensajes = list(mensajes)
+    if not mensajes:
+        return []
+    if not usa_sendgrid(settings) and not usa_smtp(settings):
+        return [ResultadoEnvio(m.to_email, False, "Sin configuración de correo") for m in mensajes]
+
+    workers = max(1, min(int(max_workers or 1), len(mensajes)))
+    if usa_sendgrid(settings):
+        if workers == 1:
+            return [_enviar_sendgrid(settings, m) for m in mensajes]
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="correo") as pool:
+            return list(pool.map(lambda m: _enviar_sendgrid(settings, m), mensajes))
+
+    grupos: List[List[tuple[int, MensajeCorreo]]] = [[] for _ in range(workers)]
+    for idx, mensaje in enumerate(mensajes):
+        grupos[idx % workers].append((idx, mensaje))
+    if workers == 1:
+        parciales = [_enviar_grupo_smtp(settings, grupos[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="correo") as pool:
+            parciales = list(pool.map(lambda g: _enviar_grupo_smtp(settings, g), grupos))
+    resultados: List[Optional[ResultadoEnvio]] = [None] * len(mensajes)
+    for parcial in parciales:
+        for idx, resultado in parcial:
+            resultados[idx] = resultado
+    return [r for r in resultados if r is not None]
+
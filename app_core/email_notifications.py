@@ -4,19 +4,25 @@ import logging
 import os
 from dataclasses import dataclass
 from datetime import date, datetime, timedelta
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.utils import formataddr
-import smtplib
-from typing import Any, Dict, Iterable, List, Optional, Tuple
-
-import requests
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 
 try:
     import streamlit as st  # type: ignore
 except Exception:  # pragma: no cover - streamlit no disponible en algunos contextos
     st = None  # type: ignore
 
+from app_core.email_dispatcher import (
+    ERROR_DESHABILITADAS,
+    ERROR_SIN_CONFIGURACION,
+    ERRORES_PERMANENTES,
+    MensajeCorreo,
+    ResultadoEnvio,
+    enviar_lote,
+    usa_sendgrid,
+    usa_smtp,
+)
 from app_core.firebase_client import get_db
 from app_core.utils import (
     EMPRESA_ASESORIA,
@@ -158,142 +164,94 @@ def _load_settings() -> EmailSettings:
     )
 
 
+_SETTINGS_TTL_S = 300.0
+_SETTINGS_LOCK = threading.Lock()
+_SETTINGS_CACHE: Optional[Tuple[float, EmailSettings]] = None
+
+
+def _settings() -> EmailSettings:
+    """`_load_settings()` memoizado por proceso (TTL corto para tomar cambios en secrets)."""
+    global _SETTINGS_CACHE
+    with _SETTINGS_LOCK:
+        ahora = time.monotonic()
+        if _SETTINGS_CACHE is None or ahora - _SETTINGS_CACHE[0] > _SETTINGS_TTL_S:
+            _SETTINGS_CACHE = (ahora, _load_settings())
+        return _SETTINGS_CACHE[1]
+
+
+def recargar_configuracion_correo() -> None:
+    global _SETTINGS_CACHE
+    with _SETTINGS_LOCK:
+        _SETTINGS_CACHE = None
+
+
 def _emit_info(msg: str) -> None:
     logger.info(msg)
 
 
 def _emit_warning(msg: str) -> None:
+    # Solo log: estas funciones corren también en hilos (outbox, lotes) sin ScriptRunContext;
+    # la UI muestra el resultado que devuelven.
     logger.warning(msg)
-    if st is not None:
-        try:
-            st.toast(msg, icon="⚠️")  # type: ignore[attr-defined]
-        except Exception:
-            pass
 
 
 def _emit_error(msg: str) -> None:
     logger.error(msg)
-    if st is not None:
-        try:
-            st.toast(msg, icon="❌")  # type: ignore[attr-defined]
-        except Exception:
-            pass
 
 
-def _send_email(
+def _mensaje(
     to_email: str,
     subject: str,
     html_body: str,
     text_body: Optional[str] = None,
     to_name: Optional[str] = None,
-) -> bool:
-    settings = _load_settings()
-    if not settings.enabled:
-        _emit_info("Notificaciones por correo deshabilitadas o sin credenciales.")
-        return False
-
-    if settings.api_key:
-        return _send_email_sendgrid(settings, to_email, subject, html_body, text_body, to_name)
-
-    if settings.smtp_host and settings.smtp_user and settings.smtp_password and settings.smtp_port:
-        return _send_email_smtp(settings, to_email, subject, html_body, text_body, to_name)
-
-    _emit_warning("No hay configuración válida de correo (SendGrid o SMTP).")
-    return False
+) -> MensajeCorreo:
+    return MensajeCorreo(
+        to_email=to_email,
+        subject=subject,
+        html_body=html_body,
+        text_body=text_body or _strip_html(html_body),
+        to_name=to_name,
+    )
 
 
-def _send_email_smtp(
-    settings: EmailSettings,
-    to_email: str,
-    subject: str,
-    html_body: str,
-    text_body: Optional[str],
-    to_name: Optional[str],
-) -> bool:
-    mensaje = MIMEMultipart("alternative")
-    remitente_nombre = settings.from_name or settings.smtp_user
-    remitente_address = settings.from_email or settings.smtp_user
-    mensaje["Subject"] = subject
-    mensaje["From"] = formataddr((remitente_nombre, remitente_address))
-    mensaje["To"] = formataddr((to_name or "", to_email))
-    if settings.reply_to:
-        mensaje["Reply-To"] = settings.reply_to
-
-    text_part = MIMEText(text_body or _strip_html(html_body), "plain", "utf-8")
-    html_part = MIMEText(html_body, "html", "utf-8")
-    mensaje.attach(text_part)
-    mensaje.attach(html_part)
-
-    try:
-        if settings.use_ssl:
-            smtp = smtplib.SMTP_SSL(settings.smtp_host, settings.smtp_port, timeout=10)
+def enviar_correos(mensajes: Sequence[MensajeCorreo], max_workers: Optional[int] = None) -> List[ResultadoEnvio]:
+    """Envía un lote reutilizando la conexión y con concurrencia acotada; un resultado por destinatario."""
+    mensajes = list(mensajes)
+    if not mensajes:
+        return []
+    settings = _settings()
+    if not settings.enabled:
+        _emit_info("Notificaciones por correo deshabilitadas o sin credenciales.")
+        return [ResultadoEnvio(m.to_email, False, ERROR_DESHABILITADAS) for m in mensajes]
+    if not usa_sendgrid(settings) and not usa_smtp(settings):
+        _emit_warning("No hay configuración válida de correo (SendGrid o SMTP).")
+        return [ResultadoEnvio(m.to_email, False, ERROR_SIN_CONFIGURACION) for m in mensajes]
+
+    kwargs = {"max_workers": max_workers} if max_workers else {}
+    resultados = enviar_lote(settings, mensajes, **kwargs)
+    for mensaje, resultado in zip(mensajes, resultados):
+        if resultado.ok:
+            _emit_info(f"Correo enviado a {resultado.destinatario} con asunto '{mensaje.subject}'.")
         else:
-            smtp = smtplib.SMTP(settings.smtp_host, settings.smtp_port, timeout=10)
-        with smtp:
-            if settings.use_starttls and not settings.use_ssl:
-                smtp.starttls()
-            smtp.login(settings.smtp_user, settings.smtp_password)
-            smtp.sendmail(remitente_address, [to_email], mensaje.as_string())
-        _emit_info(f"Correo enviado a {to_email} con asunto '{subject}'.")
-        return True
-    except Exception as exc:
-        _emit_error(f"No se pudo enviar el correo a {to_email} vía SMTP: {exc}")
-        return False
+            logger.error("No se pudo enviar el correo a %s: %s", resultado.destinatario, resultado.error)
+    return resultados
 
 
-def _send_email_sendgrid(
-    settings: EmailSettings,
+def _send_email(
     to_email: str,
     subject: str,
     html_body: str,
-    text_body: Optional[str],
-    to_name: Optional[str],
+    text_body: Optional[str] = None,
+    to_name: Optional[str] = None,
 ) -> bool:
-
-    payload = {
-        "personalizations": [
-            {
-                "to": [{"email": to_email, **({"name": to_name} if to_name else {})}],
-            }
-        ],
-        "from": {
-            "email": settings.from_email,
-            **({"name": settings.from_name} if settings.from_name else {}),
-        },
-        "subject": subject,
-        "content": [
-            {
-                "type": "text/plain",
-                "value": text_body or _strip_html(html_body),
-            },
-            {
-                "type": "text/html",
-                "value": html_body,
-            },
-        ],
-    }
-
-    if settings.reply_to:
-        payload["reply_to"] = {"email": settings.reply_to}
-
-    headers = {
-        "Authorization": f"Bearer {settings.api_key}",
-        "Content-Type": "application/json",
-    }
-
-    try:
-        response = requests.post(
-            "https://api.sendgrid.com/v3/mail/send",
-            headers=headers,
-            json=payload,
-            timeout=10,
-        )
-        response.raise_for_status()
-        _emit_info(f"Correo enviado a {to_email} con asunto '{subject}'.")
-        return True
-    except Exception as exc:
-        _emit_error(f"No se pudo enviar el correo a {to_email}: {exc}")
+    resultados = enviar_correos([_mensaje(to_email, subject, html_body, text_body, to_name)])
+    if not resultados:
         return False
+    resultado = resultados[0]
+    if not resultado.ok and resultado.error not in ERRORES_PERMANENTES:
+        _emit_error(f"No se pudo enviar el correo a {to_email}: {resultado.error}")
+    return resultado.ok
 
 
 def _strip_html(html: str) -> str:
@@ -379,7 +337,7 @@ def _bloque_resumen_label(info: Dict[str, Any]) -> str:
 
 def _resolve_portal_url(empresa: str | None = None) -> Optional[str]:
     empresa_norm = (empresa or "").strip().lower()
-    settings = _load_settings()
+    settings = _settings()
     urls = settings.program_urls or {}
     for key in (empresa_norm, "default"):
         if key and key in urls and urls[key]:
@@ -388,7 +346,7 @@ def _resolve_portal_url(empresa: str | None = None) -> Optional[str]:
 
 
 def _resolve_anamnesis_url(empresa: str | None = None) -> Optional[str]:
-    settings = _load_settings()
+    settings = _settings()
     urls = settings.anamnesis_urls or {}
     empresa_norm = (empresa or "").strip().lower()
     for key in (empresa_norm, "default"):
@@ -689,54 +647,74 @@ def preparar_resumen_bloques_entrenador(
     }
 
 
-def enviar_resumen_bloques_entrenador(
-    correo_entrenador: str,
+def enviar_resumenes_bloques(
+    correos_entrenadores: Iterable[str],
     enviar: bool = False,
     fecha_referencia: Optional[date] = None,
-) -> Dict[str, Any]:
-    try:
-        contenido = preparar_resumen_bloques_entrenador(correo_entrenador, fecha_referencia)
-    except ValueError as exc:
-        return {
-            "enviado": False,
-            "error": str(exc),
-            "destinatario": (correo_entrenador or "").strip().lower(),
-        }
-
-    resultado = dict(contenido)
-
-    if not enviar:
+) -> List[Dict[str, Any]]:
+    """
+    Prepara el resumen de cada entrenador y envía todos los correos en un solo lote
+    (una conexión, envíos en paralelo). Devuelve un resultado por entrenador.
+    """
+    resultados: List[Dict[str, Any]] = []
+    pendientes: List[Tuple[Dict[str, Any], MensajeCorreo]] = []
+    for correo_entrenador in correos_entrenadores:
+        try:
+            contenido = preparar_resumen_bloques_entrenador(correo_entrenador, fecha_referencia)
+        except ValueError as exc:
+            resultados.append({
+                "enviado": False,
+                "error": str(exc),
+                "destinatario": (correo_entrenador or "").strip().lower(),
+            })
+            continue
+        resultado = dict(contenido)
         resultado["enviado"] = False
-        return resultado
-
-    enviado = _send_email(
-        to_email=contenido["destinatario"],
-        subject=contenido["subject"],
-        html_body=contenido["html_body"],
-        text_body=contenido["text_body"],
-        to_name=contenido.get("nombre_destinatario"),
-    )
+        resultados.append(resultado)
+        if enviar:
+            pendientes.append((
+                resultado,
+                _mensaje(
+                    to_email=contenido["destinatario"],
+                    subject=contenido["subject"],
+                    html_body=contenido["html_body"],
+                    text_body=contenido["text_body"],
+                    to_name=contenido.get("nombre_destinatario"),
+                ),
+            ))
+
+    envios = enviar_correos([mensaje for _, mensaje in pendientes])
+    for (resultado, _), envio in zip(pendientes, envios):
+        resultado["enviado"] = envio.ok
+        if not envio.ok:
+            resultado["error"] = envio.error
+        if "metadata" in resultado:
+            resultado["metadata"] = dict(resultado["metadata"])
+            resultado["metadata"]["enviado"] = envio.ok
+    return resultados
 
-    if "metadata" in resultado:
-        resultado["metadata"] = dict(resultado["metadata"])
-        resultado["metadata"]["enviado"] = enviado
 
-    resultado["enviado"] = enviado
-    return resultado
+def enviar_resumen_bloques_entrenador(
+    correo_entrenador: str,
+    enviar: bool = False,
+    fecha_referencia: Optional[date] = None,
+) -> Dict[str, Any]:
+    return enviar_resumenes_bloques([correo_entrenador], enviar, fecha_referencia)[0]
 
 
-def enviar_correo_rutina_disponible(
+def preparar_correo_rutina_disponible(
     correo: str,
     nombre: Optional[str],
     fecha_inicio,
     semanas: int,
     empresa: Optional[str] = None,
     coach: Optional[str] = None,
-) -> bool:
+) -> Optional[MensajeCorreo]:
+    """Arma el aviso de rutina disponible; None si no corresponde enviarlo."""
     correo_norm = normalizar_correo(correo)
     if not correo_norm:
         _emit_warning("No se pudo enviar correo de rutina: correo vacío.")
-        return False
+        return None
 
     if not nombre:
         nombre = _buscar_nombre_usuario(correo_norm) or ""
@@ -745,7 +723,7 @@ def enviar_correo_rutina_disponible(
 
     if empresa_norm == EMPRESA_MOTION:
         _emit_info("Correo de rutina omitido para cliente Motion.")
-        return False
+        return None
 
     portal_url = _resolve_portal_url(empresa_norm)
 
@@ -762,10 +740,31 @@ def enviar_correo_rutina_disponible(
         coach_label=coach_label,
     )
 
-    return _send_email(
+    return _mensaje(
         to_email=correo_norm,
         subject=contenido.subject,
         html_body=contenido.html_body,
         text_body=contenido.text_body,
         to_name=nombre or None,
     )
+
+
+def enviar_correo_rutina_disponible(
+    correo: str,
+    nombre: Optional[str],
+    fecha_inicio,
+    semanas: int,
+    empresa: Optional[str] = None,
+    coach: Optional[str] = None,
+) -> bool:
+    mensaje = preparar_correo_rutina_disponible(correo, nombre, fecha_inicio, semanas, empresa, coach)
+    if mensaje is None:
+        return False
+    return _send_email(
+        to_email=mensaje.to_email,
+        subject=mensaje.subject,
+        html_body=mensaje.html_body,
+        text_body=mensaje.text_body,
+        to_name=mensaje.to_name,
+    )
+
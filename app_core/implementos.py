@@ -0,0 +1,119 @@
+"""Índice de la colección `implementos` compartido por las páginas.
+
+Se carga una vez por proceso, con claves exactas y normalizadas (sin tildes, casefold) de
+marca + máquina y los pesos ya convertidos a lista. Reemplaza la consulta exacta + recorrido
+de hasta 1000 docs que hacía cada página en `_resolver_id_implemento`.
+"""
+from __future__ import annotations
+
+import re
+import threading
+import time
+import unicodedata
+from types import MappingProxyType
+from typing import Mapping
+
+from app_core.firebase_client import get_db
+
+COLECCION_IMPLEMENTOS = "implementos"
+RECARGA_S = 600  # los implementos se editan fuera de esta app; se recargan cada 10 minutos
+
+
+def normalizar_clave(s: str) -> str:
+    """Sin acentos, espacios colapsados y casefold (mismo criterio que admin)."""
+    s = str(s or "")
+    s = unicodedata.normalize("NFKD", s).encode("ASCII", "ignore").decode("utf-8")
+    return re.sub(r"\s+", " ", s).strip().casefold()
+
+
+def pesos_como_lista(pesos) -> list:
+    """`pesos` guardado como lista o como mapa {"0": x, "1": y} -> lista ordenada."""
+    if isinstance(pesos, dict):
+        try:
+            return [v for _, v in sorted(pesos.items(), key=lambda kv: int(kv[0]))]
+        except (TypeError, ValueError):
+            return list(pesos.values())
+    if isinstance(pesos, (list, tuple)):
+        return list(pesos)
+    return []
+
+
+class IndiceImplementos:
+    """id -> datos (con `pesos` como lista) y marca+máquina -> ids, exacto y normalizado."""
+
+    def __init__(self, docs: Mapping[str, dict]):
+        por_id: dict[str, dict] = {}
+        exactos: dict[tuple[str, str], list[str]] = {}
+        normalizados: dict[tuple[str, str], list[str]] = {}
+        for doc_id, data in docs.items():
+            doc_id = str(doc_id)
+            data = dict(data or {})
+            data["pesos"] = pesos_como_lista(data.get("pesos"))
+            por_id[doc_id] = data
+            marca, maquina = data.get("marca"), data.get("maquina")
+            exactos.setdefault((str(marca or ""), str(maquina or "")), []).append(doc_id)
+            normalizados.setdefault((normalizar_clave(marca), normalizar_clave(maquina)), []).append(doc_id)
+        self._por_id = por_id
+        self._exactos = exactos
+        self._normalizados = normalizados
+
+    def __len__(self) -> int:
+        return len(self._por_id)
+
+    def get(self, id_implemento) -> dict | None:
+        return self._por_id.get(str(id_implemento or ""))
+
+    def pesos(self, id_implemento) -> list:
+        data = self.get(id_implemento)
+        return list(data["pesos"]) if data else []
+
+    def como_dict(self) -> Mapping[str, dict]:
+        """Vista de solo lectura id -> datos; los dicts son compartidos."""
+        return MappingProxyType(self._por_id)
+
+    def resolver_id(self, marca: str, maquina: str) -> str:
+        """
+        id_implemento si hay match único por marca+máquina; '' si no hay o es ambiguo.
+        Primero la coincidencia exacta y, si no hay ninguna, la normalizada.
+        """
+        marca_in, maquina_in = (marca or "").strip(), (maquina or "").strip()
+        if not marca_in or not maquina_in:
+            return ""
+        hits = self._exactos.get((marca_in, maquina_in)) or self._normalizados.get(
+            (normalizar_clave(marca_in), normalizar_clave(maquina_in)), []
+        )
+        return hits[0] if len(hits) == 1 else ""
+
+
+class _IndiceProceso:
+    def __init__(self) -> None:
+        self._indice: IndiceImplementos | None = None
+        self._cargado_en = 0.0
+        self._lock = threading.Lock()
+
+    def _vigente(self) -> bool:
+        return self._indice is not None and time.monotonic() - self._cargado_en < RECARGA_S
+
+    def obtener(self, db=None) -> IndiceImplementos:
+        if not self._vigente():
+            with self._lock:
+                if not self._vigente():
+                    db = db or get_db()
+                    docs = {snap.id: snap.to_dict() or {} for snap in db.collection(COLECCION_IMPLEMENTOS).stream()}
+                    self._indice = IndiceImplementos(docs)
+                    self._cargado_en = time.monotonic()
+        return self._indice
+
+
+_INDICE = _IndiceProceso()
+
+
+def obtener_indice_implementos(db=None) -> IndiceImplementos:
+    return _INDICE.obtener(db)
+
+
+def resolver_id_implemento(marca: str, maquina: str, db=None) -> str:
+    try:
+        return obtener_indice_implementos(db).resolver_id(marca, maquina)
+    except Exception:
+        return ""
@@ -0,0 +1,293 @@
+"""Cola persistente de notificaciones (`outbox` en Firestore) y su worker de envío.
+
+Guardar una rutina solo encola el aviso; un hilo del proceso drena la cola en lotes
+(vía `email_notifications.enviar_correos`), reintenta con backoff exponencial y deja
+el estado de entrega en cada documento. El ID del documento es la clave de
+deduplicación (destinatario, plantilla, semana), así que un mismo aviso no se envía dos veces.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from firebase_admin import firestore
+
+from app_core.email_dispatcher import ERRORES_PERMANENTES
+from app_core.firebase_client import get_db
+from app_core.utils import correo_a_doc_id, normalizar_correo
+
+logger = logging.getLogger(__name__)
+
+COLECCION_OUTBOX = "outbox"
+
+ESTADO_PENDIENTE = "pendiente"
+ESTADO_ENVIANDO = "enviando"
+ESTADO_ENVIADO = "enviado"
+ESTADO_FALLIDO = "fallido"
+ESTADO_OMITIDO = "omitido"
+
+MAX_INTENTOS = 6
+BACKOFF_BASE_S = 30
+BACKOFF_MAX_S = 3600
+LEASE_S = 120          # tiempo que un worker retiene un mensaje "enviando" antes de que otro lo retome
+LOTE_MAX = 50
+POLL_IDLE_S = 60
+
+
+def _plantillas() -> Dict[str, Callable[..., Any]]:
+    # Import diferido: email_notifications carga plantillas y secrets
+    from app_core.email_notifications import preparar_correo_rutina_disponible
+
+    return {"rutina_disponible": preparar_correo_rutina_disponible}
+
+
+def _enviar(mensajes: List[Any]) -> List[Any]:
+    from app_core.email_notifications import enviar_correos
+
+    return enviar_correos(mensajes)
+
+
+def _ahora() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _backoff(intentos: int) -> timedelta:
+    return timedelta(seconds=min(BACKOFF_MAX_S, BACKOFF_BASE_S * (2 ** max(0, intentos - 1))))
+
+
+def clave_outbox(destinatario: str, plantilla: str, semana: str) -> str:
+    return f"{plantilla}__{correo_a_doc_id(destinatario)}__{(semana or '').replace('-', '_')}"
+
+
+def _jsonable(valor: Any) -> Any:
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return valor
+
+
+# =============================
+#  Encolar
+# =============================
+def encolar(destinatario: str, plantilla: str, semana: str, params: Dict[str, Any]) -> bool:
+    """
+    Agrega un aviso a la cola. Devuelve False si ya existía uno igual pendiente o enviado
+    (uno fallido se reactiva). No envía nada: despierta al worker del proceso.
+    """
+    if plantilla not in _plantillas():
+        raise ValueError(f"Plantilla de correo desconocida: {plantilla}")
+    correo_norm = normalizar_correo(destinatario)
+    if not correo_norm:
+        return False
+    db = get_db()
+    ref = db.collection(COLECCION_OUTBOX).document(clave_outbox(correo_norm, plantilla, semana))
+    payload = {
+        "destinatario": correo_norm,
+        "plantilla": plantilla,
+        "semana": semana,
+        "params": {k: _jsonable(v) for k, v in (params or {}).items()},
+        "estado": ESTADO_PENDIENTE,
+        "intentos": 0,
+        "proximo_intento": _ahora(),
+        "ultimo_error": "",
+        "creado_en": firestore.SERVER_TIMESTAMP,
+    }
+
+    @firestore.transactional
+    def _upsert(transaction) -> bool:
+        snap = ref.get(transaction=transaction)
+        if snap.exists and (snap.to_dict() or {}).get("estado") != ESTADO_FALLIDO:
+            return False
+        transaction.set(ref, payload)
+        return True
+
+    creado = _upsert(db.transaction())
+    if creado:
+        iniciar_worker().despertar()
+    return creado
+
+
+def encolar_correo_rutina_disponible(
+    correo: str,
+    nombre: Optional[str],
+    fecha_inicio,
+    semanas: int,
+    empresa: Optional[str] = None,
+    coach: Optional[str] = None,
+) -> bool:
+    semana = _jsonable(fecha_inicio) if fecha_inicio else ""
+    return encolar(
+        correo,
+        "rutina_disponible",
+        str(semana)[:10],
+        {
+            "correo": correo,
+            "nombre": nombre,
+            "fecha_inicio": fecha_inicio,
+            "semanas": semanas,
+            "empresa": empresa,
+            "coach": coach,
+        },
+    )
+
+
+# =============================
+#  Drenado
+# =============================
+def _reclamar(db, snap) -> bool:
+    """Marca el mensaje como 'enviando' solo si nadie lo tocó desde que lo leímos."""
+    lease = _ahora() + timedelta(seconds=LEASE_S)
+    try:
+        # proximo_intento = fin del lease: la consulta de vencidos no lo vuelve a traer antes
+        snap.reference.update(
+            {"estado": ESTADO_ENVIANDO, "lease_hasta": lease, "proximo_intento": lease},
+            option=db.write_option(last_update_time=snap.update_time),
+        )
+        return True
+    except Exception:
+        return False
+
+
+def _disponible(data: dict, ahora: datetime) -> bool:
+    if data.get("estado") == ESTADO_ENVIANDO:
+        lease = data.get("lease_hasta")
+        return bool(lease and lease <= ahora)
+    proximo = data.get("proximo_intento")
+    return not proximo or proximo <= ahora
+
+
+def _preparar(data: dict):
+    params = dict(data.get("params") or {})
+    fecha = params.get("fecha_inicio")
+    if isinstance(fecha, str) and fecha:
+        try:
+            params["fecha_inicio"] = date.fromisoformat(fecha[:10])
+        except ValueError:
+            pass
+    return _plantillas()[data.get("plantilla", "")](**params)
+
+
+def procesar_outbox(limite: int = LOTE_MAX) -> int:
+    """Envía un lote de mensajes vencidos. Devuelve cuántos se procesaron."""
+    db = get_db()
+    ahora = _ahora()
+    # Índice compuesto (estado, proximo_intento) en firestore.indexes.json
+    snaps = (
+        db.collection(COLECCION_OUTBOX)
+        .where("estado", "in", [ESTADO_PENDIENTE, ESTADO_ENVIANDO])
+        .where("proximo_intento", "<=", ahora)
+        .order_by("proximo_intento")
+        .limit(limite * 2)
+        .stream()
+    )
+    reclamados = []
+    for snap in snaps:
+        if len(reclamados) >= limite:
+            break
+        if _disponible(snap.to_dict() or {}, ahora) and _reclamar(db, snap):
+            reclamados.append(snap)
+    if not reclamados:
+        return 0
+
+    batch = db.batch()
+    por_enviar: List[tuple] = []
+    for snap in reclamados:
+        data = snap.to_dict() or {}
+        try:
+            mensaje = _preparar(data)
+        except Exception as exc:
+            mensaje, error = None, str(exc)
+        else:
+            error = ""
+        if mensaje is None and not error:
+            batch.update(snap.reference, {"estado": ESTADO_OMITIDO, "procesado_en": firestore.SERVER_TIMESTAMP})
+        elif mensaje is None:
+            por_enviar.append((snap, data, None, error))
+        else:
+            por_enviar.append((snap, data, mensaje, ""))
+
+    mensajes = [m for _, _, m, _ in por_enviar if m is not None]
+    try:
+        resultados = iter(_enviar(mensajes))
+        error_lote = ""
+    except Exception as exc:
+        # se liberan los reclamados con su intento contado: sin esto quedan hasta que vence el lease
+        logger.exception("Outbox: fallo el envío del lote")
+        resultados, error_lote = iter(()), str(exc) or exc.__class__.__name__
+    for snap, data, mensaje, error in por_enviar:
+        if mensaje is not None and error_lote:
+            error = error_lote
+        elif mensaje is not None:
+            resultado = next(resultados)
+            if resultado.ok:
+                batch.update(snap.reference, {
+                    "estado": ESTADO_ENVIADO,
+                    "intentos": firestore.Increment(1),
+                    "ultimo_error": "",
+                    "enviado_en": firestore.SERVER_TIMESTAMP,
+                })
+                continue
+            if resultado.error in ERRORES_PERMANENTES:
+                # correo deshabilitado o sin configurar: reintentar no cambia nada
+                batch.update(snap.reference, {
+                    "estado": ESTADO_OMITIDO,
+                    "ultimo_error": resultado.error,
+                    "procesado_en": firestore.SERVER_TIMESTAMP,
+                })
+                continue
+            error = resultado.error
+        intentos = int(data.get("intentos") or 0) + 1
+        agotado = intentos >= MAX_INTENTOS
+        batch.update(snap.reference, {
+            "estado": ESTADO_FALLIDO if agotado else ESTADO_PENDIENTE,
+            "intentos": intentos,
+            "ultimo_error": error,
+            "proximo_intento": _ahora() + _backoff(intentos),
+        })
+        logger.warning("Outbox %s: intento %s falló (%s)", snap.id, intentos, error)
+    batch.commit()
+    return len(reclamados)
+
+
+class _OutboxWorker:
+    """Hilo daemon que drena la cola; `despertar()` lo adelanta tras encolar."""
+
+    def __init__(self) -> None:
+        self._evento = threading.Event()
+        self._hilo = threading.Thread(target=self._loop, name="outbox-worker", daemon=True)
+        self._hilo.start()
+
+    def despertar(self) -> None:
+        self._evento.set()
+
+    def _loop(self) -> None:
+        espera = 0.0
+        while True:
+            self._evento.wait(espera)
+            self._evento.clear()
+            try:
+                procesados = procesar_outbox()
+            except Exception:
+                logger.exception("Error procesando outbox")
+                procesados = 0
+            # Si el lote salió lleno quedan más: sigue sin esperar
+            espera = 0.0 if procesados >= LOTE_MAX else POLL_IDLE_S
+
+
+_WORKER: Optional[_OutboxWorker] = None
+_WORKER_LOCK = threading.Lock()
+
+
+def iniciar_worker() -> _OutboxWorker:
+    global _WORKER
+    with _WORKER_LOCK:
+        if _WORKER is None:
+            _WORKER = _OutboxWorker()
+        return _WORKER
+
+
+def estado_entrega(destinatario: str, plantilla: str, semana: str) -> Optional[dict]:
+    """Estado del aviso (estado, intentos, ultimo_error, enviado_en) o None si nunca se encoló."""
+    snap = get_db().collection(COLECCION_OUTBOX).document(clave_outbox(destinatario, plantilla, semana)).get()
+    return snap.to_dict() if snap.exists else None
@@ -0,0 +1,41 @@
+"""Carga diferida de vistas: cada módulo se importa la primera vez que su menú se abre."""
+from __future__ import annotations
+
+import importlib
+import logging
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Set
+
+logger = logging.getLogger(__name__)
+
+_IMPORT_TIMES: Dict[str, float] = {}
+_LISTOS: Set[str] = set()  # módulos cuya importación terminó; sys.modules también tiene los a medio ejecutar
+_LOCK = threading.Lock()
+
+
+def cargar_vista(modulo: str, atributo: str) -> Callable[..., Any]:
+    """Importa `modulo` si aún no está cargado (registrando su tiempo) y devuelve `modulo.atributo`."""
+    if modulo not in _LISTOS:
+        # Streamlit atiende sesiones en hilos; evita importar el mismo módulo en paralelo
+        with _LOCK:
+            if modulo not in _LISTOS:
+                previo = modulo in sys.modules
+                inicio = time.perf_counter()
+                # import_module espera si otro hilo está ejecutando el módulo (p. ej. un import directo)
+                importlib.import_module(modulo)
+                if not previo:
+                    _IMPORT_TIMES[modulo] = time.perf_counter() - inicio
+                    logger.info("Vista '%s' importada en %.3f s", modulo, _IMPORT_TIMES[modulo])
+                _LISTOS.add(modulo)
+    return getattr(sys.modules[modulo], atributo)
+
+
+def vista_cargada(modulo: str) -> bool:
+    return modulo in _LISTOS
+
+
+def tiempos_de_importacion() -> Dict[str, float]:
+    """Segundos que tomó importar cada vista en este proceso."""
+    return dict(_IMPORT_TIMES)
@@ -0,0 +1,266 @@
+"""Autorregulación por reglas para sugerir el peso de la próxima semana sin llamar al modelo.
+
+Trabaja sobre el historial de `agente_rutinas.get_historial_ejercicio_firestore` (lo planificado
+y lo reportado por el deportista). Solo responde los casos claros: cumplió el rango con el RIR
+objetivo, quedó dentro del rango, o falló con el RIR en cero. Si las señales se contradicen
+(tendencia del e1RM, deriva del RIR) o no hay carga externa (peso corporal, e1RM nulo)
+devuelve None y el caso se escala a la IA.
+
+`resumir_historial` arma el resumen de tamaño fijo que va en el prompt de esos casos escalados.
+Benchmark de tokens y tiempo, crudo vs resumen: `python -m app_core.progresion`.
+"""
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from app_core.utils_rm import calcular_peso_por_porcentaje, calcular_rm_teorico
+
+INCREMENTO_KG = 2.5
+CAIDA_E1RM_MAX = 0.05     # una caída mayor del e1RM entre semanas contradice una subida
+DERIVA_RIR_MAX = 2.0      # RIR que baja esto o más con el mismo peso = fatiga acumulada
+TOP_SETS_RESUMEN = 3
+
+
+@dataclass
+class Sesion:
+    fecha: str
+    peso: Optional[float]
+    reps: Optional[int]
+    rir: Optional[float]
+    reps_min: Optional[int]
+    reps_max: Optional[int]
+    rir_objetivo: Optional[float]
+
+    @property
+    def e1rm(self) -> Optional[float]:
+        if self.peso is None or not self.reps:
+            return None
+        return calcular_rm_teorico(self.peso, self.reps, int(self.rir or 0))
+
+
+@dataclass
+class DecisionProgresion:
+    peso_sugerido: Optional[float]
+    reps_sugeridas: Optional[str]
+    rir_sugerido: Optional[float]
+    comentario: str
+    regla: str
+    rm_teorico: Optional[float] = None
+
+
+def _num(value) -> Optional[float]:
+    try:
+        return float(str(value).replace(",", ".").lower().replace("kg", "").strip())
+    except Exception:
+        return None
+
+
+def _entero(value) -> Optional[int]:
+    num = _num(value)
+    return int(num) if num is not None else None
+
+
+def _redondear(peso: float, paso: float = INCREMENTO_KG) -> float:
+    return max(0.0, round(peso / paso) * paso)
+
+
+def sesiones_reportadas(historial: List[Dict[str, Any]]) -> List[Sesion]:
+    """Sesiones con peso y reps reportados, de la más antigua a la más reciente."""
+    sesiones = []
+    for item in sorted(historial, key=lambda x: x.get("fecha") or ""):
+        peso = _num(item.get("peso_alcanzado"))
+        reps = _entero(item.get("reps_alcanzadas"))
+        if peso is None or not reps:
+            continue
+        sesiones.append(Sesion(
+            fecha=item.get("fecha") or "",
+            peso=peso,
+            reps=reps,
+            rir=_num(item.get("rir_alcanzado")),
+            reps_min=_entero(item.get("reps_min")),
+            reps_max=_entero(item.get("reps_max")),
+            rir_objetivo=_num(item.get("rir")),
+        ))
+    return sesiones
+
+
+def _rango_texto(s: Sesion) -> Optional[str]:
+    if s.reps_min and s.reps_max and s.reps_min != s.reps_max:
+        return f"{s.reps_min}-{s.reps_max}"
+    tope = s.reps_max or s.reps_min
+    return str(tope) if tope else None
+
+
+def decidir_progresion(
+    historial: List[Dict[str, Any]],
+    porcentaje_objetivo: Optional[float] = None,
+) -> Optional[DecisionProgresion]:
+    """
+    Decisión para los casos claros; None si hay que escalar.
+    Con `porcentaje_objetivo` explícito se usa ese % del e1RM de la última sesión reportada.
+    """
+    if not historial:
+        return DecisionProgresion(None, None, None, "Sin historial previo: define el peso inicial.", "sin_historial")
+
+    sesiones = sesiones_reportadas(historial)
+    if not sesiones:
+        return None  # solo hay lo planificado; la IA puede razonar sobre eso
+    ultima = sesiones[-1]
+    rm = ultima.e1rm
+    if ultima.peso <= 0 or not rm:
+        return None  # peso corporal o lastre sin registrar: no hay carga que subir ni bajar
+    rir_obj = ultima.rir_objetivo
+
+    # Señales que vuelven ambiguo cualquier ajuste
+    previa = sesiones[-2] if len(sesiones) >= 2 else None
+    tendencia = None
+    if previa is not None and previa.e1rm and rm:
+        tendencia = (rm - previa.e1rm) / previa.e1rm
+    deriva_rir = None
+    if previa is not None and previa.rir is not None and ultima.rir is not None and previa.peso == ultima.peso:
+        deriva_rir = ultima.rir - previa.rir
+
+    if porcentaje_objetivo and rm:
+        peso = calcular_peso_por_porcentaje(rm, porcentaje_objetivo)
+        return DecisionProgresion(
+            peso, _rango_texto(ultima), rir_obj,
+            f"{porcentaje_objetivo:g}% del e1RM estimado ({rm:.1f} kg) de la semana {ultima.fecha}.",
+            "porcentaje_rm", rm,
+        )
+
+    if ultima.reps_max is None or ultima.rir is None or rir_obj is None:
+        return None
+
+    cumplio_tope = ultima.reps >= ultima.reps_max
+    dentro_rango = (ultima.reps_min or ultima.reps_max) <= ultima.reps <= ultima.reps_max
+
+    if cumplio_tope and ultima.rir >= rir_obj:
+        if (tendencia is not None and tendencia < -CAIDA_E1RM_MAX) or (deriva_rir is not None and deriva_rir <= -DERIVA_RIR_MAX):
+            return None
+        return DecisionProgresion(
+            _redondear(ultima.peso + INCREMENTO_KG), _rango_texto(ultima), rir_obj,
+            f"Completó {ultima.reps} reps con RIR {ultima.rir:g} (objetivo {rir_obj:g}): +{INCREMENTO_KG:g} kg.",
+            "progresar", rm,
+        )
+    if dentro_rango and abs(ultima.rir - rir_obj) <= 1:
+        return DecisionProgresion(
+            _redondear(ultima.peso), _rango_texto(ultima), rir_obj,
+            f"{ultima.reps} reps con RIR {ultima.rir:g}, dentro del rango: mantener el peso.",
+            "mantener", rm,
+        )
+    if ultima.reps < (ultima.reps_min or ultima.reps_max) and ultima.rir <= 0:
+        if tendencia is not None and tendencia > CAIDA_E1RM_MAX:
+            return None
+        return DecisionProgresion(
+            _redondear(ultima.peso - INCREMENTO_KG), _rango_texto(ultima), rir_obj,
+            f"No llegó al rango ({ultima.reps} reps) y terminó al fallo: -{INCREMENTO_KG:g} kg.",
+            "bajar", rm,
+        )
+    return None
+
+
+# =============================
+#  Resumen compacto para el prompt
+# =============================
+def _pendiente(valores: List[float]) -> Optional[float]:
+    """Pendiente por sesión (mínimos cuadrados); None con menos de 2 puntos."""
+    n = len(valores)
+    if n < 2:
+        return None
+    media_x = (n - 1) / 2
+    media_y = sum(valores) / n
+    den = sum((x - media_x) ** 2 for x in range(n))
+    return sum((x - media_x) * (y - media_y) for x, y in enumerate(valores)) / den
+
+
+def resumir_historial(historial: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Resumen de tamaño fijo del historial de un ejercicio: mejor e1RM, últimas series top,
+    pendiente del RIR y adherencia. Crece con las semanas solo en los contadores.
+    """
+    sesiones = sesiones_reportadas(historial)
+    top_por_fecha: Dict[str, Sesion] = {}
+    for s in sesiones:
+        actual = top_por_fecha.get(s.fecha)
+        if actual is None or (s.peso, s.reps) > (actual.peso, actual.reps):
+            top_por_fecha[s.fecha] = s
+    tops = [top_por_fecha[f] for f in sorted(top_por_fecha)]
+
+    mejor = max((s for s in sesiones if s.e1rm), key=lambda s: s.e1rm, default=None)
+    rirs = [s.rir for s in tops if s.rir is not None]
+    pendiente_rir = _pendiente(rirs)
+    en_rango = [
+        s for s in sesiones
+        if s.reps_max is not None and (s.reps_min or s.reps_max) <= s.reps <= s.reps_max
+    ]
+    planificado = sorted(historial, key=lambda x: x.get("fecha") or "")[-1] if historial else {}
+
+    return {
+        "semanas": len({h.get("fecha") for h in historial}),
+        "series_planificadas": len(historial),
+        "series_reportadas": len(sesiones),
+        "mejor_e1rm": {"kg": round(mejor.e1rm, 1), "fecha": mejor.fecha} if mejor else None,
+        "ultimas_series_top": [
+            {"fecha": s.fecha, "peso": s.peso, "reps": s.reps, "rir": s.rir} for s in tops[-TOP_SETS_RESUMEN:]
+        ],
+        "pendiente_rir": round(pendiente_rir, 2) if pendiente_rir is not None else None,
+        "adherencia": {
+            "reportado": round(len(sesiones) / len(historial), 2) if historial else None,
+            "en_rango": round(len(en_rango) / len(sesiones), 2) if sesiones else None,
+        },
+        "ultimo_planificado": {
+            "fecha": planificado.get("fecha"),
+            "peso": planificado.get("peso"),
+            "reps_min": planificado.get("reps_min"),
+            "reps_max": planificado.get("reps_max"),
+            "rir": planificado.get("rir"),
+        } if planificado else None,
+    }
+
+
+# =============================
+#  Benchmark
+# =============================
+def historial_sintetico(semanas: int, series_por_semana: int = 2, seed: int = 7) -> List[Dict[str, Any]]:
+    import random
+    from datetime import date, timedelta
+
+    rng = random.Random(seed)
+    lunes = date(2025, 1, 6)
+    historial = []
+    for w in range(semanas):
+        fecha = (lunes + timedelta(weeks=w)).strftime("%Y_%m_%d")
+        peso = 60 + 2.5 * (w // 2)
+        for dia in range(series_por_semana):
+            historial.append({
+                "fecha": fecha, "dia": dia + 1, "bloque": "Work Out", "circuito": "D",
+                "peso": str(peso), "reps_min": 6, "reps_max": 8, "rir": 2,
+                "peso_alcanzado": peso, "reps_alcanzadas": rng.randint(5, 9), "rir_alcanzado": rng.choice([1, 2, 2, 3]),
+            })
+    return historial
+
+
+def _contar_tokens(texto: str) -> int:
+    try:
+        import tiktoken
+
+        return len(tiktoken.get_encoding("o200k_base").encode(texto))
+    except Exception:
+        return max(1, len(texto) // 4)  # aproximación sin tiktoken
+
+
+if __name__ == "__main__":
+    import time
+
+    print(f"{'semanas':>8} {'tokens crudo':>13} {'tokens resumen':>15} {'ms crudo':>9} {'ms resumen':>11}")
+    for semanas in (2, 4, 8, 16, 52):
+        historial = historial_sintetico(semanas)
+        t0 = time.perf_counter()
+        crudo = json.dumps(historial, ensure_ascii=False)
+        t1 = time.perf_counter()
+        resumen = json.dumps(resumir_historial(historial), ensure_ascii=False)
+        t2 = time.perf_counter()
+        print(f"{semanas:>8} {_contar_tokens(crudo):>13} {_contar_tokens(resumen):>15} "
+              f"{(t1 - t0) * 1000:>9.3f} {(t2 - t1) * 1000:>11.3f}")
@@ -0,0 +1,219 @@
+"""Propagación de pesos reportados a las semanas futuras del mismo bloque.
+
+Recibe todos los cambios de peso de un día, lee una sola vez las semanas del bloque,
+aplica los cambios en memoria y escribe las semanas modificadas (con su rollup) en batches.
+Lo usan `vista_rutinas` y `vista_rutinas2` al guardar reportes; `avisar_propagacion` y
+`mostrar_aviso_propagacion` llevan el aviso de fallo a través del rerun de la página.
+"""
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional
+
+import streamlit as st
+
+from app_core.batch_writes import OperacionLote, ResultadoEscritura, documentos_fallidos, escribir_en_lotes
+from app_core.rollups_semanales import operacion_rollup
+
+TOLERANCIA = 1e-4
+
+
+@dataclass
+class CambioPeso:
+    """`peso_base` None: asignar `peso_alcanzado` donde el ejercicio no tenga peso."""
+
+    ejercicio: dict
+    peso_alcanzado: float
+    peso_base: Optional[float] = None
+
+
+@dataclass
+class ResumenPropagacion:
+    semanas_leidas: int = 0
+    semanas_modificadas: List[str] = field(default_factory=list)
+    ejercicios_modificados: int = 0
+    errores: List[ResultadoEscritura] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.errores
+
+
+# =============================
+#  Pesos
+# =============================
+def _normalizar_unidad(valor) -> str:
+    v = str(valor or "").strip().lower()
+    return "lb" if v in {"lb", "lbs", "libra", "libras"} else "kg"
+
+
+def peso_a_float(v, unidad=None) -> Optional[float]:
+    """Peso en kg desde '80', '80 kg', '175lb'...; con `unidad` None se infiere del texto."""
+    try:
+        raw_low = str(v or "").lower()
+        if unidad is None:
+            unidad_norm = "lb" if "lb" in raw_low else "kg"
+        else:
+            unidad_norm = _normalizar_unidad(unidad)
+        s = raw_low.replace("kg", "").replace("lbs", "").replace("lb", "").replace(",", ".").strip()
+        if s == "":
+            return None
+        num = float(s)
+        if not math.isfinite(num):
+            return None
+        return num * 0.45359237 if unidad_norm == "lb" else num
+    except Exception:
+        return None
+
+
+def formatear_peso(value: Optional[float]) -> str:
+    if value is None or not math.isfinite(value):
+        return ""
+    if abs(value - round(value)) < TOLERANCIA:
+        return str(int(round(value)))
+    return f"{value:.2f}".rstrip("0").rstrip(".")
+
+
+def mismo_ejercicio(a: dict, b: dict) -> bool:
+    if not isinstance(a, dict) or not isinstance(b, dict):
+        return False
+    return (
+        a.get("ejercicio", "") == b.get("ejercicio", "")
+        and a.get("circuito", "") == b.get("circuito", "")
+        and a.get("bloque", a.get("seccion", "")) == b.get("bloque", b.get("seccion", ""))
+    )
+
+
+# =============================
+#  Aplicación en memoria
+# =============================
+def _ejercicios_del_dia(dia_data) -> List[dict]:
+    """Ejercicios (dicts, mismas referencias) de un día en formato lista, {'ejercicios': [...]} o mapa."""
+    if isinstance(dia_data, list):
+        return [ex for ex in dia_data if isinstance(ex, dict)]
+    if isinstance(dia_data, dict):
+        if isinstance(dia_data.get("ejercicios"), list):
+            return [ex for ex in dia_data["ejercicios"] if isinstance(ex, dict)]
+        return [ex for ex in dia_data.values() if isinstance(ex, dict)]
+    return []
+
+
+def _aplicar_cambio(ex: dict, cambio: CambioPeso) -> bool:
+    if not mismo_ejercicio(ex, cambio.ejercicio):
+        return False
+    if cambio.peso_base is None:
+        actual = ex.get("peso")
+        if not str(actual or "").strip():
+            actual = ex.get("Peso")
+        nuevo = formatear_peso(float(cambio.peso_alcanzado))
+        if str(actual or "").strip() or not nuevo:
+            return False
+        ex["peso"] = nuevo
+        ex["Peso"] = nuevo
+        return True
+    peso_actual = peso_a_float(ex.get("peso"), ex.get("peso_unidad"))
+    if peso_actual is None or abs(peso_actual - cambio.peso_base) > TOLERANCIA:
+        return False
+    delta = float(cambio.peso_alcanzado) - float(cambio.peso_base)
+    ex["peso"] = formatear_peso(max(0.0, peso_actual + delta))
+    return True
+
+
+def aplicar_cambios_en_dia(dia_data, cambios: Iterable[CambioPeso]) -> int:
+    """Aplica los cambios sobre `dia_data` (in place). Devuelve cuántos ejercicios cambiaron."""
+    ejercicios = _ejercicios_del_dia(dia_data)
+    modificados = 0
+    for cambio in cambios:
+        for ex in ejercicios:
+            if _aplicar_cambio(ex, cambio):
+                modificados += 1
+    return modificados
+
+
+def cambios_relevantes(cambios: Iterable[CambioPeso]) -> List[CambioPeso]:
+    return [
+        c for c in cambios
+        if c is not None and c.peso_alcanzado is not None
+        and (c.peso_base is None or abs(float(c.peso_alcanzado) - float(c.peso_base)) >= TOLERANCIA)
+    ]
+
+
+# =============================
+#  Propagación
+# =============================
+def propagar_pesos(
+    db,
+    correo: str,
+    bloque_rutina: Optional[str],
+    semana_sel: str,
+    dia_sel,
+    cambios: Iterable[CambioPeso],
+) -> ResumenPropagacion:
+    """
+    Aplica `cambios` al mismo día de cada semana del bloque posterior a `semana_sel`.
+    Una lectura del bloque y escrituras en batches (semana + rollup), sin importar cuántos ejercicios.
+    """
+    resumen = ResumenPropagacion()
+    cambios = cambios_relevantes(cambios)
+    if not correo or not bloque_rutina or not cambios:
+        return resumen
+    dia_sel = str(dia_sel)
+    try:
+        snaps = list(
+            db.collection("rutinas_semanales")
+              .where("correo", "==", correo)
+              .where("bloque_rutina", "==", bloque_rutina)
+              .stream()
+        )
+    except Exception as exc:
+        resumen.errores.append(ResultadoEscritura(bloque_rutina, False, str(exc)))
+        return resumen
+
+    futuros = []
+    for snap in snaps:
+        data = snap.to_dict() or {}
+        fecha = data.get("fecha_lunes")
+        if fecha and fecha > semana_sel:
+            futuros.append((fecha, snap, data))
+    futuros.sort(key=lambda tup: tup[0])
+    resumen.semanas_leidas = len(futuros)
+
+    ops: List[OperacionLote] = []
+    for _, snap, data in futuros:
+        rutina = data.get("rutina") or {}
+        if dia_sel not in rutina:
+            continue
+        dia_data = rutina[dia_sel]
+        modificados = aplicar_cambios_en_dia(dia_data, cambios)
+        if not modificados:
+            continue
+        resumen.ejercicios_modificados += modificados
+        resumen.semanas_modificadas.append(snap.id)
+        ops.append(OperacionLote(snap.reference, {"rutina": {dia_sel: dia_data}}, merge=True))
+        ops.append(operacion_rollup(db, snap.id, data))
+
+    resumen.errores.extend(documentos_fallidos(escribir_en_lotes(db, ops)))
+    return resumen
+
+
+# =============================
+#  Aviso en la UI
+# =============================
+CLAVE_AVISO = "_propagacion_msg"
+
+
+def avisar_propagacion(resumen: ResumenPropagacion) -> None:
+    """Deja un aviso para mostrar tras el rerun si alguna semana siguiente no recibió el peso."""
+    if resumen.ok:
+        return
+    semanas = ", ".join(sorted({r.doc_id for r in resumen.errores}))
+    st.session_state[CLAVE_AVISO] = (
+        "El reporte se guardó, pero no se pudo actualizar el peso en las semanas siguientes "
+        f"del bloque ({semanas}): {resumen.errores[0].error}"
+    )
+
+
+def mostrar_aviso_propagacion() -> None:
+    if msg := st.session_state.pop(CLAVE_AVISO, None):
+        st.warning(msg)
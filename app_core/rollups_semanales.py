@@ -0,0 +1,300 @@
+"""Resúmenes precalculados por deportista-semana (`rollups_semanales`) para el seguimiento.
+
+Cada rollup guarda, por día, series/volumen/tonelaje por categoría (plan y alcanzado),
+si el día está finalizado y una versión compacta de los ejercicios. Se recalcula al
+guardar una semana o finalizar un día; el seguimiento lee N rollups en vez de N rutinas.
+"""
+from __future__ import annotations
+
+import re
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+from firebase_admin import firestore
+
+from app_core.batch_writes import OperacionLote, escribir_en_lotes
+from app_core.data_access import rutinas_metadata
+from app_core.utils import normalizar_correo
+
+COLECCION_ROLLUPS = "rollups_semanales"
+# Subir cuando cambie la forma del rollup: los de versión anterior se recalculan al leerlos.
+ROLLUP_VERSION = 1
+
+METRICAS = ("series", "volumen", "tonelaje", "volumen_alcanzado", "tonelaje_alcanzado")
+
+
+# =============================
+#  Parseo de la rutina (compartido con seguimiento_entrenamiento)
+# =============================
+def safe_int(x, default=0):
+    try: return int(float(x))
+    except Exception: return default
+
+def safe_float(x, default=0.0):
+    try: return float(x)
+    except Exception: return default
+
+def parse_reps_min(value) -> int | None:
+    """Extrae el mínimo de repeticiones desde formatos típicos."""
+    if value is None: return None
+    if isinstance(value, (int, float)):
+        try: return int(value)
+        except Exception: return None
+    if isinstance(value, dict):
+        for k in ("min","reps_min","rep_min","rmin"):
+            if k in value:
+                try: return int(value[k])
+                except Exception: pass
+        if "reps" in value:
+            return parse_reps_min(value["reps"])
+    s = str(value).strip().lower()
+    m = re.match(r"^\s*(\d+)\s*[x×]\s*\d+", s)
+    if m: return int(m.group(1))
+    m = re.match(r"^\s*(\d+)\s*[-–—]\s*(\d+)", s)
+    if m: return int(m.group(1))
+    m = re.match(r"^\s*(\d+)\s*$", s)
+    if m: return int(m.group(1))
+    return None
+
+def clasificar_categoria(reps_min: int | None) -> str:
+    """
+    Regla:
+      - reps_min < 6          -> Fuerza
+      - 6 <= reps_min < 12    -> Hipertrofia
+      - reps_min >= 12        -> Accesorio
+    """
+    if reps_min is None: return "Accesorio"
+    if reps_min < 6:     return "Fuerza"
+    if reps_min < 12:    return "Hipertrofia"
+    return "Accesorio"
+
+def es_warmup(ej: dict) -> bool:
+    bloque = str(ej.get("bloque", ej.get("seccion", ""))).strip().lower()
+    return bloque.replace("-", " ").replace("_", " ") == "warm up"
+
+def dia_finalizado(doc_dict: dict, dia_key: str) -> bool:
+    """
+    Día finalizado según tu app:
+      - doc["rutina"][f"{dia}_finalizado"] == True
+    (Se mantiene compatibilidad con mapas alternativos si existieran).
+    """
+    dia_key = str(dia_key)
+    rutina = doc_dict.get("rutina") or {}
+    flag_key = f"{dia_key}_finalizado"
+    if isinstance(rutina, dict) and flag_key in rutina:
+        return bool(rutina.get(flag_key) is True)
+
+    fin_map = doc_dict.get("finalizados")
+    if isinstance(fin_map, dict):
+        val = fin_map.get(dia_key)
+        if isinstance(val, bool):
+            return val
+
+    estado_map = doc_dict.get("estado_por_dia")
+    if isinstance(estado_map, dict):
+        val = str(estado_map.get(dia_key, "")).strip().lower()
+        if val in ("fin","final","finalizado","completado","done"):
+            return True
+
+    alt = doc_dict.get(f"dia_{dia_key}")
+    if isinstance(alt, dict) and "finalizado" in alt:
+        return bool(alt.get("finalizado"))
+
+    return False
+
+def obtener_lista_ejercicios(data_dia):
+    """
+    Normaliza el contenido del día a lista de ejercicios (dicts):
+      - lista directa de dicts
+      - dict con subclave 'ejercicios' (list/dict)
+      - dict con claves numéricas "1","2",...
+    """
+    if data_dia is None: return []
+    # Lista
+    if isinstance(data_dia, list):
+        if len(data_dia) == 1 and isinstance(data_dia[0], dict) and "ejercicios" in data_dia[0]:
+            return obtener_lista_ejercicios(data_dia[0]["ejercicios"])
+        return [e for e in data_dia if isinstance(e, dict)]
+    # Dict
+    if isinstance(data_dia, dict):
+        if "ejercicios" in data_dia:
+            ej = data_dia["ejercicios"]
+            if isinstance(ej, list):
+                return [e for e in ej if isinstance(e, dict)]
+            if isinstance(ej, dict):
+                try:
+                    pares = sorted(ej.items(), key=lambda kv: int(kv[0]))
+                    return [v for _, v in pares if isinstance(v, dict)]
+                except Exception:
+                    return [v for v in ej.values() if isinstance(v, dict)]
+            return []
+        claves_numericas = [k for k in data_dia.keys() if str(k).isdigit()]
+        if claves_numericas:
+            try:
+                pares = sorted(((k, data_dia[k]) for k in claves_numericas), key=lambda kv: int(kv[0]))
+                return [v for _, v in pares if isinstance(v, dict)]
+            except Exception:
+                return [data_dia[k] for k in data_dia if isinstance(data_dia[k], dict)]
+        return [v for v in data_dia.values() if isinstance(v, dict)]
+    return []
+
+def iter_dias_rutina(doc_dict: dict):
+    """
+    Itera días desde doc['rutina'] (dict) y devuelve (dia_key, lista_ejercicios_del_dia).
+    Detecta días por claves numéricas "1","2",... y normaliza el día con obtener_lista_ejercicios().
+    """
+    r = doc_dict.get("rutina")
+    if not isinstance(r, dict):
+        return
+    dia_keys = [k for k in r.keys() if str(k).isdigit()]
+    dia_keys.sort(key=lambda x: int(x))
+    for dia_key in dia_keys:
+        ejercicios_raw = r.get(dia_key)
+        lista = obtener_lista_ejercicios(ejercicios_raw)
+        yield str(dia_key), lista
+
+def fecha_semana_de_doc(doc_id: str, data: dict) -> Optional[date]:
+    """`fecha_lunes` (o equivalentes) del doc; si falta, la fecha del sufijo *_YYYY_MM_DD del ID."""
+    v = data.get("fecha_lunes") or data.get("semana_inicio") or data.get("fecha")
+    if isinstance(v, str):
+        try: return datetime.fromisoformat(v).date()
+        except Exception: pass
+    try:
+        tail = "_".join(doc_id.split("_")[-3:])
+        return datetime.strptime(tail, "%Y_%m_%d").date()
+    except Exception:
+        return None
+
+
+# =============================
+#  Cálculo del rollup
+# =============================
+def _ejercicio_compacto(ej: dict) -> dict:
+    reps_min = safe_int(parse_reps_min(ej.get("reps_min", ej.get("reps"))) or 0, 0)
+    return {
+        "ejercicio": ej.get("ejercicio"),
+        "series": safe_int(ej.get("series", 0), 0),
+        "reps_min": reps_min,
+        "reps_alcanzadas": safe_int(ej.get("reps_alcanzadas"), 0),
+        "peso": safe_float(ej.get("peso", 0), 0.0),
+        "peso_alcanzado": safe_float(
+            ej.get("peso_alcanzado")
+            or ej.get("Peso_alcanzado")
+            or ej.get("PesoAlcanzado"),
+            0.0,
+        ),
+        "warmup": es_warmup(ej),
+    }
+
+def _sumar(acum: dict, ej: dict) -> None:
+    categoria = clasificar_categoria(ej["reps_min"])
+    m = acum.setdefault(categoria, {k: 0 for k in METRICAS})
+    volumen = ej["series"] * ej["reps_min"]
+    volumen_alc = ej["series"] * ej["reps_alcanzadas"]
+    m["series"] += ej["series"]
+    m["volumen"] += volumen
+    m["tonelaje"] += volumen * ej["peso"]
+    m["volumen_alcanzado"] += volumen_alc
+    m["tonelaje_alcanzado"] += volumen_alc * ej["peso_alcanzado"]
+
+def calcular_rollup(doc_id: str, data: dict) -> Optional[dict]:
+    """Resume un doc de `rutinas_semanales`. Devuelve None si no tiene fecha de semana válida."""
+    fecha_semana = fecha_semana_de_doc(doc_id, data)
+    if not fecha_semana:
+        return None
+    dias: dict[str, dict] = {}
+    for dia_key, ejercicios in iter_dias_rutina(data):
+        compactos = [_ejercicio_compacto(ej) for ej in ejercicios if isinstance(ej, dict)]
+        categorias: dict[str, dict] = {}
+        categorias_warmup: dict[str, dict] = {}
+        for ej in compactos:
+            _sumar(categorias_warmup if ej["warmup"] else categorias, ej)
+        dias[dia_key] = {
+            "finalizado": dia_finalizado(data, dia_key),
+            "categorias": categorias,
+            "categorias_warmup": categorias_warmup,
+            "ejercicios": compactos,
+        }
+    return {
+        "correo": normalizar_correo(data.get("correo", "")),
+        "fecha_lunes": fecha_semana.isoformat(),
+        "dias": dias,
+        "version": ROLLUP_VERSION,
+        "updated_at": firestore.SERVER_TIMESTAMP,
+    }
+
+def _ref_rollup(db, doc_id: str):
+    return db.collection(COLECCION_ROLLUPS).document(doc_id)
+
+def operacion_rollup(db, doc_id: str, data: dict) -> OperacionLote | None:
+    """Upsert del rollup para sumarlo al batch que escribe la semana."""
+    rollup = calcular_rollup(doc_id, data)
+    if rollup is None:
+        return None
+    return OperacionLote(_ref_rollup(db, doc_id), rollup)
+
+def operacion_borrar_rollup(db, doc_id: str) -> OperacionLote:
+    return OperacionLote(_ref_rollup(db, doc_id), tipo="delete")
+
+def actualizar_rollup(db, doc_id: str, data: dict | None = None) -> bool:
+    """Recalcula el rollup de una semana ya escrita; lee el doc si no se entrega `data`."""
+    try:
+        if data is None:
+            snap = db.collection("rutinas_semanales").document(doc_id).get()
+            if not snap.exists:
+                _ref_rollup(db, doc_id).delete()
+                return True
+            data = snap.to_dict() or {}
+        op = operacion_rollup(db, doc_id, data)
+        if op is None:
+            return False
+        op.ref.set(op.data)
+    except Exception:
+        return False
+    return True
+
+
+# =============================
+#  Lectura
+# =============================
+def cargar_rollups(db, correo: str, desde: date | None = None, hasta: date | None = None) -> List[dict]:
+    """
+    Rollups de las semanas del deportista que tocan [desde, hasta].
+    Las semanas sin rollup (o con versión anterior) se calculan desde la rutina y se guardan.
+    """
+    semanas = rutinas_metadata(correo=normalizar_correo(correo), campos=("fecha_lunes",))
+    doc_ids: List[str] = []
+    for meta in semanas:
+        fecha = fecha_semana_de_doc(meta["_id"], meta)
+        if fecha is None:
+            continue
+        if desde and fecha + timedelta(days=6) < desde:
+            continue
+        if hasta and fecha > hasta:
+            continue
+        doc_ids.append(meta["_id"])
+    if not doc_ids:
+        return []
+
+    rollups: dict[str, dict] = {}
+    for snap in db.get_all([_ref_rollup(db, doc_id) for doc_id in doc_ids]):
+        data = snap.to_dict() if snap.exists else None
+        if data and data.get("version") == ROLLUP_VERSION:
+            rollups[snap.id] = data
+
+    faltantes = [doc_id for doc_id in doc_ids if doc_id not in rollups]
+    if faltantes:
+        refs = [db.collection("rutinas_semanales").document(doc_id) for doc_id in faltantes]
+        ops: List[OperacionLote] = []
+        for snap in db.get_all(refs):
+            if not snap.exists:
+                continue
+            op = operacion_rollup(db, snap.id, snap.to_dict() or {})
+            if op is None:
+                continue
+            ops.append(op)
+            rollups[snap.id] = op.data
+        escribir_en_lotes(db, ops)
+
+    return [rollups[doc_id] for doc_id in doc_ids if doc_id in rollups]
+
@@ -0,0 +1,467 @@
+"""Render de las tarjetas PNG de resumen de sesión con caché por contenido.
+
+Las páginas describen la tarjeta con `BocetoTarjeta` (misma firma que `ax.text`) y piden los
+bytes con `tarjeta_png`; la de resumen de sesión que comparten `vista_rutinas` y `vista_rutinas2`
+es `tarjeta_resumen_sesion`. La clave es el hash de la descripción: un acierto sale de la LRU en
+memoria o del disco; un fallo se rasteriza en un pool de procesos que reutiliza una figura
+plantilla ya construida, fuera del hilo de Streamlit.
+
+Backend configurable con `[tarjetas] backend` en secrets o `TARJETAS_BACKEND`: "matplotlib"
+(por defecto) o "pillow" (`app_core.tarjetas_pillow`, sin matplotlib y en el mismo hilo).
+
+Benchmark contra el camino anterior (figura nueva + savefig): `python -m app_core.tarjetas`.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass, field
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+VERSION_RENDER = 1        # subirla invalida todo lo cacheado si cambia el dibujo
+MAX_WORKERS_RENDER = 2
+MAX_TARJETAS_MEMORIA = 64
+MAX_TARJETAS_DISCO_BYTES = 200 * 1024 * 1024
+PODA_DISCO_S = 600        # cada cuánto se revisa el tamaño del directorio
+TIMEOUT_RENDER_S = 30
+BACKEND_MATPLOTLIB = "matplotlib"
+BACKEND_PILLOW = "pillow"
+BACKENDS = (BACKEND_MATPLOTLIB, BACKEND_PILLOW)
+DIR_CACHE_TARJETAS = Path(
+    os.getenv("TARJETAS_CACHE_DIR") or Path(__file__).resolve().parent.parent / ".cache" / "tarjetas"
+)
+
+
+# =============================
+#  Descripción de la tarjeta
+# =============================
+@dataclass(frozen=True)
+class Texto:
+    x: float
+    y: float
+    texto: str
+    tamano: float
+    negrita: bool = False
+    cursiva: bool = False
+    color: str = "black"
+    ha: str = "left"
+    va: str = "baseline"
+
+
+@dataclass(frozen=True)
+class Tarjeta:
+    textos: Tuple[Texto, ...]
+    ancho_in: float = 6.0
+    alto_in: float = 8.0
+    dpi: int = 200
+
+    def clave(self, backend: str = BACKEND_MATPLOTLIB) -> str:
+        raw = json.dumps(
+            {"v": VERSION_RENDER, "backend": backend, "tarjeta": asdict(self)}, sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class BocetoTarjeta:
+    """Acumula los `text(...)` de una página con los mismos argumentos que `ax.text` de matplotlib."""
+    ancho_in: float = 6.0
+    alto_in: float = 8.0
+    dpi: int = 200
+    textos: List[Texto] = field(default_factory=list)
+
+    def text(self, x, y, s, fontsize=10, fontweight="normal", style="normal", color="black",
+             ha="left", va="baseline") -> None:
+        self.textos.append(Texto(
+            float(x), float(y), str(s), float(fontsize),
+            negrita=fontweight == "bold", cursiva=style == "italic", color=str(color), ha=ha, va=va,
+        ))
+
+    def tarjeta(self) -> Tarjeta:
+        return Tarjeta(tuple(self.textos), self.ancho_in, self.alto_in, self.dpi)
+
+
+# =============================
+#  Render matplotlib
+# =============================
+def _nueva_figura(tarjeta: Tarjeta):
+    # Figure sin pyplot: no queda registrada en el gestor global ni hay que cerrarla
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(tarjeta.ancho_in, tarjeta.alto_in), dpi=tarjeta.dpi)
+    ax = fig.add_subplot()
+    ax.axis("off")
+    return fig, ax
+
+
+def _dibujar(ax, tarjeta: Tarjeta) -> None:
+    for t in tarjeta.textos:
+        ax.text(
+            t.x, t.y, t.texto, fontsize=t.tamano, color=t.color, ha=t.ha, va=t.va,
+            fontweight="bold" if t.negrita else "normal", style="italic" if t.cursiva else "normal",
+        )
+
+
+def figura(tarjeta: Tarjeta):
+    """Figura nueva con la tarjeta dibujada (para `st.pyplot`); es el camino sin caché."""
+    fig, ax = _nueva_figura(tarjeta)
+    _dibujar(ax, tarjeta)
+    fig.tight_layout()
+    return fig
+
+
+def _png(fig) -> bytes:
+    buf = BytesIO()
+    fig.savefig(buf, format="png", bbox_inches="tight")
+    return buf.getvalue()
+
+
+# figura plantilla por tamaño, una por proceso: ejes, layout y canvas ya armados
+_PLANTILLAS: Dict[Tuple[float, float, int], tuple] = {}
+
+
+def _plantilla(tarjeta: Tarjeta):
+    tamano = (tarjeta.ancho_in, tarjeta.alto_in, tarjeta.dpi)
+    if tamano not in _PLANTILLAS:
+        fig, ax = _nueva_figura(tarjeta)
+        fig.tight_layout()
+        _PLANTILLAS[tamano] = (fig, ax)
+    return _PLANTILLAS[tamano]
+
+
+def renderizar_png(tarjeta: Tarjeta) -> bytes:
+    """PNG de la tarjeta sobre la figura plantilla del proceso (no es seguro entre hilos)."""
+    fig, ax = _plantilla(tarjeta)
+    for artista in list(ax.texts):
+        artista.remove()
+    _dibujar(ax, tarjeta)
+    return _png(fig)
+
+
+def _iniciar_worker() -> None:
+    _plantilla(Tarjeta(()))
+
+
+# =============================
+#  Caché de PNG
+# =============================
+class _CachePng:
+    """
+    LRU en memoria más un .png por clave en disco. Las claves son por contenido: no vencen, pero
+    el directorio se poda a `max_disco` bytes borrando primero los menos usados (mtime = último uso).
+    """
+
+    def __init__(self, directorio: Path, max_memoria: int, max_disco: int = MAX_TARJETAS_DISCO_BYTES):
+        self._dir = directorio
+        self._max = max_memoria
+        self._max_disco = max_disco
+        self._mem: "OrderedDict[str, bytes]" = OrderedDict()
+        self._podado_en = 0.0
+        self._lock = threading.Lock()
+
+    def _ruta(self, clave: str) -> Path:
+        return self._dir / f"{clave}.png"
+
+    def _recordar(self, clave: str, png: bytes) -> None:
+        with self._lock:
+            self._mem[clave] = png
+            self._mem.move_to_end(clave)
+            while len(self._mem) > self._max:
+                self._mem.popitem(last=False)
+
+    def get(self, clave: str) -> Optional[bytes]:
+        with self._lock:
+            png = self._mem.get(clave)
+            if png is not None:
+                self._mem.move_to_end(clave)
+                return png
+        ruta = self._ruta(clave)
+        try:
+            png = ruta.read_bytes()
+        except Exception:
+            return None
+        try:
+            os.utime(ruta)  # acierto en disco: pasa al final de la cola de poda
+        except Exception:
+            pass
+        self._recordar(clave, png)
+        return png
+
+    def set(self, clave: str, png: bytes) -> None:
+        if not png:
+            return
+        self._recordar(clave, png)
+        try:
+            self._dir.mkdir(parents=True, exist_ok=True)
+            tmp = self._ruta(clave).with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_bytes(png)
+            os.replace(tmp, self._ruta(clave))
+        except Exception:
+            pass  # sin disco escribible queda solo en memoria
+        if time.time() - self._podado_en >= PODA_DISCO_S:
+            self.podar()
+
+    def podar(self) -> int:
+        """Borra los PNG menos usados hasta quedar bajo `max_disco` bytes (y los temporales huérfanos)."""
+        ahora = time.time()
+        self._podado_en = ahora
+        archivos = []
+        borrados = 0
+        try:
+            rutas = list(self._dir.iterdir())
+        except Exception:
+            return 0
+        for ruta in rutas:
+            try:
+                stat = ruta.stat()
+                if ruta.suffix == ".tmp" and ahora - stat.st_mtime > PODA_DISCO_S:
+                    ruta.unlink()
+                    borrados += 1
+                elif ruta.suffix == ".png":
+                    archivos.append((stat.st_mtime, stat.st_size, ruta))
+            except Exception:
+                continue
+        total = sum(tamano for _, tamano, _ in archivos)
+        for _, tamano, ruta in sorted(archivos, key=lambda a: a[0]):
+            if total <= self._max_disco:
+                break
+            try:
+                ruta.unlink()
+            except Exception:
+                continue
+            total -= tamano
+            borrados += 1
+        return borrados
+
+    def limpiar_memoria(self) -> None:
+        with self._lock:
+            self._mem.clear()
+
+
+_CACHE_TARJETAS = _CachePng(DIR_CACHE_TARJETAS, MAX_TARJETAS_MEMORIA)
+
+
+# =============================
+#  Backend
+# =============================
+_BACKEND: Optional[str] = None
+
+
+def _backend_configurado() -> str:
+    nombre = ""
+    try:
+        import streamlit as st
+
+        nombre = str((st.secrets.get("tarjetas") or {}).get("backend") or "")
+    except Exception:
+        pass  # sin streamlit o sin secrets
+    nombre = (nombre or os.getenv("TARJETAS_BACKEND", "")).strip().lower()
+    if nombre and nombre not in BACKENDS:
+        logger.warning("Backend de tarjetas desconocido %r; se usa %s", nombre, BACKEND_MATPLOTLIB)
+    return nombre if nombre in BACKENDS else BACKEND_MATPLOTLIB
+
+
+def backend_tarjetas() -> str:
+    global _BACKEND
+    if _BACKEND is None:
+        _BACKEND = _backend_configurado()
+    return _BACKEND
+
+
+def configurar_backend(nombre: Optional[str]) -> None:
+    """Fija el backend del proceso; None vuelve a leer la configuración."""
+    global _BACKEND
+    if nombre is not None and nombre not in BACKENDS:
+        raise ValueError(f"Backend de tarjetas desconocido: {nombre!r}")
+    _BACKEND = nombre
+
+
+def _render_pillow(tarjeta: Tarjeta) -> bytes:
+    from app_core.tarjetas_pillow import renderizar_png as renderizar_pillow
+
+    return renderizar_pillow(tarjeta)
+
+
+# =============================
+#  Pool de render
+# =============================
+class _PoolRender:
+    """Pool de procesos perezoso; une los pedidos simultáneos de la misma tarjeta en un solo render."""
+
+    def __init__(self, max_workers: int):
+        self._max_workers = max_workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._en_curso: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _ejecutor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: hacer fork del servidor de Streamlit con hilos vivos no es seguro
+            self._pool = ProcessPoolExecutor(
+                max_workers=self._max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_iniciar_worker,
+            )
+        return self._pool
+
+    def reiniciar(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+            self._en_curso.clear()
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def enviar(self, clave: str, tarjeta: Tarjeta) -> Future:
+        with self._lock:
+            futuro = self._en_curso.get(clave)
+            nuevo = futuro is None
+            if nuevo:
+                futuro = self._ejecutor().submit(renderizar_png, tarjeta)
+                self._en_curso[clave] = futuro
+        if nuevo:
+            # fuera del lock: si ya terminó, el callback corre aquí mismo
+            futuro.add_done_callback(lambda f, c=clave: self._terminado(c, f))
+        return futuro
+
+    def _terminado(self, clave: str, futuro: Future) -> None:
+        with self._lock:
+            self._en_curso.pop(clave, None)
+        if not futuro.cancelled() and futuro.exception() is None:
+            _CACHE_TARJETAS.set(clave, futuro.result())
+
+
+_POOL = _PoolRender(MAX_WORKERS_RENDER)
+_LOCK_LOCAL = threading.Lock()
+
+
+def _render_local(tarjeta: Tarjeta) -> bytes:
+    with _LOCK_LOCAL:
+        png = renderizar_png(tarjeta)
+    _CACHE_TARJETAS.set(tarjeta.clave(BACKEND_MATPLOTLIB), png)
+    return png
+
+
+def tarjeta_png_futuro(tarjeta: Tarjeta, backend: Optional[str] = None) -> Future:
+    """Future con los bytes PNG; ya resuelto si la tarjeta estaba en caché o el backend es Pillow."""
+    backend = backend or backend_tarjetas()
+    clave = tarjeta.clave(backend)
+    png = _CACHE_TARJETAS.get(clave)
+    listo: Future = Future()
+    if png is not None:
+        listo.set_result(png)
+        return listo
+    if backend == BACKEND_PILLOW:
+        # unos pocos ms: no compensa el viaje al pool
+        png = _render_pillow(tarjeta)
+        _CACHE_TARJETAS.set(clave, png)
+        listo.set_result(png)
+        return listo
+    return _POOL.enviar(clave, tarjeta)
+
+
+def tarjeta_png(tarjeta: Tarjeta, timeout: float = TIMEOUT_RENDER_S, backend: Optional[str] = None) -> bytes:
+    """Bytes PNG de la tarjeta. Si Pillow o el pool fallan, se rasteriza con matplotlib en este proceso."""
+    backend = backend or backend_tarjetas()
+    if backend == BACKEND_PILLOW:
+        try:
+            return tarjeta_png_futuro(tarjeta, backend).result()
+        except Exception:
+            logger.exception("Fallo el render con Pillow; se rasteriza con matplotlib en el proceso")
+            return _render_local(tarjeta)
+    try:
+        return tarjeta_png_futuro(tarjeta, backend).result(timeout=timeout)
+    except BrokenProcessPool:
+        logger.warning("Pool de render caído; se reinicia y se rasteriza en el proceso")
+        _POOL.reiniciar()
+    except Exception:
+        logger.exception("Fallo el render en el pool; se rasteriza en el proceso")
+    return _render_local(tarjeta)
+
+
+# =============================
+#  Tarjeta de resumen de sesión (vista_rutinas / vista_rutinas2)
+# =============================
+def tarjeta_resumen_sesion(nombre, dia_indice, ejercicios_workout, focus_tuple, gym_name="Motion Performance") -> Tarjeta:
+    """Workout del día (circuito D), grupo con más series y totales; `nombre` no se dibuja."""
+    total_series = sum(int(e.get("series", 0) or 0) for e in ejercicios_workout)
+    total_reps = sum(int(e.get("series", 0) or 0) * int(e.get("reps", 0) or 0) for e in ejercicios_workout)
+    total_peso = sum(
+        int(e.get("series", 0) or 0) * int(e.get("reps", 0) or 0) * float(e.get("peso", 0) or 0)
+        for e in ejercicios_workout
+    )
+    b = BocetoTarjeta()
+    b.text(0.5, 0.96, gym_name, ha="center", va="center", fontsize=18, fontweight="bold")
+    b.text(0.5, 0.92, "Resumen de Entrenamiento", ha="center", va="center", fontsize=13)
+    b.text(0.5, 0.87, f"Día {dia_indice}", ha="center", va="center", fontsize=11)
+    y = 0.80
+    b.text(0.05, y, "Workout", fontsize=12, fontweight="bold"); y -= 0.03
+    if not ejercicios_workout:
+        b.text(0.07, y, "Sin ejercicios en el circuito D.", fontsize=10, ha="left"); y -= 0.04
+    else:
+        max_lineas = 9
+        for e in ejercicios_workout[:max_lineas]:
+            linea = f"• {e['nombre']} {int(e.get('reps') or 0)}x{int(round(float(e.get('peso') or 0)))}"
+            color = "green" if e.get("mejoro") else "black"
+            b.text(0.07, y, linea + (" ↑" if e.get("mejoro") else ""), fontsize=10, ha="left", color=color)
+            y -= 0.03
+        if len(ejercicios_workout) > max_lineas:
+            b.text(0.07, y, f"+ {len(ejercicios_workout) - max_lineas} ejercicio(s) más…", fontsize=10, ha="left",
+                   style="italic")
+            y -= 0.04
+    grupo, total = focus_tuple
+    y -= 0.01; b.text(0.05, y, "Focus", fontsize=12, fontweight="bold"); y -= 0.03
+    b.text(0.07, y, f"Grupo con más series: {grupo} ({total} series)", fontsize=11, ha="left"); y -= 0.03
+    y -= 0.01; b.text(0.05, y, "Totales", fontsize=12, fontweight="bold"); y -= 0.035
+    b.text(0.07, y, f"• Series: {total_series}", fontsize=11, ha="left"); y -= 0.028
+    b.text(0.07, y, f"• Repeticiones: {total_reps}", fontsize=11, ha="left"); y -= 0.028
+    b.text(0.07, y, f"• Volumen estimado: {total_peso:g} kg", fontsize=11, ha="left")
+    b.text(0.5, 0.08, "¡Gran trabajo!", fontsize=10.5, ha="center", style="italic")
+    b.text(0.5, 0.04, "Comparte tu progreso 📸", fontsize=9, ha="center")
+    return b.tarjeta()
+
+
+# =============================
+#  Benchmark
+# =============================
+def _tarjeta_ejemplo(n: int = 0) -> Tarjeta:
+    workout = [
+        {"nombre": f"Ejercicio {i}", "series": 3, "reps": 8, "peso": 60 + i * 2.5, "mejoro": i % 3 == 0}
+        for i in range(9)
+    ]
+    return tarjeta_resumen_sesion("Atleta", n + 1, workout, ("Piernas", 12))
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    def _medir(nombre: str, fn, n: int) -> None:
+        t0 = time.perf_counter()
+        for i in range(n):
+            fn(i)
+        print(f"{nombre:<38} {(time.perf_counter() - t0) * 1000 / n:8.1f} ms/tarjeta")
+
+    N = 10
+    _CACHE_TARJETAS = _CachePng(Path(tempfile.mkdtemp(prefix="tarjetas_")), MAX_TARJETAS_MEMORIA)
+    _medir("actual: figura nueva + savefig", lambda i: _png(figura(_tarjeta_ejemplo(i))), N)
+    _medir("plantilla en proceso (fallo)", lambda i: renderizar_png(_tarjeta_ejemplo(100 + i)), N)
+    tarjeta_png(_tarjeta_ejemplo(999))  # arranque del pool fuera de la medición
+    _medir("servicio, fallo en el pool", lambda i: tarjeta_png(_tarjeta_ejemplo(200 + i)), N)
+    _medir("servicio, acierto en memoria", lambda i: tarjeta_png(_tarjeta_ejemplo(200 + i)), N)
+    _CACHE_TARJETAS.limpiar_memoria()
+    _medir("servicio, acierto en disco", lambda i: tarjeta_png(_tarjeta_ejemplo(200 + i)), N)
+    _POOL.reiniciar()
+    _render_pillow(_tarjeta_ejemplo(998))  # carga de fuentes fuera de la medición
+    _medir("pillow, render directo", lambda i: _render_pillow(_tarjeta_ejemplo(300 + i)), N)
+    _medir("servicio pillow, fallo", lambda i: tarjeta_png(_tarjeta_ejemplo(400 + i), backend=BACKEND_PILLOW), N)
@@ -0,0 +1,110 @@
+"""Backend Pillow para `app_core.tarjetas`: misma geometría que la figura matplotlib, sin importarla.
+
+Reproduce lo que hacen `tight_layout` (ejes con margen de 1.08 × 10 pt) y `savefig(bbox_inches="tight")`
+(recorte a ejes + textos con 0.1 in de margen) y usa las DejaVu que trae matplotlib si está instalada.
+Se importa solo cuando el backend configurado es "pillow".
+"""
+from __future__ import annotations
+
+import importlib.util
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from PIL import Image, ImageChops, ImageColor, ImageDraw, ImageFont
+
+from app_core.tarjetas import Tarjeta
+
+PAD_LAYOUT_PT = 1.08 * 10   # pad por defecto de tight_layout (en tamaño de fuente de 10 pt)
+PAD_RECORTE_IN = 0.1        # pad_inches por defecto de savefig
+NIVELES_AA = 16             # tonos de antialias por color en la paleta
+MAX_COLORES = 255 // NIVELES_AA
+
+_ARCHIVOS_FUENTE = {
+    (False, False): "DejaVuSans.ttf",
+    (True, False): "DejaVuSans-Bold.ttf",
+    (False, True): "DejaVuSans-Oblique.ttf",
+    (True, True): "DejaVuSans-BoldOblique.ttf",
+}
+_ANCLA_H = {"left": "l", "center": "m", "right": "r"}
+_ANCLA_V = {"baseline": "s", "center": "m", "top": "a", "bottom": "d"}
+
+
+def _dir_fuentes_matplotlib() -> Optional[Path]:
+    # ubica mpl-data sin importar matplotlib
+    spec = importlib.util.find_spec("matplotlib")
+    if spec is None or not spec.submodule_search_locations:
+        return None
+    return Path(list(spec.submodule_search_locations)[0]) / "mpl-data" / "fonts" / "ttf"
+
+
+@lru_cache(maxsize=32)
+def _fuente(negrita: bool, cursiva: bool, tamano_px: int):
+    archivo = _ARCHIVOS_FUENTE[(negrita, cursiva)]
+    directorio = _dir_fuentes_matplotlib()
+    for candidato in ([directorio / archivo] if directorio else []) + [archivo]:
+        try:
+            return ImageFont.truetype(str(candidato), tamano_px)
+        except OSError:
+            continue
+    return ImageFont.load_default(tamano_px)
+
+
+@lru_cache(maxsize=MAX_COLORES)
+def _lut_indices(base: int) -> tuple:
+    return (0,) + tuple(base + min(NIVELES_AA - 1, v * NIVELES_AA // 256) for v in range(1, 256))
+
+
+def _ejes(tarjeta: Tarjeta) -> Tuple[float, float, float, float]:
+    """(x0, y0 desde arriba, ancho, alto) de los ejes en píxeles, como tras `tight_layout`."""
+    ancho, alto = tarjeta.ancho_in * tarjeta.dpi, tarjeta.alto_in * tarjeta.dpi
+    margen = PAD_LAYOUT_PT / 72 * tarjeta.dpi
+    return margen, margen, ancho - 2 * margen, alto - 2 * margen
+
+
+def renderizar_png(tarjeta: Tarjeta) -> bytes:
+    """
+    Cada color se dibuja como cobertura en una capa L y se vuelca a una imagen indexada
+    (blanco + NIVELES_AA tonos por color): el PNG con paleta se codifica varias veces más rápido que RGB.
+    """
+    ancho, alto = round(tarjeta.ancho_in * tarjeta.dpi), round(tarjeta.alto_in * tarjeta.dpi)
+    x0, y0, w, h = _ejes(tarjeta)
+
+    capas: Dict[str, Image.Image] = {}
+    caja = (x0, y0, x0 + w, y0 + h)  # bbox_inches="tight" incluye los ejes aunque estén apagados
+    for t in tarjeta.textos:
+        capa = capas.get(t.color)
+        if capa is None:
+            if len(capas) == MAX_COLORES:
+                raise ValueError(f"La tarjeta usa más de {MAX_COLORES} colores")
+            capa = capas[t.color] = Image.new("L", (ancho, alto), 0)
+        fuente = _fuente(t.negrita, t.cursiva, round(t.tamano * tarjeta.dpi / 72))
+        xy = (x0 + t.x * w, y0 + (1 - t.y) * h)
+        ancla = _ANCLA_H.get(t.ha, "l") + _ANCLA_V.get(t.va, "s")
+        draw = ImageDraw.Draw(capa)
+        draw.text(xy, t.texto, fill=255, font=fuente, anchor=ancla)
+        l, a, r, b = draw.textbbox(xy, t.texto, font=fuente, anchor=ancla)
+        caja = (min(caja[0], l), min(caja[1], a), max(caja[2], r), max(caja[3], b))
+
+    indices = None
+    paleta = [255, 255, 255]
+    for i, (color, capa) in enumerate(capas.items()):
+        rgb = ImageColor.getrgb(color)[:3]
+        for k in range(1, NIVELES_AA + 1):
+            paleta += [round(255 + (c - 255) * k / NIVELES_AA) for c in rgb]
+        capa = capa.point(_lut_indices(1 + i * NIVELES_AA))
+        # los textos de distinto color no se pisan; en un cruce queda el de índice mayor
+        indices = capa if indices is None else ImageChops.lighter(indices, capa)
+    if indices is None:
+        indices = Image.new("L", (ancho, alto), 0)
+
+    pad = PAD_RECORTE_IN * tarjeta.dpi
+    indices = indices.crop((
+        max(0, round(caja[0] - pad)), max(0, round(caja[1] - pad)),
+        min(ancho, round(caja[2] + pad)), min(alto, round(caja[3] + pad)),
+    ))
+    indices.putpalette(paleta)  # L -> P
+    buf = BytesIO()
+    indices.save(buf, format="PNG", compress_level=3)
+    return buf.getvalue()
@@ -1,46 +1,227 @@
-"""Utilities para acceder a la colección de usuarios sin repetir queries pesadas."""
+"""Cache de proceso para la colección `usuarios`, mantenida al día con un listener de Firestore.
+
+Se siembra una sola vez (snapshot inicial del listener) y luego solo aplica los cambios
+que Firestore empuja, así que nunca vuelve a leer la colección completa. Si el listener
+no puede iniciarse o se cae, se vuelve a suscribir y, si tampoco puede, cae a una relectura
+completa con TTL como antes.
+
+Los dicts publicados nunca se modifican: cada cambio arma copias y cambia la referencia, así
+que quien itera un `get_users_map()` no choca con el hilo del listener.
+"""
 from __future__ import annotations
 
-from typing import Dict, List
+import logging
+import threading
+import time
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional
 
-from app_core.cache import cache_data
 from app_core.firebase_client import get_db
 from app_core.utils import normalizar_correo, correo_a_doc_id
 
+logger = logging.getLogger(__name__)
+
+_SEED_TIMEOUT_S = 15.0
+_FALLBACK_TTL_S = 300.0
+
 
-@cache_data("usuarios", show_spinner=False, ttl=300, max_entries=8)
-def _fetch_all_users() -> List[dict]:
-    """Obtiene todos los usuarios una sola vez y cachea el resultado."""
+class _UsersStore:
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._start_lock = threading.Lock()
+        self._seeded = threading.Event()
+        self._by_doc_id: Dict[str, dict] = {}
+        self._map: Dict[str, dict] = {}
+        self._watch = None
+        self._primer_snapshot = threading.Event()
+        self._reemplazar = False
+        self._loaded_at = 0.0
+        self._listener_retry_at = 0.0
 
-    db = get_db()
-    usuarios: List[dict] = []
-    for snap in db.collection("usuarios").stream():
-        if not snap.exists:
-            continue
-        data = snap.to_dict() or {}
-        data.setdefault("_id", snap.id)
+    # --- mantenimiento del índice ---
+    @staticmethod
+    def _payload(doc_id: str, raw: Optional[dict]) -> dict:
+        data = dict(raw or {})
+        data.setdefault("_id", doc_id)
         correo_norm = normalizar_correo(data.get("correo", ""))
         if correo_norm:
             data["_correo_norm"] = correo_norm
-        usuarios.append(data)
-    return usuarios
+        return data
 
+    @staticmethod
+    def _unindex(by_doc_id: Dict[str, dict], mapa: Dict[str, dict], doc_id: str) -> None:
+        previo = by_doc_id.pop(doc_id, None)
+        if not previo:
+            return
+        correo_norm = previo.get("_correo_norm")
+        if not correo_norm:
+            return
+        for key in (correo_norm, correo_a_doc_id(correo_norm)):
+            if mapa.get(key) is previo:
+                del mapa[key]
+
+    @classmethod
+    def _index(cls, by_doc_id: Dict[str, dict], mapa: Dict[str, dict], doc_id: str, raw: Optional[dict]) -> None:
+        cls._unindex(by_doc_id, mapa, doc_id)
+        data = cls._payload(doc_id, raw)
+        by_doc_id[doc_id] = data
+        correo_norm = data.get("_correo_norm")
+        if correo_norm:
+            mapa[correo_norm] = data
+            mapa[correo_a_doc_id(correo_norm)] = data
 
-@cache_data("usuarios", show_spinner=False, ttl=300, max_entries=8)
-def get_users_map() -> Dict[str, dict]:
-    """Mapping correo/doc_id normalizado -> payload del usuario."""
+    def _publicar(self, by_doc_id: Dict[str, dict], mapa: Dict[str, dict]) -> None:
+        # asignaciones atómicas: los lectores ven el dict anterior completo o el nuevo completo
+        self._by_doc_id = by_doc_id
+        self._map = mapa
+        self._loaded_at = time.monotonic()
 
-    mapping: Dict[str, dict] = {}
-    for user in _fetch_all_users():
-        correo_norm = user.get("_correo_norm") or normalizar_correo(user.get("correo", ""))
-        if not correo_norm:
-            continue
-        mapping[correo_norm] = user
-        mapping[correo_a_doc_id(correo_norm)] = user
-    return mapping
+    # --- listener ---
+    def _on_snapshot(self, _col_snapshot, changes, _read_time) -> None:
+        with self._lock:
+            if self._reemplazar:
+                # primer snapshot de una suscripción nueva: trae todos los docs como ADDED
+                by_doc_id, mapa = {}, {}
+                self._reemplazar = False
+            else:
+                by_doc_id, mapa = dict(self._by_doc_id), dict(self._map)
+            for change in changes:
+                doc = change.document
+                if change.type.name == "REMOVED":
+                    self._unindex(by_doc_id, mapa, doc.id)
+                else:
+                    self._index(by_doc_id, mapa, doc.id, doc.to_dict())
+            self._publicar(by_doc_id, mapa)
+        self._primer_snapshot.set()
+        self._seeded.set()
+
+    def _watch_activo(self) -> bool:
+        watch = self._watch
+        if watch is None:
+            return False
+        try:
+            return bool(watch.is_active)
+        except Exception:
+            return False
+
+    def _start_listener(self) -> bool:
+        self._primer_snapshot.clear()
+        with self._lock:
+            self._reemplazar = True
+        try:
+            self._watch = get_db().collection("usuarios").on_snapshot(self._on_snapshot)
+        except Exception as exc:
+            logger.warning("No se pudo iniciar el listener de usuarios: %s", exc)
+            self._watch = None
+            return False
+        if self._primer_snapshot.wait(_SEED_TIMEOUT_S):
+            return True
+        logger.warning("El listener de usuarios no entregó el snapshot inicial a tiempo")
+        try:
+            self._watch.unsubscribe()
+        except Exception:
+            pass
+        self._watch = None
+        return False
+
+    def _full_reload(self) -> None:
+        nuevos: Dict[str, dict] = {}
+        for snap in get_db().collection("usuarios").stream():
+            if snap.exists:
+                nuevos[snap.id] = snap.to_dict() or {}
+        by_doc_id: Dict[str, dict] = {}
+        mapa: Dict[str, dict] = {}
+        for doc_id, raw in nuevos.items():
+            self._index(by_doc_id, mapa, doc_id, raw)
+        with self._lock:
+            self._publicar(by_doc_id, mapa)
+        self._seeded.set()
+
+    def ensure_ready(self) -> None:
+        if self._watch_activo() and self._seeded.is_set():
+            return
+        # El snapshot inicial llega en otro hilo y toma `_lock`; por eso el arranque usa su propio lock.
+        with self._start_lock:
+            if self._watch_activo() and self._seeded.is_set():
+                return
+            if self._watch is not None:
+                # el listener se cerró (error de la RPC o cierre del SDK): se reemplaza
+                logger.warning("El listener de usuarios dejó de estar activo; se vuelve a suscribir")
+                try:
+                    self._watch.unsubscribe()
+                except Exception:
+                    pass
+                self._watch = None
+                self._listener_retry_at = 0.0
+            ahora = time.monotonic()
+            if ahora >= self._listener_retry_at:
+                if self._start_listener():
+                    return
+                self._listener_retry_at = ahora + _FALLBACK_TTL_S
+            # Sin listener: relectura completa acotada por TTL
+            if not self._seeded.is_set() or ahora - self._loaded_at > _FALLBACK_TTL_S:
+                try:
+                    self._full_reload()
+                except Exception as exc:
+                    logger.warning("No se pudieron cargar usuarios: %s", exc)
+
+    def is_ready(self) -> bool:
+        return self._seeded.is_set()
+
+    def mapping(self) -> Mapping[str, dict]:
+        return MappingProxyType(self._map)
+
+    def values(self) -> List[dict]:
+        return list(self._by_doc_id.values())
+
+    def get(self, key: str) -> Optional[dict]:
+        return self._map.get(key)
+
+    def upsert_local(self, doc_id: str, cambios: dict) -> None:
+        """Aplica una escritura propia sin esperar el eco del listener."""
+        with self._lock:
+            by_doc_id, mapa = dict(self._by_doc_id), dict(self._map)
+            actual = dict(by_doc_id.get(doc_id) or {})
+            actual.update(cambios or {})
+            self._index(by_doc_id, mapa, doc_id, actual)
+            self._publicar(by_doc_id, mapa)
+
+
+_STORE = _UsersStore()
+
+
+def get_users_map() -> Mapping[str, dict]:
+    """Mapping de solo lectura correo/doc_id normalizado -> payload del usuario (lookup O(1))."""
+
+    _STORE.ensure_ready()
+    return _STORE.mapping()
+
+
+def get_user(correo_o_doc_id: str) -> Optional[dict]:
+    """Lookup puntual sin forzar la siembra si el cache aún no existe."""
+
+    key = normalizar_correo(correo_o_doc_id)
+    if not key or not _STORE.is_ready():
+        return None
+    return _STORE.get(key) or _STORE.get(correo_a_doc_id(key))
+
+
+def users_cache_ready() -> bool:
+    return _STORE.is_ready()
+
+
+def note_user_write(correo: str, cambios: dict) -> None:
+    """Refleja en memoria una escritura hecha por este proceso (el listener la confirmará luego)."""
+
+    if not _STORE.is_ready():
+        return
+    correo_norm = normalizar_correo(correo)
+    if correo_norm:
+        _STORE.upsert_local(correo_a_doc_id(correo_norm), cambios)
 
 
 def list_users() -> List[dict]:
     """Expone la lista cacheada cuando se necesita iterar completa."""
 
-    return list(_fetch_all_users())
+    _STORE.ensure_ready()
+    return _STORE.values()
@@ -1,7 +1,7 @@
 from __future__ import annotations
 from datetime import date, datetime, timedelta
 from functools import lru_cache
-from typing import Optional, Tuple, Dict, Any
+from typing import Optional, Tuple, Dict, Any, Iterable
 
 from app_core.firebase_client import get_db
 
@@ -52,6 +52,15 @@ def _fetch_usuario_por_doc_id(doc_id: str) -> Optional[Dict[str, Any]]:
         return None
 
 
+def _usuario_en_cache_proceso(correo_norm: str) -> Optional[Dict[str, Any]]:
+    """Consulta el cache vivo de usuarios (listener) si ya está sembrado."""
+    try:
+        from app_core.users_service import get_user  # import diferido: users_service depende de este módulo
+    except Exception:
+        return None
+    return get_user(correo_norm)
+
+
 def empresa_de_usuario(correo: str, usuarios_cache: Dict[str, Dict[str, Any]] | None = None) -> str:
     correo_norm = normalizar_correo(correo)
     if not correo_norm:
@@ -66,9 +75,16 @@ def empresa_de_usuario(correo: str, usuarios_cache: Dict[str, Dict[str, Any]] |
                 data = usuarios_cache[key]
                 break
 
+    if data is None:
+        data = _usuario_en_cache_proceso(correo_norm)
+
     if data is None:
         data = _fetch_usuario_por_doc_id(correo_a_doc_id(correo_norm))
 
+    return _empresa_de_datos(data, correo_norm)
+
+
+def _empresa_de_datos(data: Optional[Dict[str, Any]], correo_norm: str) -> str:
     empresa = ""
     if isinstance(data, dict):
         empresa = str(data.get("empresa", "")).strip().lower()
@@ -81,6 +97,46 @@ def empresa_de_usuario(correo: str, usuarios_cache: Dict[str, Dict[str, Any]] |
     return empresa or EMPRESA_DESCONOCIDA
 
 
+def empresas_de_usuarios(
+    correos: Iterable[str],
+    usuarios_cache: Dict[str, Dict[str, Any]] | None = None,
+    db=None,
+) -> Dict[str, str]:
+    """
+    Versión en lote de `empresa_de_usuario`: correo normalizado -> empresa.
+    Lo que no está en `usuarios_cache` ni en el cache de proceso se lee con un solo `get_all`.
+    """
+    resultado: Dict[str, str] = {}
+    pendientes: Dict[str, str] = {}  # doc_id -> correo
+    for correo in correos:
+        correo_norm = normalizar_correo(correo)
+        if not correo_norm or correo_norm in resultado or correo_a_doc_id(correo_norm) in pendientes:
+            continue
+        data = None
+        if usuarios_cache:
+            data = usuarios_cache.get(correo_norm) or usuarios_cache.get(correo_a_doc_id(correo_norm))
+        if data is None:
+            data = _usuario_en_cache_proceso(correo_norm)
+        if data is None:
+            pendientes[correo_a_doc_id(correo_norm)] = correo_norm
+            continue
+        resultado[correo_norm] = _empresa_de_datos(data, correo_norm)
+
+    if pendientes:
+        encontrados: Dict[str, Dict[str, Any]] = {}
+        try:
+            db = db or get_db()
+            refs = [db.collection("usuarios").document(doc_id) for doc_id in pendientes]
+            for snap in db.get_all(refs):
+                if snap.exists:
+                    encontrados[snap.id] = snap.to_dict() or {}
+        except Exception:
+            pass
+        for doc_id, correo_norm in pendientes.items():
+            resultado[correo_norm] = _empresa_de_datos(encontrados.get(doc_id), correo_norm)
+    return resultado
+
+
 def usuario_es_motion(correo: str, usuarios_cache: Dict[str, Dict[str, Any]] | None = None) -> bool:
     return empresa_de_usuario(correo, usuarios_cache) == EMPRESA_MOTION
 
@@ -107,6 +163,9 @@ def usuario_activo(
                 data = usuarios_cache[key]
                 break
 
+    if data is None:
+        data = _usuario_en_cache_proceso(correo_norm)
+
     if data is None:
         data = _fetch_usuario_por_doc_id(correo_a_doc_id(correo_norm))
 
@@ -138,6 +197,9 @@ def set_usuario_activo(correo: str, activo: bool = True) -> None:
         db = get_db()
         doc_id = correo_a_doc_id(correo_norm)
         db.collection("usuarios").document(doc_id).set({"activo": bool(activo)}, merge=True)
+        from app_core.users_service import note_user_write
+
+        note_user_write(correo_norm, {"activo": bool(activo)})
     finally:
         _invalidate_usuario_cache()
 
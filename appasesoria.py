@@ -273,6 +273,8 @@ def _limpiar_estado_por_menu(menu_label: str | None) -> None:
 # 2) Soft login (usa el módulo que ya probaste)
 from soft_login_full import soft_login_barrier, soft_logout
 from inicio import inicio_deportista, SEGUIMIENTO_LABEL
+from app_core.cache import clear_cache, notify_write
+from app_core.data_access import clave_rutinas
 from app_core.theme import inject_theme
 # 3) Imports del resto de la app
 import json
@@ -442,7 +444,12 @@ with header:
             help="Actualizar datos y refrescar cachés",
             use_container_width=True,
         ):
-            st.cache_data.clear()
+            # Invalida solo las rutinas visibles para esta sesión; usuarios y ejercicios se mantienen al día por su cuenta
+            if rol in ("entrenador", "admin", "administrador"):
+                notify_write("rutinas_listado")
+                clear_cache("rutinas")
+            else:
+                notify_write("rutinas", clave_rutinas(st.session_state.get("correo", "")))
             st.rerun()
 
         if menu_actual != "Inicio":
@@ -10,6 +10,10 @@ from app_core.utils import (
     EMPRESA_DESCONOCIDA,
     correo_a_doc_id,
 )
+from app_core.cache import notify_write
+from app_core.clientes_index import depurar_cliente_sin_semanas, operacion_quitar_semanas
+from app_core.data_access import clave_rutinas
+from app_core.rollups_semanales import COLECCION_ROLLUPS
 
 # === INICIALIZAR FIREBASE con secretos ===
 if not firebase_admin._apps:
@@ -130,5 +134,15 @@ def borrar_rutinas():
             for (col_name, doc_id) in semanas[semana]:
                 batch.delete(db.collection(col_name).document(doc_id))
                 total_del += 1
+                if col_name == "rutinas_semanales":
+                    batch.delete(db.collection(COLECCION_ROLLUPS).document(doc_id))
+        op_indice = operacion_quitar_semanas(
+            db, raw_lower, [semana.replace("_", "-") for semana in semanas_seleccionadas]
+        )
+        if op_indice:
+            batch.set(op_indice.ref, op_indice.data, merge=True)
         batch.commit()
+        depurar_cliente_sin_semanas(db, raw_lower)
+        notify_write("rutinas", clave_rutinas(raw_lower))
+        notify_write("rutinas_listado")
         st.success(f"Se eliminaron {total_del} documento(s) de las semanas seleccionadas.")
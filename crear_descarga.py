@@ -7,16 +7,26 @@ from datetime import datetime
 import firebase_admin
 import json
 import copy
+from collections import ChainMap
+from types import MappingProxyType
+from typing import Mapping
 
 from app_core.utils import (
     EMPRESA_ASESORIA,
     EMPRESA_DESCONOCIDA,
     EMPRESA_MOTION,
-    correo_a_doc_id,
     empresa_de_usuario,
     usuario_activo,
 )
+from app_core.busqueda_ejercicios import LIMITE_SUGERENCIAS, obtener_indice
+from app_core.cache import clear_cache, notify_write
+from app_core.clientes_index import cargar_indice_clientes, operacion_registrar_semanas
+from app_core.data_access import clave_rutinas, rutina_semanal_por_id, rutinas_metadata
+from app_core.ejercicios_catalogo import catalogo_completo, guardar_ejercicio, version_catalogo
 from app_core.firebase_client import get_db
+from app_core.implementos import obtener_indice_implementos, resolver_id_implemento
+from app_core.rollups_semanales import operacion_rollup
+from app_core.users_service import get_users_map, list_users
 from app_core.video_utils import normalizar_link_youtube
 from servicio_catalogos import get_catalogos, add_item
 
@@ -84,28 +94,19 @@ def obtener_lista_ejercicios(data_dia):
     return []
 
 # =============== 📦 CARGAS (igual filosofía editor) ===============
-@st.cache_data(show_spinner=False)
-def cargar_ejercicios():
-    docs = db.collection("ejercicios").stream()
-    return { (d.to_dict() or {}).get("nombre",""): (d.to_dict() or {}) for d in docs if d.exists }
+_POR_NOMBRE: tuple[Mapping[str, dict] | None, Mapping[str, dict]] = (None, {})
+
+
+def cargar_ejercicios() -> ChainMap:
+    """Catálogo vigente por nombre (se rearma solo si cambió la copia del proceso); las altas de la corrida van en la primera capa."""
+    global _POR_NOMBRE
+    _, docs = catalogo_completo()
+    if _POR_NOMBRE[0] is not docs:
+        _POR_NOMBRE = (docs, MappingProxyType({data.get("nombre", ""): data for data in docs.values()}))
+    return ChainMap({}, _POR_NOMBRE[1])
 
-@st.cache_data(show_spinner=False)
 def cargar_usuarios():
-    docs = db.collection("usuarios").stream()
-    return [doc.to_dict() for doc in docs if doc.exists]
-
-@st.cache_data(show_spinner=False)
-def cargar_implementos():
-    impl = {}
-    for doc in db.collection("implementos").stream():
-        di = doc.to_dict() or {}
-        di["pesos"] = di.get("pesos", [])
-        impl[str(doc.id)] = di
-    return impl
-
-EJERCICIOS  = cargar_ejercicios()
-USUARIOS    = cargar_usuarios()
-IMPLEMENTOS = cargar_implementos()
+    return list_users()
 
 SECTION_BREAK_HTML = "<div style='height:0;margin:14px 0;'></div>"
 
@@ -222,46 +223,6 @@ def clamp_circuito_por_seccion(circ: str, seccion: str) -> str:
     return circ if circ in opciones else opciones[0]
 
 
-def _norm_text_admin(s: str) -> str:
-    s = str(s or "")
-    s = unicodedata.normalize("NFKD", s).encode("ASCII", "ignore").decode("utf-8")
-    s = re.sub(r"\\s+", " ", s).strip().casefold()
-    return s
-
-
-def _resolver_id_implemento(marca: str, maquina: str) -> str:
-    db_local = get_db()
-    marca_in = (marca or "").strip()
-    maquina_in = (maquina or "").strip()
-    if not marca_in or not maquina_in:
-        return ""
-
-    try:
-        q = (
-            db_local.collection("implementos")
-            .where("marca", "==", marca_in)
-            .where("maquina", "==", maquina_in)
-        )
-        hits = list(q.stream())
-        if len(hits) == 1:
-            return hits[0].id
-        if len(hits) >= 2:
-            return ""
-    except Exception:
-        pass
-
-    mkey, maqkey = _norm_text_admin(marca_in), _norm_text_admin(maquina_in)
-    try:
-        candidatos = []
-        for d in db_local.collection("implementos").limit(1000).stream():
-            data = d.to_dict() or {}
-            if _norm_text_admin(data.get("marca")) == mkey and _norm_text_admin(data.get("maquina")) == maqkey:
-                candidatos.append(d.id)
-        return candidatos[0] if len(candidatos) == 1 else ""
-    except Exception:
-        return ""
-
-
 ADMIN_ROLES = {"admin", "administrador", "owner"}
 
 
@@ -314,7 +275,7 @@ def guardar_ejercicio_firestore(nombre_final: str, payload_base: dict) -> None:
     meta.update(payload_base or {})
 
     doc_id = slug_nombre(nombre_final) if _es_admin else f"{slug_nombre(nombre_final)}__{_correo or 'sin_correo'}"
-    db_local.collection("ejercicios").document(doc_id).set(meta, merge=True)
+    guardar_ejercicio(db_local, doc_id, meta)
 
 def _ejercicio_firestore_a_fila_ui(ej: dict) -> dict:
     fila = {k: "" for k in COLUMNAS_TABLA}
@@ -663,7 +624,7 @@ def _render_tabla_manual(
         horizontal=True,
     )
 
-    ejercicios_dict = EJERCICIOS
+    ejercicios_dict = cargar_ejercicios()
 
     head_cols = st.columns([6.6, 1.1, 1.1, 1.1, 1.1, 1.6], gap="small")
     head_cols[0].markdown(f"<h4 class='h-accent' style='margin-top:2px'>{bloque_sel}</h4>", unsafe_allow_html=True)
@@ -741,7 +702,7 @@ def _render_tabla_manual(
                                     tipo = "otros_catalogos"
                                 add_item(tipo, valor_limpio)
                                 st.success(f"Agregado: {valor_limpio}")
-                                st.cache_data.clear()
+                                clear_cache("catalogos")
                                 st.rerun()
                     st.markdown("</div>", unsafe_allow_html=True)
                     return ""
@@ -783,15 +744,13 @@ def _render_tabla_manual(
 
             if marca and maquina:
                 try:
-                    implemento_id = _resolver_id_implemento(marca, maquina)
+                    indice_impl = obtener_indice_implementos()
+                    implemento_id = indice_impl.resolver_id(marca, maquina)
                     if implemento_id:
-                        snap = get_db().collection("implementos").document(str(implemento_id)).get()
-                        if snap.exists:
-                            data_impl = snap.to_dict() or {}
+                        data_impl = indice_impl.get(implemento_id)
+                        if data_impl:
                             st.success(f"Implemento detectado: ID **{implemento_id}** · {data_impl.get('marca','')} – {data_impl.get('maquina','')}")
-                            pesos = data_impl.get("pesos", [])
-                            if isinstance(pesos, dict):
-                                pesos = [v for _, v in sorted(pesos.items(), key=lambda kv: int(kv[0]))]
+                            pesos = data_impl["pesos"]
                             if pesos:
                                 st.caption("Pesos disponibles: " + ", ".join(str(p) for p in pesos))
                 except Exception:
@@ -822,7 +781,7 @@ def _render_tabla_manual(
                         if not nombre_final:
                             st.warning("⚠️ El campo 'nombre' es obligatorio (usa al menos Detalle/Máquina/Marca).")
                         else:
-                            id_impl_final = _resolver_id_implemento(marca, maquina) if (marca and maquina) else ""
+                            id_impl_final = resolver_id_implemento(marca, maquina) if (marca and maquina) else ""
                             payload = {
                                 "nombre": nombre_final,
                                 "marca": marca,
@@ -852,7 +811,7 @@ def _render_tabla_manual(
                                     "video": (video_url or "").strip(),
                                 }
                                 st.success(f"✅ Ejercicio '{nombre_final}' guardado correctamente")
-                                st.cache_data.clear()
+                                clear_cache("ejercicios")
                                 st.rerun()
                             except Exception as e:
                                 st.error(f"❌ Error al guardar: {e}")
@@ -907,16 +866,10 @@ def _render_tabla_manual(
         headers.pop(prog_idx)
         sizes.pop(prog_idx)
 
+    indice_busqueda = obtener_indice(ejercicios_dict, version=version_catalogo())
+
     def _buscar_fuzzy_local(palabra: str) -> list[str]:
-        if not palabra.strip():
-            return []
-        tokens = normalizar_texto(palabra).split()
-        res = []
-        for nombre in ejercicios_dict.keys():
-            nn = normalizar_texto(nombre)
-            if all(t in nn for t in tokens):
-                res.append(nombre)
-        return res
+        return indice_busqueda.buscar(palabra, limite=LIMITE_SUGERENCIAS)
 
     st.caption("Los cambios se guardan automáticamente.")
     header_cols = st.columns(sizes)
@@ -1042,12 +995,8 @@ def _render_tabla_manual(
             nombre_ej = fila.get("Ejercicio", "")
             ej_doc = ejercicios_dict.get(nombre_ej, {}) or {}
             id_impl = str(ej_doc.get("id_implemento", "") or "")
-            if id_impl and id_impl != "1" and id_impl in IMPLEMENTOS:
-                pesos_disponibles = IMPLEMENTOS[id_impl].get("pesos", []) or []
-                if isinstance(pesos_disponibles, dict):
-                    pesos_disponibles = [
-                        v for _, v in sorted(pesos_disponibles.items(), key=lambda kv: int(kv[0]))
-                    ]
+            if id_impl and id_impl != "1":
+                pesos_disponibles = obtener_indice_implementos().pesos(id_impl)
                 usar_text_input = not bool(pesos_disponibles)
         except Exception:
             usar_text_input = True
@@ -1353,20 +1302,14 @@ def descarga_rutina():
     st.title("📉 Crear Rutina de Descarga")
 
     # Mapear usuarios y filtrarlos según empresa
-    usuarios_map: dict[str, dict] = {}
-    for u in USUARIOS:
-        correo_u = (u.get("correo") or "").strip().lower()
-        if correo_u:
-            usuarios_map[correo_u] = u
-            usuarios_map[correo_a_doc_id(correo_u)] = u
+    usuarios_map = get_users_map()
 
     correo_login = (st.session_state.get("correo") or "").strip().lower()
     rol_login = (st.session_state.get("rol") or "").strip().lower()
     empresa_login = empresa_de_usuario(correo_login, usuarios_map) if correo_login else EMPRESA_DESCONOCIDA
 
     clientes_dict = {}
-    for doc in db.collection("rutinas_semanales").stream():
-        data = doc.to_dict() or {}
+    for data in cargar_indice_clientes():
         nombre = data.get("cliente")
         correo_cli = (data.get("correo") or "").strip().lower()
         if not nombre or not correo_cli:
@@ -1404,10 +1347,9 @@ def descarga_rutina():
 
     # Semanas del cliente
     semanas_dict = {}
-    for doc in db.collection("rutinas_semanales").where("correo","==",correo).stream():
-        data = doc.to_dict() or {}
+    for data in rutinas_metadata(correo=correo, campos=("fecha_lunes",)):
         f = data.get("fecha_lunes")
-        if f: semanas_dict[f] = doc.id
+        if f: semanas_dict[f] = data["_id"]
 
     if not semanas_dict:
         st.warning("❌ No hay rutinas para este cliente.")
@@ -1418,7 +1360,7 @@ def descarga_rutina():
     st.info(f"Última semana encontrada: **{ultima_semana}**")
 
     # Rutina base
-    doc_data = db.collection("rutinas_semanales").document(doc_id_semana).get().to_dict() or {}
+    doc_data = rutina_semanal_por_id(doc_id_semana) or {}
     rutina_original = doc_data.get("rutina", {}) or {}
     rutina_modificada = copy.deepcopy(rutina_original)
 
@@ -1499,7 +1441,19 @@ def descarga_rutina():
         nuevo_doc["rutina"] = rutina_modificada
         nuevo_doc["tipo"] = "descarga"
         nuevo_doc_id = f"{normalizar_correo(correo)}_{nueva_fecha.replace('-', '_')}"
-        db.collection("rutinas_semanales").document(nuevo_doc_id).set(nuevo_doc)
+        batch = db.batch()
+        batch.set(db.collection("rutinas_semanales").document(nuevo_doc_id), nuevo_doc)
+        op_indice = operacion_registrar_semanas(
+            db, correo, nuevo_doc.get("cliente", ""), nuevo_doc.get("entrenador", ""), [nueva_fecha]
+        )
+        if op_indice:
+            batch.set(op_indice.ref, op_indice.data, merge=True)
+        op_rollup = operacion_rollup(db, nuevo_doc_id, nuevo_doc)
+        if op_rollup:
+            batch.set(op_rollup.ref, op_rollup.data)
+        batch.commit()
+        notify_write("rutinas", clave_rutinas(correo))
+        notify_write("rutinas_listado")
         st.success(f"✅ Rutina de descarga creada para la semana {nueva_fecha}")
 
 # Multipage
@@ -2,10 +2,12 @@
 import streamlit as st
 import unicodedata
 from datetime import date, timedelta, datetime, timezone
+import numpy as np
 import pandas as pd
 import uuid
+from collections import ChainMap
 # Agente de sugerencias de pesos
-from agente_rutinas import agente_sugerencia_rutina
+from agente_rutinas import agente_sugerencias_rutina
 # Catálogos para caracteristica / patrón / grupo
 from servicio_catalogos import get_catalogos, add_item
 from firebase_admin import firestore
@@ -46,15 +48,19 @@ LIGHT = dict(
 )
 
 
-from app_core.cache import cache_data, clear_cache
+from app_core.busqueda_ejercicios import LIMITE_SUGERENCIAS, obtener_indice
+from app_core.cache import clear_cache
+from app_core.carga_entrenamiento import distribucion_ponderada, series_a_enteros
+from app_core.ejercicios_catalogo import cargar_ejercicios_filtrados, guardar_ejercicio, version_catalogo
 from app_core.firebase_client import get_db
+from app_core.implementos import obtener_indice_implementos, resolver_id_implemento
 from app_core.theme import inject_theme
+from app_core.users_service import get_users_map, list_users
 from app_core.video_utils import normalizar_link_youtube as _normalizar_link_youtube
 from app_core.utils import (
     EMPRESA_ASESORIA,
     EMPRESA_DESCONOCIDA,
     EMPRESA_MOTION,
-    correo_a_doc_id,
     empresa_de_usuario,
     usuario_activo,
 )
@@ -195,53 +201,8 @@ def clamp_circuito_por_seccion(circ: str, seccion: str) -> str:
             return opt
     return opciones[0]
 
-# === Helpers para detectar implemento por Marca + Máquina (mismo criterio que admin) ===
 import re as _re_mod
 
-def _norm_text_admin(s: str) -> str:
-    """Normaliza para comparar: sin acentos, trim, casefold (igual a admin)."""
-    import unicodedata
-    s = str(s or "")
-    s = unicodedata.normalize("NFKD", s).encode("ASCII", "ignore").decode("utf-8")
-    s = _re_mod.sub(r"\s+", " ", s).strip().casefold()
-    return s
-
-def _resolver_id_implemento(marca: str, maquina: str) -> str:
-    """
-    Devuelve el id_implemento si hay match único por marca+máquina en 'implementos'.
-    Si no hay o es ambiguo, retorna ''.
-    """
-    db = get_db()
-    marca_in = (marca or "").strip()
-    maquina_in = (maquina or "").strip()
-    if not marca_in or not maquina_in:
-        return ""
-
-    # 1) Intento exacto
-    try:
-        q = (db.collection("implementos")
-                .where("marca", "==", marca_in)
-                .where("maquina", "==", maquina_in))
-        hits = list(q.stream())
-        if len(hits) == 1:
-            return hits[0].id
-        elif len(hits) >= 2:
-            return ""  # ambiguo
-    except Exception:
-        pass
-
-    # 2) Fallback normalizado (memoria)
-    mkey, maqkey = _norm_text_admin(marca_in), _norm_text_admin(maquina_in)
-    try:
-        candidatos = []
-        for d in db.collection("implementos").limit(1000).stream():
-            data = d.to_dict() or {}
-            if _norm_text_admin(data.get("marca")) == mkey and _norm_text_admin(data.get("maquina")) == maqkey:
-                candidatos.append(d.id)
-        return candidatos[0] if len(candidatos) == 1 else ""
-    except Exception:
-        return ""
-
 _VIDEO_URL_REGEX = _re_mod.compile(r"(https?://[^\s]+)", _re_mod.IGNORECASE)
 
 def _extraer_video_desde_detalle(texto: str) -> str:
@@ -289,7 +250,7 @@ def _guardar_video_en_ejercicio_si_falta(nombre_ejercicio: str, video_url: str,
     if doc_id:
         try:
             db = get_db()
-            db.collection("ejercicios").document(doc_id).update({"video": video_url, "Video": video_url})
+            guardar_ejercicio(db, doc_id, {"video": video_url, "Video": video_url}, actualizar=True)
         except Exception as exc:
             st.warning(f"No se pudo guardar el video del ejercicio '{nombre_ejercicio}': {exc}")
             _marcar_video_guardado(nombre_ejercicio, video_url)
@@ -374,169 +335,31 @@ def guardar_ejercicio_firestore(nombre_final: str, payload_base: dict) -> None:
     meta.update(payload_base or {})
 
     doc_id = slug_nombre(nombre_final) if _es_admin else f"{slug_nombre(nombre_final)}__{_correo or 'sin_correo'}"
-    db.collection("ejercicios").document(doc_id).set(meta, merge=True)
-
-@cache_data("ejercicios", show_spinner=False)
-def _cargar_ejercicios_cached(correo_usuario: str, rol: str):
-    db = get_db()
-    correo_usuario = (correo_usuario or "").strip().lower()
-    rol = (rol or "").strip()
-    rol_lower = rol.lower()
-    es_admin = rol_lower in {r.lower() for r in ADMIN_ROLES}
-    empresa_usuario = empresa_de_usuario(correo_usuario) if correo_usuario else ""
-
-    def _store(target: dict[str, dict], doc_id: str, data: dict) -> None:
-        nombre = (data.get("nombre") or "").strip()
-        if not nombre:
-            return
-        enriched = dict(data)
-        if doc_id:
-            enriched["_doc_id"] = doc_id
-        if "video" not in enriched and "Video" in enriched:
-            enriched["video"] = enriched.get("Video", "")
-        if "Video" not in enriched and "video" in enriched:
-            enriched["Video"] = enriched.get("video", "")
-
-        video_normalizado = _normalizar_link_youtube(enriched.get("video", ""))
-        if video_normalizado:
-            enriched["video"] = video_normalizado
-            enriched["Video"] = video_normalizado
-        else:
-            enriched["video"] = ""
-            enriched["Video"] = ""
-        target[nombre] = enriched
+    guardar_ejercicio(db, doc_id, meta)
 
-    ejercicios_por_nombre: dict[str, dict] = {}
-    try:
-        if es_admin:
-            for doc in db.collection("ejercicios").stream():
-                if not doc.exists:
-                    continue
-                data = doc.to_dict() or {}
-                _store(ejercicios_por_nombre, doc.id, data)
-        else:
-            empresa_cache: dict[str, str] = {}
+def _con_video_normalizado(data: dict) -> dict:
+    enriched = dict(data)
+    video_normalizado = _normalizar_link_youtube(enriched.get("video", ""))
+    enriched["video"] = video_normalizado or ""
+    enriched["Video"] = video_normalizado or ""
+    return enriched
 
-            def _empresa_de_creador(correo_creador: str) -> str:
-                correo_creador = (correo_creador or "").strip().lower()
-                if not correo_creador:
-                    return ""
-                if correo_creador not in empresa_cache:
-                    try:
-                        empresa_cache[correo_creador] = empresa_de_usuario(correo_creador)
-                    except Exception:
-                        empresa_cache[correo_creador] = ""
-                return empresa_cache[correo_creador]
 
-            publicos: dict[str, dict] = {}
-            personales: dict[str, dict] = {}
-            compartidos: dict[str, dict] = {}
-
-            if empresa_usuario == EMPRESA_MOTION:
-                for doc in db.collection("ejercicios").stream():
-                    if not doc.exists:
-                        continue
-                    data = doc.to_dict() or {}
-                    if not data:
-                        continue
-                    nombre = (data.get("nombre") or "").strip()
-                    if not nombre:
-                        continue
-                    es_publico = bool(data.get("publico"))
-                    creador = (data.get("entrenador") or "").strip().lower()
-
-                    if es_publico:
-                        _store(publicos, doc.id, data)
-                        continue
-
-                    if creador and creador == correo_usuario:
-                        _store(personales, doc.id, data)
-                        continue
-
-                    empresa_doc = (data.get("empresa_propietaria") or "").strip().lower()
-                    if not empresa_doc:
-                        empresa_doc = _empresa_de_creador(creador)
-
-                    if empresa_doc == EMPRESA_MOTION:
-                        _store(compartidos, doc.id, data)
-                ejercicios_por_nombre.update(publicos)
-                ejercicios_por_nombre.update(compartidos)
-                ejercicios_por_nombre.update(personales)
-            else:
-                for doc in db.collection("ejercicios").where("publico", "==", True).stream():
-                    if not doc.exists:
-                        continue
-                    data = doc.to_dict() or {}
-                    _store(publicos, doc.id, data)
-                if correo_usuario:
-                    for doc in db.collection("ejercicios").where("entrenador", "==", correo_usuario).stream():
-                        if not doc.exists:
-                            continue
-                        data = doc.to_dict() or {}
-                        _store(personales, doc.id, data)
-                        publicos.pop((data.get("nombre") or "").strip(), None)
-                ejercicios_por_nombre.update(publicos)
-                ejercicios_por_nombre.update(personales)
-    except Exception as e:
-        st.error(f"Error cargando ejercicios: {e}")
-    return ejercicios_por_nombre
-
-
-def cargar_ejercicios():
+def cargar_ejercicios() -> ChainMap:
+    """Catálogo visible para el usuario con el video normalizado a link de YouTube; las altas locales quedan en la primera capa."""
     correo_usuario = (st.session_state.get("correo") or "").strip().lower()
     rol = (st.session_state.get("rol") or "").strip()
-    return _cargar_ejercicios_cached(correo_usuario, rol)
+    return ChainMap({}, cargar_ejercicios_filtrados(correo_usuario, rol).con_transformacion(_con_video_normalizado))
 
-@cache_data("usuarios", show_spinner=False)
 def cargar_usuarios():
-    db = get_db()
-    docs = db.collection("usuarios").stream()
-    return [doc.to_dict() for doc in docs if doc.exists]
+    return list_users()
 
-@cache_data("implementos", show_spinner=False)
 def cargar_implementos():
-    db = get_db()
-    impl = {}
-    for doc in db.collection("implementos").stream():
-        d = doc.to_dict() or {}
-        d["pesos"] = d.get("pesos", [])
-        impl[str(doc.id)] = d
-    return impl
+    return obtener_indice_implementos().como_dict()
 
 DESCANSO_OPCIONES = ["", "1", "2", "3", "4", "5"]
 
 
-class _FuzzyIndex:
-    def __init__(self, ejercicios: dict[str, dict]):
-        self._entries: list[tuple[str, str]] = []
-        for nombre, data in ejercicios.items():
-            norm = normalizar_texto(nombre)
-            slug = normalizar_texto((data or {}).get("buscable_id") or slug_nombre(nombre))
-            extra_text = f"{norm} {slug}".strip()
-            if not extra_text:
-                continue
-            self._entries.append((nombre, extra_text))
-
-    def search(self, consulta: str) -> list[str]:
-        norm = normalizar_texto(consulta)
-        if not norm:
-            return []
-        resultados: list[str] = []
-        for nombre, extra_text in self._entries:
-            if norm in extra_text:
-                resultados.append(nombre)
-        return resultados
-
-def _get_fuzzy_index(ejercicios_dict: dict[str, dict]) -> _FuzzyIndex:
-    """Devuelve un índice reusable, regenerándolo sólo si cambia el catálogo."""
-    cache = st.session_state.get("_fuzzy_index_cache")
-    claves = tuple(sorted(ejercicios_dict.keys()))
-    if cache and cache.get("claves") == claves:
-        return cache["index"]
-    index = _FuzzyIndex(ejercicios_dict)
-    st.session_state["_fuzzy_index_cache"] = {"claves": claves, "index": index}
-    return index
-
 def _ensure_len(lista: list[dict], n: int, plantilla: dict):
     if n < 0: n = 0
     while len(lista) < n: lista.append({k: "" for k in plantilla})
@@ -1046,12 +869,7 @@ def crear_rutinas():
     usuarios = cargar_usuarios()
 
     correo_login = (st.session_state.get("correo") or "").strip().lower()
-    usuarios_map: dict[str, dict] = {}
-    for u in usuarios:
-        correo_u = (u.get("correo") or "").strip().lower()
-        if correo_u:
-            usuarios_map[correo_u] = u
-            usuarios_map[correo_a_doc_id(correo_u)] = u
+    usuarios_map = get_users_map()
 
     def _es_cliente_activo(user: dict) -> bool:
         correo_u = (user.get("correo") or "").strip().lower()
@@ -1586,20 +1404,13 @@ def crear_rutinas():
                     id_impl_preview = ""
                     if marca and maquina:
                         try:
-                            # usa tu helper si lo tienes; si no, pega el helper del bloque 2
-                            id_impl_preview = _resolver_id_implemento(marca, maquina)
+                            indice_impl = obtener_indice_implementos()
+                            id_impl_preview = indice_impl.resolver_id(marca, maquina)
                             if id_impl_preview:
-                                snap_impl = get_db().collection("implementos").document(str(id_impl_preview)).get()
-                                if snap_impl.exists:
-                                    data_impl = snap_impl.to_dict() or {}
+                                data_impl = indice_impl.get(id_impl_preview)
+                                if data_impl:
                                     st.success(f"Implemento detectado: ID **{id_impl_preview}** · {data_impl.get('marca','')} – {data_impl.get('maquina','')}")
-                                    pesos = data_impl.get("pesos", [])
-                                    if isinstance(pesos, dict):
-                                        pesos_list = [v for _, v in sorted(pesos.items(), key=lambda kv: int(kv[0]))]
-                                    elif isinstance(pesos, list):
-                                        pesos_list = pesos
-                                    else:
-                                        pesos_list = []
+                                    pesos_list = data_impl["pesos"]
                                     if pesos_list:
                                         st.caption("Pesos disponibles (preview): " + ", ".join(str(p) for p in pesos_list))
                         except Exception:
@@ -1628,7 +1439,7 @@ def crear_rutinas():
                                 if not nombre_final:
                                     st.warning("⚠️ El campo 'nombre' es obligatorio (usa al menos Detalle/Máquina/Marca).")
                                 else:
-                                    id_impl_final = _resolver_id_implemento(marca, maquina) if (marca and maquina) else ""
+                                    id_impl_final = resolver_id_implemento(marca, maquina) if (marca and maquina) else ""
 
                                     payload = {
                                         "nombre": nombre_final,
@@ -1731,7 +1542,7 @@ def crear_rutinas():
                 filas_para_copiar: list[tuple[int, dict]]
                 filas_para_copiar = []
                 pendientes_sugerencia: list[dict] = []
-                fuzzy_index = _get_fuzzy_index(ejercicios_dict)
+                fuzzy_index = obtener_indice(ejercicios_dict, version=version_catalogo())
                 pending_pesos = st.session_state.get("_pending_pesos", {})
                 popover_key = f"_popover_sugerencias_{key_seccion}"
                 applied_pesos: set[str] = set()
@@ -1779,7 +1590,7 @@ def crear_rutinas():
                             return []
                         cached = search_cache.get(norm_txt)
                         if cached is None:
-                            base = fuzzy_index.search(query)
+                            base = fuzzy_index.buscar(query, limite=LIMITE_SUGERENCIAS)
                             if len(search_cache) >= 50:
                                 search_cache.clear()
                             search_cache[norm_txt] = tuple(base)
@@ -2157,33 +1968,38 @@ def crear_rutinas():
                             with st.spinner("Consultando KEPE para pesos vacíos..."):
                                 pending_updates = dict(st.session_state.get("_pending_pesos", {}))
                                 resumen_pop = []
+                                consultas = []
                                 for pend in pendientes_sugerencia:
                                     pct_raw = pend.get("porcentaje")
                                     try:
                                         pct_val = float(str(pct_raw).replace(",", ".")) if pct_raw not in (None, "") else None
                                     except Exception:
                                         pct_val = None
-                                    try:
-                                        res = agente_sugerencia_rutina(
-                                            correo_cliente=correo_cli,
-                                            nombre_ejercicio=pend["nombre"],
-                                            fecha_semana_actual=fecha_str,
-                                            porcentaje_objetivo=pct_val,
-                                        )
-                                        peso_sug = res.get("peso_sugerido")
-                                        if peso_sug not in (None, ""):
-                                            pending_updates[pend["peso_key"]] = str(peso_sug)
-                                            completados += 1
-                                        resumen_pop.append({
-                                            "nombre": pend["nombre"],
-                                            "peso": res.get("peso_sugerido", "—"),
-                                            "reps": res.get("reps_sugeridas", "—"),
-                                            "rir": res.get("rir_sugerido", "—"),
-                                            "porcentaje": res.get("porcentaje_usado", "—"),
-                                            "comentario": res.get("comentario", ""),
-                                        })
-                                    except Exception as exc:
-                                        st.warning(f"No se pudo sugerir para {pend['nombre']}: {exc}")
+                                    consultas.append({"nombre": pend["nombre"], "porcentaje": pct_val})
+                                try:
+                                    respuestas = agente_sugerencias_rutina(
+                                        correo_cliente=correo_cli,
+                                        ejercicios=consultas,
+                                        fecha_semana_actual=fecha_str,
+                                    )
+                                except Exception as exc:
+                                    respuestas = [{"error": str(exc)}] * len(pendientes_sugerencia)
+                                for pend, res in zip(pendientes_sugerencia, respuestas):
+                                    if res.get("error"):
+                                        st.warning(f"No se pudo sugerir para {pend['nombre']}: {res['error']}")
+                                        continue
+                                    peso_sug = res.get("peso_sugerido")
+                                    if peso_sug not in (None, ""):
+                                        pending_updates[pend["peso_key"]] = str(peso_sug)
+                                        completados += 1
+                                    resumen_pop.append({
+                                        "nombre": pend["nombre"],
+                                        "peso": res.get("peso_sugerido", "—"),
+                                        "reps": res.get("reps_sugeridas", "—"),
+                                        "rir": res.get("rir_sugerido", "—"),
+                                        "porcentaje": res.get("porcentaje_usado", "—"),
+                                        "comentario": res.get("comentario", ""),
+                                    })
                             if completados:
                                 st.success(f"Pesos sugeridos para {completados} ejercicio(s).")
                                 st.session_state["_pending_pesos"] = pending_updates
@@ -2394,30 +2210,6 @@ def crear_rutinas():
     
         st.markdown("</div>", unsafe_allow_html=True)
     
-    # Helpers locales
-    def _to_int_series(v) -> int:
-        s = str(v or "").strip()
-        # permite cosas tipo "4", "4.0" o "4 series"
-        try:
-            # si viene "x-y", toma el primer número
-            if "-" in s:
-                s = s.split("-", 1)[0].strip()
-            s = s.replace(",", ".")
-            return int(float(s))
-        except:
-            return 0
-    
-    def _add_valor(acum_dict, nombres_dict, cat_raw, val):
-        cat_norm = normalizar_texto(str(cat_raw))
-        if not cat_norm:
-            return
-        if cat_norm in acum_dict:
-            acum_dict[cat_norm] += float(val)
-            nombres_dict[cat_norm].add(cat_raw)
-        else:
-            acum_dict[cat_norm] = float(val)
-            nombres_dict[cat_norm] = {cat_raw}
-    
     # Carga catálogo de ejercicios
     ejercicios_dict = cargar_ejercicios()
     ejercicios_por_norm: dict[str, tuple[str | None, dict]] = {}
@@ -2436,82 +2228,69 @@ def crear_rutinas():
         if incluir_warmup and k.startswith("rutina_dia_") and k.endswith("_Warm_Up"):
             secciones_consideradas.append((k, float(peso_warmup)))
     
-    # Acumuladores
-    contador_valor = {}     # categoria_norm -> series acumuladas (float)
-    nombres_originales = {} # categoria_norm -> {nombres originales}
-    ejercicios_sin_grupo: dict[str, dict] = {}
-    
-    # Recorrido
+    # Filas de las secciones (una pasada) y conversión de series por columna
+    nombres_fila: list[str] = []
+    series_fila: list = []
+    pesos_fila: list[float] = []
     for key_seccion, peso_seccion in secciones_consideradas:
-        ejercicios = st.session_state.get(key_seccion, []) or []
-        for ej in ejercicios:
-            nombre_raw = str(ej.get("Ejercicio", "")).strip()
-            if not nombre_raw:
-                continue
-    
-            # series del ejercicio (entero)
-            series_val = _to_int_series(ej.get("Series", ""))
-            if series_val <= 0:
-                continue
-    
-            # busca metadatos del ejercicio
-            norm_nombre = normalizar_texto(nombre_raw)
-            nombre_catalogo, meta = ejercicios_por_norm.get(norm_nombre, (None, {}))
+        for ej in st.session_state.get(key_seccion, []) or []:
+            nombres_fila.append(str(ej.get("Ejercicio", "")).strip())
+            series_fila.append(ej.get("Series", ""))
+            pesos_fila.append(peso_seccion)
+    series_arr = series_a_enteros(series_fila)
+    norm_por_nombre = {n: normalizar_texto(n) for n in set(nombres_fila) if n}
+    validas = [i for i, n in enumerate(nombres_fila) if n and series_arr[i] > 0]
+    claves_fila = [norm_por_nombre[nombres_fila[i]] for i in validas]
+
+    # Metadatos por ejercicio único (no por fila)
+    principal_por_clave: dict[str, str] = {}
+    secundarios_por_clave: dict[str, list[str]] = {}
+    ejercicios_sin_grupo: dict[str, dict] = {}
+    for i in validas:
+        nombre_raw = nombres_fila[i]
+        norm_nombre = norm_por_nombre[nombre_raw]
+        if norm_nombre in principal_por_clave:
+            continue
+        nombre_catalogo, meta = ejercicios_por_norm.get(norm_nombre, (None, {}))
+        if opcion_categoria == "patron_de_movimiento":
+            principal_por_clave[norm_nombre] = meta.get("patron_de_movimiento") or "(sin dato)"
+            continue
+        categoria = meta.get("grupo_muscular_principal") or meta.get("grupo_muscular") or "(sin dato)"
+        principal_por_clave[norm_nombre] = categoria
+        if categoria == "(sin dato)":
             doc_id_meta = str(meta.get("_doc_id") or "")
-            grupo_principal_actual = (meta.get("grupo_muscular_principal") or meta.get("grupo_muscular") or "").strip()
-            grupo_secundario_actual = meta.get("grupo_muscular_secundario")
-    
-            # distribución por categoría
-            if opcion_categoria == "patron_de_movimiento":
-                categoria = meta.get("patron_de_movimiento") or "(sin dato)"
-                _add_valor(contador_valor, nombres_originales, categoria, series_val * peso_seccion)
-    
-            elif opcion_categoria == "grupo_muscular_principal":
-                categoria = meta.get("grupo_muscular_principal") or meta.get("grupo_muscular") or "(sin dato)"
-                _add_valor(contador_valor, nombres_originales, categoria, series_val * peso_seccion)
-                if es_categoria_grupo and categoria == "(sin dato)":
-                    key_store = f"doc::{doc_id_meta}" if doc_id_meta else f"nombre::{norm_nombre}"
-                    if key_store not in ejercicios_sin_grupo:
-                        ejercicios_sin_grupo[key_store] = {
-                            "doc_id": doc_id_meta,
-                            "nombre_catalogo": nombre_catalogo or nombre_raw,
-                            "nombre_display": nombre_raw,
-                            "grupo_principal_actual": grupo_principal_actual,
-                            "grupo_secundario_actual": grupo_secundario_actual,
-                            "actualizable": bool(doc_id_meta),
-                        }
-    
-            else:  # "grupo_muscular (prim+sec)"
-                # Principal: suma completo
-                cat_p = meta.get("grupo_muscular_principal") or meta.get("grupo_muscular") or "(sin dato)"
-                _add_valor(contador_valor, nombres_originales, cat_p, series_val * peso_seccion)
-                if es_categoria_grupo and cat_p == "(sin dato)":
-                    key_store = f"doc::{doc_id_meta}" if doc_id_meta else f"nombre::{norm_nombre}"
-                    if key_store not in ejercicios_sin_grupo:
-                        ejercicios_sin_grupo[key_store] = {
-                            "doc_id": doc_id_meta,
-                            "nombre_catalogo": nombre_catalogo or nombre_raw,
-                            "nombre_display": nombre_raw,
-                            "grupo_principal_actual": grupo_principal_actual,
-                            "grupo_secundario_actual": grupo_secundario_actual,
-                            "actualizable": bool(doc_id_meta),
-                        }
-    
-                # Secundarios: reparte ponderación
-                secundarios_raw = meta.get("grupo_muscular_secundario") or ""
-                if isinstance(sem_sec := secundarios_raw, str):
-                    sec_list = [s.strip() for s in sem_sec.split(",") if s.strip()]
-                elif isinstance(sem_sec, list):
-                    sec_list = [str(s).strip() for s in sem_sec if str(s).strip()]
-                elif isinstance(sem_sec, dict):
-                    sec_list = [str(v).strip() for _, v in sem_sec.items() if str(v).strip()]
-                else:
-                    sec_list = []
-    
-                if sec_list and peso_secundario > 0:
-                    por_sec = (float(peso_secundario) * float(peso_seccion)) / float(len(sec_list))
-                    for cat_s in sec_list:
-                        _add_valor(contador_valor, nombres_originales, cat_s, series_val * por_sec)
+            key_store = f"doc::{doc_id_meta}" if doc_id_meta else f"nombre::{norm_nombre}"
+            if key_store not in ejercicios_sin_grupo:
+                ejercicios_sin_grupo[key_store] = {
+                    "doc_id": doc_id_meta,
+                    "nombre_catalogo": nombre_catalogo or nombre_raw,
+                    "nombre_display": nombre_raw,
+                    "grupo_principal_actual": (meta.get("grupo_muscular_principal") or meta.get("grupo_muscular") or "").strip(),
+                    "grupo_secundario_actual": meta.get("grupo_muscular_secundario"),
+                    "actualizable": bool(doc_id_meta),
+                }
+        if opcion_categoria == "grupo_muscular (prim+sec)":
+            sem_sec = meta.get("grupo_muscular_secundario") or ""
+            if isinstance(sem_sec, str):
+                sec_list = [s.strip() for s in sem_sec.split(",") if s.strip()]
+            elif isinstance(sem_sec, list):
+                sec_list = [str(s).strip() for s in sem_sec if str(s).strip()]
+            elif isinstance(sem_sec, dict):
+                sec_list = [str(v).strip() for _, v in sem_sec.items() if str(v).strip()]
+            else:
+                sec_list = []
+            secundarios_por_clave[norm_nombre] = sec_list
+
+    # Acumulado vectorizado: categoria_norm -> series, y categoria_norm -> {nombres originales}
+    contador_valor, nombres_originales = distribucion_ponderada(
+        claves_fila,
+        series_arr[validas],
+        np.asarray(pesos_fila, dtype=float)[validas],
+        principal_por_clave,
+        secundarios_por_clave,
+        float(peso_secundario),
+        normalizar=normalizar_texto,
+    )
     
     # Render resultados
     analysis_results = st.container()
@@ -2627,12 +2406,15 @@ def crear_rutinas():
                 }
     
                 try:
-                    db.collection("ejercicios").document(item["doc_id"]).set(payload_update, merge=True)
+                    guardar_ejercicio(db, item["doc_id"], payload_update)
                     dict_key = item.get("nombre_catalogo")
                     if dict_key and dict_key in ejercicios_dict:
-                        ejercicios_dict[dict_key]["grupo_muscular_principal"] = primary_clean
-                        ejercicios_dict[dict_key]["grupo_muscular"] = primary_clean
-                        ejercicios_dict[dict_key]["grupo_muscular_secundario"] = secondary_clean
+                        ejercicios_dict[dict_key] = {
+                            **ejercicios_dict[dict_key],
+                            "grupo_muscular_principal": primary_clean,
+                            "grupo_muscular": primary_clean,
+                            "grupo_muscular_secundario": secondary_clean,
+                        }
                     actualizados += 1
                 except Exception as exc:
                     errores.append(f"{item.get('nombre_catalogo') or item.get('nombre_display')}: {exc}")
@@ -3,16 +3,24 @@ from __future__ import annotations
 import copy
 import re
 import unicodedata
-from collections import defaultdict
+from collections import ChainMap, defaultdict
 from datetime import datetime
 import pandas as pd
 import streamlit as st
 from firebase_admin import firestore
 
-from app_core.ejercicios_catalogo import obtener_ejercicios_disponibles
+from app_core.batch_writes import OperacionLote, documentos_fallidos, escribir_en_lotes
+from app_core.busqueda_ejercicios import LIMITE_SUGERENCIAS, obtener_indice
+from app_core.cache import clear_cache, notify_write
+from app_core.clientes_index import cargar_indice_clientes
+from app_core.data_access import clave_rutinas_de_doc
+from app_core.ejercicios_catalogo import guardar_ejercicio, obtener_ejercicios_disponibles, version_catalogo
 from app_core.firebase_client import get_db
-from app_core.email_notifications import enviar_correo_rutina_disponible
+from app_core.implementos import obtener_indice_implementos, resolver_id_implemento
+from app_core.outbox import encolar_correo_rutina_disponible
+from app_core.rollups_semanales import operacion_rollup
 from app_core.theme import inject_theme
+from app_core.users_service import get_users_map, list_users
 from app_core.video_utils import (
     normalizar_link_youtube as _normalizar_link_youtube,
     normalizar_video_url as _normalizar_video_url,
@@ -21,7 +29,6 @@ from app_core.utils import (
     EMPRESA_ASESORIA,
     EMPRESA_DESCONOCIDA,
     EMPRESA_MOTION,
-    correo_a_doc_id,
     empresa_de_usuario,
     usuario_activo,
 )
@@ -146,11 +153,9 @@ def _candidatos_locales_por_slug(slug: str) -> list[dict]:
     global EJERCICIOS
     if not slug:
         return []
-    catalogo_local = EJERCICIOS or {}
+    catalogo_local = EJERCICIOS
     if not catalogo_local:
-        catalogo_local = _refrescar_catalogo()
-        if isinstance(catalogo_local, dict):
-            EJERCICIOS.update(catalogo_local)
+        catalogo_local = EJERCICIOS = _refrescar_catalogo()
     coincidencias: list[dict] = []
     for nombre, data in catalogo_local.items():
         if _buscable_id(nombre) != slug:
@@ -199,12 +204,6 @@ def _video_catalogo_para_nombre(db, nombre: str, correo_entrenador: str) -> tupl
     return mejor_video, mejor_doc
 
 
-def _norm_text_admin(valor: str) -> str:
-    raw = str(valor or "")
-    raw = unicodedata.normalize("NFKD", raw).encode("ASCII", "ignore").decode("utf-8")
-    return re.sub(r"\s+", " ", raw).strip().casefold()
-
-
 def clamp_circuito_por_seccion(valor: str, seccion: str) -> str:
     opciones = ["A", "B", "C"] if (seccion or "").strip().lower() == "warm up" else list("DEFGHIJKL")
     return valor if valor in opciones else opciones[0]
@@ -218,37 +217,6 @@ def tiene_video(nombre: str, ejercicios_dict: dict) -> bool:
     return bool(_video_de_catalogo(nombre) or (ejercicios_dict.get(nombre, {}) or {}).get("video"))
 
 
-def _resolver_id_implemento(marca: str, maquina: str) -> str:
-    db = get_db()
-    marca_in, maquina_in = (marca or "").strip(), (maquina or "").strip()
-    if not marca_in or not maquina_in:
-        return ""
-    try:
-        consulta = (
-            db.collection("implementos")
-            .where("marca", "==", marca_in)
-            .where("maquina", "==", maquina_in)
-        )
-        hits = list(consulta.stream())
-        if len(hits) == 1:
-            return hits[0].id
-        if len(hits) >= 2:
-            return ""
-    except Exception:
-        pass
-
-    clave_marca, clave_maquina = _norm_text_admin(marca_in), _norm_text_admin(maquina_in)
-    try:
-        candidatos: list[str] = []
-        for doc in db.collection("implementos").limit(1000).stream():
-            data = doc.to_dict() or {}
-            if _norm_text_admin(data.get("marca")) == clave_marca and _norm_text_admin(data.get("maquina")) == clave_maquina:
-                candidatos.append(doc.id)
-        return candidatos[0] if len(candidatos) == 1 else ""
-    except Exception:
-        return ""
-
-
 CARDIO_FIELDS = (
     "tipo",
     "modalidad",
@@ -375,34 +343,20 @@ def guardar_ejercicio_firestore(nombre_final: str, payload_base: dict) -> None:
         if admin_flag
         else f"{normalizar_texto(nombre_final).replace(' ', '_')}__{correo or 'sin_correo'}"
     )
-    db.collection("ejercicios").document(doc_id).set(meta, merge=True)
+    guardar_ejercicio(db, doc_id, meta)
 
 
 # ===================== 📦 CACHE =====================
-@st.cache_data(show_spinner=False)
 def cargar_usuarios():
-    db = get_db()
-    return [doc.to_dict() for doc in db.collection("usuarios").stream() if doc.exists]
-
-
-@st.cache_data(show_spinner=False)
-def cargar_implementos():
-    db = get_db()
-    impl: dict[str, dict] = {}
-    for doc in db.collection("implementos").stream():
-        data = doc.to_dict() or {}
-        data["pesos"] = data.get("pesos", [])
-        impl[str(doc.id)] = data
-    return impl
+    return list_users()
 
 
-def _refrescar_catalogo() -> dict[str, dict]:
-    return obtener_ejercicios_disponibles()
+def _refrescar_catalogo() -> ChainMap:
+    """Vista compartida del catálogo con una capa local para los ejercicios creados en esta sesión."""
+    return ChainMap({}, obtener_ejercicios_disponibles())
 
 
-EJERCICIOS: dict[str, dict] = {}
-USUARIOS = cargar_usuarios()
-IMPLEMENTOS = cargar_implementos()
+EJERCICIOS: ChainMap | dict[str, dict] = {}
 
 
 def obtener_lista_ejercicios(data_dia):
@@ -790,6 +744,7 @@ def _completar_videos_rutina(
     except Exception as exc:
         st.error(f"No pude actualizar los videos en Firestore: {exc}")
         return 0
+    notify_write("rutinas", clave_rutinas_de_doc(doc_id))
     return total
 
 
@@ -872,6 +827,7 @@ def _reemplazar_videos_inconsistentes(
     except Exception as exc:
         st.error(f"No se pudo actualizar los videos en la rutina: {exc}")
         return 0
+    notify_write("rutinas", clave_rutinas_de_doc(doc_id))
     return total
 
 
@@ -1137,6 +1093,49 @@ def _fusionar_con_reportes_existentes(ejercicios_originales, ejercicios_nuevos:
     return fusionados
 
 
+MAX_REINTENTOS_GUARDADO = 3
+
+
+def _diff_documento(
+    data: dict,
+    dias_originales: list[str],
+    rutina_actualizada: dict[str, list[dict]],
+    cardio_actualizado: dict[str, dict],
+    objetivo_actualizado: str | None,
+) -> tuple[dict, dict]:
+    """
+    Compara lo editado con el doc cargado y devuelve (updates por field path, rutina/cardio resultantes).
+    Solo aparecen los días que cambiaron (`rutina.3`, `cardio.2`); sin cambios, `updates` queda vacío.
+    """
+    rutina_actual = data.get("rutina", {}) or {}
+    cardio_actual = data.get("cardio", {}) or {}
+    nueva_rutina = dict(rutina_actual)
+    nuevo_cardio = dict(cardio_actual)
+    updates: dict = {}
+    for dia in dias_originales:
+        dia_clave = str(dia)
+        ejercicios_nuevos = rutina_actualizada.get(dia_clave, [])
+        if not isinstance(ejercicios_nuevos, list):
+            ejercicios_nuevos = []
+        ejercicios_previos = rutina_actual.get(dia_clave, [])
+        fusionados = _fusionar_con_reportes_existentes(ejercicios_previos, ejercicios_nuevos)
+        if fusionados != ejercicios_previos:
+            updates[f"rutina.{dia_clave}"] = fusionados
+            nueva_rutina[dia_clave] = fusionados
+        cardio_dia = cardio_actualizado.get(dia_clave)
+        if _cardio_tiene_datos(cardio_dia):
+            cardio_norm = _normalizar_cardio_data(cardio_dia)
+            if cardio_norm != cardio_actual.get(dia_clave):
+                updates[f"cardio.{dia_clave}"] = cardio_norm
+                nuevo_cardio[dia_clave] = cardio_norm
+        elif dia_clave in cardio_actual:
+            updates[f"cardio.{dia_clave}"] = firestore.DELETE_FIELD
+            nuevo_cardio.pop(dia_clave, None)
+    if objetivo_actualizado is not None and objetivo_actualizado != data.get("objetivo"):
+        updates["objetivo"] = objetivo_actualizado
+    return updates, {**data, "rutina": nueva_rutina, "cardio": nuevo_cardio}
+
+
 def _guardar_cambios_en_documentos(
     db,
     doc_ids: list[str],
@@ -1145,39 +1144,49 @@ def _guardar_cambios_en_documentos(
     cardio_actualizado: dict[str, dict],
     objetivo_actualizado: str | None = None,
 ):
+    """
+    Escribe solo los días modificados de cada semana, todas en un batch (con su rollup).
+    Cada update exige el `update_time` leído: si el deportista reportó entretanto, la
+    semana se vuelve a leer, se fusionan sus reportes y se reintenta.
+    Devuelve cuántas semanas quedaron al día (escritas o ya sin diferencias).
+    """
     total = 0
-    for doc_id in doc_ids:
-        ref = db.collection("rutinas_semanales").document(doc_id)
-        snap = ref.get()
-        data = snap.to_dict() or {}
-        rutina_actual = data.get("rutina", {}) or {}
-        cardio_actual = data.get("cardio", {}) or {}
-        nueva_rutina = dict(rutina_actual)
-        nuevo_cardio = dict(cardio_actual)
-        for dia in dias_originales:
-            dia_clave = str(dia)
-            ejercicios_nuevos = rutina_actualizada.get(dia_clave, [])
-            if not isinstance(ejercicios_nuevos, list):
-                ejercicios_nuevos = []
-            ejercicios_previos = rutina_actual.get(dia_clave, [])
-            nueva_rutina[dia_clave] = _fusionar_con_reportes_existentes(ejercicios_previos, ejercicios_nuevos)
-            cardio_dia = cardio_actualizado.get(dia_clave)
-            if _cardio_tiene_datos(cardio_dia):
-                nuevo_cardio[dia_clave] = _normalizar_cardio_data(cardio_dia)
-            else:
-                nuevo_cardio.pop(dia_clave, None)
-        payload = {"rutina": nueva_rutina}
-        if nuevo_cardio:
-            payload["cardio"] = nuevo_cardio
-        elif cardio_actual:
-            payload["cardio"] = {}
-        if objetivo_actualizado is not None:
-            payload["objetivo"] = objetivo_actualizado
-        try:
-            ref.update(payload)
-            total += 1
-        except Exception as exc:
-            st.error(f"No pude guardar cambios en '{doc_id}': {exc}")
+    pendientes = list(dict.fromkeys(doc_ids))
+    fallidos: dict[str, str] = {}
+    for _ in range(MAX_REINTENTOS_GUARDADO):
+        if not pendientes:
+            break
+        refs = [db.collection("rutinas_semanales").document(doc_id) for doc_id in pendientes]
+        ops: list[OperacionLote] = []
+        for snap in db.get_all(refs):
+            if not snap.exists:
+                st.error(f"No pude guardar cambios en '{snap.id}': el documento no existe")
+                continue
+            updates, data_final = _diff_documento(
+                snap.to_dict() or {},
+                dias_originales,
+                rutina_actualizada,
+                cardio_actualizado,
+                objetivo_actualizado,
+            )
+            if not updates:
+                total += 1
+                continue
+            ops.append(OperacionLote(
+                snap.reference,
+                updates,
+                tipo="update",
+                opcion=db.write_option(last_update_time=snap.update_time),
+            ))
+            ops.append(operacion_rollup(db, snap.id, data_final))
+        resultados = escribir_en_lotes(db, ops)
+        fallidos = {r.doc_id: r.error for r in documentos_fallidos(resultados)}
+        total += len({op.ref.id for op in ops if op is not None and op.tipo == "update"} - set(fallidos))
+        pendientes = list(fallidos)
+    for doc_id in pendientes:
+        st.error(f"No pude guardar cambios en '{doc_id}': {fallidos[doc_id]}")
+    for clave in {clave_rutinas_de_doc(doc_id) for doc_id in doc_ids}:
+        notify_write("rutinas", clave)
     return total
 
 
@@ -1421,7 +1430,7 @@ def render_tabla_dia(i: int, seccion: str, progresion_activa: str, dias_labels:
                                     tipo = "otros_catalogos"
                                 add_item(tipo, limpio)
                                 st.success(f"Agregado: {limpio}")
-                                st.cache_data.clear()
+                                clear_cache("catalogos")
                                 st.rerun()
                     st.markdown("</div>", unsafe_allow_html=True)
                     return ""
@@ -1463,15 +1472,13 @@ def render_tabla_dia(i: int, seccion: str, progresion_activa: str, dias_labels:
 
             if marca and maquina:
                 try:
-                    implemento_id = _resolver_id_implemento(marca, maquina)
+                    indice_impl = obtener_indice_implementos()
+                    implemento_id = indice_impl.resolver_id(marca, maquina)
                     if implemento_id:
-                        snap = get_db().collection("implementos").document(str(implemento_id)).get()
-                        if snap.exists:
-                            data_impl = snap.to_dict() or {}
+                        data_impl = indice_impl.get(implemento_id)
+                        if data_impl:
                             st.success(f"Implemento detectado: ID **{implemento_id}** · {data_impl.get('marca','')} – {data_impl.get('maquina','')}")
-                            pesos = data_impl.get("pesos", [])
-                            if isinstance(pesos, dict):
-                                pesos = [v for _, v in sorted(pesos.items(), key=lambda kv: int(kv[0]))]
+                            pesos = data_impl["pesos"]
                             if pesos:
                                 st.caption("Pesos disponibles: " + ", ".join(str(p) for p in pesos))
                 except Exception:
@@ -1502,7 +1509,7 @@ def render_tabla_dia(i: int, seccion: str, progresion_activa: str, dias_labels:
                         if not nombre_final:
                             st.warning("⚠️ El campo 'nombre' es obligatorio (usa al menos Detalle/Máquina/Marca).")
                         else:
-                            implemento_id = _resolver_id_implemento(marca, maquina) if (marca and maquina) else ""
+                            implemento_id = resolver_id_implemento(marca, maquina) if (marca and maquina) else ""
                             payload = {
                                 "nombre": nombre_final,
                                 "marca": marca,
@@ -1526,7 +1533,7 @@ def render_tabla_dia(i: int, seccion: str, progresion_activa: str, dias_labels:
                                     "publico": bool(publico_check),
                                 }
                                 st.success(f"✅ Ejercicio '{nombre_final}' guardado correctamente.")
-                                st.cache_data.clear()
+                                clear_cache("ejercicios")
                                 _trigger_rerun()
                             except Exception as exc:
                                 st.error(f"❌ Error al guardar: {exc}")
@@ -1566,20 +1573,10 @@ def render_tabla_dia(i: int, seccion: str, progresion_activa: str, dias_labels:
         headers.pop(prog_idx)
         sizes.pop(prog_idx)
 
+    indice_busqueda = obtener_indice(ejercicios_dict, version=version_catalogo())
+
     def _buscar_fuzzy(palabra: str) -> list[str]:
-        if not palabra.strip():
-            return []
-        patron = normalizar_texto(palabra)
-        if not patron:
-            return []
-        candidatos = []
-        for nombre, data in ejercicios_dict.items():
-            nombre_norm = normalizar_texto(nombre)
-            slug_norm = normalizar_texto((data or {}).get("buscable_id") or _buscable_id(nombre))
-            extra_texto = f"{nombre_norm} {slug_norm}".strip()
-            if patron in extra_texto:
-                candidatos.append(nombre)
-        return candidatos
+        return indice_busqueda.buscar(palabra, limite=LIMITE_SUGERENCIAS)
 
     section_container = st.container()
     with section_container:
@@ -1711,10 +1708,8 @@ def render_tabla_dia(i: int, seccion: str, progresion_activa: str, dias_labels:
             try:
                 doc_ej = ejercicios_dict.get(fila.get("Ejercicio"), {}) or {}
                 id_impl = str(doc_ej.get("id_implemento") or "")
-                if id_impl and id_impl != "1" and id_impl in IMPLEMENTOS:
-                    pesos_disponibles = IMPLEMENTOS[id_impl].get("pesos", []) or []
-                    if isinstance(pesos_disponibles, dict):
-                        pesos_disponibles = [v for _, v in sorted(pesos_disponibles.items(), key=lambda kv: int(kv[0]))]
+                if id_impl and id_impl != "1":
+                    pesos_disponibles = obtener_indice_implementos().pesos(id_impl)
                     usar_text_input = not bool(pesos_disponibles)
             except Exception:
                 usar_text_input = True
@@ -2120,12 +2115,7 @@ def editar_rutinas():
     db = get_db()
 
     # ===== Clientes disponibles según permisos =====
-    usuarios_map: dict[str, dict] = {}
-    for user in USUARIOS:
-        correo_u = (user.get("correo") or "").strip().lower()
-        if correo_u:
-            usuarios_map[correo_u] = user
-            usuarios_map[correo_a_doc_id(correo_u)] = user
+    usuarios_map = get_users_map()
 
     correo_login = (st.session_state.get("correo") or "").strip().lower()
     rol_login = (st.session_state.get("rol") or "").strip().lower()
@@ -2135,36 +2125,37 @@ def editar_rutinas():
     EJERCICIOS = _refrescar_catalogo()
 
     clientes_por_nombre: dict[str, list[str]] = {}
-    for doc in db.collection("rutinas_semanales").stream():
-        data = doc.to_dict() or {}
-        nombre = (data.get("cliente") or "").strip()
-        correo_cli = (data.get("correo") or "").strip().lower()
+    for entrada in cargar_indice_clientes():
+        nombre = (entrada.get("cliente") or "").strip()
+        correo_cli = (entrada.get("correo") or "").strip().lower()
         if not nombre or not correo_cli:
             continue
 
         empresa_cli = empresa_de_usuario(correo_cli, usuarios_map)
-        entrenador_doc = (data.get("entrenador") or "").strip().lower()
+        entrenadores_doc = [
+            (e or "").strip().lower() for e in (entrada.get("entrenadores") or []) if (e or "").strip()
+        ] or [""]
         coach_cli = ((usuarios_map.get(correo_cli) or {}).get("coach_responsable") or "").strip().lower()
         if not coach_cli:
-            coach_cli = ((data.get("coach_responsable") or "").strip().lower())
-        if not coach_cli:
-            coach_cli = entrenador_doc
-
-        permitido = True
-        if rol_login in ("entrenador",):
-            if empresa_login == EMPRESA_ASESORIA:
-                permitido = coach_cli == correo_login or entrenador_doc == correo_login
-            elif empresa_login == EMPRESA_MOTION:
-                if empresa_cli == EMPRESA_MOTION:
-                    permitido = True
-                elif empresa_cli == EMPRESA_DESCONOCIDA:
-                    permitido = coach_cli == correo_login or entrenador_doc == correo_login
-                else:
-                    permitido = False
-            else:
-                permitido = coach_cli == correo_login or entrenador_doc == correo_login
-        elif rol_login not in ("admin", "administrador"):
-            permitido = coach_cli == correo_login or entrenador_doc == correo_login
+            coach_cli = ((entrada.get("coach_responsable") or "").strip().lower())
+
+        def _permitido_para(entrenador_doc: str) -> bool:
+            coach_ref = coach_cli or entrenador_doc
+            if rol_login in ("entrenador",):
+                if empresa_login == EMPRESA_ASESORIA:
+                    return coach_ref == correo_login or entrenador_doc == correo_login
+                if empresa_login == EMPRESA_MOTION:
+                    if empresa_cli == EMPRESA_MOTION:
+                        return True
+                    if empresa_cli == EMPRESA_DESCONOCIDA:
+                        return coach_ref == correo_login or entrenador_doc == correo_login
+                    return False
+                return coach_ref == correo_login or entrenador_doc == correo_login
+            if rol_login not in ("admin", "administrador"):
+                return coach_ref == correo_login or entrenador_doc == correo_login
+            return True
+
+        permitido = any(_permitido_para(entrenador_doc) for entrenador_doc in entrenadores_doc)
 
         if permitido and usuario_activo(correo_cli, usuarios_map, default_if_missing=True):
             lista = clientes_por_nombre.setdefault(nombre, [])
@@ -2446,9 +2437,9 @@ def editar_rutinas():
             objetivo_para_guardar,
         )
         if total:
-            for doc_id in doc_ids_destino:
-                snap = db.collection("rutinas_semanales").document(doc_id).get()
-                datos_cache[doc_id] = snap.to_dict() or {}
+            refs_destino = [db.collection("rutinas_semanales").document(doc_id) for doc_id in doc_ids_destino]
+            for snap in db.get_all(refs_destino):
+                datos_cache[snap.id] = snap.to_dict() or {}
             doc_data = datos_cache.get(doc_id_semana) or {}
             st.success(f"Rutina guardada en {total} semana(s).")
             if notificar_correo:
@@ -2458,7 +2449,7 @@ def editar_rutinas():
                 empresa_cliente = empresa_de_usuario(correo_cliente, usuarios_map)
                 coach_correo = (doc_data.get("entrenador") or correo_login or "").strip()
                 semanas_notificadas = max(1, len(doc_ids_destino))
-                envio_ok = enviar_correo_rutina_disponible(
+                encolado = encolar_correo_rutina_disponible(
                     correo=correo_cliente,
                     nombre=nombre_email,
                     fecha_inicio=fecha_base,
@@ -2466,10 +2457,13 @@ def editar_rutinas():
                     empresa=empresa_cliente,
                     coach=coach_correo,
                 )
-                if envio_ok:
-                    st.caption("El cliente fue notificado por correo con la rutina editada.")
+                if encolado:
+                    st.caption("El aviso por correo al cliente quedó en cola de envío.")
                 else:
-                    st.caption("No se pudo enviar el aviso por correo; revisa la configuración de notificaciones.")
+                    st.caption(
+                        "No se encoló un aviso nuevo: ya hay uno pendiente o enviado para este cliente "
+                        "y esta semana de inicio (o el cliente no tiene correo)."
+                    )
             else:
                 st.caption("No se envió correo porque la notificación está desactivada.")
             st.session_state["_editar_rutina_actual"] = clave_actual
@@ -9,6 +9,8 @@ import firebase_admin
 from firebase_admin import credentials, firestore
 import pandas as pd
 
+from app_core.ejercicios_catalogo import catalogo_completo
+
 st.set_page_config(page_title="Corregir videos de rutinas", page_icon="🎥", layout="wide")
 
 # ========= Helpers =========
@@ -35,14 +37,12 @@ def cargar_indice_ejercicios(db: firestore.Client, prefer_trainer: Optional[str]
       3) si no, el primero encontrado
     """
     candidatos: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
-    for doc in db.collection("ejercicios").stream():
-        if not doc.exists:
-            continue
-        data = doc.to_dict() or {}
+    _, docs = catalogo_completo(db)
+    for doc_id, data in docs.items():
         nombre = (data.get("nombre") or "").strip()
         if not nombre:
             continue
-        candidatos.setdefault(normalizar_texto(nombre), []).append((doc.id, data))
+        candidatos.setdefault(normalizar_texto(nombre), []).append((doc_id, data))
 
     prefer = (prefer_trainer or "").strip().lower()
     resolved: Dict[str, Dict[str, Any]] = {}
@@ -6,8 +6,14 @@ from firebase_admin import firestore
 from herramientas import aplicar_progresion, normalizar_texto
 import streamlit as st
 import uuid
+from app_core.batch_writes import OperacionLote, documentos_fallidos, escribir_en_lotes
+from app_core.cache import notify_write
+from app_core.clientes_index import operacion_registrar_semanas
+from app_core.data_access import clave_rutinas
+from app_core.rollups_semanales import operacion_rollup
+from app_core.ejercicios_catalogo import catalogo_completo
 from app_core.firebase_client import get_db
-from app_core.email_notifications import enviar_correo_rutina_disponible
+from app_core.outbox import encolar_correo_rutina_disponible
 from app_core.utils import empresa_de_usuario
 from app_core.video_utils import normalizar_link_youtube
 
@@ -22,39 +28,6 @@ def _norm(s: str) -> str:
     s = re.sub(r"\s+", " ", s).strip().casefold()
     return s
 
-def _resolver_id_implemento(db, marca: str, maquina: str) -> str:
-    """Devuelve el id_implemento si hay match único por marca+maquina; si no, ''."""
-    marca_in = (marca or "").strip()
-    maquina_in = (maquina or "").strip()
-    if not marca_in or not maquina_in:
-        return ""
-
-    # 1) Intento exacto (requiere índice compuesto si usas ambos where ==)
-    try:
-        q = (db.collection("implementos")
-               .where("marca", "==", marca_in)
-               .where("maquina", "==", maquina_in))
-        hits = list(q.stream())
-        if len(hits) == 1:
-            return hits[0].id
-        elif len(hits) >= 2:
-            return ""  # múltiples → ambiguo → vacío
-    except Exception:
-        pass
-
-    # 2) Normalizado en memoria (tolerante a acentos/caso/espacios)
-    mkey, maqkey = _norm(marca_in), _norm(maquina_in)
-    try:
-        candidatos = []
-        for d in db.collection("implementos").limit(1000).stream():
-            data = d.to_dict() or {}
-            if _norm(data.get("marca")) == mkey and _norm(data.get("maquina")) == maqkey:
-                candidatos.append(d.id)
-        return candidatos[0] if len(candidatos) == 1 else ""
-    except Exception:
-        return ""
-
-
 def _f(v):
     """Convierte a float o None. Tolerante con '8-10' => 8, '' => None."""
     try:
@@ -233,7 +206,6 @@ def _indice_ejercicios_por_nombre(ejercicios_meta: dict[str, dict]) -> dict[str,
     return idx
 
 
-@st.cache_data(show_spinner=False)
 def _cargar_ejercicios_metadata_para_guardado() -> dict[str, dict]:
     """
     Recupera metadata mínima de ejercicios (solo campos requeridos para clasificar series).
@@ -241,11 +213,8 @@ def _cargar_ejercicios_metadata_para_guardado() -> dict[str, dict]:
     """
     resultado: dict[str, dict] = {}
     try:
-        db = get_db()
-        for doc in db.collection("ejercicios").stream():
-            if not doc.exists:
-                continue
-            data = doc.to_dict() or {}
+        _, docs = catalogo_completo()
+        for data in docs.values():
             nombre = (data.get("nombre") or data.get("Nombre") or "").strip()
             if not nombre:
                 continue
@@ -431,9 +400,14 @@ def guardar_rutina(
     Escalares: peso, tiempo, velocidad, descanso, series.
     Rangos: repeticiones (min/max) y RIR (min/max).
     Además, clasifica las series por categoría (grupo muscular y patrón).
+    Todas las semanas del bloque se escriben en batches atómicos al final;
+    devuelve el estado de escritura por documento.
     """
     db = get_db()
     bloque_id = str(uuid.uuid4())
+    operaciones: list[OperacionLote] = []
+    ops_rollup: list[OperacionLote] = []
+    resultados = []
 
     docs_prev_cache: dict[tuple[str, str], dict | None] = {}
     ejercicios_meta = ejercicios_meta or _cargar_ejercicios_metadata_para_guardado()
@@ -688,12 +662,51 @@ def guardar_rutina(
 
             if rutina_semana["rutina"]:
                 doc_id = f"{correo_norm}_{fecha_norm}"
-                db.collection("rutinas_semanales").document(doc_id).set(rutina_semana)
+                operaciones.append(
+                    OperacionLote(db.collection("rutinas_semanales").document(doc_id), rutina_semana)
+                )
+                op_rollup = operacion_rollup(db, doc_id, rutina_semana)
+                if op_rollup:
+                    ops_rollup.append(op_rollup)
+                # Las condiciones RIR de la semana siguiente deben ver la semana recién generada
+                docs_prev_cache[(correo_norm, fecha_str)] = rutina_semana
+
+        # El índice de clientes viaja en el mismo batch que las semanas del bloque
+        op_indice = operacion_registrar_semanas(
+            db,
+            correo,
+            normalizar_texto(_s(nombre_sel).title()),
+            entrenador,
+            [op.data.get("fecha_lunes", "") for op in operaciones],
+        )
+        ops_semanas = {id(op) for op in operaciones}
+        ops_a_escribir = list(operaciones)
+        if operaciones:
+            # Rollups e índice van en los mismos batches; solo se reporta el estado de las semanas
+            ops_a_escribir += ops_rollup
+            if op_indice:
+                ops_a_escribir.append(op_indice)
+
+        resultados = [
+            r for op, r in zip(ops_a_escribir, escribir_en_lotes(db, ops_a_escribir))
+            if id(op) in ops_semanas
+        ]
+        notify_write("rutinas", clave_rutinas(correo))
+        notify_write("rutinas_listado")
+        fallidos = documentos_fallidos(resultados)
+        if fallidos:
+            st.error(
+                f"❌ Se guardaron {len(resultados) - len(fallidos)} de {len(resultados)} semanas. "
+                "Las siguientes no se pudieron escribir:"
+            )
+            for r in fallidos:
+                st.caption(f"• {r.doc_id}: {r.error}")
+            return resultados
 
         st.success(f"✅ Rutina generada correctamente para {semanas} semanas (progresión acumulativa + descanso + RIR min/max + series).")
         if notificar_correo:
             empresa_cliente = empresa_de_usuario(correo)
-            envio_ok = enviar_correo_rutina_disponible(
+            encolado = encolar_correo_rutina_disponible(
                 correo=correo,
                 nombre=nombre_sel,
                 fecha_inicio=fecha_inicio,
@@ -701,11 +714,16 @@ def guardar_rutina(
                 empresa=empresa_cliente,
                 coach=entrenador,
             )
-            if envio_ok:
-                st.caption("El cliente fue notificado por correo con su bloque actualizado.")
+            if encolado:
+                st.caption("El aviso por correo al cliente quedó en cola de envío.")
             else:
-                st.caption("No se pudo enviar el aviso por correo; revisa la configuración de notificaciones.")
+                st.caption(
+                    "No se encoló un aviso nuevo: ya hay uno pendiente o enviado para este cliente "
+                    "y esta semana de inicio (o el cliente no tiene correo)."
+                )
         else:
             st.caption("No se envió correo porque la notificación está desactivada.")
     except Exception as e:
         st.error(f"❌ Error al guardar la rutina: {e}")
+
+    return resultados
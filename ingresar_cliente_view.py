@@ -11,6 +11,8 @@ from datetime import datetime
 
 # 👇 servicio de catálogos (tuyo)
 from servicio_catalogos import get_catalogos, add_item
+from app_core.ejercicios_catalogo import catalogo_completo, guardar_ejercicio
+from app_core.implementos import obtener_indice_implementos, resolver_id_implemento
 from app_core.utils import empresa_de_usuario, EMPRESA_MOTION, EMPRESA_ASESORIA, EMPRESA_DESCONOCIDA
 
 # ==========================
@@ -212,38 +214,6 @@ def _norm(s: str) -> str:
     s = re.sub(r"\s+", " ", s).strip().casefold()
     return s
 
-def _resolver_id_implemento(db, marca: str, maquina: str) -> str:
-    """Devuelve el id_implemento si hay match único por marca+maquina; si no, ''."""
-    marca_in = (marca or "").strip()
-    maquina_in = (maquina or "").strip()
-    if not marca_in or not maquina_in:
-        return ""
-
-    # 1) Intento exacto (si no hay índice o falla, seguimos)
-    try:
-        q = (db.collection("implementos")
-               .where("marca", "==", marca_in)
-               .where("maquina", "==", maquina_in))
-        hits = list(q.stream())
-        if len(hits) == 1:
-            return hits[0].id
-        elif len(hits) >= 2:
-            return ""  # ambiguo
-    except Exception:
-        pass
-
-    # 2) Fallback normalizado en memoria (colección chica/mediana)
-    mkey, maqkey = _norm(marca_in), _norm(maquina_in)
-    try:
-        candidatos = []
-        for d in db.collection("implementos").limit(1000).stream():
-            data = d.to_dict() or {}
-            if _norm(data.get("marca")) == mkey and _norm(data.get("maquina")) == maqkey:
-                candidatos.append(d.id)
-        return candidatos[0] if len(candidatos) == 1 else ""
-    except Exception:
-        return ""
-
 # ==========================
 # 🔁 Navegación (menu / cliente / ejercicio)
 # ==========================
@@ -467,8 +437,8 @@ def _render_ejercicio():
     admin = es_admin()
 
     # Cargar ejercicios ya existentes
-    docs = db.collection("ejercicios").stream()
-    ejercicios_disponibles = {doc.id: doc.to_dict().get("nombre", doc.id) for doc in docs}
+    _, docs = catalogo_completo()
+    ejercicios_disponibles = {doc_id: data.get("nombre", doc_id) for doc_id, data in docs.items()}
 
     modo = st.radio("¿Qué quieres hacer?", ["Nuevo ejercicio", "Editar ejercicio existente"], horizontal=True)
 
@@ -533,19 +503,13 @@ def _render_ejercicio():
         )
     # Preview de implemento/pesos si hay marca+máquina
     if marca and maquina:
-        _id_prev = _resolver_id_implemento(db, marca, maquina)
+        indice_impl = obtener_indice_implementos(db)
+        _id_prev = indice_impl.resolver_id(marca, maquina)
         if _id_prev:
-            snap_impl = db.collection("implementos").document(str(_id_prev)).get()
-            if snap_impl.exists:
-                data_impl = snap_impl.to_dict() or {}
+            data_impl = indice_impl.get(_id_prev)
+            if data_impl:
                 st.success(f"Implemento detectado: ID **{_id_prev}** · {data_impl.get('marca','')} – {data_impl.get('maquina','')}")
-                pesos = data_impl.get("pesos", [])
-                if isinstance(pesos, dict):
-                    pesos_list = [v for _, v in sorted(pesos.items(), key=lambda kv: int(kv[0]))]
-                elif isinstance(pesos, list):
-                    pesos_list = pesos
-                else:
-                    pesos_list = []
+                pesos_list = data_impl["pesos"]
                 if pesos_list:
                     st.caption("Pesos disponibles (preview): " + ", ".join(str(p) for p in pesos_list))
 
@@ -580,7 +544,7 @@ def _render_ejercicio():
                 return
 
             # === Resolver id_implemento SOLO AL GUARDAR ===
-            id_impl_resuelto = _resolver_id_implemento(db, marca, maquina)
+            id_impl_resuelto = resolver_id_implemento(marca, maquina, db)
 
             # Si estás editando: conserva el id previo si Marca/Máquina no cambiaron
             if modo == "Editar ejercicio existente" and doc_id_sel:
@@ -612,16 +576,16 @@ def _render_ejercicio():
                 if modo == "Editar ejercicio existente" and doc_id_sel:
                     if not datos.get("entrenador"):
                         datos_guardar["entrenador"] = correo_usuario  # backfill si faltaba
-                    db.collection("ejercicios").document(doc_id_sel).update(datos_guardar)
+                    guardar_ejercicio(db, doc_id_sel, datos_guardar, actualizar=True)
                     st.success(f"✅ Ejercicio '{datos.get('nombre', doc_id_sel)}' actualizado correctamente")
                 else:
                     doc_id = normalizar_texto(nombre_final)
-                    db.collection("ejercicios").document(doc_id).set({
+                    guardar_ejercicio(db, doc_id, {
                         **datos_guardar,
                         "creado_por": correo_usuario,
                         "fecha_creacion": datetime.utcnow(),
                         "entrenador": correo_usuario,
-                    }, merge=True)
+                    })
                     st.success(f"✅ Ejercicio '{nombre_final}' guardado correctamente")
 
                 if datos_guardar["publico"]:
@@ -714,7 +678,7 @@ def _render_carga_csv():
                 if not admin:
                     publico = False
 
-                id_impl = _resolver_id_implemento(db, marca, maquina)
+                id_impl = resolver_id_implemento(marca, maquina, db)
                 doc_id = normalizar_texto(nombre)
 
                 payload = {
@@ -733,11 +697,11 @@ def _render_carga_csv():
                     "entrenador": correo_usuario,
                 }
 
-                db.collection("ejercicios").document(doc_id).set({
+                guardar_ejercicio(db, doc_id, {
                     **payload,
                     "creado_por": correo_usuario,
                     "fecha_creacion": datetime.utcnow(),
-                }, merge=True)
+                })
                 guardados += 1
             except Exception as exc:
                 errores.append((idx, str(exc)))
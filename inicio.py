@@ -21,6 +21,8 @@ for extra in EXTRA_PATHS:
         sys.path.insert(0, extra_str)
 
 from motivacional import mensaje_motivador_del_dia
+from app_core.cache import cache_data
+from app_core.data_access import clave_rutinas, rutinas_metadata, rutinas_por_ids
 from app_core.firebase_client import get_db
 from app_core.theme import inject_theme
 from app_core.users_service import get_users_map
@@ -149,7 +151,7 @@ def _fecha_lunes_hoy() -> str:
     lunes = hoy - timedelta(days=hoy.weekday())
     return lunes.strftime("%Y-%m-%d")
 
-@st.cache_data(show_spinner=False, ttl=120, max_entries=256)
+@cache_data("rutinas", key=lambda _db, correo_raw: clave_rutinas(correo_raw), show_spinner=False, ttl=120, max_entries=256)
 def _rutinas_cliente_semana(_db, correo_raw: str):
     docs = _db.collection("rutinas_semanales").where("correo", "==", correo_raw).stream()
     out = []
@@ -158,15 +160,21 @@ def _rutinas_cliente_semana(_db, correo_raw: str):
         except: pass
     return out
 
-@st.cache_data(show_spinner=False, ttl=120, max_entries=256)
+@cache_data("rutinas_listado", show_spinner=False, ttl=120, max_entries=256)
 def _rutinas_asignadas_a_entrenador(_db, correo_entrenador: str):
-    """Todas las rutinas donde el campo 'entrenador' coincide con el correo del entrenador."""
-    docs = _db.collection("rutinas_semanales").where("entrenador", "==", correo_entrenador).stream()
-    out = []
-    for d in docs:
-        try: out.append(d.to_dict())
-        except: pass
-    return out
+    """Metadata (proyectada, sin `rutina`) de las semanas donde 'entrenador' coincide con el correo del entrenador."""
+    try:
+        return rutinas_metadata(entrenador=correo_entrenador)
+    except Exception:
+        return []
+
+@cache_data("rutinas", show_spinner=False, ttl=120, max_entries=256)
+def _rutinas_completas(doc_ids: tuple[str, ...]) -> dict[str, dict]:
+    """Documentos completos por id en un solo get_all."""
+    try:
+        return rutinas_por_ids(doc_ids)
+    except Exception:
+        return {}
 
 
 def _doc_id_from_mail(mail: str) -> str:
@@ -217,6 +225,41 @@ def _comentarios_recientes_por_cliente(rutinas: list[dict], ack_map: dict[str, s
             }
     return resultado
 
+def _docs_para_comentarios(rutinas_meta: list[dict], ack_map: dict[str, str], lote: int = 4) -> list[dict]:
+    """Trae el mapa `rutina` solo de las semanas no vistas más recientes de cada cliente,
+    por rondas de `lote` semanas, y se detiene en cuanto encuentra comentarios."""
+    pendientes: dict[str, list[dict]] = defaultdict(list)
+    for doc in rutinas_meta:
+        correo_cliente = (doc.get("correo") or "").strip().lower()
+        fecha = doc.get("fecha_lunes") or ""
+        if not fecha or not (doc.get("cliente") or "").strip() or not doc.get("_id"):
+            continue
+        ack_fecha = ack_map.get(correo_cliente)
+        if ack_fecha and ack_fecha >= fecha:
+            continue
+        pendientes[correo_cliente].append(doc)
+    for docs in pendientes.values():
+        docs.sort(key=lambda d: d.get("fecha_lunes"), reverse=True)
+
+    completos: list[dict] = []
+    while pendientes:
+        ids = tuple(d["_id"] for docs in pendientes.values() for d in docs[:lote])
+        cargados = _rutinas_completas(ids)
+        for correo_cliente in list(pendientes):
+            ronda = pendientes[correo_cliente][:lote]
+            pendientes[correo_cliente] = pendientes[correo_cliente][lote:]
+            hallado = False
+            for meta in ronda:
+                doc = cargados.get(meta["_id"])
+                if not doc:
+                    continue
+                completos.append(doc)
+                if any((e.get("comentario") or "").strip() for e in _iter_ejercicios_en_doc(doc)):
+                    hallado = True
+            if hallado or not pendientes[correo_cliente]:
+                del pendientes[correo_cliente]
+    return completos
+
 def _comentarios_ack_map(_db, correo_entrenador: str) -> dict[str, str]:
     try:
         doc_id = _doc_id_from_mail(correo_entrenador)
@@ -445,7 +488,9 @@ def inicio_deportista():
                 st.info("No tienes deportistas asignados aún.")
         else:
             ack_map = _comentarios_ack_map(db, correo_raw)
-            comentarios_recientes = _comentarios_recientes_por_cliente(asignadas, ack_map)
+            comentarios_recientes = _comentarios_recientes_por_cliente(
+                _docs_para_comentarios(asignadas, ack_map), ack_map
+            )
             if comentarios_recientes:
                 avisos = []
                 for correo_cli, payload in comentarios_recientes.items():
@@ -471,9 +516,8 @@ def inicio_deportista():
             ordenados = []
             hoy_lunes_str = _fecha_lunes_hoy()
 
+            semana_actual_por_cliente: dict[str, dict | None] = {}
             for correo_cli, docs_cli in por_cliente.items():
-                nombre_cli = (docs_cli[-1].get("cliente") or correo_cli.split("@")[0] or "Cliente").strip()
-                sem_idx, sem_total, fecha_ult = _bloque_progress_para_cliente(docs_cli)
                 doc_semana_actual = max(
                     (
                         doc for doc in docs_cli
@@ -488,7 +532,19 @@ def inicio_deportista():
                         default=None,
                         key=lambda d: d.get("fecha_lunes"),
                     )
-                dias_comp, dias_total = _contar_dias_semana(doc_semana_actual or {})
+                semana_actual_por_cliente[correo_cli] = doc_semana_actual
+            # Un solo get_all para el mapa `rutina` de la semana vigente de cada cliente
+            semanas_completas = _rutinas_completas(tuple(
+                doc["_id"] for doc in semana_actual_por_cliente.values() if doc and doc.get("_id")
+            ))
+
+            for correo_cli, docs_cli in por_cliente.items():
+                nombre_cli = (docs_cli[-1].get("cliente") or correo_cli.split("@")[0] or "Cliente").strip()
+                sem_idx, sem_total, fecha_ult = _bloque_progress_para_cliente(docs_cli)
+                doc_semana_actual = semana_actual_por_cliente.get(correo_cli) or {}
+                dias_comp, dias_total = _contar_dias_semana(
+                    semanas_completas.get(doc_semana_actual.get("_id", ""), {})
+                )
                 try:
                     fecha_dt = datetime.strptime(fecha_ult, "%Y-%m-%d") if fecha_ult else datetime.min
                 except Exception:
@@ -1,6 +1,7 @@
 # offline_storage.py
 import json
 import time
+import uuid
 from typing import Any, Dict, List, Optional, Tuple
 
 import streamlit as st
@@ -12,7 +13,8 @@ _local = LocalStorage()
 KEY_EMAIL             = "mp_email_cached_v1"
 KEY_ROLE              = "mp_role_cached_v1"
 KEY_WEEK_CACHE_PREFIX = "mp_weekcache_"            # + normalized_email + "_" + monday_date
-KEY_MUTATION_QUEUE    = "mp_mutation_queue_v1"
+KEY_MUTATION_QUEUE    = "mp_mutation_queue_v1"   # formato antiguo (lista); se migra a KEY_SYNC_STATE
+KEY_SYNC_STATE        = "mp_sync_state_v2"       # {"mutations": [...], "last_sync_ok": ts}
 KEY_LAST_SYNC_OK      = "mp_last_sync_ok_v1"
 KEY_OFFLINE_FLAG      = "mp_is_offline_v1"
 
@@ -32,6 +34,26 @@ def _ls_set_raw(item_key: str, value: str) -> None:
 def _ls_remove(item_key: str) -> None:
     _local.removeItem(item_key, key=_next_uid("rm", item_key))
 
+def _ls_get_all() -> Dict[str, Any]:
+    """Todas las claves en UN viaje al navegador (si el componente no lo soporta, una por clave)."""
+    try:
+        todo = _local.getAll(key=_next_uid("getall", "*"))
+        if isinstance(todo, dict):
+            return todo
+    except Exception:
+        pass
+    return {k: _ls_get_raw(k) for k in (KEY_SYNC_STATE, KEY_MUTATION_QUEUE, KEY_LAST_SYNC_OK, KEY_OFFLINE_FLAG)}
+
+def _parse_json(raw: Any, default: Any):
+    if raw is None or raw == "":
+        return default
+    if not isinstance(raw, str):
+        return raw
+    try:
+        return json.loads(raw)
+    except Exception:
+        return default
+
 def _load_json(item_key: str, default: Any):
     try:
         raw = _ls_get_raw(item_key)
@@ -77,24 +99,49 @@ def set_cached_week(normalized_email: str, monday_str: str, week_data: Dict[str,
     _save_json(week_cache_key(normalized_email, monday_str), week_data)
 
 # ========= Cola de mutaciones =========
-# { "id": "...", "ts": 1712345678901, "op": "update_doc", "doc_path": "col/doc", "data": {...}, "merge": true }
+# { "id": "<uuid, clave de idempotencia>", "ts": 1712345678901, "op": "update_doc", "doc_path": "col/doc", "data": {...}, "merge": true }
+# La cola y el último sync OK viven juntos en KEY_SYNC_STATE: se leen y escriben en una sola llamada.
+def _estado_desde(items: Dict[str, Any]) -> Dict[str, Any]:
+    estado = _parse_json(items.get(KEY_SYNC_STATE), None)
+    if isinstance(estado, dict):
+        return {"mutations": list(estado.get("mutations") or []), "last_sync_ok": estado.get("last_sync_ok")}
+    # Migración desde el formato v1 (lista + clave aparte para el último sync)
+    legacy = _parse_json(items.get(KEY_MUTATION_QUEUE), [])
+    try:
+        last = int(items.get(KEY_LAST_SYNC_OK)) if items.get(KEY_LAST_SYNC_OK) else None
+    except (TypeError, ValueError):
+        last = None
+    return {"mutations": legacy if isinstance(legacy, list) else [], "last_sync_ok": last, "_legacy": bool(legacy)}
+
+def read_sync_state() -> Dict[str, Any]:
+    """{"mutations", "last_sync_ok", "offline"} con un único getAll."""
+    items = _ls_get_all()
+    estado = _estado_desde(items)
+    estado["offline"] = str(items.get(KEY_OFFLINE_FLAG) or "0") == "1"
+    return estado
+
+def write_sync_state(mutations: List[Dict[str, Any]], last_sync_ok: Optional[int] = None, legacy: bool = False):
+    """Guarda cola + último sync OK en un solo setItem."""
+    _save_json(KEY_SYNC_STATE, {"mutations": mutations, "last_sync_ok": last_sync_ok})
+    if legacy:
+        _ls_remove(KEY_MUTATION_QUEUE)
+
 def enqueue_mutation(mutation: Dict[str, Any]):
-    queue: List[Dict[str, Any]] = _load_json(KEY_MUTATION_QUEUE, [])
-    queue.append(mutation)
-    _save_json(KEY_MUTATION_QUEUE, queue)
+    mutation = dict(mutation)
+    mutation.setdefault("id", uuid.uuid4().hex)
+    mutation.setdefault("ts", int(time.time() * 1000))
+    estado = read_sync_state()
+    estado["mutations"].append(mutation)
+    write_sync_state(estado["mutations"], estado["last_sync_ok"], legacy=estado.get("_legacy", False))
 
 def peek_mutations() -> List[Dict[str, Any]]:
-    return _load_json(KEY_MUTATION_QUEUE, [])
+    return read_sync_state()["mutations"]
 
 def replace_mutations(new_queue: List[Dict[str, Any]]):
-    _save_json(KEY_MUTATION_QUEUE, new_queue)
+    write_sync_state(new_queue, get_last_sync_ok())
 
 def set_last_sync_ok():
-    _ls_set_raw(KEY_LAST_SYNC_OK, str(int(time.time())))
+    write_sync_state(peek_mutations(), int(time.time()))
 
 def get_last_sync_ok() -> Optional[int]:
-    raw = _ls_get_raw(KEY_LAST_SYNC_OK)
-    try:
-        return int(raw) if raw else None
-    except:
-        return None
+    return read_sync_state()["last_sync_ok"]
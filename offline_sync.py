@@ -1,34 +1,27 @@
 # offline_sync.py
+import copy
+import hashlib
+import json
 import time
+from datetime import datetime, timedelta, timezone
+from dataclasses import dataclass, field
 from typing import Dict, Any, List, Tuple
 import streamlit as st
 import firebase_admin
 from firebase_admin import firestore
 
-from offline_storage import (
-    peek_mutations, replace_mutations, set_last_sync_ok, is_offline
-)
+from app_core.batch_writes import OperacionLote, escribir_en_lotes
+from offline_storage import read_sync_state, write_sync_state
+
+COLECCION_IDEMPOTENCIA = "sync_idempotencia"
+PARES_POR_LOTE = 200   # cada escritura va con su marca de idempotencia: 400 operaciones por batch
+DIAS_MARCA = 30        # `expira` para la política TTL de la colección de marcas
 
 # === Conector Firestore (Admin SDK) ===
 def get_db():
     # Ya lo inicializas en tu app principal; solo usa firestore.client()
     return firestore.client()
 
-def _apply_mutation(db, m: Dict[str, Any]):
-    """Aplica UNA mutación contra Firestore. Puedes extender con más tipos."""
-    op = m.get("op")
-    if op == "update_doc":
-        doc_path = m["doc_path"]            # p.ej. "rutinas_semanales/abc123"
-        data     = m.get("data", {})
-        merge    = bool(m.get("merge", True))
-        doc_ref  = _doc_ref_from_path(db, doc_path)
-        # Last-write-wins (tu app define las reglas; aquí un update/merge simple)
-        doc_ref.set(data, merge=merge)
-        return True
-    else:
-        # futuros tipos: "delete_doc", "create_doc", "array_union", etc.
-        return False
-
 def _doc_ref_from_path(db, path: str):
     # path "col/doc/col/doc" -> navegar dinámico
     parts = path.split("/")
@@ -43,29 +36,119 @@ def _doc_ref_from_path(db, path: str):
             ref = ref.collection(col).document(doc)
     return ref
 
+# === Coalescencia ===
+def _id_mutacion(m: Dict[str, Any]) -> str:
+    """Clave de idempotencia de la mutación; las encoladas antes de existir `id` usan un hash de su contenido."""
+    if m.get("id"):
+        return str(m["id"])
+    raw = json.dumps(m, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def _merge_profundo(base: Dict[str, Any], nuevo: Dict[str, Any]) -> Dict[str, Any]:
+    """Mismo resultado que aplicar `nuevo` con set(merge=True) después de `base`: gana el último por field path."""
+    for k, v in nuevo.items():
+        if isinstance(v, dict) and isinstance(base.get(k), dict):
+            _merge_profundo(base[k], v)
+        else:
+            base[k] = copy.deepcopy(v)
+    return base
+
+@dataclass
+class EscrituraAgrupada:
+    """Todas las mutaciones encoladas para un documento, fusionadas en una sola escritura."""
+    doc_path: str
+    data: Dict[str, Any] = field(default_factory=dict)
+    merge: bool = True
+    ids: List[str] = field(default_factory=list)
+
+    @property
+    def clave(self) -> str:
+        return hashlib.sha1("|".join(self.ids).encode("utf-8")).hexdigest()
+
+def coalescer_mutaciones(queue: List[Dict[str, Any]]) -> Tuple[List[EscrituraAgrupada], List[Dict[str, Any]]]:
+    """
+    Agrupa por `doc_path` en orden de llegada. Un set sin merge reemplaza lo acumulado;
+    los merges se fusionan encima. Devuelve (escrituras, mutaciones con `op` no soportado).
+    """
+    grupos: Dict[str, EscrituraAgrupada] = {}
+    no_soportadas: List[Dict[str, Any]] = []
+    for m in queue:
+        if m.get("op") != "update_doc" or not m.get("doc_path"):
+            # futuros tipos: "delete_doc", "create_doc", "array_union", etc.
+            no_soportadas.append(m)
+            continue
+        doc_path = m["doc_path"]                # p.ej. "rutinas_semanales/abc123"
+        data = m.get("data", {}) or {}
+        grupo = grupos.setdefault(doc_path, EscrituraAgrupada(doc_path))
+        if not bool(m.get("merge", True)):
+            grupo.data, grupo.merge = copy.deepcopy(data), False
+        else:
+            _merge_profundo(grupo.data, data)
+        grupo.ids.append(_id_mutacion(m))
+    return list(grupos.values()), no_soportadas
+
+# === Envío ===
+def _operaciones(db, grupos: List[EscrituraAgrupada]) -> List[OperacionLote]:
+    """Par (marca create, escritura) por grupo; tamaño de lote par para que el par nunca quede partido."""
+    expira = datetime.now(timezone.utc) + timedelta(days=DIAS_MARCA)
+    ops: List[OperacionLote] = []
+    for g in grupos:
+        marca = {
+            "doc_path": g.doc_path,
+            "mutaciones": len(g.ids),
+            "aplicado_en": firestore.SERVER_TIMESTAMP,
+            "expira": expira,
+        }
+        ops.append(OperacionLote(db.collection(COLECCION_IDEMPOTENCIA).document(g.clave), marca, tipo="create"))
+        ops.append(OperacionLote(_doc_ref_from_path(db, g.doc_path), g.data, merge=g.merge))
+    return ops
+
+def _enviar(db, grupos: List[EscrituraAgrupada]) -> List[EscrituraAgrupada]:
+    """Escribe los grupos en batches y devuelve los que no quedaron aplicados."""
+    validos, fallidos = [], []
+    for g in grupos:
+        try:
+            _doc_ref_from_path(db, g.doc_path)
+            validos.append(g)
+        except ValueError:
+            fallidos.append(g)
+    if not validos:
+        return fallidos
+    resultados = escribir_en_lotes(db, _operaciones(db, validos), tamano_lote=PARES_POR_LOTE * 2)
+    fallidos.extend(g for i, g in enumerate(validos) if not resultados[2 * i + 1].ok)
+    return fallidos
+
+def _ya_aplicados(db, grupos: List[EscrituraAgrupada]) -> set:
+    """Claves cuya marca existe: un intento anterior llegó a Firestore aunque no recibimos la respuesta."""
+    if not grupos:
+        return set()
+    try:
+        refs = [db.collection(COLECCION_IDEMPOTENCIA).document(g.clave) for g in grupos]
+        return {snap.id for snap in db.get_all(refs) if snap.exists}
+    except Exception:
+        return set()
+
 def try_sync_now() -> Tuple[int, int]:
-    """Intenta sincronizar toda la cola. Devuelve (ok, fail)."""
-    if is_offline():
+    """Intenta sincronizar toda la cola en una pasada. Devuelve (ok, fail) en número de mutaciones."""
+    estado = read_sync_state()
+    if estado["offline"]:
         return (0, 0)
-
-    db = get_db()
-    queue = peek_mutations()
+    queue: List[Dict[str, Any]] = estado["mutations"]
     if not queue:
         return (0, 0)
 
-    ok = 0
-    fail = 0
-    new_queue: List[Dict[str, Any]] = []
-    for m in queue:
-        try:
-            _apply_mutation(db, m)
-            ok += 1
-        except Exception as e:
-            # Si falla por red o conflicto, lo reintentamos más tarde
-            new_queue.append(m)
-            fail += 1
+    db = get_db()
+    grupos, _no_soportadas = coalescer_mutaciones(queue)  # las no soportadas se descartan, como antes
+    pendientes = _enviar(db, grupos)
+    if pendientes:
+        # Un create de marca repetido hace fallar todo su batch: se descartan los ya aplicados y se reintenta el resto.
+        aplicados = _ya_aplicados(db, pendientes)
+        pendientes = _enviar(db, [g for g in pendientes if g.clave not in aplicados])
 
-    replace_mutations(new_queue)
-    if fail == 0:  # todo OK
-        set_last_sync_ok()
+    ids_pendientes = {i for g in pendientes for i in g.ids}
+    new_queue = [m for m in queue if _id_mutacion(m) in ids_pendientes]
+    fail = len(new_queue)
+    ok = len(queue) - fail
+    last_sync_ok = int(time.time()) if fail == 0 else estado["last_sync_ok"]
+    write_sync_state(new_queue, last_sync_ok, legacy=estado.get("_legacy", False))
     return (ok, fail)
@@ -6,8 +6,6 @@
 
 import streamlit as st
 from datetime import datetime, date, timedelta
-from io import BytesIO
-import matplotlib.pyplot as plt
 import textwrap
 import json
 import unicodedata
@@ -16,6 +14,8 @@ import unicodedata
 import firebase_admin
 from firebase_admin import credentials, firestore
 
+from app_core.tarjetas import BocetoTarjeta, Tarjeta, tarjeta_png
+
 # ==========================
 #  Utilidades generales
 # ==========================
@@ -178,9 +178,9 @@ def generar_tarjeta_resumen(
     dia_semana: str,
     ejercicios: list[dict],
     gym_name: str = "Motion Performance",
-) -> plt.Figure:
+) -> Tarjeta:
     """
-    Crea un gráfico tipo "tarjeta Strava" con:
+    Describe la tarjeta tipo "tarjeta Strava" (se rasteriza con `tarjeta_png`):
       - Encabezado con marca
       - Nombre deportista + fecha + día
       - Lista de ejercicios (truncada si hay muchos)
@@ -199,8 +199,7 @@ def generar_tarjeta_resumen(
         total_reps += s * r
         total_peso += s * r * p
 
-    fig, ax = plt.subplots(figsize=(6, 8), dpi=200)
-    ax.axis("off")
+    ax = BocetoTarjeta()
 
     # Encabezado marca
     ax.text(
@@ -259,18 +258,19 @@ def generar_tarjeta_resumen(
     ax.text(0.07, y, f"• Volumen estimado: {total_peso:g} kg", fontsize=11, ha="left"); y -= 0.02
 
     # Mensaje motivacional
-    frase = random_mensaje(nombre or "Atleta")
+    frase = random_mensaje(nombre or "Atleta", semilla=f"{nombre}|{fecha_sesion}|{dia_semana}")
     ax.text(0.5, 0.08, frase, fontsize=10.5, ha="center", style="italic")
 
     # Pie
     ax.text(0.5, 0.04, "Comparte tu progreso 📸", fontsize=9, ha="center")
 
-    fig.tight_layout()
-    return fig
+    return ax.tarjeta()
 
-def random_mensaje(nombre: str) -> str:
+def random_mensaje(nombre: str, semilla: str = "") -> str:
     import random
-    frase = random.choice(MENSAJES_MOTIVACIONALES)
+    # con semilla la misma sesión repite frase: la tarjeta no cambia y sale de la caché
+    rng = random.Random(semilla) if semilla else random
+    frase = rng.choice(MENSAJES_MOTIVACIONALES)
     return frase.format(nombre=nombre.split(" ")[0])
 
 # ==========================
@@ -350,22 +350,20 @@ def ui_resumen_strava():
     generar = st.button("📸 Generar imagen de resumen", use_container_width=True)
 
     if generar and ejercicios:
-        fig = generar_tarjeta_resumen(
+        tarjeta = generar_tarjeta_resumen(
             nombre=nombre,
             fecha_sesion=fecha_sesion,
             dia_semana=dia_semana,
             ejercicios=ejercicios,
             gym_name=gym_name
         )
-        st.pyplot(fig, clear_figure=False)
+        png = tarjeta_png(tarjeta)
+        st.image(png, use_container_width=True)
 
         # Descargar como PNG
-        buf = BytesIO()
-        fig.savefig(buf, format="png", bbox_inches="tight")
-        buf.seek(0)
         st.download_button(
             "⬇️ Descargar PNG",
-            data=buf,
+            data=png,
             file_name=f"resumen_{normalizar_correo(nombre or 'atleta')}_{fecha_sesion.isoformat()}.png",
             mime="image/png",
             use_container_width=True
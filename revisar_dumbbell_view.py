@@ -6,6 +6,8 @@ from typing import Any, Dict, List, Tuple
 
 import streamlit as st
 
+from app_core.cache import notify_write
+from app_core.data_access import clave_rutinas_de_doc
 from app_core.firebase_client import get_db
 
 
@@ -264,7 +266,7 @@ def revisar_dumbbell_admin_view() -> None:
         try:
             incidencia_sel.doc_ref.set(incidencia_sel.data_actualizada)
             st.success("Corrección aplicada correctamente.")
-            st.cache_data.clear()
+            notify_write("rutinas", clave_rutinas_de_doc(incidencia_sel.doc_ref.id))
             st.rerun()
         except Exception as exc:
             st.error(f"No se pudo actualizar la semana seleccionada: {exc}")
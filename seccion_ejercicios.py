@@ -6,6 +6,8 @@ import streamlit as st
 import firebase_admin
 from firebase_admin import firestore
 
+from app_core.cache import clear_cache
+from app_core.ejercicios_catalogo import catalogo_completo, guardar_ejercicio, guardar_ejercicios
 from app_core.utils import empresa_de_usuario, EMPRESA_ASESORIA
 
 # ======================
@@ -51,10 +53,6 @@ def _es_url_valida(url: str) -> bool:
 def _formato_link(url: str) -> str:
     return f"[Ver video]({url})" if url else "-"
 
-def _chunked(items: list, size: int):
-    for i in range(0, len(items), size):
-        yield items[i:i + size]
-
 def _ejercicios_a_csv(rows: list[dict]) -> bytes:
     """Convierte la lista de ejercicios (sin claves internas) a CSV UTF-8 BOM."""
     visibles = []
@@ -81,17 +79,11 @@ def _actualizar_privacidad(doc_ids: list[str], publico: bool):
         return
 
     db = firestore.client()
-    ref = db.collection("ejercicios")
-    for lote in _chunked(doc_ids, 400):
-        batch = db.batch()
-        for doc_id in lote:
-            batch.set(ref.document(doc_id), {"publico": publico}, merge=True)
-        batch.commit()
+    guardar_ejercicios(db, ((doc_id, {"publico": publico}) for doc_id in doc_ids))
 
 # ======================
 # Lectura con filtros de visibilidad
 # ======================
-@st.cache_data(show_spinner=False, ttl=60)
 def _cargar_ejercicios():
     """
     Lee colección 'ejercicios' filtrando:
@@ -107,27 +99,13 @@ def _cargar_ejercicios():
     restringe_privados_por_empresa = (not es_admin) and (empresa == EMPRESA_ASESORIA)
 
     try:
-        if es_admin:
-            docs = db.collection("ejercicios").stream()
-        else:
-            # 1) Públicos
-            pub_docs = list(db.collection("ejercicios").where("publico", "==", True).stream())
-            # 2) Privados del entrenador
-            priv_docs = []
-            if correo:
-                priv_docs = list(db.collection("ejercicios").where("entrenador", "==", correo).stream())
-            # Unir (evitar duplicados por id)
-            by_id = {}
-            for d in pub_docs + priv_docs:
-                if getattr(d, "exists", True):
-                    by_id[d.id] = d
-            docs = by_id.values()
-
-        for d in docs:
-            if not getattr(d, "exists", True):
+        _, docs = catalogo_completo(db)
+        for doc_id, doc_data in docs.items():
+            # No admin: públicos + privados del entrenador
+            if not es_admin and not (doc_data.get("publico") is True or (correo and doc_data.get("entrenador") == correo)):
                 continue
-            row = d.to_dict() or {}
-            row["_id"] = d.id
+            row = dict(doc_data)
+            row["_id"] = doc_id
             row["nombre"] = row.get("nombre", "")
             row["id_implemento"] = row.get("id_implemento", "")
             # Visibilidad/autor (para UI)
@@ -153,11 +131,11 @@ def _cargar_ejercicios():
 
 def _guardar_video(doc_id: str, url: str):
     db = firestore.client()
-    db.collection("ejercicios").document(doc_id).update({"video": url})
+    guardar_ejercicio(db, doc_id, {"video": url}, actualizar=True)
 
 def _quitar_video(doc_id: str):
     db = firestore.client()
-    db.collection("ejercicios").document(doc_id).update({"video": ""})
+    guardar_ejercicio(db, doc_id, {"video": ""}, actualizar=True)
 
 # ======================
 # UI
@@ -276,7 +254,7 @@ def base_ejercicios():
                         try:
                             _quitar_video(e["_id"])
                             st.success("Video eliminado.")
-                            st.cache_data.clear()
+                            clear_cache("ejercicios")
                             st.rerun()
                         except Exception as ex:
                             st.error(f"Error al eliminar: {ex}")
@@ -316,7 +294,7 @@ def base_ejercicios():
                                 st.success("¡Video guardado!")
                                 st.session_state.edit_video_id = None
                                 st.session_state.edit_video_default = ""
-                                st.cache_data.clear()
+                                clear_cache("ejercicios")
                                 st.rerun()
                             except Exception as ex:
                                 st.error(f"Error guardando: {ex}")
@@ -375,7 +353,7 @@ def base_ejercicios():
                 st.success(f"Se actualizaron {len(selected_ids)} ejercicios a públicos.")
                 for info in checkbox_registry.values():
                     st.session_state.pop(info["key"], None)
-                st.cache_data.clear()
+                clear_cache("ejercicios")
                 st.rerun()
             except Exception as ex:
                 st.error(f"Error actualizando privacidad: {ex}")
@@ -1,15 +1,20 @@
 # seguimiento_entrenamiento.py
 from __future__ import annotations
-import json, re
+import json
 from datetime import datetime, timedelta, date
 
+import numpy as np
 import pandas as pd
 import streamlit as st
 
 from firebase_admin import firestore
+from app_core.carga_entrenamiento import semanas_desde_rollups, tabla_desde_rollups
+from app_core.clientes_index import cargar_indice_clientes
 from app_core.firebase_client import get_db
+from app_core.rollups_semanales import cargar_rollups, dia_finalizado, obtener_lista_ejercicios
 from app_core.theme import inject_theme
-from app_core.utils import correo_a_doc_id, usuario_activo
+from app_core.users_service import get_users_map
+from app_core.utils import usuario_activo
 
 # =============================
 #  Estilos / Constantes
@@ -24,77 +29,23 @@ inject_theme()
 def normalizar_id(correo: str) -> str:
     return (correo or "").strip().lower()
 
-def safe_int(x, default=0):
-    try: return int(float(x))
-    except Exception: return default
-
-def safe_float(x, default=0.0):
-    try: return float(x)
-    except Exception: return default
-
-def parse_reps_min(value) -> int | None:
-    """Extrae el mínimo de repeticiones desde formatos típicos."""
-    if value is None: return None
-    if isinstance(value, (int, float)):
-        try: return int(value)
-        except Exception: return None
-    if isinstance(value, dict):
-        for k in ("min","reps_min","rep_min","rmin"):
-            if k in value:
-                try: return int(value[k])
-                except Exception: pass
-        if "reps" in value:
-            return parse_reps_min(value["reps"])
-    s = str(value).strip().lower()
-    m = re.match(r"^\s*(\d+)\s*[x×]\s*\d+", s)
-    if m: return int(m.group(1))
-    m = re.match(r"^\s*(\d+)\s*[-–—]\s*(\d+)", s)
-    if m: return int(m.group(1))
-    m = re.match(r"^\s*(\d+)\s*$", s)
-    if m: return int(m.group(1))
-    return None
-
-def clasificar_categoria(reps_min: int | None) -> str:
-    """
-    Regla:
-      - reps_min < 6          -> Fuerza
-      - 6 <= reps_min < 12    -> Hipertrofia
-      - reps_min >= 12        -> Accesorio
-    """
-    if reps_min is None: return "Accesorio"
-    if reps_min < 6:     return "Fuerza"
-    if reps_min < 12:    return "Hipertrofia"
-    return "Accesorio"
-
 
 # =============================
 #  Lectura de datos (según tu esquema real)
 # =============================
 def _usuarios_por_correo(db) -> dict[str, dict]:
-    mapping: dict[str, dict] = {}
     try:
-        for snap in db.collection("usuarios").stream():
-            if not snap.exists:
-                continue
-            data = snap.to_dict() or {}
-            correo_u = normalizar_id(data.get("correo") or "")
-            if not correo_u:
-                continue
-            mapping[correo_u] = data
-            mapping[correo_a_doc_id(correo_u)] = data
+        return dict(get_users_map())
     except Exception:
-        return mapping
-    return mapping
+        return {}
 
 
 def listar_clientes_con_rutinas(db) -> list[str]:
-    """Correos únicos desde 'rutinas_semanales' (campo 'correo')."""
+    """Correos únicos desde el índice de clientes (un doc por cliente con semanas)."""
     usuarios_map = _usuarios_por_correo(db)
     correos = set()
-    for doc in db.collection("rutinas_semanales").limit(1000).stream():
-        data = doc.to_dict() or {}
-        email = data.get("correo")
-        correo_norm = normalizar_id(email)
+    for entrada in cargar_indice_clientes():
+        correo_norm = normalizar_id(entrada.get("correo"))
         if not correo_norm:
             continue
         if usuario_activo(correo_norm, usuarios_map, default_if_missing=True):
@@ -122,207 +73,9 @@ def listar_evaluaciones_cliente(db, correo: str) -> list[dict]:
     out.sort(key=lambda x: x.get("_fecha_dt") or datetime.min)
     return out
 
-def dia_finalizado(doc_dict: dict, dia_key: str) -> bool:
-    """
-    Día finalizado según tu app:
-      - doc["rutina"][f"{dia}_finalizado"] == True
-    (Se mantiene compatibilidad con mapas alternativos si existieran).
-    """
-    dia_key = str(dia_key)
-    rutina = doc_dict.get("rutina") or {}
-    flag_key = f"{dia_key}_finalizado"
-    if isinstance(rutina, dict) and flag_key in rutina:
-        return bool(rutina.get(flag_key) is True)
-
-    fin_map = doc_dict.get("finalizados")
-    if isinstance(fin_map, dict):
-        val = fin_map.get(dia_key)
-        if isinstance(val, bool):
-            return val
-
-    estado_map = doc_dict.get("estado_por_dia")
-    if isinstance(estado_map, dict):
-        val = str(estado_map.get(dia_key, "")).strip().lower()
-        if val in ("fin","final","finalizado","completado","done"):
-            return True
-
-    alt = doc_dict.get(f"dia_{dia_key}")
-    if isinstance(alt, dict) and "finalizado" in alt:
-        return bool(alt.get("finalizado"))
-
-    return False
-
-def obtener_lista_ejercicios(data_dia):
-    """
-    Normaliza el contenido del día a lista de ejercicios (dicts):
-      - lista directa de dicts
-      - dict con subclave 'ejercicios' (list/dict)
-      - dict con claves numéricas "1","2",...
-    """
-    if data_dia is None: return []
-    # Lista
-    if isinstance(data_dia, list):
-        if len(data_dia) == 1 and isinstance(data_dia[0], dict) and "ejercicios" in data_dia[0]:
-            return obtener_lista_ejercicios(data_dia[0]["ejercicios"])
-        return [e for e in data_dia if isinstance(e, dict)]
-    # Dict
-    if isinstance(data_dia, dict):
-        if "ejercicios" in data_dia:
-            ej = data_dia["ejercicios"]
-            if isinstance(ej, list):
-                return [e for e in ej if isinstance(e, dict)]
-            if isinstance(ej, dict):
-                try:
-                    pares = sorted(ej.items(), key=lambda kv: int(kv[0]))
-                    return [v for _, v in pares if isinstance(v, dict)]
-                except Exception:
-                    return [v for v in ej.values() if isinstance(v, dict)]
-            return []
-        claves_numericas = [k for k in data_dia.keys() if str(k).isdigit()]
-        if claves_numericas:
-            try:
-                pares = sorted(((k, data_dia[k]) for k in claves_numericas), key=lambda kv: int(kv[0]))
-                return [v for _, v in pares if isinstance(v, dict)]
-            except Exception:
-                return [data_dia[k] for k in data_dia if isinstance(data_dia[k], dict)]
-        return [v for v in data_dia.values() if isinstance(v, dict)]
-    return []
-
-def _iter_dias_rutina(doc_dict: dict):
-    """
-    Itera días desde doc['rutina'] (dict) y devuelve (dia_key, lista_ejercicios_del_dia).
-    Detecta días por claves numéricas "1","2",... y normaliza el día con obtener_lista_ejercicios().
-    """
-    r = doc_dict.get("rutina")
-    if not isinstance(r, dict):
-        return
-    dia_keys = [k for k in r.keys() if str(k).isdigit()]
-    dia_keys.sort(key=lambda x: int(x))
-    for dia_key in dia_keys:
-        ejercicios_raw = r.get(dia_key)
-        lista = obtener_lista_ejercicios(ejercicios_raw)
-        yield str(dia_key), lista
-
-def iter_ejercicios_en_rango(db, correo: str, desde: date, hasta: date,
-                             usar_real: bool, excluir_warmup: bool):
-    """
-    Estructura:
-      - 'correo' (string)
-      - 'fecha_lunes' (YYYY-MM-DD)
-      - 'rutina' = dict {"1":[...], "2":[...]}
-    REGLA:
-      - Teórico (usar_real=False): cuenta TODOS los días.
-      - Real    (usar_real=True):  SOLO días finalizados.
-    Switch:
-      - excluir_warmup: omite ejercicios cuyo bloque sea "Warm Up" (o seccion equivalente).
-    """
-    correo_norm = normalizar_id(correo)
-
-    docs = list(
-        db.collection("rutinas_semanales")
-          .where("correo", "==", correo_norm)
-          .stream()
-    )
-
-    for doc in docs:
-        data = doc.to_dict() or {}
-
-        # Fecha base de semana
-        fecha_semana = None
-        v = data.get("fecha_lunes") or data.get("semana_inicio") or data.get("fecha")
-        if isinstance(v, str):
-            try: fecha_semana = datetime.fromisoformat(v).date()
-            except Exception: fecha_semana = None
-        if not fecha_semana:
-            # Fallback por ID *_YYYY_MM_DD
-            try:
-                tail = "_".join(doc.id.split("_")[-3:])
-                fecha_semana = datetime.strptime(tail, "%Y_%m_%d").date()
-            except Exception:
-                continue
-
-        # Recorremos días
-        for dia_key, ejercicios in _iter_dias_rutina(data):
-            try: idx = int(dia_key) - 1
-            except Exception: idx = 0
-            fecha_dia = fecha_semana + timedelta(days=idx)
-
-            # Filtro por rango
-            if not (desde <= fecha_dia <= hasta):
-                continue
-
-            # Real = solo finalizados
-            if usar_real and (not dia_finalizado(data, dia_key)):
-                continue
-
-            if not isinstance(ejercicios, list):
-                continue
-
-            for ej in ejercicios:
-                if not isinstance(ej, dict):
-                    continue
-
-                # Excluir Warm Up (bloque/seccion)
-                if excluir_warmup:
-                    bloque = str(ej.get("bloque", ej.get("seccion", ""))).strip().lower()
-                    bloque_norm = bloque.replace("-", " ").replace("_", " ")
-                    if bloque_norm == "warm up":
-                        continue
-
-                series   = safe_int(ej.get("series", 0), 0)
-                reps_min = parse_reps_min(ej.get("reps_min", ej.get("reps")))
-                reps_min = safe_int(reps_min or 0, 0)
-                peso_plan = safe_float(ej.get("peso", 0), 0.0)
-                peso_alc  = safe_float(
-                    ej.get("peso_alcanzado")
-                    or ej.get("Peso_alcanzado")
-                    or ej.get("PesoAlcanzado"),
-                    0.0,
-                )
-
-                yield {
-                    "fecha": fecha_dia,
-                    "ejercicio": ej.get("ejercicio"),
-                    "series": series,
-                    "reps_min": reps_min,
-                    "peso": peso_plan,
-                    "peso_alcanzado": peso_alc,
-                }
-
-
 # =============================
 #  Agregaciones (tablas)
 # =============================
-def agrupar_por_semana(ej_list: list[dict]) -> pd.DataFrame:
-    """Devuelve DF con columnas: semana, categoria, series, volumen, tonelaje."""
-    rows = []
-    for ej in ej_list:
-        reps_min = ej.get("reps_min") or 0
-        categoria = clasificar_categoria(reps_min)
-        series = safe_int(ej.get("series"), 0)
-        peso = safe_float(ej.get("peso"), 0.0)
-        volumen = series * reps_min
-        tonelaje = volumen * peso
-
-        f: date = ej["fecha"]
-        lunes = f - timedelta(days=f.weekday())
-
-        rows.append({
-            "semana": lunes,
-            "categoria": categoria,
-            "series": series,
-            "volumen": volumen,
-            "tonelaje": tonelaje
-        })
-
-    if not rows:
-        return pd.DataFrame(columns=["semana", "categoria", "series", "volumen", "tonelaje"])
-
-    df = pd.DataFrame(rows)
-    df = df.groupby(["semana", "categoria"], as_index=False).sum(numeric_only=True)
-    df = df.sort_values(["semana", "categoria"])
-    return df
-
 def resumen_semanal(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
     """Retorna (df_totales, df_promedio_por_categoria)."""
     if df.empty:
@@ -490,19 +243,10 @@ def app():
     disabled = (not correo_sel) or (fecha_ini is None) or (fecha_fin is None) or (fecha_ini > fecha_fin)
     if st.button("Calcular seguimiento", type="primary", disabled=disabled, use_container_width=True):
         with st.spinner("Calculando…"):
-            ejercicios = list(iter_ejercicios_en_rango(
-                db, correo_sel, fecha_ini, fecha_fin,
-                usar_real=usar_real, excluir_warmup=excluir_warmup
-            ))
-            df_raw = pd.DataFrame(ejercicios)
-            if not df_raw.empty:
-                df_raw["peso"] = df_raw["peso"].apply(lambda x: safe_float(x, 0.0))
-                if "peso_alcanzado" in df_raw.columns:
-                    df_raw["peso_alcanzado"] = df_raw["peso_alcanzado"].apply(lambda x: safe_float(x, 0.0))
-                else:
-                    df_raw["peso_alcanzado"] = 0.0
-                df_raw["fecha"] = pd.to_datetime(df_raw["fecha"]).dt.date
-            df = agrupar_por_semana(ejercicios)
+            rollups = cargar_rollups(db, correo_sel, fecha_ini, fecha_fin)
+            tabla = tabla_desde_rollups(rollups).filtrar(fecha_ini, fecha_fin, usar_real, excluir_warmup)
+            df_raw = tabla.a_dataframe()
+            df = semanas_desde_rollups(rollups, fecha_ini, fecha_fin, usar_real, excluir_warmup)
             df_totales, df_prom = resumen_semanal(df)
 
         st.session_state["_seg_df_raw"] = df_raw
@@ -791,11 +535,8 @@ def app():
             key="_seg_select_ejercicio"
         )
         df_ej = df_raw[df_raw["ejercicio"] == ejercicio_sel].copy()
-        df_ej["peso_util"] = df_ej.apply(
-            lambda row: row["peso_alcanzado"] if safe_float(row.get("peso_alcanzado"), 0.0) > 0 else row["peso"],
-            axis=1,
-        )
-        df_ej = df_ej[df_ej["peso_util"].apply(lambda x: safe_float(x, 0.0) > 0)]
+        df_ej["peso_util"] = np.where(df_ej["peso_alcanzado"] > 0, df_ej["peso_alcanzado"], df_ej["peso"])
+        df_ej = df_ej[df_ej["peso_util"] > 0]
 
         if df_ej.empty:
             st.info("Ese ejercicio no tiene registros de peso en el rango seleccionado.")
@@ -0,0 +1,303 @@
+"""Fixtures compartidas: Firestore en memoria y un servidor SMTP local."""
+from __future__ import annotations
+
+import copy
+import socketserver
+import sys
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+
+# =============================
+#  Firestore en memoria
+# =============================
+class DocumentoYaExiste(Exception):
+    pass
+
+
+class PrecondicionFallida(Exception):
+    pass
+
+
+def _resolver_valor(actual: Any, valor: Any) -> Any:
+    from google.cloud.firestore_v1 import transforms
+
+    if isinstance(valor, transforms.Increment):
+        return (actual or 0) + valor.value
+    if isinstance(valor, transforms.ArrayUnion):
+        previos = list(actual or [])
+        return previos + [v for v in valor.values if v not in previos]
+    if isinstance(valor, transforms.ArrayRemove):
+        return [v for v in (actual or []) if v not in valor.values]
+    if isinstance(valor, transforms.Sentinel):
+        return datetime.now(timezone.utc)
+    if isinstance(valor, dict):
+        return {k: _resolver_valor(None, v) for k, v in valor.items()}
+    return copy.deepcopy(valor)
+
+
+def _merge(base: Dict[str, Any], nuevo: Dict[str, Any]) -> None:
+    for k, v in nuevo.items():
+        if isinstance(v, dict) and isinstance(base.get(k), dict):
+            _merge(base[k], v)
+        else:
+            base[k] = _resolver_valor(base.get(k), v)
+
+
+class SnapFalso:
+    def __init__(self, ref: "RefFalsa", data: Optional[dict], update_time: Optional[int]) -> None:
+        self.reference = ref
+        self.id = ref.id
+        self.exists = data is not None
+        self.update_time = update_time
+        self._data = data
+
+    def to_dict(self) -> Optional[dict]:
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+
+class RefFalsa:
+    def __init__(self, db: "FirestoreFalso", path: str) -> None:
+        self._db = db
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def collection(self, nombre: str) -> "ColeccionFalsa":
+        return ColeccionFalsa(self._db, f"{self.path}/{nombre}")
+
+    def get(self, transaction=None) -> SnapFalso:
+        return self._db.snap(self.path)
+
+    def set(self, data: dict, merge: bool = False) -> None:
+        self._db.aplicar([("set", self.path, data, merge, None)])
+
+    def update(self, data: dict, option=None) -> None:
+        self._db.aplicar([("update", self.path, data, False, option)])
+
+
+class ConsultaFalsa:
+    def __init__(self, db: "FirestoreFalso", coleccion: str) -> None:
+        self._db = db
+        self._coleccion = coleccion
+        self._filtros: List[tuple] = []
+        self._orden: Optional[str] = None
+        self._limite: Optional[int] = None
+
+    def where(self, campo: str, op: str, valor: Any) -> "ConsultaFalsa":
+        self._filtros.append((campo, op, valor))
+        return self
+
+    def order_by(self, campo: str) -> "ConsultaFalsa":
+        self._orden = campo
+        return self
+
+    def limit(self, n: int) -> "ConsultaFalsa":
+        self._limite = n
+        return self
+
+    def _cumple(self, data: dict) -> bool:
+        for campo, op, valor in self._filtros:
+            actual = data.get(campo)
+            if op == "==" and actual != valor:
+                return False
+            if op == "in" and actual not in valor:
+                return False
+            if op == "<=" and (actual is None or actual > valor):
+                return False
+            if op == ">=" and (actual is None or actual < valor):
+                return False
+        return True
+
+    def stream(self):
+        prefijo = self._coleccion + "/"
+        snaps = [
+            self._db.snap(path)
+            for path in list(self._db.docs)
+            if path.startswith(prefijo) and "/" not in path[len(prefijo):]
+        ]
+        snaps = [s for s in snaps if self._cumple(s.to_dict())]
+        if self._orden:
+            snaps.sort(key=lambda s: s.to_dict().get(self._orden))
+        return iter(snaps[: self._limite] if self._limite is not None else snaps)
+
+
+class ColeccionFalsa(ConsultaFalsa):
+    def document(self, doc_id: str) -> RefFalsa:
+        return RefFalsa(self._db, f"{self._coleccion}/{doc_id}")
+
+
+class BatchFalso:
+    def __init__(self, db: "FirestoreFalso") -> None:
+        self._db = db
+        self._ops: List[tuple] = []
+
+    def set(self, ref: RefFalsa, data: dict, merge: bool = False) -> None:
+        self._ops.append(("set", ref.path, data, merge, None))
+
+    def create(self, ref: RefFalsa, data: dict) -> None:
+        self._ops.append(("create", ref.path, data, False, None))
+
+    def update(self, ref: RefFalsa, data: dict, option=None) -> None:
+        self._ops.append(("update", ref.path, data, False, option))
+
+    def delete(self, ref: RefFalsa, option=None) -> None:
+        self._ops.append(("delete", ref.path, None, False, option))
+
+    def commit(self) -> None:
+        self._db.commits.append(len(self._ops))
+        self._db.aplicar(self._ops)
+        if self._db.perder_respuestas > 0:
+            # El batch quedó escrito pero el cliente no recibe la confirmación
+            self._db.perder_respuestas -= 1
+            raise ConnectionError("respuesta perdida")
+
+
+class FirestoreFalso:
+    """Lo justo del cliente de Firestore para batch, consultas simples y precondiciones."""
+
+    def __init__(self) -> None:
+        self.docs: Dict[str, dict] = {}
+        self.versiones: Dict[str, int] = {}
+        self.commits: List[int] = []
+        self.perder_respuestas = 0
+        self._reloj = 0
+
+    def collection(self, nombre: str) -> ColeccionFalsa:
+        return ColeccionFalsa(self, nombre)
+
+    def batch(self) -> BatchFalso:
+        return BatchFalso(self)
+
+    def write_option(self, last_update_time=None):
+        return ("last_update_time", last_update_time)
+
+    def get_all(self, refs):
+        return [self.snap(ref.path) for ref in refs]
+
+    def snap(self, path: str) -> SnapFalso:
+        return SnapFalso(RefFalsa(self, path), self.docs.get(path), self.versiones.get(path))
+
+    def aplicar(self, ops: List[tuple]) -> None:
+        """Aplica las operaciones de forma atómica (todas o ninguna)."""
+        docs = copy.deepcopy(self.docs)
+        tocados = []
+        for tipo, path, data, merge, opcion in ops:
+            if opcion is not None and self.versiones.get(path) != opcion[1]:
+                raise PrecondicionFallida(path)
+            if tipo == "create":
+                if path in docs:
+                    raise DocumentoYaExiste(path)
+                docs[path] = _resolver_valor(None, data)
+            elif tipo == "set":
+                if merge:
+                    _merge(docs.setdefault(path, {}), data)
+                else:
+                    docs[path] = _resolver_valor(None, data)
+            elif tipo == "update":
+                if path not in docs:
+                    raise KeyError(path)
+                for k, v in data.items():
+                    docs[path][k] = _resolver_valor(docs[path].get(k), v)
+            elif tipo == "delete":
+                docs.pop(path, None)
+            tocados.append(path)
+        self.docs = docs
+        for path in tocados:
+            self._reloj += 1
+            self.versiones[path] = self._reloj
+
+
+@pytest.fixture
+def db_falsa() -> FirestoreFalso:
+    return FirestoreFalso()
+
+
+# =============================
+#  Servidor SMTP local
+# =============================
+class ServidorSMTP(socketserver.ThreadingTCPServer):
+    """SMTP mínimo en 127.0.0.1: acepta AUTH PLAIN y guarda cada mensaje recibido."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), _SesionSMTP)
+        self.host, self.port = self.server_address
+        self.mensajes: List[tuple] = []
+        self.sesiones = 0
+        self.cerrar_tras: Optional[int] = None   # corta la conexión tras N mensajes por sesión
+        self._lock = threading.Lock()
+
+
+class _SesionSMTP(socketserver.StreamRequestHandler):
+    server: ServidorSMTP
+
+    def _responder(self, linea: str) -> None:
+        self.wfile.write((linea + "\r\n").encode())
+
+    def handle(self) -> None:
+        self._responder("220 localhost ESMTP")
+        remitente, destinatarios, enviados = "", [], 0
+        while True:
+            linea = self.rfile.readline()
+            if not linea:
+                return
+            comando = linea.decode().strip()
+            verbo = comando.split(" ", 1)[0].upper()
+            if verbo == "EHLO":
+                self._responder("250-localhost")
+                self._responder("250 AUTH PLAIN")
+            elif verbo == "HELO":
+                self._responder("250 localhost")
+            elif verbo == "AUTH":
+                with self.server._lock:
+                    self.server.sesiones += 1
+                self._responder("235 2.7.0 Authentication successful")
+            elif verbo == "MAIL":
+                remitente, destinatarios = comando.split(":", 1)[1].strip(" <>"), []
+                self._responder("250 OK")
+            elif verbo == "RCPT":
+                destinatarios.append(comando.split(":", 1)[1].strip(" <>"))
+                self._responder("250 OK")
+            elif verbo == "DATA":
+                self._responder("354 End data with <CR><LF>.<CR><LF>")
+                cuerpo = []
+                while True:
+                    fila = self.rfile.readline()
+                    if not fila or fila in (b".\r\n", b".\n"):
+                        break
+                    cuerpo.append(fila)
+                with self.server._lock:
+                    self.server.mensajes.append((remitente, destinatarios, b"".join(cuerpo).decode()))
+                self._responder("250 OK")
+                enviados += 1
+                if self.server.cerrar_tras and enviados >= self.server.cerrar_tras:
+                    return
+            elif verbo == "RSET" or verbo == "NOOP":
+                self._responder("250 OK")
+            elif verbo == "QUIT":
+                self._responder("221 Bye")
+                return
+            else:
+                self._responder("502 Command not implemented")
+
+
+@pytest.fixture
+def smtp_local():
+    servidor = ServidorSMTP()
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+    try:
+        yield servidor
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
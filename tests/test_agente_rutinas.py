@@ -0,0 +1,156 @@
+"""Sugerencias escaladas contra un servidor OpenAI local y la caché acotada de respuestas."""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("dotenv")
+
+import agente_rutinas  # noqa: E402
+from agente_rutinas import _CacheRespuestas  # noqa: E402
+
+CORREO = "cliente@example.com"
+SEMANA = "2026_10_19"
+SUGERENCIA = {"peso_sugerido": 42.5, "reps_sugeridas": "8-10", "rir_sugerido": 2, "comentario": "stub"}
+
+
+class _ServidorOpenAI(ThreadingHTTPServer):
+    """Responde /v1/responses y /v1/chat/completions con una sugerencia fija y guarda cada pedido."""
+
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), _PedidoOpenAI)
+        self.pedidos: list = []
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address
+        return f"http://{host}:{port}/v1"
+
+
+class _PedidoOpenAI(BaseHTTPRequestHandler):
+    server: _ServidorOpenAI
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        cuerpo = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        with self.server._lock:
+            self.server.pedidos.append((self.path, cuerpo))
+        texto = json.dumps(SUGERENCIA)
+        if self.path.endswith("/responses"):
+            data = {
+                "id": "resp_1", "object": "response", "created_at": 0, "model": cuerpo.get("model"),
+                "status": "completed", "parallel_tool_calls": False, "tool_choice": "auto", "tools": [],
+                "output": [{
+                    "type": "message", "id": "msg_1", "role": "assistant", "status": "completed",
+                    "content": [{"type": "output_text", "text": texto, "annotations": []}],
+                }],
+            }
+        else:
+            data = {
+                "id": "chat_1", "object": "chat.completion", "created": 0, "model": cuerpo.get("model"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": texto}}],
+            }
+        salida = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(salida)))
+        self.end_headers()
+        self.wfile.write(salida)
+
+
+@pytest.fixture
+def openai_local(monkeypatch):
+    servidor = _ServidorOpenAI()
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+    monkeypatch.setenv("OPENAI_BASE_URL", servidor.base_url)
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-prueba")
+    agente_rutinas.get_openai_client.cache_clear()
+    try:
+        yield servidor
+    finally:
+        agente_rutinas.get_openai_client.cache_clear()
+        servidor.shutdown()
+        servidor.server_close()
+
+
+@pytest.fixture
+def agente(db_falsa, openai_local, monkeypatch, tmp_path):
+    """Historial con solo lo planificado (sin reportes): las reglas no deciden y se escala a la IA."""
+    semana_previa = "2026_10_12"
+    db_falsa.collection("rutinas_semanales").document(f"cliente_example_com_{semana_previa}").set({
+        "rutina": [[
+            {"ejercicio": "Sentadilla", "peso": "40", "reps_min": 8, "reps_max": 10, "rir": 2},
+            {"ejercicio": "Press banca", "peso": "30", "reps_min": 6, "reps_max": 8, "rir": 2},
+        ]],
+    })
+    monkeypatch.setattr(agente_rutinas, "get_db", lambda: db_falsa)
+    monkeypatch.setattr(agente_rutinas, "_CACHE_SUGERENCIAS", _CacheRespuestas(tmp_path, 3600))
+    agente_rutinas.invalidar_historial()
+    yield openai_local
+    agente_rutinas.invalidar_historial()
+
+
+def test_sugerencia_escalada_llama_al_servidor_una_vez(agente):
+    primera = agente_rutinas.agente_sugerencia_rutina(CORREO, "Sentadilla", SEMANA)
+    segunda = agente_rutinas.agente_sugerencia_rutina(CORREO, "Sentadilla", SEMANA)
+
+    assert len(agente.pedidos) == 1
+    ruta, cuerpo = agente.pedidos[0]
+    assert ruta == "/v1/responses"
+    assert cuerpo["model"] == agente_rutinas.MODELO_SUGERENCIAS
+    assert "Sentadilla" in cuerpo["input"][1]["content"]
+    assert primera["peso_sugerido"] == segunda["peso_sugerido"] == 42.5
+    assert primera["historial_usado"][0]["peso"] == "40"
+
+
+def test_sugerencias_en_paralelo_reusan_la_cache(agente):
+    ejercicios = [{"nombre": "Sentadilla"}, {"nombre": "Press banca"}]
+
+    primeras = agente_rutinas.agente_sugerencias_rutina(CORREO, ejercicios, SEMANA, max_concurrencia=2)
+    segundas = agente_rutinas.agente_sugerencias_rutina(CORREO, ejercicios, SEMANA)
+
+    assert len(agente.pedidos) == 2
+    assert [r["peso_sugerido"] for r in primeras] == [42.5, 42.5]
+    assert [r["comentario"] for r in segundas] == ["stub", "stub"]
+
+
+def test_cache_en_memoria_es_lru_acotada(tmp_path):
+    cache = _CacheRespuestas(tmp_path, 3600, max_memoria=2)
+    cache.set("a", "A")
+    cache.set("b", "B")
+    assert cache.get("a") == "A"          # "a" pasa a ser la más reciente
+    cache.set("c", "C")
+
+    assert list(cache._mem) == ["a", "c"]
+    # La expulsada de memoria sigue en disco
+    assert cache.get("b") == "B"
+    assert len(cache._mem) == 2
+
+
+def test_podar_borra_solo_archivos_vencidos(tmp_path):
+    cache = _CacheRespuestas(tmp_path, 60)
+    cache.set("viejo", "x")
+    cache.set("nuevo", "y")
+    huerfano = tmp_path / "perdido.123.tmp"
+    huerfano.write_text("{}", encoding="utf-8")
+    hace_rato = time.time() - 120
+    for ruta in (tmp_path / "viejo.json", huerfano):
+        os.utime(ruta, (hace_rato, hace_rato))
+
+    assert cache.podar() == 2
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["nuevo.json"]
+    assert cache.get("nuevo") == "y"
@@ -0,0 +1,40 @@
+"""Índice de búsqueda de ejercicios: coincidencias, typos y caché por versión."""
+from __future__ import annotations
+
+from app_core.busqueda_ejercicios import IndiceEjercicios, obtener_indice
+
+CATALOGO = {
+    "Pullover con mancuerna": {"grupo_muscular_principal": "Pecho"},
+    "Press banca": {"buscable_id": "press_banca", "patron_de_movimiento": "Empuje horizontal"},
+    "Sentadilla búlgara": {"grupo_muscular_principal": "Cuádriceps"},
+    "Remo con polea": {"grupo_muscular_principal": "Espalda"},
+}
+
+
+def test_prefijo_y_nombre_completo():
+    indice = IndiceEjercicios(CATALOGO)
+    assert indice.buscar("pre") == ["Press banca"]
+    assert indice.buscar("remo polea") == ["Remo con polea"]
+
+
+def test_subcadena_corta_dentro_de_palabra():
+    indice = IndiceEjercicios(CATALOGO)
+    assert "Pullover con mancuerna" in indice.buscar("ll")
+
+
+def test_typo_y_tildes():
+    indice = IndiceEjercicios(CATALOGO)
+    assert indice.buscar("sentadila bulgara")[0] == "Sentadilla búlgara"
+
+
+def test_campos_extra_pesan_menos_que_el_nombre():
+    catalogo = {**CATALOGO, "Aperturas pecho": {}}
+    assert IndiceEjercicios(catalogo).buscar("pecho")[0] == "Aperturas pecho"
+
+
+def test_indice_distinto_por_version_y_por_vista():
+    base = obtener_indice(CATALOGO, version=1)
+    assert obtener_indice(dict(CATALOGO), version=1) is base
+    assert obtener_indice(CATALOGO, version=2) is not base
+    vista_reducida = {k: v for k, v in CATALOGO.items() if k != "Press banca"}
+    assert obtener_indice(vista_reducida, version=1) is not base
@@ -0,0 +1,58 @@
+"""Refresco incremental del catálogo de ejercicios: cambios por `updated_at` y borrados anotados."""
+from __future__ import annotations
+
+import pytest
+
+pytest.importorskip("streamlit")
+
+from app_core import ejercicios_catalogo  # noqa: E402
+from app_core.ejercicios_catalogo import (  # noqa: E402
+    _CatalogoProceso,
+    borrar_ejercicio,
+    guardar_ejercicio,
+)
+
+
+@pytest.fixture
+def catalogo(db_falsa, monkeypatch):
+    cargas = []
+    proceso = _CatalogoProceso()
+    original = proceso._carga_completa
+    monkeypatch.setattr(proceso, "_carga_completa", lambda db: cargas.append(1) or original(db))
+    guardar_ejercicio(db_falsa, "a", {"nombre": "Sentadilla"})
+    guardar_ejercicio(db_falsa, "b", {"nombre": "Remo"})
+    proceso.snapshot(db_falsa)
+    return proceso, cargas
+
+
+def _refrescar(proceso, db):
+    proceso.marcar_desactualizado()
+    return proceso.snapshot(db)
+
+
+def test_borrado_se_aplica_sin_recargar_la_coleccion(db_falsa, catalogo):
+    proceso, cargas = catalogo
+
+    borrar_ejercicio(db_falsa, "a")
+    version, docs = _refrescar(proceso, db_falsa)
+
+    assert sorted(docs) == ["b"]
+    assert version == 3
+    assert cargas == [1]   # solo la carga inicial
+    assert db_falsa.docs[f"{ejercicios_catalogo.COLECCION_CONFIG}/{ejercicios_catalogo.DOC_VERSION}"]["borrados"] == ["a"]
+
+
+def test_recrear_un_id_borrado_lo_saca_de_la_lista(db_falsa, catalogo):
+    proceso, cargas = catalogo
+    borrar_ejercicio(db_falsa, "a")
+    _refrescar(proceso, db_falsa)
+
+    guardar_ejercicio(db_falsa, "a", {"nombre": "Sentadilla frontal"})
+    _refrescar(proceso, db_falsa)
+    for nombre in ("Remo con barra", "Remo con mancuerna"):   # rondas en que "a" ya no cambia
+        guardar_ejercicio(db_falsa, "b", {"nombre": nombre})
+        _, docs = _refrescar(proceso, db_falsa)
+
+    assert docs["a"]["nombre"] == "Sentadilla frontal"
+    assert docs["b"]["nombre"] == "Remo con mancuerna"
+    assert cargas == [1]
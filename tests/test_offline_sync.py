@@ -0,0 +1,143 @@
+"""Coalescencia de la cola offline y envío idempotente en batches (Firestore en memoria)."""
+from __future__ import annotations
+
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("streamlit_local_storage")
+
+import offline_sync  # noqa: E402
+from offline_sync import COLECCION_IDEMPOTENCIA, PARES_POR_LOTE, coalescer_mutaciones  # noqa: E402
+
+
+def _mut(i, doc_path, data, merge=True, op="update_doc"):
+    return {"id": f"m{i}", "op": op, "doc_path": doc_path, "data": data, "merge": merge}
+
+
+@pytest.fixture
+def sync(db_falsa, monkeypatch):
+    """Conecta try_sync_now a la base en memoria y a un estado local en un dict."""
+    estado = {"mutations": [], "last_sync_ok": None, "offline": False}
+    escrito = {}
+
+    def _write(mutations, last_sync_ok=None, legacy=False):
+        escrito.update(mutations=mutations, last_sync_ok=last_sync_ok)
+
+    monkeypatch.setattr(offline_sync, "get_db", lambda: db_falsa)
+    monkeypatch.setattr(offline_sync, "read_sync_state", lambda: dict(estado))
+    monkeypatch.setattr(offline_sync, "write_sync_state", _write)
+    return estado, escrito
+
+
+def test_merges_se_fusionan_y_set_sin_merge_reemplaza():
+    queue = [
+        _mut(1, "rutinas_semanales/a", {"rutina": {"1": {"peso": 80}}}),
+        _mut(2, "rutinas_semanales/b", {"x": 1}),
+        _mut(3, "rutinas_semanales/a", {"rutina": {"1": {"reps": 8}, "2": {"peso": 60}}}),
+        _mut(4, "rutinas_semanales/a", {"solo": True}, merge=False),
+        _mut(5, "rutinas_semanales/a", {"rutina": {"3": {"rir": 2}}}),
+        _mut(6, "rutinas_semanales/c", {}, op="delete_doc"),
+    ]
+
+    grupos, no_soportadas = coalescer_mutaciones(queue)
+
+    assert [g.doc_path for g in grupos] == ["rutinas_semanales/a", "rutinas_semanales/b"]
+    a = grupos[0]
+    assert a.data == {"solo": True, "rutina": {"3": {"rir": 2}}}
+    assert a.merge is False
+    assert a.ids == ["m1", "m3", "m4", "m5"]
+    assert [m["id"] for m in no_soportadas] == ["m6"]
+
+
+def test_merges_sin_set_conservan_campos_anidados():
+    queue = [
+        _mut(1, "rutinas_semanales/a", {"rutina": {"1": {"peso": 80, "reps": 6}}}),
+        _mut(2, "rutinas_semanales/a", {"rutina": {"1": {"reps": 8}}}),
+    ]
+
+    (grupo,), _ = coalescer_mutaciones(queue)
+
+    assert grupo.merge is True
+    assert grupo.data == {"rutina": {"1": {"peso": 80, "reps": 8}}}
+
+
+def test_aplicar_en_orden_equivale_a_la_escritura_agrupada(db_falsa, sync):
+    estado, escrito = sync
+    db_falsa.collection("rutinas_semanales").document("a").set({"previo": 1, "rutina": {"1": {"peso": 70}}})
+    estado["mutations"] = [
+        _mut(1, "rutinas_semanales/a", {"rutina": {"1": {"reps": 8}}}),
+        _mut(2, "rutinas_semanales/a", {"rutina": {"2": {"peso": 50}}}),
+    ]
+
+    assert offline_sync.try_sync_now() == (2, 0)
+
+    assert db_falsa.docs["rutinas_semanales/a"] == {"previo": 1, "rutina": {"1": {"peso": 70, "reps": 8}, "2": {"peso": 50}}}
+    assert escrito["mutations"] == []
+    assert escrito["last_sync_ok"] is not None
+
+
+def test_marca_y_escritura_no_se_separan_en_el_limite_del_batch(db_falsa, sync):
+    estado, escrito = sync
+    n = PARES_POR_LOTE + 3
+    estado["mutations"] = [_mut(i, f"rutinas_semanales/d{i}", {"v": i}) for i in range(n)]
+
+    assert offline_sync.try_sync_now() == (n, 0)
+
+    assert db_falsa.commits == [2 * PARES_POR_LOTE, 2 * 3]
+    marcas = [p for p in db_falsa.docs if p.startswith(COLECCION_IDEMPOTENCIA + "/")]
+    assert len(marcas) == n
+    assert all(db_falsa.docs[f"rutinas_semanales/d{i}"] == {"v": i} for i in range(n))
+    assert escrito["mutations"] == []
+
+
+def test_reintento_omite_grupos_ya_aplicados(db_falsa, sync):
+    estado, escrito = sync
+    estado["mutations"] = [
+        _mut(1, "rutinas_semanales/a", {"v": "nuevo"}),
+        _mut(2, "rutinas_semanales/b", {"v": "nuevo"}),
+    ]
+    grupos, _ = coalescer_mutaciones(estado["mutations"])
+    # Un intento anterior llegó a escribir "a" (con su marca) pero no recibió la respuesta
+    db_falsa.collection(COLECCION_IDEMPOTENCIA).document(grupos[0].clave).set({"doc_path": "rutinas_semanales/a"})
+    db_falsa.collection("rutinas_semanales").document("a").set({"v": "aplicado antes"})
+
+    assert offline_sync.try_sync_now() == (2, 0)
+
+    # El primer batch falla por la marca repetida; el reintento solo lleva "b"
+    assert db_falsa.commits == [4, 2]
+    assert db_falsa.docs["rutinas_semanales/a"] == {"v": "aplicado antes"}
+    assert db_falsa.docs["rutinas_semanales/b"] == {"v": "nuevo"}
+    assert escrito["mutations"] == []
+
+
+def test_respuesta_perdida_no_duplica_ni_deja_pendientes(db_falsa, sync):
+    estado, escrito = sync
+    db_falsa.perder_respuestas = 1
+    estado["mutations"] = [_mut(1, "rutinas_semanales/a", {"v": 1})]
+
+    assert offline_sync.try_sync_now() == (1, 0)
+
+    assert db_falsa.commits == [2]   # el reintento encuentra la marca y no reenvía
+    assert escrito["mutations"] == []
+
+
+def test_fallo_persistente_deja_la_mutacion_en_cola(db_falsa, sync):
+    estado, escrito = sync
+    db_falsa.perder_respuestas = 0
+    estado["mutations"] = [_mut(1, "rutinas_semanales/a", {"v": 1}), _mut(2, "ruta/invalida/x", {"v": 2})]
+
+    ok, fail = offline_sync.try_sync_now()
+
+    assert (ok, fail) == (1, 1)
+    assert [m["id"] for m in escrito["mutations"]] == ["m2"]
+    assert escrito["last_sync_ok"] is None
+
+
+def test_offline_no_toca_la_base(db_falsa, sync):
+    estado, escrito = sync
+    estado["offline"] = True
+    estado["mutations"] = [_mut(1, "rutinas_semanales/a", {"v": 1})]
+
+    assert offline_sync.try_sync_now() == (0, 0)
+    assert db_falsa.commits == []
+    assert escrito == {}
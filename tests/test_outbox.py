@@ -0,0 +1,213 @@
+"""Envío por SMTP contra un servidor local y drenado del outbox sobre Firestore en memoria."""
+from __future__ import annotations
+
+import sys
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app_core import outbox
+from app_core.email_dispatcher import ERROR_DESHABILITADAS, MensajeCorreo, ResultadoEnvio, enviar_lote
+
+
+def _settings_smtp(servidor, **extra):
+    base = dict(
+        api_key="",
+        from_email="coach@example.com",
+        from_name="Coach",
+        reply_to=None,
+        smtp_host=servidor.host,
+        smtp_port=servidor.port,
+        smtp_user="coach@example.com",
+        smtp_password="secreto",
+        use_ssl=False,
+        use_starttls=False,
+    )
+    base.update(extra)
+    return SimpleNamespace(**base)
+
+
+def _mensajes(n):
+    return [
+        MensajeCorreo(f"cliente{i}@example.com", f"Asunto {i}", f"<p>Hola {i}</p>", f"Hola {i}")
+        for i in range(n)
+    ]
+
+
+def test_lote_smtp_reutiliza_una_sesion_por_worker(smtp_local):
+    resultados = enviar_lote(_settings_smtp(smtp_local), _mensajes(6), max_workers=2)
+
+    assert [r.ok for r in resultados] == [True] * 6
+    assert [r.destinatario for r in resultados] == [f"cliente{i}@example.com" for i in range(6)]
+    assert smtp_local.sesiones == 2
+    assert sorted(rcpt[0] for _, rcpt, _ in smtp_local.mensajes) == sorted(r.destinatario for r in resultados)
+
+
+def test_lote_smtp_reconecta_si_el_servidor_corta(smtp_local):
+    smtp_local.cerrar_tras = 1
+
+    resultados = enviar_lote(_settings_smtp(smtp_local), _mensajes(3), max_workers=1)
+
+    assert all(r.ok for r in resultados)
+    assert len(smtp_local.mensajes) == 3
+    assert smtp_local.sesiones == 3
+
+
+def test_lote_smtp_informa_error_por_destinatario(smtp_local):
+    settings = _settings_smtp(smtp_local, smtp_port=1)   # nadie escucha
+
+    resultados = enviar_lote(settings, _mensajes(2), max_workers=2)
+
+    assert [r.ok for r in resultados] == [False, False]
+    assert all(r.error for r in resultados)
+
+
+def _encolar_vencido(db, correo, proximo, intentos=0):
+    db.collection(outbox.COLECCION_OUTBOX).document(outbox.clave_outbox(correo, "rutina_disponible", "2026-10-19")).set({
+        "destinatario": correo,
+        "plantilla": "rutina_disponible",
+        "semana": "2026-10-19",
+        "params": {"correo": correo},
+        "estado": outbox.ESTADO_PENDIENTE,
+        "intentos": intentos,
+        "proximo_intento": proximo,
+        "ultimo_error": "",
+    })
+
+
+def _por_destinatario(db):
+    return {
+        data["destinatario"]: data
+        for path, data in db.docs.items()
+        if path.startswith(outbox.COLECCION_OUTBOX + "/")
+    }
+
+
+@pytest.fixture
+def cola(db_falsa, monkeypatch):
+    """procesar_outbox sobre la base en memoria, con plantilla y envío reemplazados (sin email_templates)."""
+    enviados = []
+    respuesta = {"error": "", "excepcion": None}
+
+    def _enviar(mensajes):
+        if respuesta["excepcion"] is not None:
+            raise respuesta["excepcion"]
+        enviados.extend(m.to_email for m in mensajes)
+        return [ResultadoEnvio(m.to_email, not respuesta["error"], respuesta["error"]) for m in mensajes]
+
+    plantilla = lambda correo, **_: MensajeCorreo(correo, "Rutina", "<p>Hola</p>", "Hola")  # noqa: E731
+    monkeypatch.setattr(outbox, "get_db", lambda: db_falsa)
+    monkeypatch.setattr(outbox, "_plantillas", lambda: {"rutina_disponible": plantilla})
+    monkeypatch.setattr(outbox, "_enviar", _enviar)
+    return enviados, respuesta
+
+
+def test_no_reclama_mas_que_el_limite(db_falsa, cola):
+    enviados, _ = cola
+    ahora = outbox._ahora()
+    for i in range(5):
+        _encolar_vencido(db_falsa, f"c{i}@example.com", ahora - timedelta(minutes=10 - i))
+
+    assert outbox.procesar_outbox(limite=2) == 2
+
+    assert enviados == ["c0@example.com", "c1@example.com"]
+    docs = _por_destinatario(db_falsa)
+    assert [docs[f"c{i}@example.com"]["estado"] for i in range(5)] == (
+        [outbox.ESTADO_ENVIADO] * 2 + [outbox.ESTADO_PENDIENTE] * 3
+    )
+    # los que no entraron al lote no quedan con lease ni con el próximo intento corrido
+    assert all("lease_hasta" not in docs[f"c{i}@example.com"] for i in range(2, 5))
+    assert outbox.procesar_outbox(limite=2) == 2
+    assert enviados[2:] == ["c2@example.com", "c3@example.com"]
+
+
+def test_excepcion_del_envio_libera_con_backoff(db_falsa, cola):
+    _, respuesta = cola
+    respuesta["excepcion"] = ConnectionError("sin red")
+    ahora = outbox._ahora()
+    _encolar_vencido(db_falsa, "a@example.com", ahora - timedelta(minutes=1), intentos=2)
+
+    assert outbox.procesar_outbox() == 1
+
+    doc = _por_destinatario(db_falsa)["a@example.com"]
+    assert doc["estado"] == outbox.ESTADO_PENDIENTE
+    assert doc["intentos"] == 3
+    assert doc["ultimo_error"] == "sin red"
+    assert doc["proximo_intento"] >= ahora + outbox._backoff(3)
+
+
+def test_error_transitorio_agota_los_intentos(db_falsa, cola):
+    _, respuesta = cola
+    respuesta["error"] = "421 servicio no disponible"
+    _encolar_vencido(db_falsa, "a@example.com", outbox._ahora(), intentos=outbox.MAX_INTENTOS - 1)
+
+    assert outbox.procesar_outbox() == 1
+
+    doc = _por_destinatario(db_falsa)["a@example.com"]
+    assert (doc["estado"], doc["intentos"]) == (outbox.ESTADO_FALLIDO, outbox.MAX_INTENTOS)
+
+
+def test_correo_deshabilitado_se_omite_sin_reintentar(db_falsa, cola):
+    _, respuesta = cola
+    respuesta["error"] = ERROR_DESHABILITADAS
+    _encolar_vencido(db_falsa, "a@example.com", outbox._ahora())
+
+    assert outbox.procesar_outbox() == 1
+
+    doc = _por_destinatario(db_falsa)["a@example.com"]
+    assert doc["estado"] == outbox.ESTADO_OMITIDO
+    assert doc["intentos"] == 0
+    assert doc["ultimo_error"] == ERROR_DESHABILITADAS
+
+
+# email_templates usa f-strings con barras invertidas (PEP 701)
+@pytest.mark.skipif(sys.version_info < (3, 12), reason="email_templates requiere Python 3.12+")
+def test_procesar_outbox_envia_solo_los_vencidos(db_falsa, smtp_local, monkeypatch):
+    from app_core import email_notifications
+
+    settings = email_notifications.EmailSettings(
+        enabled=True,
+        from_email="coach@example.com",
+        smtp_host=smtp_local.host,
+        smtp_port=smtp_local.port,
+        smtp_user="coach@example.com",
+        smtp_password="secreto",
+        use_ssl=False,
+    )
+    monkeypatch.setattr(outbox, "get_db", lambda: db_falsa)
+    monkeypatch.setattr(email_notifications, "_settings", lambda: settings)
+
+    ahora = outbox._ahora()
+    for correo, proximo in (("vencido@example.com", ahora - timedelta(minutes=1)),
+                            ("futuro@example.com", ahora + timedelta(hours=1))):
+        clave = outbox.clave_outbox(correo, "rutina_disponible", "2026-10-19")
+        db_falsa.collection(outbox.COLECCION_OUTBOX).document(clave).set({
+            "destinatario": correo,
+            "plantilla": "rutina_disponible",
+            "semana": "2026-10-19",
+            "params": {
+                "correo": correo,
+                "nombre": "Cliente",
+                "fecha_inicio": date(2026, 10, 19).isoformat(),
+                "semanas": 4,
+                "empresa": "asesoria",
+                "coach": "Coach",
+            },
+            "estado": outbox.ESTADO_PENDIENTE,
+            "intentos": 0,
+            "proximo_intento": proximo,
+            "ultimo_error": "",
+        })
+
+    assert outbox.procesar_outbox() == 1
+
+    assert [rcpt for _, rcpt, _ in smtp_local.mensajes] == [["vencido@example.com"]]
+    estados = {
+        data["destinatario"]: data["estado"]
+        for path, data in db_falsa.docs.items()
+        if path.startswith(outbox.COLECCION_OUTBOX + "/")
+    }
+    assert estados == {"vencido@example.com": outbox.ESTADO_ENVIADO, "futuro@example.com": outbox.ESTADO_PENDIENTE}
+    # Un segundo pase no encuentra nada vencido
+    assert outbox.procesar_outbox() == 0
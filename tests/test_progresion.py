@@ -0,0 +1,94 @@
+"""Reglas de autorregulación de `app_core.progresion` y los casos que se escalan a la IA."""
+from __future__ import annotations
+
+import pytest
+
+from app_core.progresion import INCREMENTO_KG, decidir_progresion, resumir_historial
+from app_core.utils_rm import calcular_peso_por_porcentaje, calcular_rm_teorico
+
+
+def _serie(fecha, peso, reps, rir, reps_min=6, reps_max=8, rir_obj=2):
+    return {
+        "fecha": fecha, "peso": str(peso), "reps_min": reps_min, "reps_max": reps_max, "rir": rir_obj,
+        "peso_alcanzado": peso, "reps_alcanzadas": reps, "rir_alcanzado": rir,
+    }
+
+
+def test_sin_historial_pide_peso_inicial():
+    decision = decidir_progresion([])
+
+    assert decision.regla == "sin_historial"
+    assert decision.peso_sugerido is None
+
+
+def test_porcentaje_usa_el_e1rm_de_la_ultima_sesion():
+    historial = [_serie("2026_10_05", 90, 6, 1), _serie("2026_10_12", 100, 5, 0)]
+
+    decision = decidir_progresion(historial, porcentaje_objetivo=80)
+
+    rm = calcular_rm_teorico(100, 5, 0)
+    assert decision.regla == "porcentaje_rm"
+    assert decision.rm_teorico == rm
+    assert decision.peso_sugerido == calcular_peso_por_porcentaje(rm, 80)
+    assert decision.reps_sugeridas == "6-8"
+
+
+def test_progresa_al_completar_el_tope_con_el_rir_objetivo():
+    decision = decidir_progresion([_serie("2026_10_12", 60, 8, 2)])
+
+    assert decision.regla == "progresar"
+    assert decision.peso_sugerido == 60 + INCREMENTO_KG
+    assert decision.rir_sugerido == 2
+
+
+def test_mantiene_dentro_del_rango():
+    decision = decidir_progresion([_serie("2026_10_12", 60, 7, 2)])
+
+    assert decision.regla == "mantener"
+    assert decision.peso_sugerido == 60
+
+
+def test_baja_si_no_llega_al_rango_al_fallo():
+    decision = decidir_progresion([_serie("2026_10_12", 60, 5, 0)])
+
+    assert decision.regla == "bajar"
+    assert decision.peso_sugerido == 60 - INCREMENTO_KG
+
+
+@pytest.mark.parametrize("historial", [
+    # solo lo planificado, sin reportes
+    [{"fecha": "2026_10_12", "peso": "60", "reps_min": 6, "reps_max": 8, "rir": 2}],
+    # subiría, pero el e1RM cayó más de lo tolerado respecto de la semana anterior
+    [_serie("2026_10_05", 70, 8, 2), _serie("2026_10_12", 60, 8, 2)],
+    # subiría, pero con el mismo peso el RIR bajó dos puntos (fatiga)
+    [_serie("2026_10_05", 60, 7, 4), _serie("2026_10_12", 60, 8, 2)],
+    # bajaría, pero el e1RM viene subiendo
+    [_serie("2026_10_05", 50, 5, 0), _serie("2026_10_12", 60, 5, 0)],
+    # dentro del rango pero con un RIR lejos del objetivo
+    [_serie("2026_10_12", 60, 7, 5)],
+    # falta el RIR reportado
+    [_serie("2026_10_12", 60, 8, None)],
+    # falta el rango planificado
+    [_serie("2026_10_12", 60, 8, 2, reps_min=None, reps_max=None)],
+], ids=["solo_planificado", "caida_e1rm", "deriva_rir", "e1rm_subiendo", "rir_lejano", "sin_rir", "sin_rango"])
+def test_casos_ambiguos_se_escalan(historial):
+    assert decidir_progresion(historial) is None
+
+
+@pytest.mark.parametrize("porcentaje", [None, 80])
+def test_peso_corporal_se_escala_sin_inventar_carga(porcentaje):
+    historial = [_serie("2026_10_12", 0, 12, 2, reps_min=8, reps_max=12)]
+
+    assert decidir_progresion(historial, porcentaje_objetivo=porcentaje) is None
+
+
+def test_resumen_tiene_tamano_fijo():
+    corto = [_serie(f"2026_{m:02d}_01", 60, 7, 2) for m in range(1, 3)]
+    largo = [_serie(f"2026_{m:02d}_01", 60, 7, 2) for m in range(1, 13)]
+
+    resumen_corto, resumen_largo = resumir_historial(corto), resumir_historial(largo)
+
+    assert resumen_corto.keys() == resumen_largo.keys()
+    assert len(resumen_largo["ultimas_series_top"]) == 3
+    assert resumen_largo["semanas"] == 12
+    assert resumen_largo["adherencia"] == {"reportado": 1.0, "en_rango": 1.0}
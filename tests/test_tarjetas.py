@@ -0,0 +1,68 @@
+"""Poda del disco de la caché de tarjetas y respaldo cuando falla el backend Pillow."""
+from __future__ import annotations
+
+import logging
+import os
+import time
+
+from app_core import tarjetas
+from app_core.tarjetas import BACKEND_PILLOW, Tarjeta, Texto, _CachePng
+
+
+def test_podar_borra_los_menos_usados_hasta_el_tope(tmp_path):
+    cache = _CachePng(tmp_path, max_memoria=4, max_disco=250)
+    for i, clave in enumerate(("a", "b", "c")):
+        cache.set(clave, b"x" * 100)
+        os.utime(tmp_path / f"{clave}.png", (time.time() - 300 + i, time.time() - 300 + i))
+    cache.limpiar_memoria()
+    assert cache.get("a") == b"x" * 100          # acierto en disco: "a" pasa a ser la más reciente
+    huerfano = tmp_path / "perdido.123.tmp"
+    huerfano.write_bytes(b"x")
+    os.utime(huerfano, (0, 0))
+
+    assert cache.podar() == 2
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.png", "c.png"]
+
+
+def test_set_poda_a_lo_mas_una_vez_por_intervalo(tmp_path, monkeypatch):
+    cache = _CachePng(tmp_path, max_memoria=4, max_disco=150)
+    llamadas = []
+    original = cache.podar
+    monkeypatch.setattr(cache, "podar", lambda: llamadas.append(1) or original())
+
+    for clave in ("a", "b", "c"):
+        cache.set(clave, b"x" * 100)
+
+    assert llamadas == [1]
+    assert len(list(tmp_path.glob("*.png"))) == 3
+
+
+def test_fallo_de_pillow_se_informa_aparte_y_usa_matplotlib(tmp_path, monkeypatch, caplog):
+    def _romper(_tarjeta):
+        raise OSError("sin fuentes")
+
+    monkeypatch.setattr(tarjetas, "_CACHE_TARJETAS", _CachePng(tmp_path, 4))
+    monkeypatch.setattr(tarjetas, "_render_pillow", _romper)
+    monkeypatch.setattr(tarjetas, "_render_local", lambda _tarjeta: b"png-matplotlib")
+
+    with caplog.at_level(logging.WARNING, logger=tarjetas.__name__):
+        png = tarjetas.tarjeta_png(Tarjeta((Texto(0.5, 0.5, "hola", 10),)), backend=BACKEND_PILLOW)
+
+    assert png == b"png-matplotlib"
+    assert [r.getMessage() for r in caplog.records] == [
+        "Fallo el render con Pillow; se rasteriza con matplotlib en el proceso"
+    ]
+
+
+def test_tarjeta_de_sesion_trunca_el_workout_y_suma_totales():
+    workout = [{"nombre": f"E{i}", "series": 3, "reps": 8, "peso": 50, "mejoro": i == 0} for i in range(11)]
+
+    tarjeta = tarjetas.tarjeta_resumen_sesion("Atleta", 2, workout, ("Piernas", 12))
+
+    textos = [t.texto for t in tarjeta.textos]
+    assert textos.count("• E0 8x50 ↑") == 1
+    assert sum(1 for t in textos if t.startswith("• E")) == 9
+    assert "+ 2 ejercicio(s) más…" in textos
+    assert "• Volumen estimado: 13200 kg" in textos
+    assert tarjeta == tarjetas.tarjeta_resumen_sesion("Atleta", 2, workout, ("Piernas", 12))
@@ -6,9 +6,21 @@ from firebase_admin import firestore
 from datetime import datetime, timedelta, date
 import json, random, re, math, html
 from io import BytesIO
-import matplotlib.pyplot as plt
 import time
+from app_core.cache import cache_data, notify_write
+from app_core.data_access import clave_rutinas, clave_rutinas_de_doc, rutina_semanal_por_id, rutinas_metadata
 from app_core.firebase_client import get_db
+from app_core.propagacion_pesos import (
+    CambioPeso,
+    avisar_propagacion,
+    formatear_peso,
+    mismo_ejercicio,
+    mostrar_aviso_propagacion,
+    peso_a_float,
+    propagar_pesos,
+)
+from app_core.rollups_semanales import actualizar_rollup, operacion_rollup
+from app_core.tarjetas import figura, tarjeta_png, tarjeta_resumen_sesion
 from app_core.theme import inject_theme
 from app_core.users_service import get_users_map
 from app_core.utils import empresa_de_usuario, EMPRESA_MOTION, EMPRESA_ASESORIA, EMPRESA_DESCONOCIDA
@@ -580,37 +592,6 @@ def _format_minutos(v) -> str:
     n = int(round(f))
     return f"{n} Minuto" if n == 1 else f"{n} Minutos"
 
-def _peso_to_float(v, unidad=None):
-    try:
-        raw = str(v or "")
-        unidad_norm = _normalizar_unidad_peso(unidad)
-        raw_low = raw.lower()
-        if unidad is None:
-            if "lb" in raw_low:
-                unidad_norm = "lb"
-            else:
-                unidad_norm = "kg"
-        s = raw_low.replace("kg", "").replace("lbs", "").replace("lb", "").replace(",", ".").strip()
-        if s == "":
-            return None
-        num = float(s)
-        if not math.isfinite(num):
-            return None
-        if unidad_norm == "lb":
-            num = num * 0.45359237
-        return num
-    except Exception:
-        return None
-
-def _format_peso_value(value: float) -> str:
-    if value is None:
-        return ""
-    if not math.isfinite(value):
-        return ""
-    if abs(value - round(value)) < 1e-4:
-        return str(int(round(value)))
-    formatted = f"{value:.2f}".rstrip("0").rstrip(".")
-    return formatted
 
 
 def _format_display_value(value) -> tuple[str, bool]:
@@ -798,7 +779,7 @@ def _render_top_sets_block(top_sets: list[dict], usar_libras: bool = False, most
             reps_txt = "—"
         peso_val, peso_es_num = _format_display_value(item.get("Peso"))
         if usar_libras:
-            peso_num = _peso_to_float(item.get("Peso"))
+            peso_num = peso_a_float(item.get("Peso"))
             if peso_num is not None:
                 peso_lb = peso_num * 2.20462
                 peso_val, peso_es_num = _format_display_value(peso_lb)
@@ -954,14 +935,6 @@ def _calcular_racha_dias(rutinas_cliente: list[dict], semana_sel: str) -> int:
 # ==========================
 #  Guardado / Reportes
 # ==========================
-def _match_mismo_ejercicio(a: dict, b: dict) -> bool:
-    if not isinstance(a, dict) or not isinstance(b, dict): return False
-    return (
-        (a.get("ejercicio","") == b.get("ejercicio","")) and
-        (a.get("circuito","")  == b.get("circuito",""))  and
-        (a.get("bloque", a.get("seccion","")) == b.get("bloque", b.get("seccion","")))
-    )
-
 def _normalizar_unidad_peso(valor) -> str:
     v = str(valor or "").strip().lower()
     if v in {"lb", "lbs", "libra", "libras"}:
@@ -1049,322 +1022,175 @@ def _preparar_ejercicio_para_guardado(e: dict, correo_actor: str) -> dict:
     if "bloque" not in e: e["bloque"] = e.get("seccion","")
     return e
 
-def _aplicar_delta_en_dia(dia_data, ejercicio_ref, delta, peso_base_ref):
-    def _actualizar_ex(ex):
-        if not isinstance(ex, dict):
-            return False
-        if not _match_mismo_ejercicio(ex, ejercicio_ref):
-            return False
-        peso_actual = _peso_to_float(ex.get("peso"), ex.get("peso_unidad"))
-        if peso_actual is None:
-            return False
-        if peso_base_ref is not None and abs(peso_actual - peso_base_ref) > 1e-4:
-            return False
-        nuevo_peso = max(0.0, peso_actual + delta)
-        ex["peso"] = _format_peso_value(nuevo_peso)
-        return True
-
-    changed = False
-
-    if isinstance(dia_data, list):
-        for ex in dia_data:
-            if _actualizar_ex(ex):
-                changed = True
-    elif isinstance(dia_data, dict):
-        ejercicios = None
-        if isinstance(dia_data.get("ejercicios"), list):
-            ejercicios = dia_data["ejercicios"]
-        if ejercicios is not None:
-            for ex in ejercicios:
-                if _actualizar_ex(ex):
-                    changed = True
-        else:
-            for key, ex in dia_data.items():
-                if isinstance(ex, dict) and _actualizar_ex(ex):
-                    dia_data[key] = ex
-                    changed = True
-    return changed
-
-
-def _asignar_peso_si_vacio(dia_data, ejercicio_ref, nuevo_peso_str):
-    def _actualizar_ex(ex):
-        if not isinstance(ex, dict):
-            return False
-        if not _match_mismo_ejercicio(ex, ejercicio_ref):
-            return False
-        peso_actual = ex.get("peso")
-        if not str(peso_actual or "").strip():
-            peso_actual = ex.get("Peso")
-        if str(peso_actual or "").strip():
-            return False
-        ex["peso"] = nuevo_peso_str
-        ex["Peso"] = nuevo_peso_str
-        return True
-
-    changed = False
-
-    if isinstance(dia_data, list):
-        for ex in dia_data:
-            if _actualizar_ex(ex):
-                changed = True
-    elif isinstance(dia_data, dict):
-        ejercicios = None
-        if isinstance(dia_data.get("ejercicios"), list):
-            ejercicios = dia_data["ejercicios"]
-        if ejercicios is not None:
-            for ex in ejercicios:
-                if _actualizar_ex(ex):
-                    changed = True
-        else:
-            for key, ex in dia_data.items():
-                if isinstance(ex, dict) and _actualizar_ex(ex):
-                    dia_data[key] = ex
-                    changed = True
-    return changed
-
-def _propagar_peso_a_futuras_semanas(db, correo_original, bloque_rutina, semana_sel, dia_sel, ejercicio_editado, delta, peso_base_ref):
-    if not correo_original or not bloque_rutina:
-        return
-    if delta is None or abs(delta) < 1e-4:
-        return
-    dia_sel = str(dia_sel)
-    try:
-        snaps = list(
-            db.collection("rutinas_semanales")
-              .where("correo", "==", correo_original)
-              .where("bloque_rutina", "==", bloque_rutina)
-              .stream()
-        )
-    except Exception:
-        return
-
-    futuros = []
-    for snap in snaps:
-        data = snap.to_dict() or {}
-        fecha = data.get("fecha_lunes")
-        if not fecha or fecha <= semana_sel:
-            continue
-        futuros.append((fecha, snap, data))
-
-    if not futuros:
-        return
-
-    futuros.sort(key=lambda tup: tup[0])
-    for _, snap, data in futuros:
-        rutina = data.get("rutina", {}) or {}
-        if dia_sel not in rutina:
-            continue
-        dia_data = rutina[dia_sel]
-        if _aplicar_delta_en_dia(dia_data, ejercicio_editado, delta, peso_base_ref):
-            try:
-                snap.reference.set({"rutina": {dia_sel: dia_data}}, merge=True)
-            except Exception:
-                continue
-
-
-def _propagar_peso_a_futuras_semanas_sin_base(db, correo_original, bloque_rutina, semana_sel, dia_sel, ejercicio_editado, nuevo_peso_val):
-    if not correo_original or not bloque_rutina:
-        return
-    if nuevo_peso_val is None:
-        return
-    dia_sel = str(dia_sel)
-    nuevo_peso_str = _format_peso_value(float(nuevo_peso_val))
-    if not nuevo_peso_str:
-        return
-    try:
-        snaps = list(
-            db.collection("rutinas_semanales")
-              .where("correo", "==", correo_original)
-              .where("bloque_rutina", "==", bloque_rutina)
-              .stream()
-        )
-    except Exception:
-        return
-
-    futuros = []
-    for snap in snaps:
-        data = snap.to_dict() or {}
-        fecha = data.get("fecha_lunes")
-        if not fecha or fecha <= semana_sel:
-            continue
-        futuros.append((fecha, snap, data))
-
-    if not futuros:
-        return
-
-    futuros.sort(key=lambda tup: tup[0])
-    for _, snap, data in futuros:
-        rutina = data.get("rutina", {}) or {}
-        if dia_sel not in rutina:
-            continue
-        dia_data = rutina[dia_sel]
-        if _asignar_peso_si_vacio(dia_data, ejercicio_editado, nuevo_peso_str):
-            try:
-                snap.reference.set({"rutina": {dia_sel: dia_data}}, merge=True)
-            except Exception:
-                continue
-
-def guardar_reporte_ejercicio(db, correo_cliente_norm, correo_original, semana_sel, dia_sel, ejercicio_editado, bloque_rutina=None):
+def _aplicar_reporte_en_lista(ejercicios_lista, ejercicio_editado):
+    """
+    Reemplaza (o agrega) el ejercicio reportado en la lista del día, en memoria.
+    Devuelve el `CambioPeso` a propagar a semanas futuras, o None si no hay peso alcanzado.
+    """
     ejercicio_editado["peso_unidad"] = _normalizar_unidad_peso(ejercicio_editado.get("peso_unidad") or ejercicio_editado.get("peso_unit"))
-    fecha_norm = semana_sel.replace("-", "_")
-    doc_id = f"{correo_cliente_norm}_{fecha_norm}"
-    doc_ref = db.collection("rutinas_semanales").document(doc_id)
-    doc = doc_ref.get()
-    if not doc.exists:
-        doc_ref.set({"rutina": {dia_sel: [ejercicio_editado]}}, merge=True); return True
-    rutina = doc.to_dict().get("rutina", {})
-    ejercicios_raw = rutina.get(dia_sel, [])
-    ejercicios_lista = obtener_lista_ejercicios(ejercicios_raw)
-    changed = False
     for i, ex in enumerate(ejercicios_lista):
-        if _match_mismo_ejercicio(ex, ejercicio_editado):
-            ejercicios_lista[i] = ejercicio_editado; changed = True; break
-    if not changed: ejercicios_lista.append(ejercicio_editado)
-    peso_base_ref = _peso_to_float(ejercicio_editado.get("peso"), ejercicio_editado.get("peso_unidad"))
+        if mismo_ejercicio(ex, ejercicio_editado):
+            ejercicios_lista[i] = ejercicio_editado
+            break
+    else:
+        ejercicios_lista.append(ejercicio_editado)
+    peso_base_ref = peso_a_float(ejercicio_editado.get("peso"), ejercicio_editado.get("peso_unidad"))
     if peso_base_ref is None:
-        peso_base_ref = _peso_to_float(ejercicio_editado.get("Peso"), ejercicio_editado.get("peso_unidad"))
+        peso_base_ref = peso_a_float(ejercicio_editado.get("Peso"), ejercicio_editado.get("peso_unidad"))
     peso_alcanzado_val = ejercicio_editado.get("peso_alcanzado")
     if peso_alcanzado_val is None:
         peso_alcanzado_val, _, _ = _parsear_series(
             ejercicio_editado.get("series_data", []),
             ejercicio_editado.get("peso_unidad"),
         )
-    peso_alcanzado_float = float(peso_alcanzado_val) if peso_alcanzado_val is not None else None
-    if peso_base_ref is None and peso_alcanzado_float is not None:
-        peso_formateado = _format_peso_value(peso_alcanzado_float)
+    if peso_alcanzado_val is None:
+        return None
+    peso_alcanzado_float = float(peso_alcanzado_val)
+    if peso_base_ref is None:
+        peso_formateado = formatear_peso(peso_alcanzado_float)
         if peso_formateado:
             ejercicio_editado["peso"] = peso_formateado
             ejercicio_editado["Peso"] = peso_formateado
             ejercicio_editado["peso_unidad"] = "kg"
+    return CambioPeso(ejercicio_editado, peso_alcanzado_float, peso_base_ref)
 
-    doc_ref.set({"rutina": {dia_sel: ejercicios_lista}}, merge=True)
 
-    if peso_alcanzado_float is not None:
-        if peso_base_ref is None:
-            _propagar_peso_a_futuras_semanas_sin_base(
-                db=db,
-                correo_original=correo_original,
-                bloque_rutina=bloque_rutina,
-                semana_sel=semana_sel,
-                dia_sel=dia_sel,
-                ejercicio_editado=ejercicio_editado,
-                nuevo_peso_val=peso_alcanzado_float,
-            )
-        else:
-            delta = float(peso_alcanzado_float) - float(peso_base_ref)
-            if abs(delta) >= 1e-4:
-                _propagar_peso_a_futuras_semanas(
-                    db=db,
-                    correo_original=correo_original,
-                    bloque_rutina=bloque_rutina,
-                    semana_sel=semana_sel,
-                    dia_sel=dia_sel,
-                    ejercicio_editado=ejercicio_editado,
-                    delta=delta,
-                    peso_base_ref=peso_base_ref,
-                )
 
+
+def guardar_reporte_ejercicio(db, correo_cliente_norm, correo_original, semana_sel, dia_sel, ejercicio_editado, bloque_rutina=None):
+    fecha_norm = semana_sel.replace("-", "_")
+    doc_id = f"{correo_cliente_norm}_{fecha_norm}"
+    doc_ref = db.collection("rutinas_semanales").document(doc_id)
+    doc = doc_ref.get()
+    if not doc.exists:
+        ejercicio_editado["peso_unidad"] = _normalizar_unidad_peso(ejercicio_editado.get("peso_unidad") or ejercicio_editado.get("peso_unit"))
+        doc_ref.set({"rutina": {dia_sel: [ejercicio_editado]}}, merge=True); return True
+    rutina = doc.to_dict().get("rutina", {})
+    ejercicios_lista = obtener_lista_ejercicios(rutina.get(dia_sel, []))
+    cambio = _aplicar_reporte_en_lista(ejercicios_lista, ejercicio_editado)
+
+    doc_ref.set({"rutina": {dia_sel: ejercicios_lista}}, merge=True)
+
+    avisar_propagacion(propagar_pesos(db, correo_original, bloque_rutina, semana_sel, dia_sel, [cambio]))
     return True
 
 
+def _campos_finalizado(dia_sel, correo_actor, rpe_valor=None) -> dict:
+    campos = {
+        f"{dia_sel}_finalizado": True,
+        f"{dia_sel}_finalizado_por": correo_actor,
+        f"{dia_sel}_finalizado_en": firestore.SERVER_TIMESTAMP,
+    }
+    if rpe_valor is not None:
+        campos[f"{dia_sel}_rpe"] = float(rpe_valor)
+    return campos
+
+
 def marcar_dia_como_finalizado(db, correo_cliente_norm, semana_sel, dia_sel, correo_actor, rpe_valor=None):
     dia_sel = str(dia_sel)
     fecha_norm = semana_sel.replace("-", "_")
     doc_id = f"{correo_cliente_norm}_{fecha_norm}"
     doc_ref = db.collection("rutinas_semanales").document(doc_id)
 
-    updates = {
-        "rutina": {
-            f"{dia_sel}_finalizado": True,
-            f"{dia_sel}_finalizado_por": correo_actor,
-            f"{dia_sel}_finalizado_en": firestore.SERVER_TIMESTAMP,
-        }
-    }
-    if rpe_valor is not None:
-        updates["rutina"][f"{dia_sel}_rpe"] = float(rpe_valor)
-
     try:
-        doc_ref.set(updates, merge=True)
+        doc_ref.set({"rutina": _campos_finalizado(dia_sel, correo_actor, rpe_valor)}, merge=True)
     except Exception:
         return False
+    actualizar_rollup(db, doc_id)
     return True
 
 
 def guardar_reportes_del_dia(db, correo_cliente_norm, correo_original, semana_sel, dia_sel, ejercicios, correo_actor, rpe_valor, bloque_rutina=None):
+    """
+    Guarda los reportes faltantes del día y lo marca finalizado en una sola transacción
+    (semana + rollup); después propaga los pesos a las semanas futuras en un batch.
+    """
     dia_sel = str(dia_sel)
     fecha_norm = semana_sel.replace("-", "_")
     doc_id = f"{correo_cliente_norm}_{fecha_norm}"
     doc_ref = db.collection("rutinas_semanales").document(doc_id)
-    doc = doc_ref.get()
-    ejercicios_guardados = []
-    if doc.exists:
-        rutina = doc.to_dict().get("rutina", {})
-        ejercicios_raw = rutina.get(dia_sel, [])
-        ejercicios_guardados = obtener_lista_ejercicios(ejercicios_raw)
+
     def _key_ex(e: dict):
         return ((e.get("bloque") or e.get("seccion") or "").strip().lower(),
                 (e.get("circuito") or "").strip().upper(),
                 (e.get("ejercicio") or "").strip().lower())
-    idx_guardados = {_key_ex(e): e for e in ejercicios_guardados if isinstance(e, dict)}
-    for e in ejercicios:
-        if not isinstance(e, dict): continue
-        key = _key_ex(e)
-        ex_prev = idx_guardados.get(key)
-        if ex_prev and _tiene_reporte_guardado(ex_prev): continue
-        e2 = _preparar_ejercicio_para_guardado(dict(e), correo_actor)
-        ok = guardar_reporte_ejercicio(
-            db=db,
-            correo_cliente_norm=correo_cliente_norm,
-            correo_original=correo_original,
-            semana_sel=semana_sel,
-            dia_sel=dia_sel,
-            ejercicio_editado=e2,
-            bloque_rutina=bloque_rutina,
-        )
-        if not ok: return False
-    return marcar_dia_como_finalizado(
-        db=db,
-        correo_cliente_norm=correo_cliente_norm,
-        semana_sel=semana_sel,
-        dia_sel=dia_sel,
-        correo_actor=correo_actor,
-        rpe_valor=rpe_valor,
-    )
+
+    @firestore.transactional
+    def _guardar(transaction):
+        doc = doc_ref.get(transaction=transaction)
+        data = (doc.to_dict() or {}) if doc.exists else {}
+        rutina = dict(data.get("rutina") or {})
+        ejercicios_lista = obtener_lista_ejercicios(rutina.get(dia_sel, []))
+        idx_guardados = {_key_ex(e): e for e in ejercicios_lista if isinstance(e, dict)}
+        cambios = []
+        for e in ejercicios:
+            if not isinstance(e, dict): continue
+            ex_prev = idx_guardados.get(_key_ex(e))
+            if ex_prev and _tiene_reporte_guardado(ex_prev): continue
+            e2 = _preparar_ejercicio_para_guardado(dict(e), correo_actor)
+            cambios.append(_aplicar_reporte_en_lista(ejercicios_lista, e2))
+
+        cambios_dia = {dia_sel: ejercicios_lista, **_campos_finalizado(dia_sel, correo_actor, rpe_valor)}
+        transaction.set(doc_ref, {"rutina": cambios_dia}, merge=True)
+        rutina.update(cambios_dia)
+        op_rollup = operacion_rollup(db, doc_id, {**data, "rutina": rutina})
+        if op_rollup is not None:
+            transaction.set(op_rollup.ref, op_rollup.data)
+        return cambios
+
+    try:
+        cambios = _guardar(db.transaction())
+    except Exception:
+        return False
+    avisar_propagacion(propagar_pesos(db, correo_original, bloque_rutina, semana_sel, dia_sel, cambios))
+    return True
 
 # ==========================
-#  PNG Resumen (no se toca)
+#  PNG Resumen (render y caché en app_core.tarjetas)
 # ==========================
-def generar_tarjeta_resumen_sesion(nombre, dia_indice, ejercicios_workout, focus_tuple, gym_name="Motion Performance") -> plt.Figure:
-    total_series = sum(int(e.get("series",0) or 0) for e in ejercicios_workout)
-    total_reps   = sum(int(e.get("series",0) or 0)*int(e.get("reps",0) or 0) for e in ejercicios_workout)
-    total_peso   = sum(int(e.get("series",0) or 0)*int(e.get("reps",0) or 0)*float(e.get("peso",0) or 0) for e in ejercicios_workout)
-    fig, ax = plt.subplots(figsize=(6,8), dpi=200); ax.axis("off")
-    ax.text(0.5,0.96,gym_name,ha="center",va="center",fontsize=18,fontweight="bold")
-    ax.text(0.5,0.92,"Resumen de Entrenamiento",ha="center",va="center",fontsize=13)
-    ax.text(0.5,0.87,f"Día {dia_indice}",ha="center",va="center",fontsize=11)
-    y=0.80; ax.text(0.05,y,"Workout",fontsize=12,fontweight="bold"); y-=0.03
-    if not ejercicios_workout:
-        ax.text(0.07,y,"Sin ejercicios en el circuito D.",fontsize=10,ha="left"); y-=0.04
-    else:
-        max_lineas=9; mostrados=0
-        for e in ejercicios_workout:
-            if mostrados>=max_lineas: break
-            linea=f"• {e['nombre']} {int(e.get('reps') or 0)}x{int(round(float(e.get('peso') or 0)))}"
-            color="green" if e.get("mejoro") else "black"
-            ax.text(0.07,y,linea+(" ↑" if e.get("mejoro") else ""),fontsize=10,ha="left",color=color)
-            y-=0.03; mostrados+=1
-        if len(ejercicios_workout)>max_lineas:
-            ax.text(0.07,y,f"+ {len(ejercicios_workout)-max_lineas} ejercicio(s) más…",fontsize=10,ha="left",style="italic"); y-=0.04
-    grupo,total=focus_tuple
-    y-=0.01; ax.text(0.05,y,"Focus",fontsize=12,fontweight="bold"); y-=0.03
-    ax.text(0.07,y,f"Grupo con más series: {grupo} ({total} series)",fontsize=11,ha="left"); y-=0.03
-    y-=0.01; ax.text(0.05,y,"Totales",fontsize=12,fontweight="bold"); y-=0.035
-    ax.text(0.07,y,f"• Series: {total_series}",fontsize=11,ha="left"); y-=0.028
-    ax.text(0.07,y,f"• Repeticiones: {total_reps}",fontsize=11,ha="left"); y-=0.028
-    ax.text(0.07,y,f"• Volumen estimado: {total_peso:g} kg",fontsize=11,ha="left"); y-=0.02
-    ax.text(0.5,0.08,"¡Gran trabajo!",fontsize=10.5,ha="center",style="italic")
-    ax.text(0.5,0.04,"Comparte tu progreso 📸",fontsize=9,ha="center")
-    fig.tight_layout(); return fig
+def generar_tarjeta_resumen_sesion(nombre, dia_indice, ejercicios_workout, focus_tuple, gym_name="Motion Performance"):
+    return figura(tarjeta_resumen_sesion(nombre, dia_indice, ejercicios_workout, focus_tuple, gym_name))
+
+def tarjeta_resumen_sesion_png(nombre, dia_indice, ejercicios_workout, focus_tuple, gym_name="Motion Performance") -> bytes:
+    return tarjeta_png(tarjeta_resumen_sesion(nombre, dia_indice, ejercicios_workout, focus_tuple, gym_name))
+
+# ==========================
+#  Carga de rutinas (cache por namespace / deportista)
+# ==========================
+@cache_data("rutinas_listado", show_spinner=False, ttl=120, max_entries=64)
+def cargar_todas_las_rutinas():
+    # Solo metadata (select); el mapa `rutina` se trae con cargar_rutina_completa
+    return rutinas_metadata()
+
+@cache_data("rutinas", key=clave_rutinas_de_doc, show_spinner=False, ttl=120, max_entries=512)
+def cargar_rutina_completa(doc_id: str) -> dict:
+    return rutina_semanal_por_id(doc_id) or {}
+
+def _con_payload(doc: dict | None) -> dict | None:
+    if not doc or "rutina" in doc or not doc.get("_id"):
+        return doc
+    completo = cargar_rutina_completa(doc["_id"])
+    return {**doc, **completo} if completo else doc
+
+@cache_data("rutinas", key=clave_rutinas, show_spinner=False, ttl=120, max_entries=512)
+def cargar_rutinas_por_correo(correo_objetivo: str) -> list[dict]:
+    correo_objetivo = (correo_objetivo or "").strip().lower()
+    if not correo_objetivo:
+        return []
+    try:
+        docs = (
+            get_db().collection("rutinas_semanales")
+              .where("correo", "==", correo_objetivo)
+              .stream()
+        )
+    except Exception:
+        return []
+    resultados: list[dict] = []
+    for doc in docs:
+        if not doc.exists:
+            continue
+        resultados.append(doc.to_dict())
+    return resultados
 
 # ==========================
 #  VISTA
@@ -1372,37 +1198,13 @@ def generar_tarjeta_resumen_sesion(nombre, dia_indice, ejercicios_workout, focus
 def ver_rutinas():
     # Firebase init
     db = get_db()
+    mostrar_aviso_propagacion()
 
     def normalizar_correo(c): return c.strip().lower().replace("@","_").replace(".","_")
     def obtener_fecha_lunes():
         hoy=datetime.now(); lunes=hoy-timedelta(days=hoy.weekday()); return lunes.strftime("%Y-%m-%d")
     def es_entrenador(rol): return rol.lower() in ["entrenador","admin","administrador"]
 
-    @st.cache_data(show_spinner=False, ttl=120, max_entries=64)
-    def cargar_todas_las_rutinas():
-        docs = db.collection("rutinas_semanales").stream()
-        return [doc.to_dict() for doc in docs]
-
-    @st.cache_data(show_spinner=False, ttl=120, max_entries=512)
-    def cargar_rutinas_por_correo(correo_objetivo: str) -> list[dict]:
-        correo_objetivo = (correo_objetivo or "").strip().lower()
-        if not correo_objetivo:
-            return []
-        try:
-            docs = (
-                db.collection("rutinas_semanales")
-                  .where("correo", "==", correo_objetivo)
-                  .stream()
-            )
-        except Exception:
-            return []
-        resultados: list[dict] = []
-        for doc in docs:
-            if not doc.exists:
-                continue
-            resultados.append(doc.to_dict())
-        return resultados
-
     # Usuario
     correo_raw = (st.session_state.get("correo","") or "").strip().lower()
     if not correo_raw: st.error("❌ No hay correo registrado."); st.stop()
@@ -1786,6 +1588,7 @@ def ver_rutinas():
     else:
         rutina_doc = next((r for r in rutinas_cliente if r.get("fecha_lunes")==semana_sel), None)
 
+    rutina_doc = _con_payload(rutina_doc)
     if not rutina_doc:
         st.warning("⚠️ No hay rutina para esa semana y cliente.")
         st.stop()
@@ -1924,7 +1727,7 @@ def ver_rutinas():
     ejercicios_prev_map = {}
     if mostrar_prev:
         semana_prev = (datetime.strptime(semana_sel, "%Y-%m-%d") - timedelta(days=7)).strftime("%Y-%m-%d")
-        rutina_prev_doc = next((r for r in rutinas_cliente if r.get("fecha_lunes")==semana_prev), None)
+        rutina_prev_doc = _con_payload(next((r for r in rutinas_cliente if r.get("fecha_lunes")==semana_prev), None))
         if rutina_prev_doc and str(dia_sel) in (rutina_prev_doc.get("rutina", {}) or {}):
             ejercicios_prev = obtener_lista_ejercicios(rutina_prev_doc["rutina"][str(dia_sel)])
             for ex in ejercicios_prev:
@@ -2062,7 +1865,7 @@ def ver_rutinas():
                         )
 
                     # 2) Cálculo de partes usando usa_libras
-                    peso_base_kg = _peso_to_float(e.get("peso"), unidad_origen)
+                    peso_base_kg = peso_a_float(e.get("peso"), unidad_origen)
                     if peso_base_kg is not None and usa_libras:
                         peso_valor, peso_es_num = _format_display_value(peso_base_kg * 2.20462)
                     elif peso_base_kg is not None:
@@ -2354,7 +2157,7 @@ def ver_rutinas():
                                     rpe_valor=None,
                                 )
                             st.success("✅ Reporte guardado.")
-                            st.cache_data.clear()
+                            notify_write("rutinas", clave_rutinas(rutina_doc.get("correo", "")))
                             st.rerun()
                         else:
                             st.error("❌ No se pudo guardar el reporte.")
@@ -2400,7 +2203,7 @@ def ver_rutinas():
                             bloque_rutina=rutina_doc.get("bloque_rutina"),
                         )
                         if ok_all:
-                            st.cache_data.clear()
+                            notify_write("rutinas", clave_rutinas(rutina_doc.get("correo", "")))
                             st.success("✅ Día finalizado y registrado correctamente. ¡Gran trabajo! 💪")
                             time.sleep(2.5)  
                             st.rerun()
@@ -5,11 +5,19 @@ import streamlit as st
 import firebase_admin
 from firebase_admin import credentials, firestore
 from datetime import datetime, timedelta, date
-import json, random, re, math
+import json, random, re
 from io import BytesIO
-import matplotlib.pyplot as plt
 import time
 from soft_login_full import soft_login_barrier
+from app_core.propagacion_pesos import (
+    CambioPeso,
+    avisar_propagacion,
+    mismo_ejercicio,
+    mostrar_aviso_propagacion,
+    peso_a_float,
+    propagar_pesos,
+)
+from app_core.tarjetas import figura, tarjeta_png, tarjeta_resumen_sesion
 soft_login_full = soft_login_barrier(required_roles=["entrenador", "deportista", "admin"])
 
 # ==========================
@@ -224,25 +232,6 @@ def _format_minutos(v) -> str:
     n = int(round(f))
     return f"{n} Minuto" if n == 1 else f"{n} Minutos"
 
-def _peso_to_float(v):
-    try:
-        s = str(v or "").lower().replace("kg", "").replace(",", ".").strip()
-        if s == "":
-            return None
-        return float(s)
-    except Exception:
-        return None
-
-def _format_peso_value(value: float) -> str:
-    if value is None:
-        return ""
-    if not math.isfinite(value):
-        return ""
-    if abs(value - round(value)) < 1e-4:
-        return str(int(round(value)))
-    formatted = f"{value:.2f}".rstrip("0").rstrip(".")
-    return formatted
-
 # ==========================
 #  NORMALIZACIÓN / LISTAS
 # ==========================
@@ -366,14 +355,6 @@ def _calcular_racha_dias(rutinas_cliente: list[dict], semana_sel: str) -> int:
 # ==========================
 #  Guardado / Reportes
 # ==========================
-def _match_mismo_ejercicio(a: dict, b: dict) -> bool:
-    if not isinstance(a, dict) or not isinstance(b, dict): return False
-    return (
-        (a.get("ejercicio","") == b.get("ejercicio","")) and
-        (a.get("circuito","")  == b.get("circuito",""))  and
-        (a.get("bloque", a.get("seccion","")) == b.get("bloque", b.get("seccion","")))
-    )
-
 def _parsear_series(series_data: list[dict]):
     pesos, reps, rirs = [], [], []
     for s in (series_data or []):
@@ -428,80 +409,20 @@ def _preparar_ejercicio_para_guardado(e: dict, correo_actor: str) -> dict:
     if "bloque" not in e: e["bloque"] = e.get("seccion","")
     return e
 
-def _aplicar_delta_en_dia(dia_data, ejercicio_ref, delta, peso_base_ref):
-    def _actualizar_ex(ex):
-        if not isinstance(ex, dict):
-            return False
-        if not _match_mismo_ejercicio(ex, ejercicio_ref):
-            return False
-        peso_actual = _peso_to_float(ex.get("peso"))
-        if peso_actual is None:
-            return False
-        if peso_base_ref is not None and abs(peso_actual - peso_base_ref) > 1e-4:
-            return False
-        nuevo_peso = max(0.0, peso_actual + delta)
-        ex["peso"] = _format_peso_value(nuevo_peso)
-        return True
-
-    changed = False
-
-    if isinstance(dia_data, list):
-        for ex in dia_data:
-            if _actualizar_ex(ex):
-                changed = True
-    elif isinstance(dia_data, dict):
-        ejercicios = None
-        if isinstance(dia_data.get("ejercicios"), list):
-            ejercicios = dia_data["ejercicios"]
-        if ejercicios is not None:
-            for ex in ejercicios:
-                if _actualizar_ex(ex):
-                    changed = True
-        else:
-            for key, ex in dia_data.items():
-                if isinstance(ex, dict) and _actualizar_ex(ex):
-                    dia_data[key] = ex
-                    changed = True
-    return changed
-
-def _propagar_peso_a_futuras_semanas(db, correo_original, bloque_rutina, semana_sel, dia_sel, ejercicio_editado, delta, peso_base_ref):
-    if not correo_original or not bloque_rutina:
-        return
-    if delta is None or abs(delta) < 1e-4:
-        return
-    dia_sel = str(dia_sel)
-    try:
-        snaps = list(
-            db.collection("rutinas_semanales")
-              .where("correo", "==", correo_original)
-              .where("bloque_rutina", "==", bloque_rutina)
-              .stream()
-        )
-    except Exception:
-        return
-
-    futuros = []
-    for snap in snaps:
-        data = snap.to_dict() or {}
-        fecha = data.get("fecha_lunes")
-        if not fecha or fecha <= semana_sel:
-            continue
-        futuros.append((fecha, snap, data))
-
-    if not futuros:
-        return
-
-    futuros.sort(key=lambda tup: tup[0])
-    for _, snap, data in futuros:
-        rutina = data.get("rutina", {}) or {}
-        if dia_sel not in rutina:
-            continue
-        dia_data = rutina[dia_sel]
-        if _aplicar_delta_en_dia(dia_data, ejercicio_editado, delta, peso_base_ref):
-            try:
-                snap.reference.set({"rutina": {dia_sel: dia_data}}, merge=True)
-            except Exception:
-                continue
+def _cambio_de_peso(ejercicio_editado: dict) -> CambioPeso | None:
+    peso_base_ref = peso_a_float(ejercicio_editado.get("peso"))
+    peso_alcanzado_val = ejercicio_editado.get("peso_alcanzado")
+    if peso_alcanzado_val is None:
+        peso_alcanzado_val, _, _ = _parsear_series(ejercicio_editado.get("series_data", []))
+    if peso_base_ref is None or peso_alcanzado_val is None:
+        return None
+    return CambioPeso(ejercicio_editado, float(peso_alcanzado_val), peso_base_ref)
+
+def _reemplazar_en_lista(ejercicios_lista: list, ejercicio_editado: dict) -> None:
+    for i, ex in enumerate(ejercicios_lista):
+        if mismo_ejercicio(ex, ejercicio_editado):
+            ejercicios_lista[i] = ejercicio_editado; return
+    ejercicios_lista.append(ejercicio_editado)
 
 def guardar_reporte_ejercicio(db, correo_cliente_norm, correo_original, semana_sel, dia_sel, ejercicio_editado, bloque_rutina=None):
     fecha_norm = semana_sel.replace("-", "_")
@@ -511,33 +432,12 @@ def guardar_reporte_ejercicio(db, correo_cliente_norm, correo_original, semana_s
     if not doc.exists:
         doc_ref.set({"rutina": {dia_sel: [ejercicio_editado]}}, merge=True); return True
     rutina = doc.to_dict().get("rutina", {})
-    ejercicios_raw = rutina.get(dia_sel, [])
-    ejercicios_lista = obtener_lista_ejercicios(ejercicios_raw)
-    changed = False
-    for i, ex in enumerate(ejercicios_lista):
-        if _match_mismo_ejercicio(ex, ejercicio_editado):
-            ejercicios_lista[i] = ejercicio_editado; changed = True; break
-    if not changed: ejercicios_lista.append(ejercicio_editado)
+    ejercicios_lista = obtener_lista_ejercicios(rutina.get(dia_sel, []))
+    _reemplazar_en_lista(ejercicios_lista, ejercicio_editado)
     doc_ref.set({"rutina": {dia_sel: ejercicios_lista}}, merge=True)
-
-    peso_base_ref = _peso_to_float(ejercicio_editado.get("peso"))
-    peso_alcanzado_val = ejercicio_editado.get("peso_alcanzado")
-    if peso_alcanzado_val is None:
-        peso_alcanzado_val, _, _ = _parsear_series(ejercicio_editado.get("series_data", []))
-    if peso_base_ref is not None and peso_alcanzado_val is not None:
-        delta = float(peso_alcanzado_val) - peso_base_ref
-        if abs(delta) >= 1e-4:
-            _propagar_peso_a_futuras_semanas(
-                db=db,
-                correo_original=correo_original,
-                bloque_rutina=bloque_rutina,
-                semana_sel=semana_sel,
-                dia_sel=dia_sel,
-                ejercicio_editado=ejercicio_editado,
-                delta=delta,
-                peso_base_ref=peso_base_ref,
-            )
-
+    avisar_propagacion(
+        propagar_pesos(db, correo_original, bloque_rutina, semana_sel, dia_sel, [_cambio_de_peso(ejercicio_editado)])
+    )
     return True
 
 def guardar_reportes_del_dia(db, correo_cliente_norm, correo_original, semana_sel, dia_sel, ejercicios, correo_actor, rpe_valor, bloque_rutina=None):
@@ -546,73 +446,41 @@ def guardar_reportes_del_dia(db, correo_cliente_norm, correo_original, semana_se
     doc_id = f"{correo_cliente_norm}_{fecha_norm}"
     doc_ref = db.collection("rutinas_semanales").document(doc_id)
     doc = doc_ref.get()
-    ejercicios_guardados = []
+    ejercicios_lista = []
     if doc.exists:
         rutina = doc.to_dict().get("rutina", {})
-        ejercicios_raw = rutina.get(dia_sel, [])
-        ejercicios_guardados = obtener_lista_ejercicios(ejercicios_raw)
+        ejercicios_lista = obtener_lista_ejercicios(rutina.get(dia_sel, []))
     def _key_ex(e: dict):
         return ((e.get("bloque") or e.get("seccion") or "").strip().lower(),
                 (e.get("circuito") or "").strip().upper(),
                 (e.get("ejercicio") or "").strip().lower())
-    idx_guardados = {_key_ex(e): e for e in ejercicios_guardados if isinstance(e, dict)}
+    idx_guardados = {_key_ex(e): e for e in ejercicios_lista if isinstance(e, dict)}
+    cambios = []
     for e in ejercicios:
         if not isinstance(e, dict): continue
-        key = _key_ex(e)
-        ex_prev = idx_guardados.get(key)
+        ex_prev = idx_guardados.get(_key_ex(e))
         if ex_prev and _tiene_reporte_guardado(ex_prev): continue
         e2 = _preparar_ejercicio_para_guardado(dict(e), correo_actor)
-        ok = guardar_reporte_ejercicio(
-            db=db,
-            correo_cliente_norm=correo_cliente_norm,
-            correo_original=correo_original,
-            semana_sel=semana_sel,
-            dia_sel=dia_sel,
-            ejercicio_editado=e2,
-            bloque_rutina=bloque_rutina,
-        )
-        if not ok: return False
-    updates = {"rutina": {f"{dia_sel}_finalizado": True,
+        _reemplazar_en_lista(ejercicios_lista, e2)
+        cambios.append(_cambio_de_peso(e2))
+    updates = {"rutina": {dia_sel: ejercicios_lista,
+                          f"{dia_sel}_finalizado": True,
                           f"{dia_sel}_finalizado_por": correo_actor,
                           f"{dia_sel}_finalizado_en": firestore.SERVER_TIMESTAMP}}
     if rpe_valor is not None:
         updates["rutina"][f"{dia_sel}_rpe"] = float(rpe_valor)
-    doc_ref.set(updates, merge=True); return True
+    doc_ref.set(updates, merge=True)
+    avisar_propagacion(propagar_pesos(db, correo_original, bloque_rutina, semana_sel, dia_sel, cambios))
+    return True
 
 # ==========================
-#  PNG Resumen (no se toca)
+#  PNG Resumen (render y caché en app_core.tarjetas)
 # ==========================
-def generar_tarjeta_resumen_sesion(nombre, dia_indice, ejercicios_workout, focus_tuple, gym_name="Motion Performance") -> plt.Figure:
-    total_series = sum(int(e.get("series",0) or 0) for e in ejercicios_workout)
-    total_reps   = sum(int(e.get("series",0) or 0)*int(e.get("reps",0) or 0) for e in ejercicios_workout)
-    total_peso   = sum(int(e.get("series",0) or 0)*int(e.get("reps",0) or 0)*float(e.get("peso",0) or 0) for e in ejercicios_workout)
-    fig, ax = plt.subplots(figsize=(6,8), dpi=200); ax.axis("off")
-    ax.text(0.5,0.96,gym_name,ha="center",va="center",fontsize=18,fontweight="bold")
-    ax.text(0.5,0.92,"Resumen de Entrenamiento",ha="center",va="center",fontsize=13)
-    ax.text(0.5,0.87,f"Día {dia_indice}",ha="center",va="center",fontsize=11)
-    y=0.80; ax.text(0.05,y,"Workout",fontsize=12,fontweight="bold"); y-=0.03
-    if not ejercicios_workout:
-        ax.text(0.07,y,"Sin ejercicios en el circuito D.",fontsize=10,ha="left"); y-=0.04
-    else:
-        max_lineas=9; mostrados=0
-        for e in ejercicios_workout:
-            if mostrados>=max_lineas: break
-            linea=f"• {e['nombre']} {int(e.get('reps') or 0)}x{int(round(float(e.get('peso') or 0)))}"
-            color="green" if e.get("mejoro") else "black"
-            ax.text(0.07,y,linea+(" ↑" if e.get("mejoro") else ""),fontsize=10,ha="left",color=color)
-            y-=0.03; mostrados+=1
-        if len(ejercicios_workout)>max_lineas:
-            ax.text(0.07,y,f"+ {len(ejercicios_workout)-max_lineas} ejercicio(s) más…",fontsize=10,ha="left",style="italic"); y-=0.04
-    grupo,total=focus_tuple
-    y-=0.01; ax.text(0.05,y,"Focus",fontsize=12,fontweight="bold"); y-=0.03
-    ax.text(0.07,y,f"Grupo con más series: {grupo} ({total} series)",fontsize=11,ha="left"); y-=0.03
-    y-=0.01; ax.text(0.05,y,"Totales",fontsize=12,fontweight="bold"); y-=0.035
-    ax.text(0.07,y,f"• Series: {total_series}",fontsize=11,ha="left"); y-=0.028
-    ax.text(0.07,y,f"• Repeticiones: {total_reps}",fontsize=11,ha="left"); y-=0.028
-    ax.text(0.07,y,f"• Volumen estimado: {total_peso:g} kg",fontsize=11,ha="left"); y-=0.02
-    ax.text(0.5,0.08,"¡Gran trabajo!",fontsize=10.5,ha="center",style="italic")
-    ax.text(0.5,0.04,"Comparte tu progreso 📸",fontsize=9,ha="center")
-    fig.tight_layout(); return fig
+def generar_tarjeta_resumen_sesion(nombre, dia_indice, ejercicios_workout, focus_tuple, gym_name="Motion Performance"):
+    return figura(tarjeta_resumen_sesion(nombre, dia_indice, ejercicios_workout, focus_tuple, gym_name))
+
+def tarjeta_resumen_sesion_png(nombre, dia_indice, ejercicios_workout, focus_tuple, gym_name="Motion Performance") -> bytes:
+    return tarjeta_png(tarjeta_resumen_sesion(nombre, dia_indice, ejercicios_workout, focus_tuple, gym_name))
 
 # ==========================
 #  VISTA
@@ -624,6 +492,7 @@ def ver_rutinas():
         cred = credentials.Certificate(cred_dict)
         firebase_admin.initialize_app(cred)
     db = firestore.client()
+    mostrar_aviso_propagacion()
 
     def normalizar_correo(c): return c.strip().lower().replace("@","_").replace(".","_")
     def obtener_fecha_lunes():